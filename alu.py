@@ -1,3 +1,82 @@
+# Each operation takes two 32-bit values and returns a 32-bit result
+# They're plain functions so the CPU's dispatch table can call them directly
+
+def op_add(a, b):
+    return (a + b) & 0xFFFFFFFF
+
+def op_sub(a, b):
+    return (a - b) & 0xFFFFFFFF
+
+def op_and(a, b):
+    return a & b
+
+def op_or(a, b):
+    return a | b
+
+def op_xor(a, b):
+    return a ^ b
+
+def op_sll(a, b):
+    shift = b & 0x1F
+    return (a << shift) & 0xFFFFFFFF
+
+def op_srl(a, b):
+    shift = b & 0x1F
+    return (a >> shift) & 0xFFFFFFFF
+
+def op_sra(a, b):
+    # Shift right arithmetic - preserve sign bit
+    shift = b & 0x1F
+    
+    # AI Start - arithmetic right shift with sign extension
+    # Had trouble with this - needed to preserve sign bit for negative numbers
+    # Asked AI how to handle sign extension in Python
+    # AI explained: check MSB, if set then fill with 1s from left
+    if a & 0x80000000:
+        # Fill with 1s from the left
+        result = a >> shift
+        sign_bits = 0xFFFFFFFF << (32 - shift)
+        return (result | sign_bits) & 0xFFFFFFFF
+    else:
+        # Positive numbers just shift normally
+        return (a >> shift) & 0xFFFFFFFF
+    # AI End
+
+def op_slt(a, b):
+    # Set less than (signed)
+    # Convert to signed integers
+    if a & 0x80000000:
+        a_signed = a - 0x100000000
+    else:
+        a_signed = a
+    
+    if b & 0x80000000:
+        b_signed = b - 0x100000000
+    else:
+        b_signed = b
+    
+    return 1 if a_signed < b_signed else 0
+
+def op_sltu(a, b):
+    # Set less than unsigned - just compare directly
+    return 1 if a < b else 0
+
+
+# Operation name -> function
+OPERATIONS = {
+    'ADD': op_add,
+    'SUB': op_sub,
+    'AND': op_and,
+    'OR': op_or,
+    'XOR': op_xor,
+    'SLL': op_sll,
+    'SRL': op_srl,
+    'SRA': op_sra,
+    'SLT': op_slt,
+    'SLTU': op_sltu,
+}
+
+
 class ALU:
     """
     32-bit ALU for RISC-V processor
@@ -13,56 +92,9 @@ class ALU:
         a = a & 0xFFFFFFFF
         b = b & 0xFFFFFFFF
         
-        if operation == 'ADD':
-            self.result = (a + b) & 0xFFFFFFFF
-        elif operation == 'SUB':
-            self.result = (a - b) & 0xFFFFFFFF
-        elif operation == 'AND':
-            self.result = a & b
-        elif operation == 'OR':
-            self.result = a | b
-        elif operation == 'XOR':
-            self.result = a ^ b
-        elif operation == 'SLL':
-            shift = b & 0x1F
-            self.result = (a << shift) & 0xFFFFFFFF
-        elif operation == 'SRL':
-            shift = b & 0x1F
-            self.result = (a >> shift) & 0xFFFFFFFF
-        elif operation == 'SRA':
-            # Shift right arithmetic - preserve sign bit
-            shift = b & 0x1F
-            
-            # AI Start - arithmetic right shift with sign extension
-            # Had trouble with this - needed to preserve sign bit for negative numbers
-            # Asked AI how to handle sign extension in Python
-            # AI explained: check MSB, if set then fill with 1s from left
-            if a & 0x80000000:
-                # Fill with 1s from the left
-                result = a >> shift
-                sign_bits = 0xFFFFFFFF << (32 - shift)
-                self.result = (result | sign_bits) & 0xFFFFFFFF
-            else:
-                # Positive numbers just shift normally
-                self.result = (a >> shift) & 0xFFFFFFFF
-            # AI End
-        elif operation == 'SLT':
-            # Set less than (signed)
-            # Convert to signed integers
-            if a & 0x80000000:
-                a_signed = a - 0x100000000
-            else:
-                a_signed = a
-            
-            if b & 0x80000000:
-                b_signed = b - 0x100000000
-            else:
-                b_signed = b
-            
-            self.result = 1 if a_signed < b_signed else 0
-        elif operation == 'SLTU':
-            # Set less than unsigned - just compare directly
-            self.result = 1 if a < b else 0
+        op = OPERATIONS.get(operation)
+        if op is not None:
+            self.result = op(a, b)
         else:
             print(f"Error: Unknown operation {operation}")
             self.result = 0
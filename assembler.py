@@ -0,0 +1,614 @@
+"""
+Assembler - RV32I programs built in Python, straight into memory
+
+    b = ProgramBuilder()
+    b.li('a0', 100000)
+    b.label('loop')
+    b.addi('a0', 'a0', -1)
+    b.bnez('a0', 'loop')
+    b.halt()
+    b.to_memory(cpu.memory)             # or b.to_numpy(), b.assemble()
+
+or the same thing as text, in the format InstructionDecoder.disassemble
+prints (plus labels, ABI register names and pseudo-instructions):
+
+    b.source('''
+        li   a0, 100000
+    loop:
+        addi a0, a0, -1
+        bnez a0, loop             # numeric targets are offsets, as encoded
+        halt
+    ''')
+
+Every instruction the CPU executes has a method of the same name
+(`and_` and `or_` for the two that are Python keywords), plus the
+pseudo-instructions nop, mv, li, la, j, jr, call, ret, beqz, bnez, bgt,
+ble and halt (jal x0, 0, which the CPU stops on).
+
+Each call encodes its word immediately and appends it to a list; only
+instructions that name a label are patched at the end, so building
+costs about a microsecond per instruction.
+"""
+
+import array
+import re
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from symbols import SymbolTable
+
+
+class AssemblerError(Exception):
+    """
+    An instruction that can't be assembled
+
+    Attributes:
+        reason: Short description of the problem
+        line_num: 1-based line number in the source text, or None
+        line: The offending line (stripped), or None
+    """
+
+    def __init__(self, reason, line_num=None, line=None):
+        self.reason = reason
+        self.line_num = line_num
+        self.line = line
+        where = f"line {line_num}: " if line_num is not None else ""
+        detail = f" ({line})" if line else ""
+        super().__init__(f"{where}{reason}{detail}")
+
+
+# Typecode for a 4-byte unsigned array item
+_WORD_TYPECODE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("to_numpy needs NumPy (pip install numpy)")
+
+
+# Register names -> numbers; numbers map to themselves
+REGISTERS = {i: i for i in range(32)}
+REGISTERS.update({f"x{i}": i for i in range(32)})
+REGISTERS.update({name: i for i, name in enumerate(
+    ['zero', 'ra', 'sp', 'gp', 'tp', 't0', 't1', 't2', 's0', 's1',
+     'a0', 'a1', 'a2', 'a3', 'a4', 'a5', 'a6', 'a7',
+     's2', 's3', 's4', 's5', 's6', 's7', 's8', 's9', 's10', 's11',
+     't3', 't4', 't5', 't6'])})
+REGISTERS['fp'] = 8
+
+
+def _register(name):
+    try:
+        return REGISTERS[name]
+    except (KeyError, TypeError):
+        raise AssemblerError(f"unknown register {name!r}") from None
+
+
+def _bad_operands(*registers):
+    """The error for an emit call whose fast path failed on a register"""
+    for name in registers:
+        _register(name)
+    raise AssemblerError(f"bad operands {registers!r}")
+
+
+def _check(value, low, high, what):
+    if not low <= value <= high:
+        raise AssemblerError(f"{what} {value} out of range ({low} to {high})")
+    return value
+
+
+# ---- immediate field encodings ----
+
+def _i_imm(imm):
+    return (_check(imm, -2048, 2047, "immediate") & 0xFFF) << 20
+
+
+def _s_imm(imm):
+    imm = _check(imm, -2048, 2047, "offset") & 0xFFF
+    return ((imm & 0xFE0) << 20) | ((imm & 0x1F) << 7)
+
+
+def _b_imm(offset):
+    if offset & 1:
+        raise AssemblerError(f"branch offset {offset} is odd")
+    offset = _check(offset, -4096, 4094, "branch offset") & 0x1FFF
+    return (((offset & 0x1000) << 19) | ((offset & 0x7E0) << 20) |
+            ((offset & 0x1E) << 7) | ((offset & 0x800) >> 4))
+
+
+def _j_imm(offset):
+    if offset & 1:
+        raise AssemblerError(f"jump offset {offset} is odd")
+    offset = _check(offset, -(1 << 20), (1 << 20) - 2, "jump offset") & 0x1FFFFF
+    return (((offset & 0x100000) << 11) | ((offset & 0x7FE) << 20) |
+            ((offset & 0x800) << 9) | (offset & 0xFF000))
+
+
+def _split_address(value):
+    """(upper 20 bits for LUI, signed low 12 bits for ADDI) adding up to value"""
+    upper = ((value + 0x800) >> 12) & 0xFFFFF
+    lower = ((value & 0xFFF) ^ 0x800) - 0x800
+    return upper, lower
+
+
+# ---- instruction method factories ----
+
+# These are the hot path when generating big programs, so registers are
+# looked up inline and a failed lookup is sorted out afterwards
+
+def _r_type(funct3, funct7):
+    base = (funct7 << 25) | (funct3 << 12) | 0x33
+
+    def emit(self, rd, rs1, rs2, regs=REGISTERS):
+        try:
+            self.words.append(base | (regs[rd] << 7) | (regs[rs1] << 15) | (regs[rs2] << 20))
+        except (KeyError, TypeError):
+            _bad_operands(rd, rs1, rs2)
+    return emit
+
+
+def _i_type(funct3):
+    base = (funct3 << 12) | 0x13
+
+    def emit(self, rd, rs1, imm, regs=REGISTERS):
+        if not -2048 <= imm <= 2047:
+            _i_imm(imm)
+        try:
+            self.words.append(base | (regs[rd] << 7) | (regs[rs1] << 15) | ((imm & 0xFFF) << 20))
+        except (KeyError, TypeError):
+            _bad_operands(rd, rs1)
+    return emit
+
+
+def _offset_type(funct3, opcode):
+    """lw and jalr: rd, offset(base)"""
+    base_word = (funct3 << 12) | opcode
+
+    def emit(self, rd, offset, base, regs=REGISTERS):
+        if not -2048 <= offset <= 2047:
+            _i_imm(offset)
+        try:
+            self.words.append(base_word | (regs[rd] << 7) | (regs[base] << 15) |
+                              ((offset & 0xFFF) << 20))
+        except (KeyError, TypeError):
+            _bad_operands(rd, base)
+    return emit
+
+
+def _shift(funct3, funct7):
+    base = (funct7 << 25) | (funct3 << 12) | 0x13
+
+    def emit(self, rd, rs1, shamt, regs=REGISTERS):
+        if not 0 <= shamt <= 31:
+            _check(shamt, 0, 31, "shift amount")
+        try:
+            self.words.append(base | (regs[rd] << 7) | (regs[rs1] << 15) | (shamt << 20))
+        except (KeyError, TypeError):
+            _bad_operands(rd, rs1)
+    return emit
+
+
+def _branch(funct3):
+    base = (funct3 << 12) | 0x63
+
+    def emit(self, rs1, rs2, target, regs=REGISTERS):
+        try:
+            word = base | (regs[rs1] << 15) | (regs[rs2] << 20)
+        except (KeyError, TypeError):
+            _bad_operands(rs1, rs2)
+        if isinstance(target, str):
+            self._fixup(target, 'B', word)
+        else:
+            self.words.append(word | _b_imm(target))
+    return emit
+
+
+def _upper(opcode):
+    def emit(self, rd, imm):
+        imm = _check(imm, -(1 << 19), (1 << 20) - 1, "upper immediate") & 0xFFFFF
+        self.words.append((imm << 12) | (_register(rd) << 7) | opcode)
+    return emit
+
+
+class ProgramBuilder:
+    """
+    Builds a program one instruction at a time
+
+    Register arguments take numbers or names ('x5', 'a0', 'sp'). Branch
+    and jump targets are label names, or offsets from the instruction.
+
+    Attributes:
+        origin: Address of the first word
+        words: Instruction words so far (labelled ones not yet patched)
+        labels: Label name -> address
+    """
+
+    def __init__(self, origin=0):
+        """
+        Args:
+            origin: Address the program will be loaded at
+        """
+        self.origin = origin
+        self.words = []
+        self.labels = {}
+        # (word index, kind, label, unpatched word, source line number)
+        self.fixups = []
+        self._line_num = None
+
+    @property
+    def address(self):
+        """Address the next instruction will go at"""
+        return self.origin + 4 * len(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    def label(self, name):
+        """
+        Name the address of the next instruction
+
+        Raises:
+            AssemblerError: The label is already defined
+        """
+        if name in self.labels:
+            raise AssemblerError(f"label {name!r} defined twice")
+        self.labels[name] = self.origin + 4 * len(self.words)
+
+    def _fixup(self, label, kind, word):
+        self.fixups.append((len(self.words), kind, label, word, self._line_num))
+        self.words.append(word)
+
+    # ---- the instructions the CPU executes ----
+
+    add = _r_type(0x0, 0x00)
+    sub = _r_type(0x0, 0x20)
+    and_ = _r_type(0x7, 0x00)
+    or_ = _r_type(0x6, 0x00)
+    xor = _r_type(0x4, 0x00)
+    sll = _r_type(0x1, 0x00)
+    srl = _r_type(0x5, 0x00)
+    sra = _r_type(0x5, 0x20)
+
+    addi = _i_type(0x0)
+    andi = _i_type(0x7)
+    ori = _i_type(0x6)
+    xori = _i_type(0x4)
+    slli = _shift(0x1, 0x00)
+    srli = _shift(0x5, 0x00)
+    srai = _shift(0x5, 0x20)
+
+    beq = _branch(0x0)
+    bne = _branch(0x1)
+    blt = _branch(0x4)
+    bge = _branch(0x5)
+
+    lui = _upper(0x37)
+    auipc = _upper(0x17)
+
+    lw = _offset_type(0x2, 0x03)
+
+    def sw(self, rs2, offset, base, regs=REGISTERS):
+        """sw rs2, offset(base)"""
+        try:
+            self.words.append((2 << 12) | 0x23 | (regs[rs2] << 20) | (regs[base] << 15) |
+                              _s_imm(offset))
+        except (KeyError, TypeError):
+            _bad_operands(rs2, base)
+
+    def jal(self, rd, target):
+        """jal rd, target"""
+        word = (_register(rd) << 7) | 0x6F
+        if isinstance(target, str):
+            self._fixup(target, 'J', word)
+        else:
+            self.words.append(word | _j_imm(target))
+
+    jalr = _offset_type(0x0, 0x67)
+
+    # ---- pseudo-instructions ----
+
+    def nop(self):
+        """addi x0, x0, 0"""
+        self.words.append(0x00000013)
+
+    def mv(self, rd, rs):
+        """addi rd, rs, 0"""
+        self.addi(rd, rs, 0)
+
+    def li(self, rd, value):
+        """
+        Load any 32-bit value: addi for small values, lui (+ addi) otherwise
+
+        Raises:
+            AssemblerError: value doesn't fit in 32 bits
+        """
+        if -2048 <= value <= 2047:
+            self.addi(rd, 0, value)
+            return
+        _check(value, -(1 << 31), (1 << 32) - 1, "value")
+        reg = _register(rd) << 7
+        lower = ((value & 0xFFF) ^ 0x800) - 0x800
+        self.words.append(((value + 0x800) & 0xFFFFF000) | reg | 0x37)
+        if lower:
+            self.words.append(((lower & 0xFFF) << 20) | (reg << 8) | reg | 0x13)
+
+    def la(self, rd, label):
+        """Load a label's address (always lui + addi, so it can be patched later)"""
+        reg = _register(rd) << 7
+        self._fixup(label, 'HI', reg | 0x37)
+        self._fixup(label, 'LO', reg | (_register(rd) << 15) | 0x13)
+
+    def j(self, target):
+        """jal x0, target"""
+        self.jal(0, target)
+
+    def jr(self, rs):
+        """jalr x0, 0(rs)"""
+        self.jalr(0, 0, rs)
+
+    def call(self, target):
+        """jal ra, target"""
+        self.jal(1, target)
+
+    def ret(self):
+        """jalr x0, 0(ra)"""
+        self.words.append(0x00008067)
+
+    def beqz(self, rs, target):
+        """beq rs, x0, target"""
+        self.beq(rs, 0, target)
+
+    def bnez(self, rs, target):
+        """bne rs, x0, target"""
+        self.bne(rs, 0, target)
+
+    def bgt(self, rs1, rs2, target):
+        """blt rs2, rs1, target"""
+        self.blt(rs2, rs1, target)
+
+    def ble(self, rs1, rs2, target):
+        """bge rs2, rs1, target"""
+        self.bge(rs2, rs1, target)
+
+    def halt(self):
+        """jal x0, 0 - the CPU stops when it fetches this"""
+        self.words.append(0x0000006F)
+
+    def word(self, *values):
+        """Raw 32-bit words (data, or encodings there's no method for)"""
+        for value in values:
+            self.words.append(value & 0xFFFFFFFF)
+
+    # ---- text ----
+
+    def source(self, text):
+        """
+        Assemble text and append it
+
+        One instruction per line, operands separated by commas, '#' starts
+        a comment, 'name:' defines a label and '.word v1, v2' emits data.
+        Loads, stores and jalr take the offset(base) form.
+
+        Returns:
+            self
+        Raises:
+            AssemblerError: With the line number and text of the problem
+        """
+        for line_num, raw in enumerate(text.splitlines(), 1):
+            line = raw.split('#', 1)[0].strip()
+            if not line:
+                continue
+            self._line_num = line_num
+            try:
+                while ':' in line:
+                    name, line = line.split(':', 1)
+                    self.label(name.strip())
+                    line = line.strip()
+                if line:
+                    self._statement(line)
+            except AssemblerError as e:
+                raise AssemblerError(e.reason, line_num, raw.strip()) from None
+            finally:
+                self._line_num = None
+        return self
+
+    def _statement(self, line):
+        parts = line.split(None, 1)
+        mnemonic = parts[0].lower()
+        operands = [o.strip() for o in parts[1].split(',')] if len(parts) > 1 else []
+
+        if mnemonic == '.word':
+            self.word(*[_number(o) for o in operands])
+            return
+        syntax = _SYNTAX.get(mnemonic)
+        if syntax is None:
+            raise AssemblerError(f"unknown instruction {mnemonic!r}")
+        # Short forms: 'jalr rs1', 'jalr rd, rs1, imm', 'jal target'
+        if mnemonic == 'jalr':
+            if len(operands) == 1:
+                operands = ['ra', f"0({operands[0]})"]
+            elif len(operands) == 3:
+                syntax = 'rri'
+        elif mnemonic == 'jal' and len(operands) == 1:
+            operands = ['ra'] + operands
+        if len(operands) != len(syntax):
+            raise AssemblerError(f"{mnemonic} takes {len(syntax)} operand(s), got {len(operands)}")
+
+        args = []
+        for kind, operand in zip(syntax, operands):
+            if kind == 'r':
+                args.append(operand.lower())
+            elif kind == 'i':
+                args.append(_number(operand))
+            elif kind == 't':
+                args.append(operand if _LABEL.match(operand) else _number(operand))
+            else:
+                match = _MEMORY_OPERAND.match(operand)
+                if match is None:
+                    raise AssemblerError(f"expected offset(register), got {operand!r}")
+                args.append(_number(match.group(1)) if match.group(1).strip() else 0)
+                args.append(match.group(2).lower())
+
+        if syntax == 'rri' and mnemonic == 'jalr':
+            args = [args[0], args[2], args[1]]
+        getattr(self, _METHODS.get(mnemonic, mnemonic))(*args)
+
+    # ---- output ----
+
+    def assemble(self):
+        """
+        Finished machine code, with every label reference filled in
+
+        Returns:
+            List of 32-bit words
+        Raises:
+            AssemblerError: A label is undefined or out of reach
+        """
+        words = list(self.words)
+        labels = self.labels
+        origin = self.origin
+        for index, kind, label, word, line_num in self.fixups:
+            target = labels.get(label)
+            if target is None:
+                raise AssemblerError(f"undefined label {label!r}", line_num)
+            offset = target - origin - 4 * index
+            # In-range branches are by far the most common, so they're inline
+            if kind == 'B' and -4096 <= offset <= 4094:
+                words[index] = (word | ((offset & 0x1000) << 19) | ((offset & 0x7E0) << 20) |
+                                ((offset & 0x1E) << 7) | ((offset & 0x800) >> 4))
+                continue
+            try:
+                if kind == 'B':
+                    word |= _b_imm(offset)
+                elif kind == 'J':
+                    word |= _j_imm(offset)
+                elif kind == 'HI':
+                    word |= _split_address(target)[0] << 12
+                else:
+                    word |= (_split_address(target)[1] & 0xFFF) << 20
+            except AssemblerError as e:
+                raise AssemblerError(f"{e.reason} to label {label!r}", line_num) from None
+            words[index] = word
+        return words
+
+    def to_bytes(self):
+        """Little-endian machine code, as it sits in memory"""
+        words = array.array(_WORD_TYPECODE, self.assemble())
+        if sys.byteorder != 'little':
+            words.byteswap()
+        return words.tobytes()
+
+    def to_memory(self, memory, address=None):
+        """
+        Write the program to a Memory or PagedMemory in one write_block
+
+        Args:
+            memory: Memory to write to
+            address: Where to put it (default: origin - anywhere else
+                     breaks la, which uses absolute addresses)
+        Returns:
+            Number of words written
+        """
+        data = self.to_bytes()
+        memory.write_block(self.origin if address is None else address, data)
+        return len(data) // 4
+
+    def to_numpy(self):
+        """Machine code as a NumPy uint32 array"""
+        _require_numpy()
+        return np.array(self.assemble(), dtype=np.uint32)
+
+    def symbols(self):
+        """The labels as a SymbolTable, e.g. for cpu.symbols"""
+        return SymbolTable((address, 0, name) for name, address in self.labels.items())
+
+
+# Operand kinds per mnemonic: r register, i number, t label or offset,
+# m offset(register)
+_SYNTAX = {
+    'add': 'rrr', 'sub': 'rrr', 'and': 'rrr', 'or': 'rrr', 'xor': 'rrr',
+    'sll': 'rrr', 'srl': 'rrr', 'sra': 'rrr',
+    'addi': 'rri', 'andi': 'rri', 'ori': 'rri', 'xori': 'rri',
+    'slli': 'rri', 'srli': 'rri', 'srai': 'rri',
+    'lw': 'rm', 'sw': 'rm', 'jalr': 'rm',
+    'beq': 'rrt', 'bne': 'rrt', 'blt': 'rrt', 'bge': 'rrt',
+    'bgt': 'rrt', 'ble': 'rrt', 'beqz': 'rt', 'bnez': 'rt',
+    'jal': 'rt', 'j': 't', 'call': 't', 'jr': 'r', 'ret': '',
+    'lui': 'ri', 'auipc': 'ri', 'li': 'ri', 'la': 'rt', 'mv': 'rr',
+    'nop': '', 'halt': '',
+}
+_METHODS = {'and': 'and_', 'or': 'or_'}
+
+_LABEL = re.compile(r'[A-Za-z_.$][\w.$]*$')
+_MEMORY_OPERAND = re.compile(r'(.*)\(\s*(\w+)\s*\)$')
+
+
+def _number(text):
+    try:
+        return int(text, 0)
+    except ValueError:
+        raise AssemblerError(f"expected a number, got {text!r}") from None
+
+
+def assemble(text, origin=0):
+    """
+    Assemble source text
+
+    Args:
+        text: Assembly (see ProgramBuilder.source)
+        origin: Address of the first instruction
+    Returns:
+        List of 32-bit words
+    """
+    return ProgramBuilder(origin).source(text).assemble()
+
+
+# Test
+if __name__ == "__main__":
+    from cpu import RISCV_CPU
+    from decoder import InstructionDecoder
+
+    print("Testing assembler...")
+
+    # test_base.hex, from its disassembly
+    words = assemble("""
+        addi x1, x0, 5
+        addi x2, x0, 10
+        add x3, x1, x2
+        sub x4, x2, x1
+        lui x5, 0x10
+        sw x3, 0(x5)
+        lw x4, 0(x5)
+        beq x3, x4, 8
+        addi x6, x0, 1
+        addi x6, x0, 2
+        jal x0, 0
+    """)
+    with open("test_base.hex") as f:
+        expected = [int(line, 16) for line in f if line.strip() and not line.startswith('#')]
+    print(f"test_base.hex reassembled: {words == expected} (expected True)")
+
+    # Sum 1..100 with labels and pseudo-instructions
+    b = ProgramBuilder()
+    b.li('a0', 100)
+    b.li('a1', 0)
+    b.label('loop')
+    b.add('a1', 'a1', 'a0')
+    b.addi('a0', 'a0', -1)
+    b.bnez('a0', 'loop')
+    b.halt()
+    cpu = RISCV_CPU()
+    b.to_memory(cpu.memory)
+    cpu.simulate(max_cycles=1000)
+    print(f"Sum 1..100 = {cpu.registers.read(11)} (expected 5050)")
+
+    decoder = InstructionDecoder()
+    print("Listing:")
+    for i, word in enumerate(b.assemble()):
+        print(f"  {i * 4:08X}: {word:08X}  {decoder.disassemble(decoder.decode_record(word))}")
+
+    print("\nAssembler test complete!")
@@ -0,0 +1,230 @@
+"""
+Batch runner - many programs, one process pool
+
+Runs every program in a directory or manifest, each in a fresh RISCV_CPU,
+across a ProcessPoolExecutor with one worker per available core. Workers
+import the simulator once and then take jobs in chunks, so the per-program
+cost is just the run itself rather than a new interpreter each time.
+
+Results stream into one JSONL file (one object per program) as chunks
+finish, so a long batch can be watched or resumed from its output.
+
+Manifest format, one job per line (blank lines and # comments skipped):
+    path/to/prog.hex
+    path/to/other.elf 500000          (per-job max cycles)
+    path/to/warm.ckpt                 (a saved checkpoint, see checkpoint.py)
+    {"program": "x.bin", "max_cycles": 1000}
+
+Usage: python batch.py <directory|manifest> [-o results.jsonl] [--workers N]
+                       [--max-cycles N] [--engine E] [--memory M] [--chunk-size N]
+"""
+
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from cpu import RISCV_CPU
+
+
+PROGRAM_SUFFIXES = ('.hex', '.elf', '.bin', '.ckpt')
+
+
+def available_cores():
+    """Cores this process may run on (falls back to the machine's count)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:      # not on every platform
+        return os.cpu_count() or 1
+
+
+def find_programs(directory):
+    """Every program file under a directory, in a stable order"""
+    programs = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(PROGRAM_SUFFIXES):
+                programs.append(os.path.join(root, name))
+    return programs
+
+
+def read_manifest(path, max_cycles):
+    """
+    Read a manifest into jobs
+
+    Args:
+        path: Manifest file
+        max_cycles: Limit for lines that don't give their own
+    Returns:
+        List of (program, max_cycles) tuples. Relative program paths are
+        taken relative to the manifest's directory.
+    """
+    base = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    with open(path, 'r') as f:
+        for line_num, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                entry = json.loads(line)
+                program = entry['program']
+                limit = int(entry.get('max_cycles', max_cycles))
+            else:
+                parts = line.split()
+                if len(parts) > 2:
+                    raise ValueError(f"{path}:{line_num}: expected 'program [max_cycles]'")
+                program = parts[0]
+                limit = int(parts[1]) if len(parts) == 2 else max_cycles
+            jobs.append((os.path.join(base, program), limit))
+    return jobs
+
+
+def collect_jobs(source, max_cycles):
+    """Jobs from a directory of programs or a manifest file"""
+    if os.path.isdir(source):
+        return [(program, max_cycles) for program in find_programs(source)]
+    return read_manifest(source, max_cycles)
+
+
+def run_job(program, max_cycles, engine='interpreter', memory='dict'):
+    """
+    Run one program on a fresh CPU
+
+    Never raises - load errors and crashes come back in the record.
+
+    Returns:
+        Dict ready to be written as a JSON line
+    """
+    start = time.perf_counter()
+    record = {'program': program, 'max_cycles': max_cycles}
+    try:
+        cpu = RISCV_CPU(engine=engine, memory=memory)
+        cpu.load(program)
+        result = cpu.simulate(max_cycles)
+        record.update(result.to_dict())
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        record['traceback'] = traceback.format_exc()
+    record['seconds'] = round(time.perf_counter() - start, 6)
+    return record
+
+
+def run_chunk(jobs, engine, memory):
+    """Run a list of jobs in one worker call (keeps pickling per job small)"""
+    return [run_job(program, max_cycles, engine, memory) for program, max_cycles in jobs]
+
+
+class BatchSummary:
+    """Totals for a finished batch"""
+
+    def __init__(self):
+        self.programs = 0
+        self.failures = 0
+        self.cycles = 0
+        self.halt_reasons = {}
+        self.seconds = 0.0
+
+    def add(self, record):
+        self.programs += 1
+        if 'error' in record:
+            self.failures += 1
+            return
+        self.cycles += record['cycles']
+        reason = record['halt_reason']
+        self.halt_reasons[reason] = self.halt_reasons.get(reason, 0) + 1
+
+    def to_dict(self):
+        return {
+            'programs': self.programs,
+            'failures': self.failures,
+            'cycles': self.cycles,
+            'halt_reasons': dict(self.halt_reasons),
+            'seconds': round(self.seconds, 3),
+        }
+
+
+def run_batch(jobs, results_path, workers=None, engine='interpreter', memory='dict',
+              chunk_size=None):
+    """
+    Run jobs across a process pool, streaming records into a JSONL file
+
+    Records are written in the order chunks finish, not job order.
+
+    Args:
+        jobs: List of (program, max_cycles) tuples
+        results_path: JSONL file to write (overwritten)
+        workers: Worker processes (default: available cores)
+        engine: CPU engine for every job
+        memory: Memory backend for every job
+        chunk_size: Jobs per worker call (default: enough for ~8 chunks per worker)
+    Returns:
+        BatchSummary
+    """
+    workers = workers or available_cores()
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(jobs) // (workers * 8) or 1))
+    chunks = [jobs[i:i + chunk_size] for i in range(0, len(jobs), chunk_size)]
+
+    summary = BatchSummary()
+    start = time.perf_counter()
+    with open(results_path, 'w') as out, ProcessPoolExecutor(max_workers=workers) as pool:
+        # Keep a bounded number of chunks in flight so huge manifests
+        # don't queue every job up front
+        pending = set()
+        next_chunk = 0
+        while next_chunk < len(chunks) or pending:
+            while next_chunk < len(chunks) and len(pending) < workers * 4:
+                pending.add(pool.submit(run_chunk, chunks[next_chunk], engine, memory))
+                next_chunk += 1
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                for record in future.result():
+                    out.write(json.dumps(record) + "\n")
+                    summary.add(record)
+            out.flush()
+
+    summary.seconds = time.perf_counter() - start
+    return summary
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run many RISC-V programs in parallel")
+    parser.add_argument("source", help="directory of .hex/.elf/.bin files, or a manifest")
+    parser.add_argument("-o", "--output", default="results.jsonl",
+                        help="JSONL results file (default: results.jsonl)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help=f"worker processes (default: available cores, {available_cores()} here)")
+    parser.add_argument("--max-cycles", type=int, default=100000,
+                        help="limit for jobs that don't set their own (default: 100000)")
+    parser.add_argument("--engine", choices=RISCV_CPU.ENGINES, default="translate")
+    parser.add_argument("--memory", choices=("dict", "paged"), default="dict")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="jobs per worker call")
+    args = parser.parse_args(argv)
+
+    jobs = collect_jobs(args.source, args.max_cycles)
+    if not jobs:
+        print(f"No programs found in {args.source}")
+        return 1
+
+    summary = run_batch(jobs, args.output, args.workers, args.engine, args.memory,
+                        args.chunk_size)
+    print(f"Ran {summary.programs} programs in {summary.seconds:.2f}s "
+          f"({summary.programs / summary.seconds:.1f} programs/s), "
+          f"{summary.failures} failed")
+    for reason, count in sorted(summary.halt_reasons.items()):
+        print(f"  {reason}: {count}")
+    print(f"Results written to {args.output}")
+    return 1 if summary.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
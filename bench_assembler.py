@@ -0,0 +1,81 @@
+"""
+Assembler benchmark - how fast big programs can be generated
+
+Builds a program of straight-line blocks (arithmetic, loads/stores, a
+branch and a call to a label in each) through the ProgramBuilder methods,
+then times resolving the labels, writing the result into both memory
+backends and converting it to NumPy. Also times the text assembler on
+the disassembly of the same code.
+
+Usage: python bench_assembler.py [instructions]   (default 1000000)
+"""
+
+import sys
+import time
+
+from assembler import ProgramBuilder, np
+from decoder import InstructionDecoder
+from memory import Memory, PagedMemory
+
+
+def build(instructions):
+    """A ProgramBuilder with about `instructions` instructions"""
+    b = ProgramBuilder()
+    for i in range(instructions // 10):
+        b.label(f"block{i}")
+        b.addi('a0', 'a0', 1)
+        b.add('t0', 't1', 't2')
+        b.xor('t1', 't0', 'a0')
+        b.slli('t2', 't1', 3)
+        b.lw('a1', 8, 'sp')
+        b.sw('a1', -4, 'sp')
+        b.li('a2', 0x12345678)              # lui + addi
+        b.bne('a0', 'a1', f"block{i}")
+        b.jal('ra', f"block{i}")
+    b.halt()
+    return b
+
+
+def timed(function, *args):
+    """(result, seconds)"""
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    instructions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    print(f"Assembler benchmark ({instructions} instructions)")
+    print("=" * 60)
+    builder, build_time = timed(build, instructions)
+    count = len(builder)
+    words, assemble_time = timed(builder.assemble)
+    _, paged_time = timed(builder.to_memory, PagedMemory())
+    _, dict_time = timed(builder.to_memory, Memory(size=8 * count))
+
+    rows = [
+        ("builder calls", build_time),
+        ("resolve labels", assemble_time),
+        ("to_memory (paged)", paged_time),
+        ("to_memory (dict)", dict_time),
+    ]
+    if np is not None:
+        rows.append(("to_numpy", timed(builder.to_numpy)[1]))
+    rows.append(("build + write to paged", build_time + paged_time))
+    for name, seconds in rows:
+        print(f"{name:<26} {seconds * 1000:9.1f} ms   {count / seconds / 1e6:6.2f} M instructions/s")
+
+    # Text: the same code as disassembled lines
+    decoder = InstructionDecoder()
+    lines = [decoder.disassemble(decoder.decode_record(w)) for w in words[:100000]]
+    text = "\n".join(lines)
+    b = ProgramBuilder()
+    _, text_time = timed(b.source, text)
+    print(f"{'text source':<26} {text_time * 1000:9.1f} ms   "
+          f"{len(lines) / text_time / 1e6:6.2f} M lines/s ({len(lines)} lines)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Batch runner scaling benchmark
+
+Generates a directory of small loop programs and runs it through
+batch.run_batch with 1, 2, 4, ... workers up to the available cores,
+reporting throughput, speedup over one worker and parallel efficiency.
+Also times the old way - one `python cpu.py` process per program - on
+a sample, to show what the pool saves in startup alone.
+
+Usage: python bench_batch.py [programs] [loop_count] [max_workers]
+       (default 400 programs, 20000 iterations each, all available cores)
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from batch import available_cores, collect_jobs, run_batch
+
+
+def write_programs(directory, count, loop_count):
+    """Counting-loop programs, each with a slightly different trip count"""
+    for i in range(count):
+        n = loop_count + i % 16
+        upper = (n + 0x800) >> 12       # addi sign-extends, so round the lui part
+        lower = (n - (upper << 12)) & 0xFFF
+        program = [
+            0x00000093,                                 # addi x1, x0, 0
+            (upper << 12) | (2 << 7) | 0x37,            # lui x2, upper
+            (lower << 20) | (2 << 15) | (2 << 7) | 0x13,  # addi x2, x2, lower
+            0x00108093,                                 # addi x1, x1, 1
+            0xFE209EE3,                                 # bne x1, x2, -4
+            0x0000006F,                                 # halt
+        ]
+        with open(os.path.join(directory, f"prog_{i:05d}.hex"), 'w') as f:
+            f.write("".join(f"{word:08X}\n" for word in program))
+
+
+def worker_counts(limit):
+    """1, 2, 4, ... up to limit, always including limit itself"""
+    counts = []
+    n = 1
+    while n < limit:
+        counts.append(n)
+        n *= 2
+    counts.append(limit)
+    return counts
+
+
+def time_per_process(jobs, sample):
+    """Seconds per program when each one gets its own python cpu.py"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    for program, max_cycles in jobs[:sample]:
+        subprocess.run([sys.executable, os.path.join(here, "cpu.py"), program,
+                        "--verbosity", "quiet", "--engine", "translate",
+                        "--max-cycles", str(max_cycles)],
+                       check=True, stdout=subprocess.DEVNULL)
+    return (time.perf_counter() - start) / sample
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    loop_count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    max_workers = int(sys.argv[3]) if len(sys.argv) > 3 else available_cores()
+
+    print(f"Batch scaling benchmark ({count} programs, ~{loop_count * 2} cycles each, "
+          f"{available_cores()} core(s) available)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        write_programs(tmp, count, loop_count)
+        jobs = collect_jobs(tmp, max_cycles=10 ** 6)
+        results = os.path.join(tmp, "results.jsonl")
+
+        print(f"{'workers':>8} {'seconds':>9} {'programs/s':>11} {'speedup':>8} {'efficiency':>10}")
+        base = None
+        for workers in worker_counts(max_workers):
+            summary = run_batch(jobs, results, workers=workers, engine='translate')
+            if summary.failures:
+                print(f"  {summary.failures} programs failed")
+            base = base or summary.seconds
+            speedup = base / summary.seconds
+            print(f"{workers:>8} {summary.seconds:>9.2f} {count / summary.seconds:>11.1f} "
+                  f"{speedup:>7.2f}x {speedup / workers:>9.0%}")
+
+        sample = min(count, 20)
+        per_process = time_per_process(jobs, sample)
+        print("-" * 60)
+        print(f"One process per program: {1 / per_process:.1f} programs/s "
+              f"(sampled {sample}), {per_process * count:.1f}s for the whole set")
+
+    if max_workers > available_cores():
+        print("Note: more workers than cores - expect no speedup past the core count")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Bulk decoder throughput benchmark
+
+Decodes multi-megabyte images of random instruction words with
+bulk_decode.decode_array and compares against decoding a sample
+word by word with InstructionDecoder.decode.
+
+Usage: python bench_bulk_decode.py [size_mb ...]   (default 1 4 16 64)
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from bulk_decode import decode_array
+from decoder import InstructionDecoder
+
+
+def main():
+    sizes_mb = [int(a) for a in sys.argv[1:]] or [1, 4, 16, 64]
+    rng = np.random.default_rng(1)
+
+    print("Bulk decode throughput")
+    print("=" * 60)
+    print(f"{'image':>8} {'words':>12} {'seconds':>9} {'MB/s':>9} {'Mwords/s':>9}")
+
+    for size_mb in sizes_mb:
+        num_words = size_mb * (1 << 20) // 4
+        words = rng.integers(0, 1 << 32, size=num_words, dtype=np.uint32)
+
+        start = time.perf_counter()
+        decode_array(words)
+        elapsed = time.perf_counter() - start
+
+        print(f"{size_mb:>6}MB {num_words:>12} {elapsed:>9.3f} "
+              f"{size_mb / elapsed:>9.1f} {num_words / elapsed / 1e6:>9.2f}")
+
+    # Scalar baseline on a sample - the dict decoder, word by word
+    decoder = InstructionDecoder()
+    sample = [int(w) for w in rng.integers(0, 1 << 32, size=200000, dtype=np.uint32)]
+    start = time.perf_counter()
+    for w in sample:
+        decoder.decode(w)
+    elapsed = time.perf_counter() - start
+    print("-" * 60)
+    print(f"Scalar decode(): {len(sample) / elapsed / 1e6:.2f} Mwords/s "
+          f"({len(sample) * 4 / (1 << 20) / elapsed:.1f} MB/s)")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
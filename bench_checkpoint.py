@@ -0,0 +1,74 @@
+"""
+Checkpoint benchmark - cost of checkpoint/restore/fork vs guest size
+
+Fills a PagedMemory guest, then times:
+  - the first checkpoint (every page is dirty, so every page is frozen)
+  - checkpoints after dirtying 0, 10 and 1000 pages
+  - restore and fork
+  - writing the checkpoint file
+against a deep copy of every page.
+
+Usage: python bench_checkpoint.py [guest_mb]   (default 100)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from cpu import RISCV_CPU
+from checkpoint import save_checkpoint
+from memory import PAGE_SIZE
+
+
+def timed(function):
+    """(seconds, result) for one call"""
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main():
+    guest_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    num_pages = (guest_mb << 20) // PAGE_SIZE
+
+    print(f"Checkpoint benchmark ({guest_mb} MB guest, {num_pages} pages)")
+    print("=" * 60)
+
+    cpu = RISCV_CPU(memory='paged')
+    # Mostly-zero pages with a little data each, like a real heap
+    page = bytearray(PAGE_SIZE)
+    for page_num in range(num_pages):
+        page[0:4] = page_num.to_bytes(4, 'little')
+        cpu.memory.write_block(0x100000 + page_num * PAGE_SIZE, page)
+
+    seconds, _ = timed(cpu.checkpoint)
+    print(f"{'first checkpoint (all dirty)':<32} {seconds * 1000:9.2f} ms")
+
+    for dirty in (0, 10, 1000):
+        for page_num in range(min(dirty, num_pages)):
+            cpu.memory.write_word(0x100000 + page_num * PAGE_SIZE + 8, dirty)
+        seconds, saved = timed(cpu.checkpoint)
+        print(f"{f'checkpoint, {dirty} dirty pages':<32} {seconds * 1000:9.2f} ms")
+
+    for page_num in range(0, num_pages, 97):
+        cpu.memory.write_word(0x100000 + page_num * PAGE_SIZE + 12, 1)
+    seconds, _ = timed(lambda: cpu.restore(saved))
+    print(f"{'restore':<32} {seconds * 1000:9.2f} ms")
+    seconds, _ = timed(cpu.fork)
+    print(f"{'fork':<32} {seconds * 1000:9.2f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.ckpt")
+        seconds, size = timed(lambda: save_checkpoint(saved, path, level=1))
+        print(f"{'save checkpoint file':<32} {seconds * 1000:9.2f} ms "
+              f"({size / 1e6:.2f} MB on disk)")
+
+    pages = cpu.memory.byte_pages
+    seconds, _ = timed(lambda: {page_num: bytearray(page) for page_num, page in pages.items()})
+    print(f"{'deep copy of every page':<32} {seconds * 1000:9.2f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
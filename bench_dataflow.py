@@ -0,0 +1,75 @@
+"""
+Dataflow analysis benchmark - streaming speed and memory over long runs
+
+Runs a bench_suite guest program with a DataflowAnalyzer attached and
+compares it with a plain run. Then records runs a tenth as long and full
+length to trace files and streams each through a fresh analyzer in
+batches, under tracemalloc, printing how much memory the analyzer still
+holds at the end. That stays flat as runs get longer, except for the
+words the program stores to, which the unlimited critical path has to
+remember (bench_suite's memcpy copies more data the longer it runs).
+
+Usage: python bench_dataflow.py [instructions] [program]   (default 1000000, calls)
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_suite import program_cpu
+from dataflow import DataflowAnalyzer
+from timing import trace_chunks
+from trace_recorder import RECORD, TraceWriter
+
+
+def timed_run(name, instructions, reporter):
+    """(instructions run, seconds) for one run"""
+    cpu, _ = program_cpu(name, instructions)
+    start = time.perf_counter()
+    result = cpu.simulate(max_cycles=10 ** 10, reporter=reporter)
+    return result.cycles, time.perf_counter() - start
+
+
+def retained(name, instructions, path):
+    """(instructions, bytes the analyzer holds, stored words) after streaming a recorded run"""
+    cpu, _ = program_cpu(name, instructions)
+    with TraceWriter(path) as writer:
+        cpu.simulate(max_cycles=10 ** 10, reporter=writer)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    analyzer = DataflowAnalyzer()
+    for chunk in trace_chunks(path):
+        analyzer.replay(RECORD.iter_unpack(chunk))
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return analyzer.instructions, after - before, analyzer.stored_words
+
+
+def main():
+    instructions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    name = sys.argv[2] if len(sys.argv) > 2 else 'calls'
+
+    print(f"Dataflow analysis benchmark ({name}, {instructions} instructions)")
+    print("=" * 64)
+    count, plain = timed_run(name, instructions, None)
+    analyzer = DataflowAnalyzer()
+    _, live = timed_run(name, instructions, analyzer)
+    print(f"plain run                {count / plain / 1e6:8.3f} MIPS")
+    print(f"with the analyzer        {count / live / 1e6:8.3f} MIPS   ({live:.1f} s, "
+          f"{len(analyzer.windows)} windows)")
+    print(f"critical path {analyzer.critical_path} cycles, ideal IPC {analyzer.ideal_ipc():.2f}; "
+          + ", ".join(f"window {size} {analyzer.ilp(size):.2f}" for size in analyzer.windows))
+
+    print("-" * 64)
+    with tempfile.TemporaryDirectory() as scratch:
+        for length in (instructions // 10, instructions):
+            count, held, words = retained(name, length, os.path.join(scratch, "run.trace"))
+            print(f"streamed {count:>9} instructions: analyzer holds {held / 1024:8.1f} KiB "
+                  f"({words} words stored to)")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Decoder memory and speed benchmark
+
+Compares the dictionary returned by InstructionDecoder.decode with the
+interned DecodedInstruction records from decode_record:
+  - bytes per decoded instruction (measured with tracemalloc)
+  - time per decode for fresh words and for words seen before
+
+Usage: python bench_decode.py [num_words]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from decoder import InstructionDecoder
+
+
+def sample_words(count, seed=1):
+    """Random words spread over the opcodes the CPU knows"""
+    rng = random.Random(seed)
+    opcodes = [0x33, 0x13, 0x03, 0x23, 0x63, 0x6F, 0x67, 0x37, 0x17]
+    words = set()
+    while len(words) < count:
+        words.add((rng.getrandbits(25) << 7) | rng.choice(opcodes))
+    return list(words)
+
+
+def measure_bytes(build, words):
+    """Bytes allocated per item when build(word) results are all kept alive"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(w) for w in words]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Don't count the list holding them
+    list_bytes = sys.getsizeof(kept)
+    return max(0.0, (after - before - list_bytes) / len(words))
+
+
+def measure_time(function, words, repeat=3):
+    """Best nanoseconds per call over a few runs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for w in words:
+            function(w)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(words) * 1e9
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    words = sample_words(count)
+    decoder = InstructionDecoder()
+
+    print(f"Decoder benchmark - {count} distinct instruction words")
+    print("=" * 60)
+
+    # Before: a fresh dict for every decode
+    dict_bytes = measure_bytes(decoder.decode, words)
+
+    # After: one interned record per distinct word
+    InstructionDecoder._interned.clear()
+    record_bytes = measure_bytes(decoder.decode_record, words)
+
+    # Decoding words that are already interned allocates nothing
+    repeat_bytes = measure_bytes(decoder.decode_record, words)
+
+    print("Memory per decoded instruction:")
+    print(f"  dict (decode)                 {dict_bytes:8.1f} bytes")
+    print(f"  record, first time            {record_bytes:8.1f} bytes "
+          f"(object alone is {sys.getsizeof(decoder.decode_record(words[0]))})")
+    print(f"  record, already interned      {repeat_bytes:8.1f} bytes")
+
+    InstructionDecoder._interned.clear()
+    fresh_ns = measure_time(decoder._build_record, words, repeat=1)
+    dict_ns = measure_time(decoder.decode, words)
+    repeat_ns = measure_time(decoder.decode_record, words)
+
+    print("\nTime per decode:")
+    print(f"  dict (decode)                 {dict_ns:8.0f} ns")
+    print(f"  record, first time            {fresh_ns:8.0f} ns")
+    print(f"  record, already interned      {repeat_ns:8.0f} ns")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Hex loader benchmark - bulk load_hex vs the original line-by-line loop
+
+Generates hex files from 1K to 10M lines and times:
+  - load_hex on a plain file (8 digits per line, the fast path)
+  - load_hex on the same words with comments and blank lines mixed in
+  - the original strip / int(line, 16) / write_word loop, for comparison
+    (only up to 1M lines - it's far too slow beyond that)
+
+Programs are loaded into PagedMemory. Files go in a temporary directory.
+
+Usage: python bench_loader.py [lines ...]   (default 1000 ... 10000000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from loader import load_hex
+from memory import PagedMemory
+
+
+LEGACY_LIMIT = 1000000
+
+
+def write_hex_file(path, num_lines, commented=False):
+    """Write num_lines random words, a chunk at a time to bound host memory"""
+    chunk = 1 << 16
+    with open(path, 'w') as f:
+        for first in range(0, num_lines, chunk):
+            count = min(chunk, num_lines - first)
+            digits = os.urandom(4 * count).hex().upper()
+            lines = [digits[i:i + 8] for i in range(0, 8 * count, 8)]
+            if commented:
+                # A comment and a blank line every 16 instructions
+                for i in range(len(lines) - 16, -1, -16):
+                    lines[i:i] = ["# block", ""]
+            f.write("\n".join(lines) + "\n")
+
+
+def legacy_load(filename, memory):
+    """The original per-line loader, minus the printing"""
+    address = 0
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            try:
+                memory.write_word(address, int(line, 16) & 0xFFFFFFFF)
+                address += 4
+            except ValueError:
+                continue
+    return address // 4
+
+
+def time_load(load, path):
+    """Seconds to load a file into a fresh PagedMemory"""
+    memory = PagedMemory()
+    start = time.perf_counter()
+    load(path, memory)
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [1000, 10000, 100000, 1000000, 10000000]
+
+    print("Hex loader benchmark (Mlines/s)")
+    print("=" * 60)
+    print(f"{'lines':>10} {'bulk':>10} {'commented':>10} {'original':>10} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_lines in sizes:
+            plain = os.path.join(tmp, "plain.hex")
+            commented = os.path.join(tmp, "commented.hex")
+            write_hex_file(plain, num_lines)
+            write_hex_file(commented, num_lines, commented=True)
+
+            bulk = time_load(load_hex, plain)
+            mixed = time_load(load_hex, commented)
+            row = f"{num_lines:>10} {num_lines / bulk / 1e6:>10.2f} {num_lines / mixed / 1e6:>10.2f}"
+
+            if num_lines <= LEGACY_LIMIT:
+                legacy = time_load(legacy_load, plain)
+                row += f" {num_lines / legacy / 1e6:>10.2f} {legacy / bulk:>7.1f}x"
+            else:
+                row += f" {'-':>10} {'-':>8}"
+            print(row)
+
+            os.remove(plain)
+            os.remove(commented)
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Memory backend benchmark - dict Memory vs PagedMemory
+
+Reports, for each backend:
+  - host bytes used per guest word after filling a region
+  - word and byte read/write throughput
+  - a memcpy-style guest loop run on the CPU
+
+Usage: python bench_memory.py [fill_mb]   (default 8)
+"""
+
+import sys
+import time
+import tracemalloc
+
+from cpu import RISCV_CPU
+from memory import MEMORY_BACKENDS
+
+
+def measure_footprint(backend, fill_bytes):
+    """Host bytes per guest word after writing every word of a region"""
+    tracemalloc.start()
+    mem = MEMORY_BACKENDS[backend]()
+    before = tracemalloc.get_traced_memory()[0]
+    for address in range(0x100000, 0x100000 + fill_bytes, 4):
+        mem.write_word(address, address)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / (fill_bytes // 4)
+
+
+def measure_ops(backend, count=200000):
+    """Million operations per second for each access type"""
+    mem = MEMORY_BACKENDS[backend]()
+    addresses = [0x10000 + (i * 4) % 0x40000 for i in range(count)]
+    results = {}
+
+    start = time.perf_counter()
+    for a in addresses:
+        mem.write_word(a, a)
+    results['write_word'] = count / (time.perf_counter() - start) / 1e6
+
+    start = time.perf_counter()
+    for a in addresses:
+        mem.read_word(a)
+    results['read_word'] = count / (time.perf_counter() - start) / 1e6
+
+    start = time.perf_counter()
+    for a in addresses:
+        mem.write_byte(a + 1, 0x5A)
+    results['write_byte'] = count / (time.perf_counter() - start) / 1e6
+
+    start = time.perf_counter()
+    for a in addresses:
+        mem.read_byte(a + 1)
+    results['read_byte'] = count / (time.perf_counter() - start) / 1e6
+    return results
+
+
+# Copies 4096 words from 0x10000 to 0x20000
+MEMCPY_PROGRAM = [
+    0x000100B7,  # lui x1, 0x10        (source)
+    0x00020137,  # lui x2, 0x20        (destination)
+    0x000041B7,  # lui x3, 0x4         (bytes left = 16 KiB)
+    0x0000A203,  # lw x4, 0(x1)
+    0x00412023,  # sw x4, 0(x2)
+    0x00408093,  # addi x1, x1, 4
+    0x00410113,  # addi x2, x2, 4
+    0xFFC18193,  # addi x3, x3, -4
+    0xFE0196E3,  # bne x3, x0, -20
+    0x0000006F,  # halt
+]
+
+
+def measure_program(backend, engine):
+    """Simulated MIPS for the memcpy loop"""
+    cpu = RISCV_CPU(engine=engine, memory=backend)
+    for i, inst in enumerate(MEMCPY_PROGRAM):
+        cpu.memory.write_word(i * 4, inst)
+    for i in range(4096):
+        cpu.memory.write_word(0x10000 + i * 4, i)
+
+    start = time.perf_counter()
+    cpu.simulate(max_cycles=10 ** 7)
+    elapsed = time.perf_counter() - start
+    return cpu.cycle_count / elapsed / 1e6
+
+
+def main():
+    fill_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    fill_bytes = fill_mb << 20
+
+    print(f"Memory backend benchmark (fill {fill_mb} MB)")
+    print("=" * 60)
+    for backend in MEMORY_BACKENDS:
+        per_word = measure_footprint(backend, fill_bytes)
+        total_mb = per_word * (fill_bytes // 4) / (1 << 20)
+        print(f"{backend:>6}: {per_word:7.1f} host bytes per guest word "
+              f"({total_mb:.1f} MB for {fill_mb} MB of guest data)")
+
+    print("\nThroughput (million ops/s):")
+    print(f"{'':>6}  {'write_word':>10} {'read_word':>10} {'write_byte':>10} {'read_byte':>10}")
+    for backend in MEMORY_BACKENDS:
+        ops = measure_ops(backend)
+        print(f"{backend:>6}  {ops['write_word']:>10.2f} {ops['read_word']:>10.2f} "
+              f"{ops['write_byte']:>10.2f} {ops['read_byte']:>10.2f}")
+
+    print("\nmemcpy loop (simulated MIPS):")
+    for backend in MEMORY_BACKENDS:
+        for engine in RISCV_CPU.ENGINES:
+            print(f"{backend:>6} / {engine:<12} {measure_program(backend, engine):6.2f}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Out-of-order model benchmark - simulation speed on million-instruction runs
+
+Runs each bench_suite guest program for a million instructions (by
+default) three ways: the plain interpreter, the interpreter with an
+OutOfOrderModel attached, and the model replaying a recorded trace with
+no CPU involved. Prints MIPS for each and the model's IPC, so a run's
+timing cost can be seen next to what it found.
+
+Usage: python bench_out_of_order.py [instructions] [program ...]   (default 1000000, all four)
+"""
+
+import sys
+import time
+
+from bench_suite import program_cpu
+from out_of_order import OutOfOrderModel
+from trace_recorder import TraceRing
+
+
+PROGRAMS = ('arith', 'memcpy', 'branchy', 'calls')
+
+
+def timed_run(name, instructions, reporter):
+    """(instructions run, seconds) for one run"""
+    cpu, _ = program_cpu(name, instructions)
+    start = time.perf_counter()
+    result = cpu.simulate(max_cycles=10 ** 10, reporter=reporter)
+    return result.cycles, time.perf_counter() - start
+
+
+def main():
+    instructions = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    names = sys.argv[2:] or PROGRAMS
+
+    print(f"Out-of-order model benchmark ({instructions} instructions, default 4-wide core)")
+    print("=" * 80)
+    print(f"{'program':<10} {'instrs':>8} {'plain':>10} {'with model':>12} {'replay':>10} "
+          f"{'run time':>9} {'IPC':>6} {'ROB':>5}")
+    for name in names:
+        count, plain = timed_run(name, instructions, None)
+        model = OutOfOrderModel()
+        _, live = timed_run(name, instructions, model)
+
+        ring = TraceRing(capacity=count + 16)
+        cpu, _ = program_cpu(name, instructions)
+        cpu.simulate(max_cycles=10 ** 10, reporter=ring)
+        records = list(ring)
+        replayed = OutOfOrderModel()
+        start = time.perf_counter()
+        replayed.replay(records, end_pc=cpu.pc)
+        replay = time.perf_counter() - start
+        if replayed.to_dict() != model.to_dict():
+            print(f"{name}: replay and live results DIFFER")
+
+        print(f"{name:<10} {count:>8} {count / plain / 1e6:>5.2f} MIPS {count / live / 1e6:>7.2f} MIPS "
+              f"{count / replay / 1e6:>5.2f} MIPS {live:>7.1f} s {model.ipc():>6.3f} "
+              f"{model.mean_occupancy():>5.1f}")
+    print("=" * 80)
+    print("run time: the run with the model attached; ROB: mean entries in use")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Pipeline model benchmark - cost of cycle timing on top of functional runs
+
+Runs a loop with loads, a load-use pair and a taken branch every
+iteration, alternating plain interpreter runs, plain runs on the
+translate engine, runs with a do-nothing trace hook (what any tracing
+reporter costs) and runs with the PipelineModel attached, best of
+several each. A reporter with a trace hook always runs on the
+interpreter, so the model's cost is shown against both engines. Also
+times replaying a recorded trace into the model, with no CPU involved.
+
+Usage: python bench_pipeline.py [iterations] [repeats]   (default 100000, 5)
+"""
+
+import sys
+import time
+
+from assembler import assemble
+from cpu import RISCV_CPU
+from pipeline import PipelineModel
+from trace_recorder import TraceRing
+
+
+PROGRAM = assemble("""
+    li   t0, 0x1000
+loop:
+    lw   t1, 0(t0)
+    add  a0, a0, t1         # load-use
+    lw   t2, 4(t0)
+    xor  a1, a1, t2
+    slli t3, a0, 2
+    sw   t3, 8(t0)
+    addi a2, a2, -1
+    bne  a2, zero, loop
+    halt
+""")
+
+
+class NullTrace:
+    """A reporter with a trace hook that does nothing"""
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        pass
+
+    def trace(self, cpu, decoded):
+        pass
+
+
+def measure(iterations, reporter, engine='interpreter'):
+    """MIPS for one run"""
+    cpu = RISCV_CPU(engine=engine)
+    for i, inst in enumerate(PROGRAM):
+        cpu.memory.write_word(i * 4, inst)
+    cpu.registers.write(12, iterations)
+    start = time.perf_counter()
+    result = cpu.simulate(max_cycles=10 ** 9, reporter=reporter)
+    return result.cycles / (time.perf_counter() - start) / 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"Pipeline model benchmark ({iterations} iterations, best of {repeats})")
+    print("=" * 60)
+    # Alternate them so drifting machine load hits all alike
+    runs = {'plain': [], 'translate': [], 'hook': [], 'model': []}
+    model = None
+    for _ in range(repeats):
+        runs['plain'].append(measure(iterations, None))
+        runs['translate'].append(measure(iterations, None, engine='translate'))
+        runs['hook'].append(measure(iterations, NullTrace()))
+        model = PipelineModel()
+        runs['model'].append(measure(iterations, model))
+    plain, translate, hook, timed = (max(runs[name]) for name in ('plain', 'translate', 'hook', 'model'))
+
+    print(f"interpreter               {plain:8.3f} MIPS")
+    print(f"  with a no-op trace hook {hook:8.3f} MIPS   ({(plain / hook - 1) * 100:+.1f}% time)")
+    print(f"  with the pipeline model {timed:8.3f} MIPS   ({(plain / timed - 1) * 100:+.1f}% time)")
+    print(f"  (model CPI {model.cpi():.3f})")
+    print(f"translate engine          {translate:8.3f} MIPS")
+    print(f"  with the pipeline model {timed:8.3f} MIPS   ({translate / timed:.1f}x the time; "
+          f"a trace hook forces the interpreter)")
+
+    ring = TraceRing(capacity=8 * len(PROGRAM) * min(iterations, 20000))
+    measure(min(iterations, 20000), ring)
+    records = list(ring)
+    best = None
+    for _ in range(repeats):
+        replayed = PipelineModel()
+        start = time.perf_counter()
+        replayed.replay(records)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+    print(f"replay from a trace       {len(records) / best / 1e6:8.3f} M instructions/s")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Profiler benchmark - cost of profiling on the interpreter loop
+
+Runs a nested loop (a short inner loop with a branch every 4
+instructions, so transfers are frequent) with and without profiling,
+best of several alternating runs each, and reports the slowdown. Also times
+building the report afterwards.
+
+Usage: python bench_profiler.py [outer_loops] [repeats]   (default 2000, 5)
+"""
+
+import sys
+import time
+
+from cpu import RISCV_CPU
+
+
+# for x1 in 0..x10: for x2 in 0..16: x3 += x2; store x3
+PROGRAM = [
+    0x00000093,  # addi x1, x0, 0
+    0x01000213,  # addi x4, x0, 16
+    0x00000113,  # addi x2, x0, 0
+    0x002181B3,  # add x3, x3, x2
+    0x00110113,  # addi x2, x2, 1
+    0xFE414CE3,  # blt x2, x4, -8
+    0x40302023,  # sw x3, 0x400(x0)
+    0x00108093,  # addi x1, x1, 1
+    0xFEA0C4E3,  # blt x1, x10, -24
+    0x0000006F,  # halt
+]
+
+
+def measure(outer_loops, profile):
+    """(MIPS, seconds to build the report or None)"""
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(PROGRAM):
+        cpu.memory.write_word(i * 4, inst)
+    cpu.registers.write(10, outer_loops)
+    profiler = cpu.start_profiling() if profile else None
+
+    start = time.perf_counter()
+    result = cpu.simulate(max_cycles=10 ** 9)
+    mips = result.cycles / (time.perf_counter() - start) / 1e6
+
+    report_time = None
+    if profiler is not None:
+        start = time.perf_counter()
+        profiler.report()
+        report_time = time.perf_counter() - start
+    return mips, report_time
+
+
+def main():
+    outer_loops = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"Profiler benchmark ({outer_loops} outer loops, best of {repeats})")
+    print("=" * 60)
+    # Alternate the two so drifting machine load hits both alike
+    plain_runs = []
+    profiled_runs = []
+    for _ in range(repeats):
+        plain_runs.append(measure(outer_loops, False)[0])
+        profiled_runs.append(measure(outer_loops, True))
+    plain = max(plain_runs)
+    profiled = max(mips for mips, _ in profiled_runs)
+    report_time = min(seconds for _, seconds in profiled_runs)
+
+    print(f"interpreter            {plain:8.3f} MIPS")
+    print(f"interpreter, profiled  {profiled:8.3f} MIPS   ({(plain / profiled - 1) * 100:+.1f}% time)")
+    print(f"building the report    {report_time * 1000:8.1f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+SIMT engine benchmark - N lanes in lockstep vs N separate RISCV_CPU runs
+
+Every lane runs the same counting loop with its own trip count (a small
+spread, so lanes diverge at the loop exit and regroup at the halt).
+Reports aggregate simulated MIPS for the SIMT engine at each lane count,
+against one RISCV_CPU per lane on each engine (timed on a sample of
+lanes and scaled up).
+
+Usage: python bench_simt.py [loop_count] [max_lanes]
+       (default 2000 iterations, up to 1024 lanes)
+"""
+
+import sys
+import time
+
+from cpu import RISCV_CPU
+from simt import SIMTEngine
+
+
+# x1 counts up to x10 (set per lane), then the sum is stored
+PROGRAM = [
+    0x00000093,  # addi x1, x0, 0
+    0x00000113,  # addi x2, x0, 0
+    0x00108093,  # addi x1, x1, 1
+    0x00110113,  # addi x2, x2, 1
+    0x0020C1B3,  # xor x3, x1, x2  (just more work per iteration)
+    0xFEA09AE3,  # bne x1, x10, -12
+    0x40202023,  # sw x2, 0x400(x0)
+    0x0000006F,  # halt
+]
+
+
+def trip_counts(num_lanes, loop_count):
+    return [loop_count + lane % 8 for lane in range(num_lanes)]
+
+
+def measure_simt(num_lanes, loop_count):
+    """(aggregate MIPS, fraction of lanes busy per step)"""
+    sim = SIMTEngine(num_lanes)
+    for i, inst in enumerate(PROGRAM):
+        sim.write_word(i * 4, inst)
+    sim.regs[:, 10] = trip_counts(num_lanes, loop_count)
+
+    start = time.perf_counter()
+    sim.run(max_cycles=10 ** 9)
+    elapsed = time.perf_counter() - start
+    return int(sim.cycles.sum()) / elapsed / 1e6, sim.efficiency()
+
+
+def measure_scalar(engine, loop_count, sample=8):
+    """Aggregate MIPS of one RISCV_CPU per lane (per-lane speed doesn't depend on N)"""
+    cycles = 0
+    start = time.perf_counter()
+    for n in trip_counts(sample, loop_count):
+        cpu = RISCV_CPU(engine=engine)
+        for i, inst in enumerate(PROGRAM):
+            cpu.memory.write_word(i * 4, inst)
+        cpu.registers.write(10, n)
+        cycles += cpu.simulate(max_cycles=10 ** 9).cycles
+    return cycles / (time.perf_counter() - start) / 1e6
+
+
+def main():
+    loop_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    max_lanes = int(sys.argv[2]) if len(sys.argv) > 2 else 1024
+
+    print(f"SIMT engine benchmark ({loop_count} loop iterations per lane)")
+    print("=" * 60)
+    scalar = {engine: measure_scalar(engine, loop_count) for engine in RISCV_CPU.ENGINES}
+    for engine, mips in scalar.items():
+        print(f"RISCV_CPU per lane ({engine:<11}): {mips:8.2f} MIPS")
+
+    print(f"\n{'lanes':>6} {'MIPS':>9} {'busy':>6} {'vs interp':>10} {'vs translate':>13}")
+    lanes = 1
+    while lanes <= max_lanes:
+        mips, busy = measure_simt(lanes, loop_count)
+        print(f"{lanes:>6} {mips:>9.2f} {busy:>6.0%} {mips / scalar['interpreter']:>9.1f}x "
+              f"{mips / scalar['translate']:>12.1f}x")
+        lanes *= 4 if lanes < 64 else 2
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
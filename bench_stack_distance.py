@@ -0,0 +1,70 @@
+"""
+Stack distance benchmark - one analysis pass vs one cache run per config
+
+Runs a bench_suite guest program once with a StackDistanceAnalyzer doing
+a sweep of set-associative configs (and every fully associative size),
+then once per config with a CacheHierarchy, which is what the sweep costs
+without it. Also times replaying a recorded trace into the analyzer.
+
+Usage: python bench_stack_distance.py [program] [instructions]   (default memcpy, 300000)
+"""
+
+import sys
+import time
+
+from bench_suite import program_cpu
+from cache import Cache, CacheHierarchy
+from stack_distance import StackDistanceAnalyzer, DATA, _size_text
+from trace_recorder import TraceRing
+
+
+# 20 configs: 4 sizes x 5 associativities
+CONFIGS = [(size, ways) for size in (4096, 8192, 16384, 32768) for ways in (1, 2, 4, 8, 16)]
+
+
+def timed_run(name, instructions, reporter):
+    """Seconds for one run"""
+    cpu, _ = program_cpu(name, instructions)
+    start = time.perf_counter()
+    cpu.simulate(max_cycles=10 ** 10, reporter=reporter)
+    return time.perf_counter() - start
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else 'memcpy'
+    instructions = int(sys.argv[2]) if len(sys.argv) > 2 else 300000
+
+    print(f"Stack distance benchmark ({name}, {instructions} instructions, {len(CONFIGS)} configs)")
+    print("=" * 64)
+    plain = timed_run(name, instructions, None)
+    analyzer = StackDistanceAnalyzer(CONFIGS)
+    one_pass = timed_run(name, instructions, analyzer)
+    reruns = 0.0
+    agree = True
+    for size, ways in CONFIGS:
+        caches = CacheHierarchy(l1i=Cache('L1I', size, ways), l1d=Cache('L1D', size, ways), l2=None)
+        reruns += timed_run(name, instructions, caches)
+        agree = agree and abs(caches.l1d.miss_rate() - analyzer.miss_ratio(DATA, size, ways)) < 1e-12
+
+    references = sum(analyzer.profiles[stream].references for stream in analyzer.profiles)
+    print(f"plain run                 {plain:8.2f} s")
+    print(f"one analysis pass         {one_pass:8.2f} s   ({references / one_pass / 1e6:.2f} M references/s)")
+    print(f"one cache run per config  {reruns:8.2f} s   ({reruns / one_pass:.1f}x the analysis)")
+    print(f"miss ratios agree: {'yes' if agree else 'NO'}")
+
+    ring = TraceRing(capacity=instructions + 1000)
+    timed_run(name, instructions, ring)
+    replayed = StackDistanceAnalyzer(CONFIGS)
+    start = time.perf_counter()
+    replayed.replay(ring)
+    seconds = time.perf_counter() - start
+    print(f"replay from a trace       {seconds:8.2f} s   ({len(ring) / seconds / 1e6:.2f} M instructions/s)")
+    print("=" * 64)
+    data = analyzer.profiles[DATA]
+    print(f"data: {data.references} references to {data.lines} lines; fully associative "
+          + ", ".join(f"{_size_text(size)} {100 * analyzer.miss_ratio(DATA, size):.2f}%"
+                      for size in (4096, 32768)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Benchmark suite - did a change make the simulator faster or slower?
+
+Two kinds of benchmark:
+  micro      one component call in a loop (ALU.execute, InstructionDecoder
+             decode, Memory word/byte access, RegisterFile access),
+             reported in nanoseconds per call
+  program    a whole guest program run to its halt on each engine,
+             reported in simulated MIPS:
+               arith    tight register arithmetic loop
+               memcpy   LW/LW/SW/SW word copy loop
+               branchy  pseudo-random data-dependent branches
+               calls    recursive JAL/JALR call chain 32 deep, with the
+                        return address kept on a stack in memory
+
+Each result is the best of several repeats. `run` appends the results,
+the machine they ran on and the git commit to a JSONL history file;
+`compare` lines two history entries up and flags anything that got
+slower by more than a threshold (exit code 1 if anything did).
+
+Usage: python bench_suite.py run [--quick] [--only TEXT] [--label TEXT]
+                                 [--history FILE] [--no-save] [--baseline REF]
+       python bench_suite.py compare [BASELINE] [CURRENT] [--threshold PCT]
+       python bench_suite.py list
+REF is a history index (0 = oldest, -1 = newest), a label or a commit.
+"""
+
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from alu import ALU
+from cpu import RISCV_CPU
+from decoder import InstructionDecoder
+from memory import Memory, PagedMemory
+from registers import RegisterFile
+from run_result import HALT_INSTRUCTION
+
+
+DEFAULT_HISTORY = "bench_history.jsonl"
+
+# Better when the number goes up, or down
+HIGHER_IS_BETTER = {'MIPS': True, 'ns/call': False}
+
+
+# ---- guest programs (x10 = iterations) ----
+
+ARITH = [
+    0x00000093,  # addi x1, x0, 0
+    0x00100113,  # addi x2, x0, 1
+    0x002181B3,  # add x3, x3, x2
+    0x00324233,  # xor x4, x4, x3
+    0x00319293,  # slli x5, x3, 3
+    0x40428333,  # sub x6, x5, x4
+    0x003373B3,  # and x7, x6, x3
+    0x00310113,  # addi x2, x2, 3
+    0x00108093,  # addi x1, x1, 1
+    0xFEA0C2E3,  # blt x1, x10, -28
+    0x0000006F,  # halt
+]
+
+# Copies x10 words (two per iteration) from 0x10000 to 0x80000
+MEMCPY = [
+    0x00010137,  # lui x2, 0x10
+    0x000801B7,  # lui x3, 0x80
+    0x00251213,  # slli x4, x10, 2
+    0x00220233,  # add x4, x4, x2
+    0x00012283,  # lw x5, 0(x2)
+    0x00412303,  # lw x6, 4(x2)
+    0x0051A023,  # sw x5, 0(x3)
+    0x0061A223,  # sw x6, 4(x3)
+    0x00810113,  # addi x2, x2, 8
+    0x00818193,  # addi x3, x3, 8
+    0xFE4144E3,  # blt x2, x4, -24
+    0x0000006F,  # halt
+]
+
+# x2 steps a 32-bit LCG; bit 16 and bit 10 pick the path each time
+BRANCHY = [
+    0x00000093,  # addi x1, x0, 0
+    0x4D200113,  # addi x2, x0, 1234
+    0x00211193,  # slli x3, x2, 2
+    0x00310133,  # add x2, x2, x3
+    0x3F510113,  # addi x2, x2, 1013
+    0x01015213,  # srli x4, x2, 16
+    0x00127213,  # andi x4, x4, 1
+    0x00020663,  # beq x4, x0, 12
+    0x00130313,  # addi x6, x6, 1
+    0x0080006F,  # jal x0, 8
+    0x00138393,  # addi x7, x7, 1
+    0x40017293,  # andi x5, x2, 1024
+    0x00029463,  # bne x5, x0, 8
+    0x00244433,  # xor x8, x8, x2
+    0x00108093,  # addi x1, x1, 1
+    0xFCA0C6E3,  # blt x1, x10, -52
+    0x0000006F,  # halt
+]
+
+# Calls f(32) x10 times; f(n) pushes x1, calls f(n - 1), pops x1, returns
+CALLS = [
+    0x00040137,  # lui x2, 0x40          (stack pointer)
+    0x00000413,  # addi x8, x0, 0
+    0x02000593,  # addi x11, x0, 32
+    0x010000EF,  # jal x1, 16            (call f)
+    0x00140413,  # addi x8, x8, 1
+    0xFEA44AE3,  # blt x8, x10, -12
+    0x0000006F,  # halt
+    0x00058E63,  # beq x11, x0, 28       (f: return when n == 0)
+    0xFFC10113,  # addi x2, x2, -4
+    0x00112023,  # sw x1, 0(x2)
+    0xFFF58593,  # addi x11, x11, -1
+    0xFF1FF0EF,  # jal x1, -16
+    0x00012083,  # lw x1, 0(x2)
+    0x00410113,  # addi x2, x2, 4
+    0x00008067,  # jalr x0, 0(x1)
+]
+
+MEMCPY_SOURCE = 0x10000
+MEMCPY_MAX_WORDS = (0x80000 - MEMCPY_SOURCE) // 4
+
+# name -> (words, instructions per iteration, roughly)
+PROGRAMS = {
+    'arith': (ARITH, 8),
+    'memcpy': (MEMCPY, 3.5),
+    'branchy': (BRANCHY, 12),
+    'calls': (CALLS, 262),
+}
+
+
+def program_cpu(name, instructions, engine='interpreter'):
+    """
+    A CPU loaded with one of the PROGRAMS, sized to run about
+    `instructions` instructions
+
+    Returns:
+        (cpu, iterations)
+    """
+    words, per_iteration = PROGRAMS[name]
+    iterations = max(1, int(instructions / per_iteration))
+    cpu = RISCV_CPU(engine=engine)
+    for i, inst in enumerate(words):
+        cpu.memory.write_word(i * 4, inst)
+    if name == 'memcpy':
+        iterations = max(2, min(iterations, MEMCPY_MAX_WORDS) & ~1)
+        for i in range(iterations):
+            cpu.memory.write_word(MEMCPY_SOURCE + 4 * i, i * 0x9E3779B1 & 0xFFFFFFFF)
+    cpu.registers.write(10, iterations)
+    return cpu, iterations
+
+
+def measure_program(name, engine, instructions, repeats):
+    """Best simulated MIPS over `repeats` runs, each on a fresh CPU"""
+    best = 0.0
+    for _ in range(repeats):
+        cpu, _ = program_cpu(name, instructions, engine)
+        start = time.perf_counter()
+        result = cpu.simulate(max_cycles=10 ** 10)
+        elapsed = time.perf_counter() - start
+        if result.halt_reason != HALT_INSTRUCTION:
+            raise RuntimeError(f"benchmark program {name} stopped with {result.halt_reason}")
+        best = max(best, result.cycles / elapsed / 1e6)
+    return best
+
+
+# ---- microbenchmarks ----
+
+def measure_calls(function, args, repeats):
+    """Best nanoseconds per function(*a) for a in args"""
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for a in args:
+            function(*a)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / len(args) * 1e9
+
+
+def micro_benchmarks(calls, seed=1):
+    """
+    Name -> (function, argument tuples) for every microbenchmark
+
+    Args:
+        calls: Calls per repeat
+        seed: For the random arguments (fixed so every run times the same work)
+    """
+    rng = random.Random(seed)
+    alu = ALU()
+    decoder = InstructionDecoder()
+    registers = RegisterFile()
+    operations = ['ADD', 'SUB', 'AND', 'OR', 'XOR', 'SLL', 'SRL', 'SRA', 'SLT', 'SLTU']
+    opcodes = [0x33, 0x13, 0x03, 0x23, 0x63, 0x6F, 0x67, 0x37, 0x17]
+    values = [(rng.getrandbits(32),) for _ in range(calls)]
+    words = [((rng.getrandbits(25) << 7) | rng.choice(opcodes),) for _ in range(calls)]
+    word_addresses = [(4 * rng.randrange(0x4000),) for _ in range(calls)]
+    byte_addresses = [(rng.randrange(0x10000),) for _ in range(calls)]
+    register_numbers = [(rng.randrange(32),) for _ in range(calls)]
+
+    benchmarks = {
+        'alu.execute': (alu.execute, [(rng.choice(operations),) + v + w
+                                      for v, w in zip(values, reversed(values))]),
+        'decoder.decode': (decoder.decode, words),
+        'decoder.decode_record': (decoder.decode_record, words),
+        'registers.read': (registers.read, register_numbers),
+        'registers.write': (registers.write, [r + v for r, v in zip(register_numbers, values)]),
+    }
+    for backend, memory in (('dict', Memory()), ('paged', PagedMemory())):
+        # Reads of memory that has been written, like a running program's
+        for (address,), (value,) in zip(word_addresses, values):
+            memory.write_word(address, value)
+        benchmarks[f'memory.{backend}.read_word'] = (memory.read_word, word_addresses)
+        benchmarks[f'memory.{backend}.write_word'] = (
+            memory.write_word, [a + v for a, v in zip(word_addresses, values)])
+        benchmarks[f'memory.{backend}.read_byte'] = (memory.read_byte, byte_addresses)
+        benchmarks[f'memory.{backend}.write_byte'] = (
+            memory.write_byte, [a + (v[0] & 0xFF,) for a, v in zip(byte_addresses, values)])
+    return benchmarks
+
+
+# ---- running ----
+
+def run_suite(instructions=300000, calls=100000, repeats=5, only=None, progress=None):
+    """
+    Run every benchmark
+
+    Args:
+        instructions: Roughly how many guest instructions per program run
+        calls: Calls per repeat of each microbenchmark
+        repeats: Runs of each benchmark (the best is kept)
+        only: Run just the benchmarks whose name contains this text
+        progress: Optional function(name, value, unit) called after each one
+    Returns:
+        Dict of name -> {'value': float, 'unit': 'ns/call' or 'MIPS'}
+    """
+    results = {}
+
+    def keep(name, value, unit):
+        results[name] = {'value': value, 'unit': unit}
+        if progress is not None:
+            progress(name, value, unit)
+
+    for name, (function, args) in micro_benchmarks(calls).items():
+        if only is None or only in name:
+            keep(name, measure_calls(function, args, repeats), 'ns/call')
+
+    for program in PROGRAMS:
+        for engine in RISCV_CPU.ENGINES:
+            name = f'program.{program}.{engine}'
+            if only is None or only in name:
+                keep(name, measure_program(program, engine, instructions, repeats), 'MIPS')
+    return results
+
+
+def machine_info():
+    """What the numbers were measured on"""
+    return {
+        'python': f"{platform.python_implementation()} {platform.python_version()}",
+        'system': f"{platform.system()} {platform.release()}",
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'host': platform.node(),
+    }
+
+
+def git_commit():
+    """Short hash of the checked-out commit, plus '+' for local changes, or None"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                                capture_output=True, text=True, timeout=10)
+        if commit.returncode != 0:
+            return None
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               cwd=here, capture_output=True, text=True, timeout=10)
+        return commit.stdout.strip() + ("+" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def make_entry(results, label=None, settings=None):
+    """A history entry for results from run_suite"""
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'label': label,
+        'commit': git_commit(),
+        'machine': machine_info(),
+        'settings': settings or {},
+        'results': results,
+    }
+
+
+# ---- history ----
+
+def load_history(path):
+    """Every entry in a history file, oldest first ([] if there isn't one)"""
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path) as f:
+        for line_num, line in enumerate(f, 1):
+            if line.strip():
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"{path}:{line_num}: not a history entry ({e})") from e
+    return entries
+
+
+def append_history(path, entry):
+    """Add one entry to the end of a history file"""
+    with open(path, 'a') as f:
+        f.write(json.dumps(entry) + "\n")
+
+
+def select_entry(history, ref):
+    """
+    Find a history entry
+
+    Args:
+        history: List from load_history
+        ref: Index (negative counts from the newest), or a label or commit
+             (the newest entry with it; labels win over commits)
+    Raises:
+        ValueError: Nothing matches
+    """
+    try:
+        index = int(ref)
+    except ValueError:
+        for entry in reversed(history):
+            if entry.get('label') == ref:
+                return entry
+        for entry in reversed(history):
+            if (entry.get('commit') or '').startswith(ref):
+                return entry
+        raise ValueError(f"no history entry labelled or at commit {ref!r}")
+    try:
+        return history[index]
+    except IndexError:
+        raise ValueError(f"history has {len(history)} entries, no entry {index}") from None
+
+
+def compare(baseline, current, threshold=5.0):
+    """
+    Line up the results two entries have in common
+
+    Args:
+        baseline, current: History entries (or anything with 'results')
+        threshold: Percent slower that counts as a regression
+    Returns:
+        List of (name, unit, baseline value, current value, percent slower,
+        regressed) - percent slower is negative when it got faster
+    """
+    rows = []
+    old_results = baseline['results']
+    for name, new in current['results'].items():
+        old = old_results.get(name)
+        if old is None or old['unit'] != new['unit']:
+            continue
+        if HIGHER_IS_BETTER[new['unit']]:
+            slower = (old['value'] / new['value'] - 1) * 100
+        else:
+            slower = (new['value'] / old['value'] - 1) * 100
+        rows.append((name, new['unit'], old['value'], new['value'], slower, slower > threshold))
+    return rows
+
+
+def describe(entry):
+    """One line naming a history entry"""
+    parts = [entry.get('timestamp', '?')]
+    if entry.get('label'):
+        parts.append(entry['label'])
+    if entry.get('commit'):
+        parts.append(entry['commit'])
+    return ", ".join(parts)
+
+
+def print_comparison(baseline, current, threshold):
+    """Print compare() as a table; returns how many regressed"""
+    print(f"Baseline: {describe(baseline)}")
+    print(f"Current:  {describe(current)}")
+    if baseline.get('machine') != current.get('machine'):
+        print("Note: measured on different machines or Pythons - differences may not be the code")
+    print("=" * 78)
+    print(f"{'benchmark':<34} {'baseline':>11} {'current':>11} {'unit':<8} {'slower':>8}")
+    rows = compare(baseline, current, threshold)
+    for name, unit, old, new, slower, regressed in rows:
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<34} {old:>11.3f} {new:>11.3f} {unit:<8} {slower:>+7.1f}%{flag}")
+    regressions = sum(1 for row in rows if row[5])
+    print("=" * 78)
+    print(f"{regressions} regression(s) beyond {threshold:g}%")
+    return regressions
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulator benchmark suite")
+    parser.add_argument("--history", default=DEFAULT_HISTORY,
+                        help=f"JSONL history file (default: {DEFAULT_HISTORY})")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and record the results")
+    run.add_argument("--quick", action="store_true", help="smaller runs, for a rough check")
+    run.add_argument("--only", metavar="TEXT", help="only benchmarks whose name contains TEXT")
+    run.add_argument("--label", help="name this entry, to compare against later")
+    run.add_argument("--repeats", type=int, default=None, help="runs of each (default: 5, quick: 3)")
+    run.add_argument("--instructions", type=int, default=None,
+                     help="guest instructions per program run (default: 300000, quick: 30000)")
+    run.add_argument("--no-save", action="store_true", help="don't add to the history file")
+    run.add_argument("--baseline", metavar="REF",
+                     help="compare against this history entry afterwards")
+    run.add_argument("--threshold", type=float, default=5.0,
+                     help="percent slower that counts as a regression (default: 5)")
+
+    cmp = commands.add_parser("compare", help="compare two history entries")
+    cmp.add_argument("baseline", nargs="?", default="-2", help="REF (default: -2)")
+    cmp.add_argument("current", nargs="?", default="-1", help="REF (default: -1, the newest)")
+    cmp.add_argument("--threshold", type=float, default=5.0,
+                     help="percent slower that counts as a regression (default: 5)")
+
+    commands.add_parser("list", help="list the history entries")
+    args = parser.parse_args(argv)
+
+    try:
+        history = load_history(args.history)
+        if args.command == "list":
+            for index, entry in enumerate(history):
+                print(f"{index:>4}  {describe(entry)}  ({len(entry['results'])} results)")
+            return 0
+
+        if args.command == "compare":
+            baseline = select_entry(history, args.baseline)
+            current = select_entry(history, args.current)
+            return 1 if print_comparison(baseline, current, args.threshold) else 0
+
+        baseline = select_entry(history, args.baseline) if args.baseline else None
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    repeats = args.repeats or (3 if args.quick else 5)
+    instructions = args.instructions or (30000 if args.quick else 300000)
+    calls = 10000 if args.quick else 100000
+    print(f"Benchmark suite ({instructions} instructions per program, "
+          f"{calls} calls per microbenchmark, best of {repeats})")
+    print("=" * 60)
+    results = run_suite(instructions, calls, repeats, args.only,
+                        progress=lambda name, value, unit: print(f"{name:<34} {value:>11.3f} {unit}"))
+    print("=" * 60)
+
+    entry = make_entry(results, args.label, {'instructions': instructions, 'calls': calls,
+                                             'repeats': repeats})
+    if not args.no_save:
+        append_history(args.history, entry)
+        print(f"Saved to {args.history}")
+
+    if baseline is not None:
+        print()
+        return 1 if print_comparison(baseline, entry, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,83 @@
+"""
+Decoupled timing benchmark - one functional run vs one run per model
+
+Times a sweep of timing models (pipeline configs, branch predictors,
+caches) over a bench_suite guest program three ways: each model attached
+to its own live run, as it had to be done before timing.py; one
+EventStream run replayed into every model in this process; and the same
+through run_timing's worker processes. Prints the cores available, since
+the workers can only help when there is more than one.
+
+Usage: python bench_timing.py [program] [instructions] [workers]   (default branchy, 200000, cores)
+"""
+
+import functools
+import sys
+import time
+
+from batch import available_cores
+from bench_suite import program_cpu
+from branch_predictor import BranchEvaluator
+from cache import Cache, CacheHierarchy
+from pipeline import PipelineConfig, PipelineModel
+from timing import EventStream, run_timing
+
+
+def sweep():
+    """8 models: 4 pipelines, 2 predictor sweeps, 2 cache hierarchies"""
+    models = {}
+    for forwarding in (True, False):
+        for penalty in (1, 3):
+            models[f"pipeline {forwarding} {penalty}"] = functools.partial(
+                PipelineModel, PipelineConfig(forwarding=forwarding, branch_penalty=penalty))
+    models['bimodal'] = functools.partial(BranchEvaluator, ["bimodal:256", "bimodal:4096"])
+    models['gshare'] = functools.partial(BranchEvaluator, ["gshare:4096:12+btb:512+ras:16"])
+    models['caches 4K'] = functools.partial(CacheHierarchy, Cache('L1I', 4096, 2), Cache('L1D', 4096, 2))
+    models['caches 32K'] = CacheHierarchy
+    return models
+
+
+def main():
+    name = sys.argv[1] if len(sys.argv) > 1 else 'branchy'
+    instructions = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else available_cores()
+    models = sweep()
+
+    print(f"Decoupled timing benchmark ({name}, {instructions} instructions, "
+          f"{len(models)} models, {available_cores()} cores)")
+    print("=" * 64)
+    cpu, _ = program_cpu(name, instructions)
+    start = time.perf_counter()
+    cpu.simulate(max_cycles=10 ** 10)
+    plain = time.perf_counter() - start
+
+    live = {}
+    start = time.perf_counter()
+    for label, factory in models.items():
+        cpu, _ = program_cpu(name, instructions)
+        model = factory()
+        cpu.simulate(max_cycles=10 ** 10, reporter=model)
+        live[label] = model.to_dict()
+    separate = time.perf_counter() - start
+
+    cpu, _ = program_cpu(name, instructions)
+    start = time.perf_counter()
+    in_process = run_timing(EventStream(cpu, 10 ** 10), models, workers=0)
+    together = time.perf_counter() - start
+
+    cpu, _ = program_cpu(name, instructions)
+    start = time.perf_counter()
+    parallel = run_timing(EventStream(cpu, 10 ** 10), models, workers=workers)
+    pooled = time.perf_counter() - start
+
+    print(f"functional run alone           {plain:8.2f} s")
+    print(f"one live run per model         {separate:8.2f} s")
+    print(f"one stream, models in-process  {together:8.2f} s   ({separate / together:.1f}x faster)")
+    print(f"one stream, workers={workers:<3}        {pooled:8.2f} s   ({separate / pooled:.1f}x faster)")
+    same = live == in_process == parallel
+    print(f"results identical: {'yes' if same else 'NO'}")
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
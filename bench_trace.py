@@ -0,0 +1,82 @@
+"""
+Trace recorder benchmark - what tracing costs per instruction
+
+Runs the same loop with no tracing, with the binary recorders (in-memory
+ring and buffered file writer) and with the old verbose text trace sent
+to /dev/null, and reports simulated MIPS and the slowdown against the
+untraced interpreter. Also times reading the file back into NumPy.
+
+Usage: python bench_trace.py [loop_count]   (default 50000)
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+from cpu import RISCV_CPU
+from reporter import ConsoleReporter
+from trace_recorder import TraceRing, TraceWriter, read_trace, np
+
+
+# x1 counts to x10 with a store and a load each iteration
+PROGRAM = [
+    0x00000093,  # addi x1, x0, 0
+    0x000022B7,  # lui x5, 0x2
+    0x00108093,  # addi x1, x1, 1
+    0x0012A023,  # sw x1, 0(x5)
+    0x0002A303,  # lw x6, 0(x5)
+    0xFEA09AE3,  # bne x1, x10, -12
+    0x0000006F,  # halt
+]
+
+
+def make_cpu(loop_count, engine='interpreter'):
+    cpu = RISCV_CPU(engine=engine)
+    for i, inst in enumerate(PROGRAM):
+        cpu.memory.write_word(i * 4, inst)
+    cpu.registers.write(10, loop_count)
+    return cpu
+
+
+def measure(loop_count, engine='interpreter', reporter=None):
+    """Simulated MIPS for one run"""
+    cpu = make_cpu(loop_count, engine)
+    start = time.perf_counter()
+    result = cpu.simulate(max_cycles=10 ** 9, reporter=reporter)
+    return result.cycles / (time.perf_counter() - start) / 1e6
+
+
+def main():
+    loop_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    print(f"Trace recorder benchmark ({loop_count} loop iterations, "
+          f"{2 + 4 * loop_count} instructions)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.trace")
+        rows = [("interpreter, no trace", measure(loop_count))]
+        rows.append(("translate, no trace", measure(loop_count, 'translate')))
+        rows.append(("ring buffer (64K records)", measure(loop_count, reporter=TraceRing())))
+        with TraceWriter(path) as writer:
+            rows.append(("file writer", measure(loop_count, reporter=writer)))
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            rows.append(("verbose text trace", measure(loop_count, reporter=ConsoleReporter(verbose=True))))
+
+        base = rows[0][1]
+        for name, mips in rows:
+            print(f"{name:<28} {mips:8.3f} MIPS   {base / mips:5.2f}x the untraced time")
+
+        size = os.path.getsize(path)
+        print(f"\nTrace file: {size / 1e6:.2f} MB ({size / (2 + 4 * loop_count):.1f} bytes/instruction)")
+        if np is not None:
+            start = time.perf_counter()
+            trace = read_trace(path)
+            print(f"read_trace: {len(trace)} records in {(time.perf_counter() - start) * 1000:.1f} ms")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Trace codec benchmark - compression ratio and encode/decode speed
+
+Traces come from the bundled test programs and from long synthetic loops
+run on the CPU:
+  count    a counting loop (registers only)
+  array    sums an array with a 12-byte stride and stores the running total
+  lcg      a pseudo-random number generator storing every value to a table
+
+Each is compressed with zlib and lzma, against plain zlib on the raw
+32-byte records for comparison.
+
+Usage: python bench_trace_codec.py [iterations]   (default 100000 per loop)
+"""
+
+import glob
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+from cpu import RISCV_CPU
+from trace_recorder import TraceRing, np
+from trace_codec import CompressedTrace, compress_trace
+
+
+LOOPS = {
+    'count': [
+        0x00000093,  # addi x1, x0, 0
+        0x00108093,  # addi x1, x1, 1
+        0xFEA0CEE3,  # blt x1, x10, -4
+        0x0000006F,  # halt
+    ],
+    'array': [
+        0x00004137,  # lui x2, 0x4
+        0x00000093,  # addi x1, x0, 0
+        0x00012183,  # lw x3, 0(x2)
+        0x003080B3,  # add x1, x1, x3
+        0x00112023,  # sw x1, 0(x2)
+        0x00C10113,  # addi x2, x2, 12
+        0xFEA148E3,  # blt x2, x10, -16
+        0x0000006F,  # halt
+    ],
+    'lcg': [
+        0x00004137,  # lui x2, 0x4
+        0x00100093,  # addi x1, x0, 1
+        0x00109193,  # slli x3, x1, 1
+        0x003080B3,  # add x1, x1, x3
+        0x3F708093,  # addi x1, x1, 1015
+        0x0050C0B3,  # xor x1, x1, x5
+        0x0010D293,  # srli x5, x1, 1
+        0x00112023,  # sw x1, 0(x2)
+        0x00410113,  # addi x2, x2, 4
+        0xFEA142E3,  # blt x2, x10, -28
+        0x0000006F,  # halt
+    ],
+}
+
+
+def loop_trace(name, iterations):
+    """Trace of one of the LOOPS, sized to run `iterations` times"""
+    program = LOOPS[name]
+    cpu = RISCV_CPU(memory='paged')
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    stride = {'count': 0, 'array': 12, 'lcg': 4}[name]
+    cpu.registers.write(10, 0x4000 + stride * iterations if stride else iterations)
+    ring = TraceRing(capacity=len(program) * iterations)
+    cpu.simulate(max_cycles=10 ** 9, reporter=ring)
+    return ring.to_numpy()
+
+
+def program_traces():
+    """One trace with every bundled test program run back to back"""
+    traces = []
+    for program in sorted(glob.glob("test_*.hex")):
+        cpu = RISCV_CPU()
+        cpu.load(program)
+        ring = TraceRing()
+        cpu.simulate(max_cycles=10000, reporter=ring)
+        traces.append(ring.to_numpy())
+    return np.concatenate(traces)
+
+
+def measure(records, method, path):
+    """(compressed bytes, encode Mrecords/s, decode Mrecords/s)"""
+    start = time.perf_counter()
+    compress_trace(records, path, method=method)
+    encode = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with CompressedTrace(path) as trace:
+        decoded = trace.read()
+    decode = time.perf_counter() - start
+    assert decoded.tobytes() == records.tobytes()
+    count = len(records) / 1e6
+    return os.path.getsize(path), count / encode, count / decode
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    traces = {'test_*.hex': program_traces()}
+    for name in LOOPS:
+        traces[name] = loop_trace(name, iterations)
+
+    print(f"Trace codec benchmark ({iterations} loop iterations)")
+    print("=" * 78)
+    print(f"{'trace':<11} {'records':>9} {'raw MB':>7} {'method':<10} {'bytes':>10} "
+          f"{'ratio':>7} {'B/rec':>6} {'enc Mr/s':>9} {'dec Mr/s':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.rvtz")
+        for name, records in traces.items():
+            raw = records.nbytes
+            plain = len(zlib.compress(records.tobytes(), 6))
+            print(f"{name:<11} {len(records):>9} {raw / 1e6:>7.2f} {'raw+zlib':<10} {plain:>10} "
+                  f"{raw / plain:>6.0f}x {plain / len(records):>6.2f}")
+            for method in ('zlib', 'lzma'):
+                size, encode, decode = measure(records, method, path)
+                print(f"{'':<11} {'':>9} {'':>7} {method:<10} {size:>10} {raw / size:>6.0f}x "
+                      f"{size / len(records):>6.2f} {encode:>9.2f} {decode:>9.2f}")
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,642 @@
+"""
+Branch predictor models - how well a front end would guess where to fetch
+
+The simulator always knows where the next instruction is. A pipelined
+front end has to guess, and every wrong guess is a flush. This module
+models the usual guessers and counts how often each would be wrong on the
+branches and jumps a program actually runs:
+
+  direction predictors (taken or not, for BEQ/BNE/BLT/BGE)
+    StaticPredictor      always taken, never taken, or backward taken /
+                         forward not taken
+    BimodalPredictor     2-bit counters indexed by pc
+    GsharePredictor      2-bit counters indexed by pc xor global history
+    TournamentPredictor  bimodal and gshare with a chooser between them
+  target predictors
+    BranchTargetBuffer   pc -> last target, so taken branches and jumps can
+                         be redirected at fetch
+    ReturnAddressStack   return addresses pushed by calls, popped by returns
+
+A BranchUnit puts a direction predictor together with an optional BTB and
+RAS. A BranchEvaluator feeds one run to any number of units at once, so a
+design sweep is one simulation, not one per configuration:
+
+    sweep = BranchEvaluator([parse_unit("bimodal:1024"),
+                             parse_unit("gshare:4096:12+btb:512+ras:16")])
+    cpu.simulate(max_cycles=10**6, reporter=sweep)
+    print(sweep.report())
+
+Calls and returns follow the RISC-V hints: JAL/JALR writing ra (x1) or t0
+(x5) is a call, JALR x0 through ra or t0 is a return. Without a BTB,
+branch and JAL targets count as known once decoded, so only the direction
+can be wrong. JALR targets then count as never known.
+
+Command line: python branch_predictor.py PROGRAM [--max-cycles N]
+                  [--unit SPEC ...] [--detail NAME]
+"""
+
+from decoder import InstructionDecoder
+
+
+# Control transfer kinds
+BRANCH, JAL, JALR = 'branch', 'jal', 'jalr'
+KINDS = (BRANCH, JAL, JALR)
+
+# ra and t0, the link registers
+_LINK = (1, 5)
+
+
+def control_transfer(decoded):
+    """
+    How a decoded instruction moves the pc, if it can
+
+    Args:
+        decoded: DecodedInstruction
+    Returns:
+        (kind, offset, call, ret) - kind BRANCH, JAL or JALR, offset the
+        pc-relative target (0 for JALR), and whether it's a call or a
+        return by the RISC-V hints - or None if it always goes to pc + 4
+    """
+    name = decoded.name
+    if name in ('BEQ', 'BNE', 'BLT', 'BGE'):
+        return (BRANCH, decoded.imm, False, False)
+    if name == 'JAL':
+        return (JAL, decoded.imm, decoded.rd in _LINK, False)
+    if name == 'JALR':
+        return (JALR, 0, decoded.rd in _LINK, decoded.rd == 0 and decoded.rs1 in _LINK)
+    return None
+
+
+def _check_size(name, value):
+    """Table sizes must be powers of two so an index is a mask"""
+    if value < 1 or value & (value - 1):
+        raise ValueError(f"{name} must be a power of two, got {value}")
+
+
+# ---- direction predictors ----
+
+class StaticPredictor:
+    """
+    The same guess every time
+
+    Policies:
+        'taken', 'not_taken', or 'btfn' (backward taken, forward not taken -
+        loops close with backward branches)
+    """
+
+    POLICIES = ('taken', 'not_taken', 'btfn')
+
+    def __init__(self, policy='btfn'):
+        if policy not in self.POLICIES:
+            raise ValueError(f"unknown static policy {policy!r} "
+                             f"(expected one of {', '.join(self.POLICIES)})")
+        self.policy = policy
+
+    @property
+    def name(self):
+        return f"static:{self.policy}"
+
+    def predict(self, pc, target):
+        if self.policy == 'btfn':
+            return target <= pc
+        return self.policy == 'taken'
+
+    def update(self, pc, target, taken):
+        pass
+
+
+class BimodalPredictor:
+    """2-bit saturating counters indexed by pc (taken when >= 2)"""
+
+    def __init__(self, entries=1024):
+        _check_size("entries", entries)
+        self.entries = entries
+        self._mask = entries - 1
+        # Start weakly not taken
+        self.counters = bytearray([1]) * entries
+
+    @property
+    def name(self):
+        return f"bimodal:{self.entries}"
+
+    def predict(self, pc, target):
+        return self.counters[(pc >> 2) & self._mask] >= 2
+
+    def update(self, pc, target, taken):
+        i = (pc >> 2) & self._mask
+        count = self.counters[i]
+        if taken:
+            if count < 3:
+                self.counters[i] = count + 1
+        elif count:
+            self.counters[i] = count - 1
+
+
+class GsharePredictor:
+    """2-bit counters indexed by pc xor the last history_bits outcomes"""
+
+    def __init__(self, entries=4096, history_bits=None):
+        """
+        Args:
+            entries: Counters (a power of two)
+            history_bits: Outcomes remembered (default: enough to cover
+                          the whole table)
+        """
+        _check_size("entries", entries)
+        if history_bits is None:
+            history_bits = entries.bit_length() - 1
+        if history_bits < 0:
+            raise ValueError("history_bits can't be negative")
+        self.entries = entries
+        self.history_bits = history_bits
+        self._mask = entries - 1
+        self._history_mask = (1 << history_bits) - 1
+        self.history = 0
+        self.counters = bytearray([1]) * entries
+
+    @property
+    def name(self):
+        return f"gshare:{self.entries}:{self.history_bits}"
+
+    def _index(self, pc):
+        return ((pc >> 2) ^ self.history) & self._mask
+
+    def predict(self, pc, target):
+        return self.counters[self._index(pc)] >= 2
+
+    def update(self, pc, target, taken):
+        i = self._index(pc)
+        count = self.counters[i]
+        if taken:
+            if count < 3:
+                self.counters[i] = count + 1
+        elif count:
+            self.counters[i] = count - 1
+        self.history = ((self.history << 1) | taken) & self._history_mask
+
+
+class TournamentPredictor:
+    """
+    A bimodal and a gshare predictor, and 2-bit chooser counters indexed
+    by pc that learn which of the two to believe for each branch
+    """
+
+    def __init__(self, entries=4096, history_bits=None, chooser_entries=None):
+        """
+        Args:
+            entries: Counters in each of the two predictors
+            history_bits: gshare history length (see GsharePredictor)
+            chooser_entries: Chooser counters (default: entries)
+        """
+        chooser_entries = chooser_entries or entries
+        _check_size("chooser_entries", chooser_entries)
+        self.local = BimodalPredictor(entries)
+        self.global_ = GsharePredictor(entries, history_bits)
+        self.chooser_entries = chooser_entries
+        self._mask = chooser_entries - 1
+        # >= 2 means believe gshare; start weakly on bimodal
+        self.chooser = bytearray([1]) * chooser_entries
+
+    @property
+    def name(self):
+        name = f"tournament:{self.local.entries}:{self.global_.history_bits}"
+        if self.chooser_entries != self.local.entries:
+            name += f":{self.chooser_entries}"
+        return name
+
+    def predict(self, pc, target):
+        if self.chooser[(pc >> 2) & self._mask] >= 2:
+            return self.global_.predict(pc, target)
+        return self.local.predict(pc, target)
+
+    def update(self, pc, target, taken):
+        local_right = self.local.predict(pc, target) == taken
+        global_right = self.global_.predict(pc, target) == taken
+        if local_right != global_right:
+            i = (pc >> 2) & self._mask
+            count = self.chooser[i]
+            if global_right:
+                if count < 3:
+                    self.chooser[i] = count + 1
+            elif count:
+                self.chooser[i] = count - 1
+        self.local.update(pc, target, taken)
+        self.global_.update(pc, target, taken)
+
+
+# ---- target predictors ----
+
+class BranchTargetBuffer:
+    """Direct-mapped pc -> target of the last time it was taken"""
+
+    def __init__(self, entries=512):
+        _check_size("entries", entries)
+        self.entries = entries
+        self._mask = entries - 1
+        self.tags = [None] * entries
+        self.targets = [0] * entries
+
+    def lookup(self, pc):
+        """The remembered target, or None on a miss"""
+        i = (pc >> 2) & self._mask
+        return self.targets[i] if self.tags[i] == pc else None
+
+    def update(self, pc, target):
+        i = (pc >> 2) & self._mask
+        self.tags[i] = pc
+        self.targets[i] = target
+
+
+class ReturnAddressStack:
+    """Fixed-depth stack of return addresses - the oldest fall off when full"""
+
+    def __init__(self, depth=16):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        self.depth = depth
+        self.stack = []
+
+    def push(self, address):
+        if len(self.stack) == self.depth:
+            del self.stack[0]
+        self.stack.append(address)
+
+    def pop(self):
+        """The predicted return address, or None when empty"""
+        return self.stack.pop() if self.stack else None
+
+
+# ---- putting it together ----
+
+class BranchUnit:
+    """
+    One front-end configuration and its prediction statistics
+
+    Attributes:
+        direction: Direction predictor for conditional branches
+        btb: BranchTargetBuffer or None
+        ras: ReturnAddressStack or None
+        name: Label for reports
+        branches: pc -> [kind, executed, taken, mispredicted]
+    """
+
+    def __init__(self, direction=None, btb=None, ras=None, name=None):
+        self.direction = direction or BimodalPredictor()
+        self.btb = btb
+        self.ras = ras
+        self.name = name or self._describe()
+        self.branches = {}
+
+    def _describe(self):
+        name = self.direction.name
+        if self.btb is not None:
+            name += f"+btb:{self.btb.entries}"
+        if self.ras is not None:
+            name += f"+ras:{self.ras.depth}"
+        return name
+
+    def resolve(self, pc, kind, target, taken, call, ret):
+        """
+        Predict one control transfer, learn its outcome and count it
+
+        Args:
+            pc: Its address
+            kind: BRANCH, JAL or JALR
+            target: Where it goes when taken
+            taken: Whether it was (always True for jumps)
+            call, ret: Whether it's a call / a return
+        Returns:
+            True if the front end would have guessed wrong
+        """
+        btb = self.btb
+        if kind == BRANCH:
+            guess = self.direction.predict(pc, target)
+            wrong = guess != taken
+            if guess and taken and btb is not None:
+                wrong = btb.lookup(pc) != target
+            self.direction.update(pc, target, taken)
+        elif kind == JAL:
+            wrong = btb is not None and btb.lookup(pc) != target
+        else:
+            if ret and self.ras is not None:
+                guess = self.ras.pop()
+            elif btb is not None:
+                guess = btb.lookup(pc)
+            else:
+                guess = None
+            wrong = guess != target
+        if taken and btb is not None:
+            btb.update(pc, target)
+        if call and self.ras is not None:
+            self.ras.push((pc + 4) & 0xFFFFFFFF)
+
+        counts = self.branches.get(pc)
+        if counts is None:
+            counts = self.branches[pc] = [kind, 0, 0, 0]
+        counts[1] += 1
+        counts[2] += taken
+        counts[3] += wrong
+        return wrong
+
+    def totals(self):
+        """Kind -> (executed, mispredicted), with 'all' as well"""
+        totals = {kind: [0, 0] for kind in KINDS + ('all',)}
+        for kind, executed, _, wrong in self.branches.values():
+            for key in (kind, 'all'):
+                totals[key][0] += executed
+                totals[key][1] += wrong
+        return {kind: tuple(counts) for kind, counts in totals.items()}
+
+    def mispredict_rate(self, kind='all'):
+        """Mispredicted fraction of transfers of one kind (0.0 if none ran)"""
+        executed, wrong = self.totals()[kind]
+        return wrong / executed if executed else 0.0
+
+    def worst(self, limit=10):
+        """(pc, kind, executed, taken, mispredicted) with the most misses first"""
+        rows = [(pc, *counts) for pc, counts in self.branches.items() if counts[3]]
+        rows.sort(key=lambda row: (-row[4], row[0]))
+        return rows[:limit]
+
+    def to_dict(self):
+        """Statistics as plain data, ready for json.dumps"""
+        return {
+            'name': self.name,
+            'totals': {kind: {'executed': executed, 'mispredicted': wrong}
+                       for kind, (executed, wrong) in self.totals().items()},
+            'branches': {f"0x{pc:08X}": {'kind': kind, 'executed': executed, 'taken': taken,
+                                         'mispredicted': wrong}
+                         for pc, (kind, executed, taken, wrong) in sorted(self.branches.items())},
+        }
+
+
+def parse_unit(spec):
+    """
+    A BranchUnit from a short description
+
+    Args:
+        spec: Direction predictor, then optional '+btb:N' and '+ras:N':
+                static[:taken|not_taken|btfn]   bimodal[:ENTRIES]
+                gshare[:ENTRIES[:HISTORY]]      tournament[:ENTRIES[:HISTORY[:CHOOSER]]]
+              e.g. "gshare:4096:12+btb:512+ras:16"
+    Returns:
+        BranchUnit named spec
+    Raises:
+        ValueError: If spec doesn't describe one
+    """
+    makers = {'static': StaticPredictor, 'bimodal': BimodalPredictor,
+              'gshare': GsharePredictor, 'tournament': TournamentPredictor}
+    parts = spec.strip().split('+')
+    name, *args = parts[0].split(':')
+    if name not in makers:
+        raise ValueError(f"unknown predictor {name!r} in {spec!r}")
+    try:
+        if name != 'static':
+            args = [int(arg, 0) for arg in args]
+        direction = makers[name](*args)
+    except TypeError:
+        raise ValueError(f"too many settings for {name} in {spec!r}")
+
+    btb = ras = None
+    for part in parts[1:]:
+        what, _, size = part.partition(':')
+        if what == 'btb':
+            btb = BranchTargetBuffer(int(size, 0)) if size else BranchTargetBuffer()
+        elif what == 'ras':
+            ras = ReturnAddressStack(int(size, 0)) if size else ReturnAddressStack()
+        else:
+            raise ValueError(f"unknown part {part!r} in {spec!r} (expected btb or ras)")
+    return BranchUnit(direction, btb, ras, name=spec.strip())
+
+
+class BranchEvaluator:
+    """
+    Feeds the control transfers of one run to several BranchUnits
+
+    Use it as a simulate() reporter, or feed it with step() / replay(). A
+    transfer's outcome is only known from the pc after it, so each one is
+    resolved when the next instruction (or the end of the run) arrives.
+
+    Attributes:
+        units: The BranchUnits being compared
+        instructions: Instructions seen
+    """
+
+    def __init__(self, units):
+        """
+        Args:
+            units: BranchUnits (or specs for parse_unit)
+        """
+        self.units = [parse_unit(unit) if isinstance(unit, str) else unit for unit in units]
+        names = [unit.name for unit in self.units]
+        if len(set(names)) != len(names):
+            raise ValueError("branch units need different names")
+        self.decoder = InstructionDecoder()
+        # Instruction word -> (kind, offset, call, ret), or None if it isn't one
+        self._info = {}
+        self.instructions = 0
+        self._pending = None
+
+    # ---- reporter interface ----
+
+    def start(self, cpu):
+        pass
+
+    def trace(self, cpu, decoded):
+        self.step(cpu.pc, decoded.word)
+
+    def finish(self, cpu, result):
+        # The last transfer went to wherever the run stopped
+        self._resolve(cpu.pc)
+
+    # ---- feeding it yourself ----
+
+    def step(self, pc, word):
+        """Count one executed instruction (the next one's pc shows where it went)"""
+        if self._pending is not None:
+            self._resolve(pc)
+        info = self._info.get(word, False)
+        if info is False:
+            info = self._describe(word)
+        if info is not None:
+            self._pending = (pc, info)
+        self.instructions += 1
+
+    def replay(self, records, end_pc=None):
+        """
+        Evaluate a recorded trace
+
+        Args:
+            records: Iterable of trace records - tuples in RECORD field order
+                     (TraceRing, iter_trace) or a TRACE_DTYPE array
+            end_pc: The pc the run stopped at, if known, so a transfer in
+                    the last record counts too
+        """
+        if hasattr(records, 'dtype'):
+            for pc, word in zip(records['pc'].tolist(), records['word'].tolist()):
+                self.step(pc, word)
+        else:
+            for record in records:
+                self.step(record[1], record[2])
+        if end_pc is not None:
+            self._resolve(end_pc)
+
+    def _describe(self, word):
+        info = control_transfer(self.decoder.decode_record(word))
+        self._info[word] = info
+        return info
+
+    def _resolve(self, next_pc):
+        if self._pending is None:
+            return
+        pc, (kind, offset, call, ret) = self._pending
+        self._pending = None
+        if kind == JALR:
+            target, taken = next_pc, True
+        else:
+            target = (pc + offset) & 0xFFFFFFFF
+            taken = kind == JAL or next_pc != ((pc + 4) & 0xFFFFFFFF)
+        for unit in self.units:
+            unit.resolve(pc, kind, target, taken, call, ret)
+
+    # ---- results ----
+
+    def report(self, detail=None, limit=10, symbols=None):
+        """
+        Mispredict rates of every unit side by side, and the worst branches
+        of one of them
+
+        Args:
+            detail: Name of the unit to list branches for (default: the first)
+            limit: Branches to list
+            symbols: Optional SymbolTable for naming them
+        Returns:
+            String
+        """
+        kilo = max(self.instructions, 1) / 1000
+        lines = [f"Branch prediction: {self.instructions} instructions",
+                 "",
+                 f"  {'unit':<34} {'branch':>8} {'jal':>8} {'jalr':>8} {'all':>8} {'MPKI':>7}"]
+        for unit in self.units:
+            totals = unit.totals()
+            rates = [f"{100 * wrong / executed:7.2f}%" if executed else f"{'-':>8}"
+                     for executed, wrong in (totals[kind] for kind in KINDS + ('all',))]
+            lines.append(f"  {unit.name:<34} {' '.join(rates)} {totals['all'][1] / kilo:7.2f}")
+        lines.append("  (mispredicted % of each kind executed; MPKI = mispredicts per 1000 instructions)")
+
+        if not self.units:
+            return "\n".join(lines)
+        unit = self.units[0] if detail is None else self.unit(detail)
+        worst = unit.worst(limit)
+        if worst:
+            lines.append("")
+            lines.append(f"Most mispredicted with {unit.name} (top {limit}):")
+            lines.append(f"  {'pc':<10} {'kind':<6} {'executed':>10} {'taken':>7} {'wrong':>7}")
+            for pc, kind, executed, taken, wrong in worst:
+                where = symbols.name_for(pc) if symbols else None
+                lines.append(f"  0x{pc:08X} {kind:<6} {executed:>10} {100 * taken / executed:6.1f}% "
+                             f"{100 * wrong / executed:6.1f}%" + (f"  <{where}>" if where else ""))
+        return "\n".join(lines)
+
+    def unit(self, name):
+        """The unit with this name (KeyError if there isn't one)"""
+        for unit in self.units:
+            if unit.name == name:
+                return unit
+        raise KeyError(name)
+
+    def to_dict(self):
+        """Results as plain data, ready for json.dumps"""
+        return {'instructions': self.instructions,
+                'units': [unit.to_dict() for unit in self.units]}
+
+
+# The sweep the command line runs when no units are given
+DEFAULT_UNITS = (
+    "static:not_taken",
+    "static:btfn",
+    "bimodal:1024",
+    "gshare:4096:12",
+    "tournament:4096:12",
+    "tournament:4096:12+btb:512+ras:16",
+)
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+    import json
+    from cpu import RISCV_CPU
+    from elf_loader import ProgramLoadError
+    from loader import HexLoadError
+
+    parser = argparse.ArgumentParser(
+        description="Run a program once and compare branch predictors on it")
+    parser.add_argument("program", help="hex, ELF, raw .bin or .ckpt file")
+    parser.add_argument("--max-cycles", type=int, default=10 ** 6,
+                        help="stop after this many instructions (default: 1000000)")
+    parser.add_argument("--unit", action="append", metavar="SPEC",
+                        help="a predictor configuration, e.g. gshare:4096:12+btb:512+ras:16 "
+                             "(repeat for more; default: a small sweep)")
+    parser.add_argument("--detail", metavar="SPEC",
+                        help="which unit to list the worst branches for (default: the first)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        evaluator = BranchEvaluator(args.unit or DEFAULT_UNITS)
+        if args.detail is not None:
+            evaluator.unit(args.detail)
+    except (ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        return 2
+
+    cpu = RISCV_CPU()
+    try:
+        cpu.load(args.program)
+    except (HexLoadError, ProgramLoadError) as e:
+        print(f"Error: {e}")
+        return 1
+    cpu.simulate(args.max_cycles, reporter=evaluator)
+    if args.json:
+        print(json.dumps(evaluator.to_dict()))
+    else:
+        print(evaluator.report(detail=args.detail, symbols=cpu.symbols))
+    return 0
+
+
+# Test
+if __name__ == "__main__":
+    import sys
+    from cpu import RISCV_CPU
+
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    print("Testing branch predictors...")
+
+    # A 10-iteration loop inside a 5-iteration loop
+    program = [
+        0x00500093,  # addi x1, x0, 5
+        0x00A00113,  # addi x2, x0, 10
+        0xFFF10113,  # addi x2, x2, -1
+        0xFE011EE3,  # bne x2, x0, -4
+        0xFFF08093,  # addi x1, x1, -1
+        0xFE0098E3,  # bne x1, x0, -16
+        0x0000006F,  # halt
+    ]
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    sweep = BranchEvaluator(["static:not_taken", "static:btfn", "bimodal:64"])
+    cpu.simulate(max_cycles=1000, reporter=sweep)
+
+    not_taken, btfn, bimodal = sweep.units
+    print(f"Branches: {not_taken.totals()['branch'][0]} (expected 55)")
+    print(f"Never taken wrong: {not_taken.totals()['branch'][1]} (expected 49)")
+    print(f"BTFN wrong: {btfn.totals()['branch'][1]} (expected 6)")
+    print(f"Bimodal wrong: {bimodal.totals()['branch'][1]} (expected 8)")
+    print()
+    print(sweep.report())
+
+    print("\nBranch predictor test complete!")
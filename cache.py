@@ -0,0 +1,604 @@
+"""
+Cache hierarchy model - hit rates and average memory access time
+
+Memory answers every access at once. CacheHierarchy models what a real
+memory system would do with the same accesses: split L1 instruction and
+data caches, an optional unified L2, then main memory. Like the other
+timing models it is a reporter (see reporter.py) fed the instruction
+fetches and LW/SW addresses the CPU makes, so Memory itself and the
+program's results are unchanged:
+
+    caches = CacheHierarchy(l1d=Cache('L1D', 16384, ways=4, line_size=32,
+                                      policy='plru', write_back=False))
+    cpu.simulate(max_cycles=10**6, reporter=caches)
+    print(caches.report())          # hits/misses by access type, AMAT
+
+Each Cache has a size, associativity, line size, replacement policy
+('lru', 'plru' or 'random'), write policy and hit latency. Write-back
+caches allocate on a store miss and write dirty lines back to the next
+level when they're evicted. Write-through caches pass every store on and
+don't allocate on a store miss. Tags, dirty bits and replacement state
+live in flat integer arrays, one slot per line frame, with a dict from
+line to frame for the lookups.
+"""
+
+import itertools
+import random
+from array import array
+
+
+# Access types
+FETCH, LOAD, STORE, WRITEBACK = 'fetch', 'load', 'store', 'writeback'
+ACCESS_TYPES = (FETCH, LOAD, STORE, WRITEBACK)
+# The ones a program asks for - AMAT is about these
+DEMAND_TYPES = (FETCH, LOAD, STORE)
+
+POLICIES = ('lru', 'plru', 'random')
+
+_MASK = 0xFFFFFFFF
+# Up to this many ways, PLRU victims come from a table indexed by the whole tree
+_PLRU_TABLE_WAYS = 8
+
+
+def _log2(name, value):
+    """log2 of a power of two, else ValueError"""
+    if value < 1 or value & (value - 1):
+        raise ValueError(f"{name} must be a power of two, got {value}")
+    return value.bit_length() - 1
+
+
+def _plru_masks(ways):
+    """
+    Per-way (keep, mark) masks for a tree pseudo-LRU set, so touching way w
+    is tree & keep[w] | mark[w]. Node n's children are 2n and 2n + 1 from
+    the root at node 1; a set bit points the victim search right.
+    """
+    levels = ways.bit_length() - 1
+    keep, mark = [], []
+    for way in range(ways):
+        clear = point = 0
+        node = 1
+        # Point every node on the way to this way at the other half
+        for shift in range(levels - 1, -1, -1):
+            bit = (way >> shift) & 1
+            if bit:
+                clear |= 1 << node
+            else:
+                point |= 1 << node
+            node = 2 * node + bit
+        keep.append(((1 << ways) - 1) & ~clear)
+        mark.append(point)
+    return keep, mark
+
+
+def _plru_victims(ways):
+    """The way each possible tree points at, indexed by the tree"""
+    levels = ways.bit_length() - 1
+    victims = bytearray(1 << ways)
+    for tree in range(1 << ways):
+        node = 1
+        way = 0
+        for _ in range(levels):
+            bit = (tree >> node) & 1
+            way = (way << 1) | bit
+            node = 2 * node + bit
+        victims[tree] = way
+    return bytes(victims)
+
+
+class MainMemory:
+    """The level below the last cache: counts what reaches it"""
+
+    def __init__(self, latency=100):
+        """
+        Args:
+            latency: Cycles for an access
+        """
+        self.name = 'memory'
+        self.latency = latency
+        self.accesses = dict.fromkeys(ACCESS_TYPES, 0)
+
+    def access(self, address, kind):
+        self.accesses[kind] += 1
+        return False
+
+    def reset(self):
+        self.accesses = dict.fromkeys(ACCESS_TYPES, 0)
+
+
+class Cache:
+    """
+    One set-associative cache
+
+    Attributes:
+        access: access(address, kind) looks up one access (see _lookup)
+        hits, misses: Access type -> count
+        writebacks: Dirty lines written to the next level
+        next_level: Cache or MainMemory that misses go to
+    """
+
+    def __init__(self, name, size, ways=8, line_size=64, policy='lru', write_back=True,
+                 hit_latency=1, seed=0):
+        """
+        Args:
+            name: Label for reports
+            size: Capacity in bytes (a power of two)
+            ways: Associativity (a power of two; size // line_size for fully associative)
+            line_size: Bytes per line (a power of two)
+            policy: 'lru', 'plru' (tree pseudo-LRU) or 'random'
+            write_back: True for write-back + write-allocate, False for
+                        write-through + no-write-allocate
+            hit_latency: Cycles for a hit
+            seed: Seed for the random policy
+        Raises:
+            ValueError: If the geometry or policy doesn't work
+        """
+        self.line_bits = _log2("line_size", line_size)
+        _log2("size", size)
+        _log2("ways", ways)
+        if policy not in POLICIES:
+            raise ValueError(f"unknown replacement policy {policy!r} "
+                             f"(expected one of {', '.join(POLICIES)})")
+        if policy == 'plru' and ways > 64:
+            raise ValueError("plru supports up to 64 ways")
+        if ways * line_size > size:
+            raise ValueError(f"{name}: {ways} ways of {line_size} byte lines don't fit in {size} bytes")
+        self.name = name
+        self.size = size
+        self.ways = ways
+        self.line_size = line_size
+        self.sets = size // (ways * line_size)
+        self.policy = policy
+        self.write_back = write_back
+        self.hit_latency = hit_latency
+        self.next_level = None
+        self._set_mask = self.sets - 1
+        self._way_bits = ways.bit_length() - 1   # also the depth of the PLRU tree
+        self._plru_keep, self._plru_mark = _plru_masks(ways)
+        self._plru_victims = None
+        if policy == 'plru' and ways <= _PLRU_TABLE_WAYS:
+            self._plru_victims = _plru_victims(ways)
+        self._rng = random.Random(seed)
+        self.reset()
+
+    def reset(self):
+        """Empty the cache and zero its counts"""
+        frames = self.sets * self.ways
+        # Line number (address >> line_bits) held in each frame, -1 if empty
+        self.tags = array('q', [-1]) * frames
+        # Line number -> frame for the lines present; frames used in each set
+        self.frames = {}
+        self.filled = array('L', [0]) * self.sets
+        self.dirty = bytearray(frames)
+        # LRU: when each frame was last used; PLRU: one tree of bits per set
+        self.stamps = array('Q', [0]) * frames
+        self.trees = array('Q', [0]) * self.sets
+        self._clock = itertools.count(1)
+        self.hits = dict.fromkeys(ACCESS_TYPES, 0)
+        self.misses = dict.fromkeys(ACCESS_TYPES, 0)
+        self.writebacks = 0
+        self.access = self._lookup()
+
+    def describe(self):
+        """e.g. 'L1D 32 KiB 8-way 64 B lines, lru, write-back, 1 cycle'"""
+        return (f"{self.name} {self.size // 1024} KiB {self.ways}-way {self.line_size} B lines, "
+                f"{self.policy}, {'write-back' if self.write_back else 'write-through'}, "
+                f"{self.hit_latency} cycle{'s' if self.hit_latency != 1 else ''}")
+
+    def _lookup(self):
+        """
+        The access function, as a closure over this run's arrays
+
+        access(address, kind) looks up one access, going to the next level
+        on a miss. address is a byte address and kind FETCH, LOAD, STORE or
+        WRITEBACK (from the level above). Returns True on a hit.
+        """
+        hits, misses, frames, tags, dirty = self.hits, self.misses, self.frames, self.tags, self.dirty
+        find = frames.get
+        line_bits, set_mask, ways, way_bits = self.line_bits, self._set_mask, self.ways, self._way_bits
+        way_mask = ways - 1
+        filled = self.filled
+        write_back = self.write_back
+        lru, plru = self.policy == 'lru', self.policy == 'plru'
+        stamps, tick = self.stamps, self._clock.__next__
+        trees, keep, mark = self.trees, self._plru_keep, self._plru_mark
+        victims = self._plru_victims if plru else None
+        victim = self._victim
+        cache = self
+
+        def access(address, kind):
+            line = address >> line_bits
+            write = kind == STORE or kind == WRITEBACK
+            frame = find(line)
+
+            if frame is not None:
+                hits[kind] += 1
+                if lru:
+                    stamps[frame] = tick()
+                elif plru:
+                    # Point every node on the way to this frame at the other half
+                    s = frame >> way_bits
+                    way = frame & way_mask
+                    trees[s] = trees[s] & keep[way] | mark[way]
+                if write:
+                    if write_back:
+                        dirty[frame] = 1
+                    else:
+                        cache.next_level.access(address, kind)
+                return True
+
+            misses[kind] += 1
+            if write and not write_back:
+                # No-write-allocate: the store just goes on down
+                cache.next_level.access(address, kind)
+                return False
+            s = line & set_mask
+            used = filled[s]
+            if used < ways:
+                # Lines are never dropped, so a set's empty frames are the ones after its filled ones
+                filled[s] = used + 1
+                frame = (s << way_bits) + used
+            elif lru:
+                base = s << way_bits
+                ages = stamps[base:base + ways]
+                frame = base + ages.index(min(ages))
+            elif victims is not None:
+                frame = (s << way_bits) + victims[trees[s]]
+            else:
+                frame = victim(s)
+            old = tags[frame]
+            if old >= 0:
+                del frames[old]
+                if dirty[frame]:
+                    cache.writebacks += 1
+                    cache.next_level.access(old << line_bits, WRITEBACK)
+            # A write-back from above replaces the whole line, so nothing is read
+            if kind != WRITEBACK:
+                cache.next_level.access(address, kind)
+            tags[frame] = line
+            frames[line] = frame
+            dirty[frame] = write
+            if lru:
+                stamps[frame] = tick()
+            elif plru:
+                s = frame >> way_bits
+                way = frame & way_mask
+                trees[s] = trees[s] & keep[way] | mark[way]
+            return False
+
+        return access
+
+    def _victim(self, s):
+        """The frame to replace in full set s: random, or PLRU too wide for the table"""
+        base = s * self.ways
+        if self.policy == 'plru':
+            tree = self.trees[s]
+            node = 1
+            way = 0
+            for _ in range(self._way_bits):
+                bit = (tree >> node) & 1
+                way = (way << 1) | bit
+                node = 2 * node + bit
+            return base + way
+        return base + self._rng.randrange(self.ways)
+
+    def contains(self, address):
+        """Whether the line holding address is in the cache"""
+        return address >> self.line_bits in self.frames
+
+    def accesses(self, kinds=DEMAND_TYPES):
+        """Hits + misses of some access types"""
+        return sum(self.hits[kind] + self.misses[kind] for kind in kinds)
+
+    def miss_rate(self, kinds=DEMAND_TYPES):
+        """Misses / accesses of some access types (0.0 if there were none)"""
+        accesses = self.accesses(kinds)
+        return sum(self.misses[kind] for kind in kinds) / accesses if accesses else 0.0
+
+
+class CacheHierarchy:
+    """
+    Split L1 caches, an optional unified L2 and main memory
+
+    Use it as a simulate() reporter, or feed it with step() / replay().
+    Counts carry on across runs until reset().
+    """
+
+    def __init__(self, l1i=None, l1d=None, l2='default', memory_latency=100):
+        """
+        Args:
+            l1i: Instruction Cache (default: 32 KiB 8-way 64 B lines, 1 cycle)
+            l1d: Data Cache (default: the same)
+            l2: Unified Cache (default: 256 KiB 8-way, 10 cycles), or None for none
+            memory_latency: Cycles for main memory
+        """
+        self.l1i = l1i or Cache('L1I', 32768, 8, 64)
+        self.l1d = l1d or Cache('L1D', 32768, 8, 64)
+        if l2 == 'default':
+            l2 = Cache('L2', 262144, 8, 64, hit_latency=10)
+        self.l2 = l2
+        self.memory = MainMemory(memory_latency)
+        if self.l2 is not None:
+            self.l2.next_level = self.memory
+        below = self.l2 or self.memory
+        self.l1i.next_level = below
+        self.l1d.next_level = below
+        self.reset()
+
+    @property
+    def caches(self):
+        """The caches, top level first"""
+        return [cache for cache in (self.l1i, self.l1d, self.l2) if cache is not None]
+
+    def reset(self):
+        """Empty every cache and zero the counts"""
+        for cache in self.caches:
+            cache.reset()
+        self.memory.reset()
+        self.trace, self._flush = self._tracer()
+
+    # ---- reporter interface ----
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        self._flush()
+
+    def _tracer(self):
+        """
+        The trace hook, as a closure. A fetch from either of the last two
+        lines fetched, or a load (store) to the same line as the last load
+        (store), finds L1 as it was left, so the caches aren't searched:
+        the hit is counted and the frame's LRU stamp or PLRU tree bits
+        renewed, unless it's the L1D line touched last anyway. A
+        write-through store to the line still goes on to the next level, as
+        a miss if the line isn't in L1D. A slow access that evicts a
+        remembered line forgets it, as does a slow load that brings in a
+        remembered write-through store line.
+        """
+        l1i, l1d = self.l1i, self.l1d
+        fetch, data, below = l1i.access, l1d.access, l1d.next_level.access
+        i_shift, d_shift = l1i.line_bits, l1d.line_bits
+        i_tags, i_frames, i_stamps, i_tick = l1i.tags, l1i.frames, l1i.stamps, l1i._clock.__next__
+        i_trees, i_keep, i_mark = l1i.trees, l1i._plru_keep, l1i._plru_mark
+        i_way_bits, i_way_mask = l1i._way_bits, l1i.ways - 1
+        i_plru = l1i.policy == 'plru'
+        tags, frames, stamps, tick = l1d.tags, l1d.frames, l1d.stamps, l1d._clock.__next__
+        trees, keep, mark = l1d.trees, l1d._plru_keep, l1d._plru_mark
+        way_bits, way_mask = l1d._way_bits, l1d.ways - 1
+        plru = l1d.policy == 'plru'
+        write_back = l1d.write_back
+        last_fetch = other_fetch = last_load = last_store = -1
+        fetch_frame = other_frame = 0
+        # store_frame is -1 for a write-through store line that isn't in L1D
+        load_frame = store_frame = 0
+        fetch_hits = load_hits = store_hits = store_misses = 0
+        # The L1D line touched last, which needs no renewing
+        newest = -1
+
+        def trace(cpu, decoded):
+            nonlocal last_fetch, other_fetch, fetch_frame, other_frame
+            nonlocal last_load, last_store, load_frame, store_frame, newest
+            nonlocal fetch_hits, load_hits, store_hits, store_misses
+            # Only fetches reach L1I, so the last fetched line is still its set's MRU
+            line = cpu.pc >> i_shift
+            if line == last_fetch:
+                fetch_hits += 1
+            elif line == other_fetch:
+                fetch_hits += 1
+                if i_plru:
+                    s = other_frame >> i_way_bits
+                    way = other_frame & i_way_mask
+                    i_trees[s] = i_trees[s] & i_keep[way] | i_mark[way]
+                else:
+                    i_stamps[other_frame] = i_tick()
+                last_fetch, other_fetch = other_fetch, last_fetch
+                fetch_frame, other_frame = other_frame, fetch_frame
+            else:
+                fetch(cpu.pc, FETCH)
+                other_fetch, other_frame = last_fetch, fetch_frame
+                last_fetch = line
+                fetch_frame = i_frames[line]
+                if other_fetch >= 0 and i_tags[other_frame] != other_fetch:
+                    other_fetch = -1
+
+            name = decoded.name
+            if name == 'LW':
+                address = (cpu.registers.registers[decoded.rs1] + decoded.imm) & _MASK
+                line = address >> d_shift
+                if line == last_load:
+                    load_hits += 1
+                    if line != newest:
+                        newest = line
+                        if plru:
+                            s = load_frame >> way_bits
+                            way = load_frame & way_mask
+                            trees[s] = trees[s] & keep[way] | mark[way]
+                        else:
+                            stamps[load_frame] = tick()
+                else:
+                    data(address, LOAD)
+                    last_load = newest = line
+                    load_frame = frames[line]
+                    if last_store >= 0 and (tags[store_frame] != last_store if store_frame >= 0
+                                            else line == last_store):
+                        last_store = -1
+            elif name == 'SW':
+                address = (cpu.registers.registers[decoded.rs1] + decoded.imm) & _MASK
+                line = address >> d_shift
+                if line == last_store:
+                    if store_frame < 0:
+                        store_misses += 1
+                        below(address, STORE)
+                    else:
+                        store_hits += 1
+                        if line != newest:
+                            newest = line
+                            if plru:
+                                s = store_frame >> way_bits
+                                way = store_frame & way_mask
+                                trees[s] = trees[s] & keep[way] | mark[way]
+                            else:
+                                stamps[store_frame] = tick()
+                        if not write_back:
+                            below(address, STORE)
+                else:
+                    data(address, STORE)
+                    last_store = line
+                    store_frame = frames.get(line, -1)
+                    if store_frame >= 0:
+                        newest = line
+                    if last_load >= 0 and tags[load_frame] != last_load:
+                        last_load = -1
+
+        def flush():
+            """Add the counted hits and misses to the caches' counts and forget the lines"""
+            nonlocal last_fetch, other_fetch, last_load, last_store, newest
+            nonlocal fetch_hits, load_hits, store_hits, store_misses
+            l1i.hits[FETCH] += fetch_hits
+            l1d.hits[LOAD] += load_hits
+            l1d.hits[STORE] += store_hits
+            l1d.misses[STORE] += store_misses
+            fetch_hits = load_hits = store_hits = store_misses = 0
+            last_fetch = other_fetch = last_load = last_store = newest = -1
+
+        return trace, flush
+
+    # ---- feeding it yourself ----
+
+    def step(self, pc, address=None, store=False):
+        """
+        One instruction: its fetch, and its data access if it has one
+
+        Args:
+            pc: Instruction address
+            address: LW/SW address, or None
+            store: True for SW
+        """
+        self._flush()
+        self.l1i.access(pc, FETCH)
+        if address is not None:
+            self.l1d.access(address, STORE if store else LOAD)
+
+    def replay(self, records):
+        """
+        Run a recorded trace through the caches
+
+        Args:
+            records: Iterable of trace records - tuples in RECORD field order
+                     (TraceRing, iter_trace) or a TRACE_DTYPE array
+        """
+        from trace_recorder import FLAG_LOAD, FLAG_STORE
+        if hasattr(records, 'dtype'):
+            records = zip(records['pc'].tolist(), records['mem_addr'].tolist(),
+                          records['flags'].tolist())
+        else:
+            records = ((record[1], record[4], record[7]) for record in records)
+        self._flush()
+        fetch, data = self.l1i.access, self.l1d.access
+        for pc, address, flags in records:
+            fetch(pc, FETCH)
+            if flags & FLAG_LOAD:
+                data(address, LOAD)
+            elif flags & FLAG_STORE:
+                data(address, STORE)
+
+    # ---- results ----
+
+    def amat(self, cache=None):
+        """
+        Average memory access time in cycles, from the miss rates:
+        hit time + miss rate * (the next level's AMAT), down to memory
+
+        Args:
+            cache: The L1 to start from (default: both, weighted by accesses)
+        """
+        self._flush()
+        if cache is None:
+            total = self.l1i.accesses() + self.l1d.accesses()
+            if not total:
+                return 0.0
+            return (self.amat(self.l1i) * self.l1i.accesses() +
+                    self.amat(self.l1d) * self.l1d.accesses()) / total
+        time = 0.0
+        reach = 1.0
+        while cache is not None:
+            time += reach * cache.hit_latency
+            reach *= cache.miss_rate()
+            cache = cache.next_level if isinstance(cache.next_level, Cache) else None
+        return time + reach * self.memory.latency
+
+    def to_dict(self):
+        """Counts and AMAT as plain data, ready for json.dumps"""
+        self._flush()
+        return {
+            'caches': {cache.name: {'hits': dict(cache.hits), 'misses': dict(cache.misses),
+                                    'writebacks': cache.writebacks}
+                       for cache in self.caches},
+            'memory': dict(self.memory.accesses),
+            'amat': {'instruction': self.amat(self.l1i), 'data': self.amat(self.l1d),
+                     'overall': self.amat()},
+        }
+
+    def report(self):
+        """Hits and misses by access type for each cache, memory traffic and AMAT"""
+        self._flush()
+        lines = ["Cache hierarchy:"]
+        for cache in self.caches:
+            lines.append(f"  {cache.describe()}")
+        lines.append(f"  memory, {self.memory.latency} cycles")
+        lines.append("")
+        lines.append(f"  {'cache':<6} {'type':<10} {'accesses':>12} {'hits':>12} "
+                     f"{'misses':>10} {'miss %':>7}")
+        for cache in self.caches:
+            for kind in ACCESS_TYPES:
+                hits, misses = cache.hits[kind], cache.misses[kind]
+                if hits + misses:
+                    lines.append(f"  {cache.name:<6} {kind:<10} {hits + misses:>12} {hits:>12} "
+                                 f"{misses:>10} {100 * misses / (hits + misses):>6.2f}%")
+            if cache.writebacks:
+                lines.append(f"  {cache.name:<6} {'(dirty lines written back: ' + str(cache.writebacks) + ')'}")
+        memory = self.memory.accesses
+        lines.append(f"  {'memory':<6} reads {memory[FETCH] + memory[LOAD]}, "
+                     f"writes {memory[STORE] + memory[WRITEBACK]}")
+        lines.append("")
+        lines.append(f"AMAT: instruction {self.amat(self.l1i):.2f}, data {self.amat(self.l1d):.2f}, "
+                     f"overall {self.amat():.2f} cycles")
+        return "\n".join(lines)
+
+
+# Test
+if __name__ == "__main__":
+    from cpu import RISCV_CPU
+
+    print("Testing cache hierarchy...")
+
+    # Sum 256 words from 0x1000 twice: the second pass hits
+    program = [
+        0x00200193,  # addi x3, x0, 2
+        0x00001137,  # lui x2, 1          (x2 = 0x1000)
+        0x40000213,  # addi x4, x0, 1024
+        0x00012283,  # lw x5, 0(x2)
+        0x005080B3,  # add x1, x1, x5
+        0x00410113,  # addi x2, x2, 4
+        0xFFC20213,  # addi x4, x4, -4
+        0xFE0218E3,  # bne x4, x0, -16
+        0xFFF18193,  # addi x3, x3, -1
+        0xFE0190E3,  # bne x3, x0, -32
+        0x0000006F,  # halt
+    ]
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    caches = CacheHierarchy()
+    cpu.simulate(max_cycles=100000, reporter=caches)
+
+    loads = caches.l1d.hits[LOAD] + caches.l1d.misses[LOAD]
+    print(f"Loads: {loads} (expected 512)")
+    print(f"L1D load misses: {caches.l1d.misses[LOAD]} (expected 16)")
+    print(f"L1I fetch misses: {caches.l1i.misses[FETCH]} (expected 1)")
+    print()
+    print(caches.report())
+
+    print("\nCache hierarchy test complete!")
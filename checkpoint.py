@@ -0,0 +1,254 @@
+"""
+CPU checkpoints - capture, restore, fork and ship a whole machine state
+
+RISCV_CPU.checkpoint() returns a Checkpoint holding the PC, cycle count,
+halt state, registers and a MemorySnapshot. With PagedMemory the snapshot
+shares pages copy-on-write with the running CPU, so taking one only
+copies the pages written since the last one; restore() and fork() share
+them again instead of copying.
+
+Checkpoints can be written to a compact file (zero pages skipped, the
+rest zlib-compressed) and loaded in another process, e.g. to run a long
+initialisation once and hand the warmed-up state to batch workers. A
+checkpoint file can be passed anywhere a program file is accepted.
+
+File layout (little-endian):
+    header    - magic, version, flags, PC, cycle count, memory size, page count
+    registers - 32 u32
+    strings   - memory backend, halt reason, trap cause (u16 length + UTF-8 each)
+    index     - one u32 page number per stored page, in address order
+    pages     - zlib stream of PAGE_SIZE bytes per page, same order
+"""
+
+import struct
+import zlib
+
+from elf_loader import ProgramLoadError
+from memory import MemorySnapshot, PagedMemory, MEMORY_BACKENDS, PAGE_SIZE
+
+
+CHECKPOINT_MAGIC = b'RVCHKPT\0'
+CHECKPOINT_VERSION = 1
+_HEADER = struct.Struct('<8sHHIQQI')
+_REGISTERS = struct.Struct('<32I')
+_LENGTH = struct.Struct('<H')
+
+_FLAG_HALTED = 1
+
+
+class Checkpoint:
+    """
+    Complete CPU state at one moment
+
+    Attributes:
+        pc, cycle_count, halted, halt_reason, trap_cause: As on RISCV_CPU
+        registers: Tuple of the 32 register values
+        memory: MemorySnapshot
+        backend: Memory backend name it was taken from ('dict' or 'paged')
+        format: Always 'checkpoint' (so reporters can tell it from a program image)
+    """
+
+    format = 'checkpoint'
+
+    def __init__(self, pc, cycle_count, halted, halt_reason, trap_cause, registers, memory,
+                 backend='paged'):
+        self.pc = pc
+        self.cycle_count = cycle_count
+        self.halted = halted
+        self.halt_reason = halt_reason
+        self.trap_cause = trap_cause
+        self.registers = tuple(registers)
+        self.memory = memory
+        self.backend = backend
+
+    @property
+    def count(self):
+        """Number of non-zero memory words"""
+        return sum(1 for value in self.memory.word_table().values() if value)
+
+    def __reduce__(self):
+        # Memory pages are memoryviews, which can't be pickled - send the
+        # compact file form instead (lets checkpoints go to worker processes)
+        return (loads, (dumps(self),))
+
+    def __repr__(self):
+        return f"Checkpoint(pc=0x{self.pc:08X}, cycles={self.cycle_count}, {self.backend})"
+
+
+def backend_name(memory):
+    """MEMORY_BACKENDS name for a memory object ('dict' for anything unknown)"""
+    for name, backend in MEMORY_BACKENDS.items():
+        if type(memory) is backend:
+            return name
+    return 'dict'
+
+
+def _stored_pages(snapshot):
+    """Every non-zero page of a snapshot, mapped regions included, in address order"""
+    if snapshot.regions:
+        memory = PagedMemory(snapshot.size)
+        memory.restore(snapshot)
+        pages = ((page_num, memory.page_view(page_num)) for page_num in memory.page_numbers())
+    else:
+        table = snapshot.page_table()
+        pages = ((page_num, table[page_num]) for page_num in sorted(table))
+    return [(page_num, page) for page_num, page in pages if page is not None and any(page)]
+
+
+def _pack_string(text):
+    data = (text or '').encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+
+def dumps(checkpoint, level=6):
+    """
+    Serialise a checkpoint
+
+    Args:
+        checkpoint: Checkpoint
+        level: zlib compression level (0-9)
+    Returns:
+        bytes
+    """
+    pages = _stored_pages(checkpoint.memory)
+    flags = _FLAG_HALTED if checkpoint.halted else 0
+
+    parts = [
+        _HEADER.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, flags, checkpoint.pc,
+                     checkpoint.cycle_count, checkpoint.memory.size, len(pages)),
+        _REGISTERS.pack(*checkpoint.registers),
+        _pack_string(checkpoint.backend),
+        _pack_string(checkpoint.halt_reason),
+        _pack_string(checkpoint.trap_cause),
+        struct.pack(f'<{len(pages)}I', *[page_num for page_num, _ in pages]),
+    ]
+    compressor = zlib.compressobj(level)
+    for _, page in pages:
+        parts.append(compressor.compress(page))
+    parts.append(compressor.flush())
+    return b''.join(parts)
+
+
+def loads(data, filename='<bytes>'):
+    """
+    Rebuild a checkpoint from dumps() output
+
+    The memory snapshot's pages are read-only slices of one decompressed
+    buffer, ready to be shared by whatever restores it.
+
+    Raises:
+        ProgramLoadError if the data isn't a valid checkpoint
+    """
+    data = memoryview(data)
+    if len(data) < _HEADER.size + _REGISTERS.size:
+        raise ProgramLoadError(filename, "too small to be a checkpoint")
+    magic, version, flags, pc, cycles, size, count = _HEADER.unpack_from(data, 0)
+    if magic != CHECKPOINT_MAGIC:
+        raise ProgramLoadError(filename, "not a checkpoint file")
+    if version != CHECKPOINT_VERSION:
+        raise ProgramLoadError(filename, f"unsupported checkpoint version {version}")
+
+    try:
+        offset = _HEADER.size
+        registers = _REGISTERS.unpack_from(data, offset)
+        offset += _REGISTERS.size
+
+        strings = []
+        for _ in range(3):
+            (length,) = _LENGTH.unpack_from(data, offset)
+            strings.append(bytes(data[offset + 2:offset + 2 + length]).decode('utf-8') or None)
+            offset += 2 + length
+        backend, halt_reason, trap_cause = strings
+
+        page_nums = struct.unpack_from(f'<{count}I', data, offset)
+        offset += 4 * count
+    except (struct.error, UnicodeDecodeError):
+        raise ProgramLoadError(filename, "truncated checkpoint header") from None
+
+    try:
+        contents = zlib.decompress(data[offset:])
+    except zlib.error as e:
+        raise ProgramLoadError(filename, f"corrupt memory pages ({e})") from None
+    if len(contents) != count * PAGE_SIZE:
+        raise ProgramLoadError(filename, "truncated memory pages")
+
+    view = memoryview(contents)
+    pages = {page_num: view[i * PAGE_SIZE:(i + 1) * PAGE_SIZE]
+             for i, page_num in enumerate(page_nums)}
+    return Checkpoint(pc, cycles, bool(flags & _FLAG_HALTED), halt_reason, trap_cause,
+                      registers, MemorySnapshot(size, pages=pages), backend or 'paged')
+
+
+def save_checkpoint(checkpoint, path, level=6):
+    """
+    Write a checkpoint file
+
+    Returns:
+        Size of the file in bytes
+    """
+    data = dumps(checkpoint, level)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def is_checkpoint(path):
+    """True if a file starts with the checkpoint magic number"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(CHECKPOINT_MAGIC)) == CHECKPOINT_MAGIC
+    except OSError:
+        return False
+
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint file
+
+    Raises:
+        ProgramLoadError if the file can't be read or isn't a checkpoint
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        raise ProgramLoadError(path, str(e)) from e
+    return loads(data, filename=path)
+
+
+# Test
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    from cpu import RISCV_CPU
+
+    print("Testing checkpoints...")
+
+    cpu = RISCV_CPU(memory='paged')
+    cpu.load("test_mem.hex")
+    cpu.simulate(max_cycles=3)
+    saved = cpu.checkpoint()
+    cpu.simulate(max_cycles=100)
+    finished = list(cpu.registers.registers)
+
+    cpu.restore(saved)
+    print(f"Restored PC=0x{cpu.pc:08X}, cycle {cpu.cycle_count} (expected cycle 3)")
+    cpu.simulate(max_cycles=100)
+    print(f"Same result after replaying: {cpu.registers.registers == finished} (expected True)")
+
+    child = cpu.fork()
+    child.memory.write_word(0x10000, 0xDEADBEEF)
+    print(f"Fork wrote 0x{child.memory.read_word(0x10000):08X}, parent still has "
+          f"0x{cpu.memory.read_word(0x10000):08X} (expected 0x00000014)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "warm.ckpt")
+        size = save_checkpoint(saved, path)
+        loaded = RISCV_CPU()
+        loaded.load(path)
+        loaded.simulate(max_cycles=100)
+        print(f"Checkpoint file is {size} bytes; run from it matches: "
+              f"{loaded.registers.registers == finished} (expected True)")
+
+    print("\nCheckpoint test complete!")
@@ -1,242 +1,342 @@
 from alu import ALU
 from registers import RegisterFile
-from memory import Memory
+from memory import make_memory
 from decoder import InstructionDecoder
-from loader import load_hex_file
+from loader import load_hex, HexLoadError
+from elf_loader import is_elf, load_elf, load_binary
+from run_result import (RunResult, diff_memory, illegal_instruction_message,
+                        HALT_INSTRUCTION, HALT_UNINITIALIZED,
+                        HALT_ILLEGAL, HALT_MAX_CYCLES)
+from reporter import ConsoleReporter
+from checkpoint import Checkpoint, backend_name, is_checkpoint, load_checkpoint
+from predecode import PredecodeCache
+from profiler import Profiler
+from translator import BlockTranslator
 
 class RISCV_CPU:
     
-    def __init__(self):
+    # Ways run() can execute guest code
+    ENGINES = ('interpreter', 'translate')
+    
+    def __init__(self, engine='interpreter', memory='dict'):
+        """
+        Args:
+            engine: 'interpreter' steps one instruction at a time,
+                    'translate' compiles basic blocks into Python functions
+            memory: Memory backend name ('dict' or 'paged'),
+                    or an already created memory object
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
+        
         # Create all the components
         self.alu = ALU()
         self.registers = RegisterFile()
-        self.memory = Memory()
+        if isinstance(memory, str):
+            memory = make_memory(memory)
+        self.memory = memory
         self.decoder = InstructionDecoder()
         
+        # Decoded instructions by PC, dropped when memory under them changes
+        self.predecode = PredecodeCache(self.memory, self.decoder)
+        
+        self.engine = engine
+        self.translator = None
+        if engine == 'translate':
+            self.translator = BlockTranslator(self.memory, self.decoder)
+        
         self.pc = 0
         self.cycle_count = 0
         self.halted = False
+        self.halt_reason = None
+        self.trap_cause = None
+        
+        # Address -> name index from the program's symbol table, if it had one
+        self.symbols = None
+        
+        # Profiler counting executions, while profiling is on
+        self.profiler = None
     
-    def load_program(self, hex_file):
-        """Load program from hex file"""
-        print(f"Loading: {hex_file}")
-        count = load_hex_file(hex_file, self.memory, start_address=0x0)
-        print(f"Loaded {count} instructions\n")
-        return count
+    def load(self, program_file):
+        """
+        Load a program from a hex, ELF or raw .bin file without printing
+        ELF files also set the PC to their entry point and load symbols.
+        A checkpoint file restores the whole saved state instead.
+        
+        Returns:
+            HexImage for hex files, ProgramImage for ELF and .bin,
+            Checkpoint for checkpoints
+        Raises:
+            HexLoadError or ProgramLoadError if the file can't be loaded
+        """
+        if is_checkpoint(program_file):
+            checkpoint = load_checkpoint(program_file)
+            self.restore(checkpoint)
+            return checkpoint
+        
+        if is_elf(program_file):
+            image = load_elf(program_file, self.memory)
+            self.pc = image.entry
+            self.symbols = image.symbols
+            return image
+        
+        if program_file.endswith('.bin'):
+            return load_binary(program_file, self.memory, address=0x0)
+        
+        return load_hex(program_file, self.memory, start_address=0x0)
+    
+    def load_program(self, program_file):
+        """
+        Load a program and print what was loaded
+        
+        Returns:
+            Number of 32-bit words loaded (0 if a hex file couldn't be read)
+        """
+        reporter = ConsoleReporter()
+        reporter.loading(program_file)
+        try:
+            image = self.load(program_file)
+        except HexLoadError as e:
+            reporter.load_failed(program_file, e)
+            return 0
+        reporter.loaded(self, image)
+        return image.count
+    
+    def checkpoint(self):
+        """
+        Capture the complete CPU state: PC, cycle count, halt state,
+        registers and memory
+        
+        With PagedMemory, memory pages are shared copy-on-write, so this
+        only copies pages written since the last checkpoint. The dict
+        backend copies its whole dict.
+        
+        Returns:
+            Checkpoint (see checkpoint.py for saving it to a file)
+        """
+        return Checkpoint(self.pc, self.cycle_count, self.halted, self.halt_reason,
+                          self.trap_cause, self.registers.registers,
+                          self.memory.snapshot(), backend_name(self.memory))
+    
+    def restore(self, checkpoint):
+        """
+        Go back to a checkpoint (it can be restored again any number of times)
+        Cached decoded/translated code is kept for pages that didn't change
+        """
+        self.memory.restore(checkpoint.memory)
+        self.registers.registers[:] = checkpoint.registers
+        self.pc = checkpoint.pc
+        self.cycle_count = checkpoint.cycle_count
+        self.halted = checkpoint.halted
+        self.halt_reason = checkpoint.halt_reason
+        self.trap_cause = checkpoint.trap_cause
+    
+    def fork(self, engine=None):
+        """
+        Make an independent copy of this CPU to run on from the same state
+        
+        Args:
+            engine: Engine for the copy (default: the same as this CPU)
+        Returns:
+            New RISCV_CPU. Its memory shares pages with this one
+            copy-on-write (PagedMemory), so forking is cheap
+        """
+        checkpoint = self.checkpoint()
+        child = RISCV_CPU(engine=engine or self.engine,
+                          memory=type(self.memory)(size=self.memory.size))
+        child.restore(checkpoint)
+        child.symbols = self.symbols
+        return child
+    
+    def start_profiling(self):
+        """
+        Count executions per PC (and everything derived from that) in
+        every run from now on - see profiler.py
+        Profiled runs always use the interpreter
+        
+        Returns:
+            Profiler collecting the counts
+        """
+        if self.profiler is None:
+            self.profiler = Profiler(self)
+            # Refill the predecode cache with the profiler's counting records
+            self.predecode.wrap = self.profiler.wrap
+            self.predecode.clear()
+        return self.profiler
+    
+    def stop_profiling(self):
+        """
+        Turn profiling off
+        
+        Returns:
+            The Profiler with the counts so far, or None
+        """
+        profiler = self.profiler
+        self.profiler = None
+        self.predecode.wrap = None
+        self.predecode.clear()
+        return profiler
     
     def fetch(self):
         """Get instruction at current PC"""
         return self.memory.read_word(self.pc)
     
     def execute(self, instruction):
+        """Execute one instruction"""
+        # Decode it first
+        self.execute_decoded(self.decoder.decode_record(instruction))
+    
+    def execute_decoded(self, decoded):
         """
-        Execute one instruction
-        This got pretty long but it works
+        Execute one instruction that has already been decoded
+        The record carries the handler picked from the dispatch table
         """
-        # Decode it first
-        decoded = self.decoder.decode(instruction)
-        opcode = decoded['opcode']
+        decoded.handler(self, decoded)
+    
+    def trap(self, decoded):
+        """
+        Handle an instruction we don't know how to execute
+        Stops the CPU with the PC left on the bad instruction
+        """
+        self.trap_cause = illegal_instruction_message(decoded, self.pc)
+        self.halt_reason = HALT_ILLEGAL
+        self.halted = True
+    
+    def run(self, max_cycles=1000, verbose=False):
+        """
+        Run the CPU until halt or max cycles, printing progress and
+        the final state
         
-        # R-type (register operations like add, sub, etc)
-        if opcode == 0x33:
-            rs1_val = self.registers.read(decoded['rs1'])
-            rs2_val = self.registers.read(decoded['rs2'])
-            
-            funct3 = decoded['funct3']
-            funct7 = decoded['funct7']
-            
-            # Figure out which operation
-            if funct3 == 0x0:
-                if funct7 == 0x00:  # ADD
-                    result = self.alu.execute('ADD', rs1_val, rs2_val)
-                elif funct7 == 0x20:  # SUB
-                    result = self.alu.execute('SUB', rs1_val, rs2_val)
-            elif funct3 == 0x7:  # AND
-                result = self.alu.execute('AND', rs1_val, rs2_val)
-            elif funct3 == 0x6:  # OR
-                result = self.alu.execute('OR', rs1_val, rs2_val)
-            elif funct3 == 0x4:  # XOR
-                result = self.alu.execute('XOR', rs1_val, rs2_val)
-            elif funct3 == 0x1:  # SLL
-                result = self.alu.execute('SLL', rs1_val, rs2_val)
-            elif funct3 == 0x5:
-                if funct7 == 0x00:  # SRL
-                    result = self.alu.execute('SRL', rs1_val, rs2_val)
-                elif funct7 == 0x20:  # SRA
-                    result = self.alu.execute('SRA', rs1_val, rs2_val)
-            
-            self.registers.write(decoded['rd'], result)
-            self.pc += 4
+        Returns:
+            RunResult
+        """
+        return self.simulate(max_cycles, reporter=ConsoleReporter(verbose=verbose))
+    
+    def simulate(self, max_cycles=1000, memory_diff=False, reporter=None):
+        """
+        Run the CPU until halt or max cycles without printing anything
+        (unless a reporter is given)
         
-        # I-type immediate arithmetic (like addi)
-        elif opcode == 0x13:
-            rs1_val = self.registers.read(decoded['rs1'])
-            imm = decoded['imm']
-            funct3 = decoded['funct3']
-            
-            if funct3 == 0x0:  # ADDI
-                result = self.alu.execute('ADD', rs1_val, imm)
-            elif funct3 == 0x7:  # ANDI
-                result = self.alu.execute('AND', rs1_val, imm)
-            elif funct3 == 0x6:  # ORI
-                result = self.alu.execute('OR', rs1_val, imm)
-            elif funct3 == 0x4:  # XORI
-                result = self.alu.execute('XOR', rs1_val, imm)
-            # AI Start - shift immediate handling
-            # Asked AI how to tell SRLI from SRAI - they have same funct3
-            # AI said check bit 30 which shows up as bit 10 in decoded immediate
-            elif funct3 == 0x1:  # SLLI
-                result = self.alu.execute('SLL', rs1_val, imm & 0x1F)
-            elif funct3 == 0x5:
-                # Check bit 10 to distinguish SRLI vs SRAI
-                if (decoded['imm'] >> 10) == 0x00:
-                    result = self.alu.execute('SRL', rs1_val, imm & 0x1F)
-                else:
-                    result = self.alu.execute('SRA', rs1_val, imm & 0x1F)
-            # AI End
-            
-            self.registers.write(decoded['rd'], result)
-            self.pc += 4
+        Args:
+            max_cycles: Stop after this many instructions in total
+            memory_diff: Also work out which memory words the run changed
+            reporter: Optional output layer, see reporter.py
+        Returns:
+            RunResult
+        """
+        before = self.memory.nonzero_words() if memory_diff else None
+        trace = None
+        if reporter is not None:
+            reporter.start(self)
+            trace = reporter.trace
         
-        # Load instructions
-        elif opcode == 0x03:
-            rs1_val = self.registers.read(decoded['rs1'])
-            address = (rs1_val + decoded['imm']) & 0xFFFFFFFF
-            
-            if decoded['funct3'] == 0x2:  # LW
-                value = self.memory.read_word(address)
-                self.registers.write(decoded['rd'], value)
-            
-            self.pc += 4
+        # Per-instruction tracing and profiling only exist in the interpreter
+        if self.profiler is not None:
+            self.profiler.enter(self.pc)
+            try:
+                self._run_interpreter(max_cycles, trace)
+            finally:
+                # Whatever is at the PC now didn't run
+                self.profiler.leave(self.pc)
+        elif self.translator is not None and trace is None:
+            self._run_translated(max_cycles)
+        else:
+            self._run_interpreter(max_cycles, trace)
         
-        # Store instructions
-        elif opcode == 0x23:
-            rs1_val = self.registers.read(decoded['rs1'])
-            rs2_val = self.registers.read(decoded['rs2'])
-            address = (rs1_val + decoded['imm']) & 0xFFFFFFFF
-            
-            if decoded['funct3'] == 0x2:  # SW
-                self.memory.write_word(address, rs2_val)
-            
-            self.pc += 4
+        result = RunResult(self.halt_reason if self.halted else HALT_MAX_CYCLES,
+                           self.cycle_count, self.pc, list(self.registers.registers),
+                           self.trap_cause)
+        if before is not None:
+            result.memory_diff = diff_memory(before, self.memory.nonzero_words())
         
-        # Branch instructions
-        elif opcode == 0x63:
-            rs1_val = self.registers.read(decoded['rs1'])
-            rs2_val = self.registers.read(decoded['rs2'])
-            
-            branch_taken = False
-            funct3 = decoded['funct3']
-            
-            if funct3 == 0x0:  # BEQ
-                branch_taken = (rs1_val == rs2_val)
-            elif funct3 == 0x1:  # BNE
-                branch_taken = (rs1_val != rs2_val)
-            # AI Start - signed comparison for BLT/BGE
-            # This was really tricky - branches weren't working
-            # BLT was treating -1 as bigger than 5
-            # Asked AI how to handle signed comparison in Python
-            # AI said: if value >= 0x80000000, subtract 0x100000000 to get signed
-            elif funct3 == 0x4:  # BLT - signed comparison
-                # Convert to signed for comparison
-                if rs1_val >= 0x80000000:
-                    rs1_signed = rs1_val - 0x100000000
+        if reporter is not None:
+            reporter.finish(self, result)
+        return result
+    
+    def _run_interpreter(self, max_cycles, trace=None):
+        """
+        Interpret instructions one at a time until halt or max cycles
+        
+        Args:
+            max_cycles: Cycle count to stop at
+            trace: None, or a function called as trace(cpu, decoded)
+                   before each instruction executes
+        """
+        # Fetch through the predecode cache - hits skip fetch and decode
+        entries = self.predecode.entries
+        hits = 0
+        
+        try:
+            while not self.halted and self.cycle_count < max_cycles:
+                # Fetch instruction
+                decoded = entries.get(self.pc)
+                if decoded is None:
+                    decoded = self.predecode.fill(self.pc)
                 else:
-                    rs1_signed = rs1_val
+                    hits += 1
+                instruction = decoded.word
                 
-                if rs2_val >= 0x80000000:
-                    rs2_signed = rs2_val - 0x100000000
-                else:
-                    rs2_signed = rs2_val
+                # AI Start - halt detection
+                # Found that jal x0, 0 (infinite loop) is used as halt
+                # This is 0x0000006F in machine code
+                if instruction == 0x0000006F:
+                    self.halt_reason = HALT_INSTRUCTION
+                    self.halted = True
+                    break
+                # AI End
                 
-                branch_taken = (rs1_signed < rs2_signed)
-            elif funct3 == 0x5:  # BGE - signed comparison
-                # Same conversion as BLT
-                if rs1_val >= 0x80000000:
-                    rs1_signed = rs1_val - 0x100000000
-                else:
-                    rs1_signed = rs1_val
+                # Check if we're in uninitialized memory
+                if instruction == 0:
+                    self.halt_reason = HALT_UNINITIALIZED
+                    self.halted = True
+                    break
                 
-                if rs2_val >= 0x80000000:
-                    rs2_signed = rs2_val - 0x100000000
-                else:
-                    rs2_signed = rs2_val
+                if trace is not None:
+                    trace(self, decoded)
                 
-                branch_taken = (rs1_signed >= rs2_signed)
-            # AI End
-            
-            if branch_taken:
-                self.pc = (self.pc + decoded['imm']) & 0xFFFFFFFF
-            else:
-                self.pc += 4
-        
-        # JAL
-        elif opcode == 0x6F:
-            # Save return address
-            self.registers.write(decoded['rd'], self.pc + 4)
-            # Jump
-            self.pc = (self.pc + decoded['imm']) & 0xFFFFFFFF
-        
-        # JALR
-        elif opcode == 0x67:
-            rs1_val = self.registers.read(decoded['rs1'])
-            # AI Start - JALR address alignment
-            # Asked AI why JALR clears LSB - AI said instructions must be 2-byte aligned
-            target = (rs1_val + decoded['imm']) & 0xFFFFFFFE  # Clear LSB
-            # AI End
-            self.registers.write(decoded['rd'], self.pc + 4)
-            self.pc = target
-        
-        # LUI
-        elif opcode == 0x37:
-            self.registers.write(decoded['rd'], decoded['imm'])
-            self.pc += 4
-        
-        # AUIPC
-        elif opcode == 0x17:
-            result = (self.pc + decoded['imm']) & 0xFFFFFFFF
-            self.registers.write(decoded['rd'], result)
-            self.pc += 4
-        
-        else:
-            print(f"Unknown opcode: 0x{opcode:02X}")
-            self.pc += 4
+                # Execute it
+                decoded.handler(self, decoded)
+                self.cycle_count += 1
+        finally:
+            # Hits are counted locally to keep the loop cheap
+            self.predecode.hits += hits
     
-    def run(self, max_cycles=1000, verbose=False):
-        """Run the CPU until halt or max cycles"""
-        print("Starting execution...")
-        print(f"PC = 0x{self.pc:08X}\n")
+    def _run_translated(self, max_cycles):
+        """
+        Run translated basic blocks until halt or max cycles
+        Falls back to the interpreter for single instructions the
+        translator can't handle (halt, empty memory, unknown encodings)
+        and when a whole block won't fit in the remaining cycles
+        """
+        translator = self.translator
+        blocks = translator.blocks
+        stale = translator.stale
+        fault = translator.fault
+        read_word = self.memory.read_word
+        write_word = self.memory.write_word
         
         while not self.halted and self.cycle_count < max_cycles:
-            # Fetch instruction
-            instruction = self.fetch()
+            block = blocks.get(self.pc)
+            if block is None:
+                block = translator.translate(self.pc)
             
-            # AI Start - halt detection
-            # Found that jal x0, 0 (infinite loop) is used as halt
-            # This is 0x0000006F in machine code
-            if instruction == 0x0000006F:
-                print(f"Halt detected at cycle {self.cycle_count}")
-                self.halted = True
-                break
-            # AI End
+            budget = max_cycles - self.cycle_count
+            if block is None or block.length > budget:
+                self._run_interpreter(self.cycle_count + 1)
+                continue
             
-            # Check if we're in uninitialized memory
-            if instruction == 0:
-                print(f"Reached uninitialized memory at PC=0x{self.pc:08X}")
-                self.halted = True
-                break
-            
-            if verbose:
-                decoded = self.decoder.decode(instruction)
-                name = self.decoder.get_name(decoded)
-                print(f"[{self.cycle_count}] PC=0x{self.pc:08X} | {instruction:08X} | {name}")
-            
-            # Execute it
-            self.execute(instruction)
-            self.cycle_count += 1
-        
-        print(f"\nFinished after {self.cycle_count} cycles")
-        self.print_final_state()
+            stale[0] = False
+            block.executions += 1
+            try:
+                self.pc, executed = block.function(self.registers.registers,
+                                                   read_word, write_word,
+                                                   stale, budget, fault)
+            except Exception:
+                # Stop on the load or store that raised, as the interpreter does
+                self.pc = fault[0]
+                self.cycle_count += fault[1]
+                raise
+            self.cycle_count += executed
     
     def print_final_state(self):
         """Print the final state of registers and memory"""
@@ -252,11 +352,9 @@ class RISCV_CPU:
         # Show memory if anything was written
         print("\nMemory (non-zero):")
         memory_empty = True
-        for addr in sorted(self.memory.data.keys()):
-            val = self.memory.data[addr]
-            if val != 0:
-                print(f"  [0x{addr:08X}] = 0x{val:08X} ({val})")
-                memory_empty = False
+        for addr, val in self.memory.nonzero_words():
+            print(f"  [0x{addr:08X}] = 0x{val:08X} ({val})")
+            memory_empty = False
         
         if memory_empty:
             print("  (nothing written)")
@@ -264,25 +362,89 @@ class RISCV_CPU:
         print("=" * 60)
 
 
-# Run the CPU
-if __name__ == "__main__":
-    import sys
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+    import json
+    from elf_loader import ProgramLoadError
+    from reporter import JSONReporter
+    from checkpoint import save_checkpoint
+    
+    parser = argparse.ArgumentParser(description="Run a RISC-V program on the simulator")
+    parser.add_argument("program", nargs="?", default="test_base.hex",
+                        help="hex, ELF or raw .bin file (default: test_base.hex)")
+    parser.add_argument("--max-cycles", type=int, default=100,
+                        help="stop after this many instructions (default: 100)")
+    parser.add_argument("--verbosity", choices=("quiet", "normal", "trace"), default="trace",
+                        help="quiet: one summary line, normal: banner and final state, "
+                             "trace: also every instruction (default)")
+    parser.add_argument("--format", choices=("text", "json"), default="text",
+                        help="json prints the run result as a JSON object")
+    parser.add_argument("--memory-diff", action="store_true",
+                        help="include the memory words the run changed (json)")
+    parser.add_argument("--engine", choices=RISCV_CPU.ENGINES, default="interpreter")
+    parser.add_argument("--memory", choices=("dict", "paged"), default="dict")
+    parser.add_argument("--profile", action="store_true",
+                        help="print the hottest instructions, mnemonics and blocks after the run")
+    parser.add_argument("--profile-out", metavar="PATH",
+                        help="write per-PC execution counts (.json, otherwise CSV)")
+    parser.add_argument("--save-checkpoint", metavar="PATH",
+                        help="write the final state to a checkpoint file, which can be "
+                             "run later in place of a program")
+    args = parser.parse_args(argv)
+    
+    cpu = RISCV_CPU(engine=args.engine, memory=args.memory)
+    if args.profile or args.profile_out:
+        cpu.start_profiling()
+    
+    def save_state():
+        if args.save_checkpoint:
+            save_checkpoint(cpu.checkpoint(), args.save_checkpoint)
+        if args.profile_out:
+            cpu.profiler.write(args.profile_out)
+        # Keep JSON output parseable
+        if args.profile and args.format != "json":
+            print()
+            print(cpu.profiler.report())
     
-    cpu = RISCV_CPU()
+    if args.format == "json":
+        try:
+            cpu.load(args.program)
+        except (HexLoadError, ProgramLoadError) as e:
+            print(json.dumps({'program': args.program, 'error': str(e)}))
+            return 1
+        cpu.simulate(args.max_cycles, memory_diff=args.memory_diff,
+                     reporter=JSONReporter(extra={'program': args.program}))
+        save_state()
+        return 0
     
-    # Get filename from command line
-    if len(sys.argv) > 1:
-        filename = sys.argv[1]
-    else:
-        filename = "test_base.hex"
+    if args.verbosity == "quiet":
+        try:
+            cpu.load(args.program)
+        except (HexLoadError, ProgramLoadError) as e:
+            print(f"Error: {e}")
+            return 1
+        result = cpu.simulate(args.max_cycles)
+        print(f"{result.message()} - {result.cycles} cycles, PC=0x{result.pc:08X}")
+        save_state()
+        return 0
     
     try:
-        cpu.load_program(filename)
-        cpu.run(max_cycles=100, verbose=True)
-    except FileNotFoundError:
-        print(f"Error: Can't find file '{filename}'")
-        print("Usage: python cpu.py <hex_file>")
+        cpu.load_program(args.program)
+        cpu.run(max_cycles=args.max_cycles, verbose=(args.verbosity == "trace"))
+        save_state()
+    except ProgramLoadError as e:
+        print(f"Error: {e}")
+        return 1
     except Exception as e:
         print(f"Error: {e}")
         import traceback
-        traceback.print_exc()
\ No newline at end of file
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+# Run the CPU
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
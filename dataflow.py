@@ -0,0 +1,485 @@
+"""
+Dataflow limits - how much parallelism a run has in it at all
+
+Before asking how a particular core would run a program, it's worth
+knowing the most any core could get out of it. DataflowAnalyzer watches
+the instructions the CPU runs (as a reporter, or from a recorded trace)
+and schedules each one as early as its true dependences allow:
+
+    analyzer = DataflowAnalyzer(windows=(16, 64, 256, 1024))
+    cpu.simulate(max_cycles=10**6, reporter=analyzer)
+    print(analyzer.report())        # critical path, ideal IPC, window sweep, blocks
+
+An instruction can start once the values it reads are ready: the
+registers it reads (rs1/rs2), and for LW the last SW to the same word. It
+takes one cycle, or its mnemonic's latency. Nothing else holds it up:
+registers and memory are renamed perfectly, every branch is predicted
+and there is no limit on width or units. So:
+
+  critical path   the cycle the last value is ready with no other limit;
+                  ideal IPC is instructions / critical path
+  window of W     the same, but an instruction can't start until the one
+                  W before it has retired (in order, once done), like a
+                  W-entry ROB on a core of unlimited width
+  basic blocks    each block's critical path on its own (values from
+                  before it count as ready), per run of the block from
+                  where control arrived to its branch, jump or trap
+
+Everything is worked out as each instruction arrives, so a run of any
+length can be streamed through it. A window of W only keeps the last W
+retire cycles and the stores among the last W instructions (an older
+store has retired, so it can't hold anything up). The unlimited critical
+path has to remember every word stored, so its memory grows with the
+data a program writes, never with how long it runs.
+
+Command line: python dataflow.py PROGRAM [--max-cycles N] [--window N ...]
+                  [--limit N] [--json]
+"""
+
+from collections import deque
+
+from branch_predictor import control_transfer
+from decoder import InstructionDecoder
+from dispatch import NAMES
+
+
+DEFAULT_WINDOWS = (16, 64, 256, 1024)
+
+# Memory access kinds
+_LOAD, _STORE = 1, 2
+
+
+
+def _window(size):
+    """
+    The schedule under one window size, as closures over its state
+
+    Args:
+        size: Instructions in the window
+    Returns:
+        (step(index, rs1, rs2, rd, cycles, memory, word), cycles() -> last retire cycle)
+    """
+    ready = [0] * 32                # register -> cycle its value is ready
+    stores = {}                     # word -> (index of its last store, cycle it's ready)
+    stored = deque()                # (index, word) of stores still in the window
+    retired = deque(maxlen=size)    # retire cycles of the last `size` instructions
+    last = 0
+
+    def step(index, rs1, rs2, rd, cycles, memory, word):
+        nonlocal last
+        start = ready[rs1]
+        t = ready[rs2]
+        if t > start:
+            start = t
+        if memory == _LOAD:
+            store = stores.get(word)
+            if store is not None and store[1] > start:
+                start = store[1]
+        if len(retired) == size:
+            t = retired[0]
+            if t > start:
+                start = t
+        done = start + cycles
+        if rd:
+            ready[rd] = done
+        if memory == _STORE:
+            stores[word] = (index, done)
+            stored.append((index, word))
+        # The next instruction starts after this one's retired anyway
+        while stored and stored[0][0] <= index + 1 - size:
+            old, old_word = stored.popleft()
+            if stores[old_word][0] == old:
+                del stores[old_word]
+        if done > last:
+            last = done
+        retired.append(last)
+
+    def finished():
+        return last
+
+    return step, finished
+
+
+class DataflowAnalyzer:
+    """
+    Dataflow critical path, ILP under window sizes and per-block paths
+
+    Use it as a simulate() reporter, or feed it with step() / replay().
+    Counts carry on across runs until reset().
+
+    Attributes:
+        windows: Window sizes being swept
+        latency: Mnemonic -> cycles, for anything that isn't 1
+        instructions: Instructions analysed
+        critical_path: Cycles to run them with unlimited resources
+        stored_words: Words the unlimited critical path remembers a store to
+        blocks: Entry pc -> (runs, instructions, total of their critical
+                paths, longest critical path)
+    """
+
+    def __init__(self, windows=DEFAULT_WINDOWS, latency=None):
+        """
+        Args:
+            windows: Window sizes to work out the ILP for
+            latency: Mnemonic -> cycles, for anything that isn't 1
+        Raises:
+            ValueError: If a window size or latency isn't at least 1, or a
+                        mnemonic isn't one
+        """
+        windows = tuple(sorted(set(windows)))
+        if any(size < 1 for size in windows):
+            raise ValueError("window sizes must be at least 1")
+        latency = dict(latency or {})
+        for name, cycles in latency.items():
+            if name not in _KNOWN:
+                raise ValueError(f"unknown mnemonic {name!r}")
+            if cycles < 1:
+                raise ValueError("latencies must be at least 1 cycle")
+        self.windows = windows
+        self.latency = latency
+        self.decoder = InstructionDecoder()
+        # Instruction word -> (rs1, rs2, rd, cycles, load or store, ends a block?)
+        self._info = {}
+        self.reset()
+
+    def reset(self):
+        """Start a new analysis"""
+        from trace_recorder import address_trace
+        self._step, self._totals = self._analysis()
+        self.trace = address_trace(self._step)
+
+    # ---- reporter interface ----
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        pass
+
+    # ---- feeding it yourself ----
+
+    def step(self, pc, word, address=None):
+        """
+        Analyse one executed instruction
+
+        Args:
+            pc: Its address
+            word: Instruction word
+            address: LW/SW address, or None
+        """
+        self._step(pc, word, address)
+
+    def replay(self, records):
+        """
+        Analyse a recorded trace, or the next part of one
+
+        Args:
+            records: Iterable of trace records - tuples in RECORD field order
+                     (TraceRing, iter_trace) or a TRACE_DTYPE array
+        """
+        from trace_recorder import FLAG_LOAD, FLAG_STORE
+        memory = FLAG_LOAD | FLAG_STORE
+        step = self._step
+        if hasattr(records, 'dtype'):
+            records = zip(records['pc'].tolist(), records['word'].tolist(),
+                          records['mem_addr'].tolist(), records['flags'].tolist())
+        else:
+            records = ((record[1], record[2], record[4], record[7]) for record in records)
+        for pc, word, address, flags in records:
+            step(pc, word, address if flags & memory else None)
+
+    # ---- the analysis ----
+
+    def _analysis(self):
+        """
+        The analysis state and the function that adds one instruction to
+        it, as closures so the per-instruction work is all on local variables
+
+        Returns:
+            (step(pc, word, address), totals() -> results so far)
+        """
+        infos = self._info
+        describe = self._describe
+        windows = [_window(size) for size in self.windows]
+        window_steps = [step for step, _ in windows]
+        ready = [0] * 32
+        stores = {}
+        blocks = {}
+        critical = 0
+        count = 0
+        # The block running now: where it was entered, its values, its path so far
+        entry = None
+        local = {}
+        local_stores = {}
+        path = 0
+        length = 0
+        last_pc = -8
+        ended = True
+
+        def close():
+            record = blocks.get(entry)
+            if record is None:
+                blocks[entry] = [1, length, path, path]
+            else:
+                record[0] += 1
+                record[1] += length
+                record[2] += path
+                if path > record[3]:
+                    record[3] = path
+
+        def step(pc, word, address):
+            nonlocal critical, count, entry, local, local_stores, path, length, last_pc, ended
+            info = infos.get(word)
+            if info is None:
+                info = describe(word)
+            rs1, rs2, rd, cycles, memory, ends = info
+            word_address = address >> 2 if memory else 0
+
+            # Unlimited
+            start = ready[rs1]
+            t = ready[rs2]
+            if t > start:
+                start = t
+            if memory == _LOAD:
+                t = stores.get(word_address, 0)
+                if t > start:
+                    start = t
+            done = start + cycles
+            if rd:
+                ready[rd] = done
+            if memory == _STORE:
+                stores[word_address] = done
+            if done > critical:
+                critical = done
+
+            for window in window_steps:
+                window(count, rs1, rs2, rd, cycles, memory, word_address)
+
+            # This block on its own
+            if ended or pc != last_pc + 4:
+                if entry is not None:
+                    close()
+                entry = pc
+                local = {}
+                local_stores = {}
+                path = length = 0
+            start = local.get(rs1, 0)
+            t = local.get(rs2, 0)
+            if t > start:
+                start = t
+            if memory == _LOAD:
+                t = local_stores.get(word_address, 0)
+                if t > start:
+                    start = t
+            done = start + cycles
+            if rd:
+                local[rd] = done
+            if memory == _STORE:
+                local_stores[word_address] = done
+            if done > path:
+                path = done
+            length += 1
+            ended = ends
+            last_pc = pc
+            count += 1
+
+        def totals():
+            # With the block still running counted as it is so far
+            counted = {pc: tuple(record) for pc, record in blocks.items()}
+            if entry is not None:
+                runs, instructions, paths, longest = counted.get(entry, (0, 0, 0, 0))
+                counted[entry] = (runs + 1, instructions + length, paths + path,
+                                  max(longest, path))
+            return {'instructions': count, 'critical_path': critical,
+                    'windows': [cycles() for _, cycles in windows], 'blocks': counted,
+                    'stored_words': len(stores)}
+
+        return step, totals
+
+    def _describe(self, word):
+        decoded = self.decoder.decode_record(word)
+        name = decoded.name
+        rs1, rs2, rd = decoded.operands()
+        memory = _LOAD if name == 'LW' else _STORE if name == 'SW' else 0
+        # Traps end a block too
+        info = (rs1, rs2, rd, self.latency.get(name, 1), memory,
+                control_transfer(decoded) is not None or name == 'UNKNOWN')
+        self._info[word] = info
+        return info
+
+    # ---- results ----
+
+    @property
+    def instructions(self):
+        """Instructions analysed"""
+        return self._totals()['instructions']
+
+    @property
+    def critical_path(self):
+        """Cycles to run them with unlimited resources"""
+        return self._totals()['critical_path']
+
+    @property
+    def stored_words(self):
+        """Words the unlimited critical path is remembering a store to"""
+        return self._totals()['stored_words']
+
+    @property
+    def blocks(self):
+        """Entry pc -> (runs, instructions, total critical path, longest)"""
+        return self._totals()['blocks']
+
+    def ideal_ipc(self):
+        """Instructions per cycle with unlimited resources"""
+        totals = self._totals()
+        return totals['instructions'] / totals['critical_path'] if totals['critical_path'] else 0.0
+
+    def window_cycles(self):
+        """Window size -> cycles to run everything with that window"""
+        return dict(zip(self.windows, self._totals()['windows']))
+
+    def ilp(self, window=None):
+        """
+        Instructions per cycle under a window size
+
+        Args:
+            window: One of the windows, or None for unlimited
+        Raises:
+            KeyError: If that window size wasn't analysed
+        """
+        if window is None:
+            return self.ideal_ipc()
+        cycles = self.window_cycles()[window]
+        return self.instructions / cycles if cycles else 0.0
+
+    def hot_blocks(self, limit=10):
+        """(entry pc, runs, instructions, total path, longest) with the most instructions first"""
+        ranked = sorted(((pc, *record) for pc, record in self.blocks.items()),
+                        key=lambda row: (-row[2], row[0]))
+        return ranked[:limit]
+
+    def to_dict(self):
+        """Results as plain data, ready for json.dumps"""
+        totals = self._totals()
+        count = totals['instructions']
+        return {
+            'instructions': count,
+            'critical_path': totals['critical_path'],
+            'ideal_ipc': self.ideal_ipc(),
+            'windows': [{'size': size, 'cycles': cycles, 'ipc': count / cycles if cycles else 0.0}
+                        for size, cycles in zip(self.windows, totals['windows'])],
+            'blocks': {f"0x{pc:08X}": {'runs': runs, 'instructions': instructions,
+                                       'mean_critical_path': paths / runs,
+                                       'longest_critical_path': longest,
+                                       'ilp': instructions / paths if paths else 0.0}
+                       for pc, (runs, instructions, paths, longest)
+                       in sorted(totals['blocks'].items())},
+        }
+
+    def report(self, limit=10, symbols=None):
+        """
+        Critical path, ideal IPC, the window sweep and the hottest blocks
+
+        Args:
+            limit: Blocks to list
+            symbols: Optional SymbolTable for naming them
+        Returns:
+            String
+        """
+        count = self.instructions
+        lines = [
+            f"Dataflow limits: {count} instructions, critical path {self.critical_path} "
+            f"cycles, ideal IPC {self.ideal_ipc():.2f}",
+            "",
+            "ILP by window size:",
+        ]
+        for size, cycles in self.window_cycles().items():
+            lines.append(f"  {size:>8} {cycles:>12} cycles  IPC {count / cycles if cycles else 0:>7.2f}")
+        lines.append(f"  {'no limit':>8} {self.critical_path:>12} cycles  IPC {self.ideal_ipc():>7.2f}")
+
+        hot = self.hot_blocks(limit)
+        if hot:
+            lines.append("")
+            lines.append(f"Hottest basic blocks (top {limit}, by instructions executed):")
+            lines.append(f"  {'entry':<10} {'runs':>9} {'length':>7} {'path':>7} {'longest':>7} "
+                         f"{'ILP':>6}")
+            for pc, runs, instructions, paths, longest in hot:
+                where = symbols.name_for(pc) if symbols else None
+                lines.append(f"  0x{pc:08X} {runs:>9} {instructions / runs:>7.1f} "
+                             f"{paths / runs:>7.1f} {longest:>7} {instructions / paths:>6.2f}"
+                             + (f"  <{where}>" if where else ""))
+        return "\n".join(lines)
+
+
+_KNOWN = frozenset(NAMES) - {'UNKNOWN'}
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+    import json
+    from cpu import RISCV_CPU
+    from elf_loader import ProgramLoadError
+    from loader import HexLoadError
+
+    parser = argparse.ArgumentParser(
+        description="Run a program and work out its dataflow critical path and ILP limits")
+    parser.add_argument("program", help="hex, ELF, raw .bin or .ckpt file")
+    parser.add_argument("--max-cycles", type=int, default=10 ** 6,
+                        help="stop after this many instructions (default: 1000000)")
+    parser.add_argument("--window", type=int, action="append", metavar="N",
+                        help="a window size (repeat for more; default: 16, 64, 256, 1024)")
+    parser.add_argument("--limit", type=int, default=10, help="blocks to list (default: 10)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        analyzer = DataflowAnalyzer(args.window or DEFAULT_WINDOWS)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    cpu = RISCV_CPU()
+    try:
+        cpu.load(args.program)
+    except (HexLoadError, ProgramLoadError) as e:
+        print(f"Error: {e}")
+        return 1
+    cpu.simulate(args.max_cycles, reporter=analyzer)
+    if args.json:
+        print(json.dumps(analyzer.to_dict()))
+    else:
+        print(analyzer.report(args.limit, symbols=cpu.symbols))
+    return 0
+
+
+# Test
+if __name__ == "__main__":
+    import sys
+    from cpu import RISCV_CPU
+
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    print("Testing dataflow analysis...")
+
+    # Four independent chains of 10 dependent adds, interleaved
+    program = []
+    for step in range(10):
+        for reg in range(1, 5):
+            program.append(0x00100013 | reg << 15 | reg << 7)   # addi xN, xN, 1
+    program.append(0x0000006F)  # halt
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    analyzer = DataflowAnalyzer(windows=(1, 2, 4))
+    cpu.simulate(max_cycles=1000, reporter=analyzer)
+
+    print(f"Instructions: {analyzer.instructions} (expected 40)")
+    print(f"Critical path: {analyzer.critical_path} (expected 10)")
+    print(f"Ideal IPC: {analyzer.ideal_ipc():.2f} (expected 4.00)")
+    print(f"Window cycles: {analyzer.window_cycles()} (expected {{1: 40, 2: 20, 4: 10}})")
+    print()
+    print(analyzer.report())
+
+    print("\nDataflow analysis test complete!")
@@ -1,5 +1,88 @@
+from dispatch import NAMES, HANDLERS, table_index
+
+
+# Register fields each format reads: (rs1, rs2)
+_READS = {'R': (True, True), 'I': (True, False), 'S': (True, True), 'B': (True, True)}
+
+
+class DecodedInstruction:
+    """
+    Decoded form of one 32-bit instruction word
+    
+    Uses __slots__ so each one is a small fixed-size object instead of a
+    dict. Records are interned per word by InstructionDecoder.decode_record,
+    so a word that has been seen before costs one lookup and no allocation.
+    Treat them as read-only - the same record is shared by everyone.
+    """
+    
+    __slots__ = ('word', 'opcode', 'rd', 'funct3', 'rs1', 'rs2', 'funct7',
+                 'type', 'imm', 'name', 'handler')
+    
+    def __init__(self, word, opcode, rd, funct3, rs1, rs2, funct7, inst_type, imm):
+        self.word = word
+        self.opcode = opcode
+        self.rd = rd
+        self.funct3 = funct3
+        self.rs1 = rs1
+        self.rs2 = rs2
+        self.funct7 = funct7
+        self.type = inst_type
+        self.imm = imm              # 0 for R and UNKNOWN types
+        
+        # Name and handler come from the dispatch table
+        index = table_index(opcode, funct3, funct7)
+        self.name = NAMES[index]
+        self.handler = HANDLERS[index]
+    
+    def __getitem__(self, key):
+        """Allow decoded['rd'] style access like the old dictionaries"""
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+    
+    def operands(self):
+        """
+        Registers it reads and writes, for dependence tracking
+        
+        Returns:
+            (rs1, rs2, rd), with 0 for a field the format doesn't use -
+            stores, branches and UNKNOWN words write nothing
+        """
+        reads_rs1, reads_rs2 = _READS.get(self.type, (False, False))
+        writes = self.type not in ('S', 'B') and self.name != 'UNKNOWN'
+        return (self.rs1 if reads_rs1 else 0,
+                self.rs2 if reads_rs2 else 0,
+                self.rd if writes else 0)
+    
+    def to_dict(self):
+        """Get the fields as a dictionary, the same shape decode() returns"""
+        result = {
+            'opcode': self.opcode,
+            'rd': self.rd,
+            'funct3': self.funct3,
+            'rs1': self.rs1,
+            'rs2': self.rs2,
+            'funct7': self.funct7,
+            'type': self.type,
+        }
+        if self.type not in ('R', 'UNKNOWN'):
+            result['imm'] = self.imm
+        return result
+    
+    def __repr__(self):
+        return f"DecodedInstruction(0x{self.word:08X} {self.name})"
+
+
 class InstructionDecoder:
     
+    # Shared by every decoder: instruction word -> DecodedInstruction
+    _interned = {}
+    
+    # Start over if something decodes a huge number of distinct words
+    # (like random data) so the table can't grow forever
+    MAX_INTERNED = 1 << 20
+    
     def __init__(self):
         pass
     
@@ -7,7 +90,28 @@ class InstructionDecoder:
         """
         Decode a 32-bit instruction
         Returns a dictionary with all the fields
+        
+        Kept for compatibility - new code should use decode_record,
+        which doesn't build a new dictionary every time
+        """
+        return self.decode_record(instruction).to_dict()
+    
+    def decode_record(self, instruction):
+        """
+        Decode a 32-bit instruction into a shared DecodedInstruction
+        
+        Args:
+            instruction: 32-bit instruction word
+        Returns:
+            DecodedInstruction (the same object for the same word)
         """
+        record = self._interned.get(instruction)
+        if record is None:
+            record = self._build_record(instruction)
+        return record
+    
+    def _build_record(self, instruction):
+        """Decode a word that hasn't been seen yet and intern it"""
         # Extract the basic fields using bit shifting and masks
         opcode = instruction & 0x7F
         rd = (instruction >> 7) & 0x1F
@@ -16,33 +120,31 @@ class InstructionDecoder:
         rs2 = (instruction >> 20) & 0x1F
         funct7 = (instruction >> 25) & 0x7F
         
-        # Store in dictionary
-        result = {
-            'opcode': opcode,
-            'rd': rd,
-            'funct3': funct3,
-            'rs1': rs1,
-            'rs2': rs2,
-            'funct7': funct7,
-        }
-        
         # Figure out instruction type
         inst_type = self.get_type(opcode)
-        result['type'] = inst_type
         
         # Decode the immediate value based on instruction type
         if inst_type == 'I':
-            result['imm'] = self.decode_i_imm(instruction)
+            imm = self.decode_i_imm(instruction)
         elif inst_type == 'S':
-            result['imm'] = self.decode_s_imm(instruction)
+            imm = self.decode_s_imm(instruction)
         elif inst_type == 'B':
-            result['imm'] = self.decode_b_imm(instruction)
+            imm = self.decode_b_imm(instruction)
         elif inst_type == 'U':
-            result['imm'] = self.decode_u_imm(instruction)
+            imm = self.decode_u_imm(instruction)
         elif inst_type == 'J':
-            result['imm'] = self.decode_j_imm(instruction)
+            imm = self.decode_j_imm(instruction)
+        else:
+            imm = 0
         
-        return result
+        record = DecodedInstruction(instruction, opcode, rd, funct3, rs1, rs2,
+                                    funct7, inst_type, imm)
+        
+        interned = self._interned
+        if len(interned) >= self.MAX_INTERNED:
+            interned.clear()
+        interned[instruction] = record
+        return record
     
     def decode_i_imm(self, instruction):
         """Decode I-type immediate (bits 31:20)"""
@@ -141,71 +243,47 @@ class InstructionDecoder:
     def get_name(self, decoded):
         """
         Get the instruction name/mnemonic
+        Names come from the same dispatch table the CPU executes with
+        """
+        return NAMES[table_index(decoded['opcode'], decoded['funct3'], decoded['funct7'])]
+    
+    def disassemble(self, decoded):
         """
-        opcode = decoded['opcode']
-        funct3 = decoded['funct3']
-        funct7 = decoded['funct7']
+        Format an instruction as assembly, like "addi x1, x0, 5"
+        Branch and jump offsets are relative to the instruction, as encoded
         
-        # R-type instructions
-        if opcode == 0x33:
-            if funct3 == 0x0 and funct7 == 0x00:
-                return "ADD"
-            elif funct3 == 0x0 and funct7 == 0x20:
-                return "SUB"
-            elif funct3 == 0x7:
-                return "AND"
-            elif funct3 == 0x6:
-                return "OR"
-            elif funct3 == 0x4:
-                return "XOR"
-            elif funct3 == 0x1:
-                return "SLL"
-            elif funct3 == 0x5 and funct7 == 0x00:
-                return "SRL"
-            elif funct3 == 0x5 and funct7 == 0x20:
-                return "SRA"
-        
-        # I-type arithmetic
-        elif opcode == 0x13:
-            if funct3 == 0x0:
-                return "ADDI"
-            elif funct3 == 0x7:
-                return "ANDI"
-            elif funct3 == 0x6:
-                return "ORI"
-            elif funct3 == 0x4:
-                return "XORI"
-        
-        # Load/Store
-        elif opcode == 0x03 and funct3 == 0x2:
-            return "LW"
-        elif opcode == 0x23 and funct3 == 0x2:
-            return "SW"
-        
-        # Branches
-        elif opcode == 0x63:
-            if funct3 == 0x0:
-                return "BEQ"
-            elif funct3 == 0x1:
-                return "BNE"
-            elif funct3 == 0x4:
-                return "BLT"
-            elif funct3 == 0x5:
-                return "BGE"
-        
-        # Jumps
-        elif opcode == 0x6F:
-            return "JAL"
-        elif opcode == 0x67:
-            return "JALR"
+        Args:
+            decoded: DecodedInstruction
+        Returns:
+            String (".word 0x..." for encodings the CPU doesn't know)
+        """
+        name = decoded.name
+        if name == 'UNKNOWN':
+            return f".word 0x{decoded.word:08X}"
         
-        # Upper immediate
-        elif opcode == 0x37:
-            return "LUI"
-        elif opcode == 0x17:
-            return "AUIPC"
+        mnemonic = name.lower()
+        rd = f"x{decoded.rd}"
+        rs1 = f"x{decoded.rs1}"
+        rs2 = f"x{decoded.rs2}"
+        # Immediates are stored as unsigned 32-bit values
+        imm = decoded.imm - 0x100000000 if decoded.imm & 0x80000000 else decoded.imm
         
-        return "UNKNOWN"
+        inst_type = decoded.type
+        if inst_type == 'R':
+            return f"{mnemonic} {rd}, {rs1}, {rs2}"
+        if name == 'LW' or name == 'JALR':
+            return f"{mnemonic} {rd}, {imm}({rs1})"
+        if name in ('SLLI', 'SRLI', 'SRAI'):
+            return f"{mnemonic} {rd}, {rs1}, {imm & 0x1F}"
+        if inst_type == 'I':
+            return f"{mnemonic} {rd}, {rs1}, {imm}"
+        if inst_type == 'S':
+            return f"{mnemonic} {rs2}, {imm}({rs1})"
+        if inst_type == 'B':
+            return f"{mnemonic} {rs1}, {rs2}, {imm}"
+        if inst_type == 'U':
+            return f"{mnemonic} {rd}, 0x{decoded.imm >> 12:X}"
+        return f"{mnemonic} {rd}, {imm}"
 
 
 # Test it
@@ -0,0 +1,252 @@
+"""
+Table-driven instruction dispatch
+
+Every (opcode, funct3, funct7) combination gets a slot in one flat table
+that says what the instruction is called and which function executes it.
+The CPU indexes straight into the table instead of walking if/elif chains,
+and InstructionDecoder.get_name reads names from the same table, so the
+disassembly can never disagree with what actually runs.
+
+Handlers are called as handler(cpu, decoded) with a DecodedInstruction
+and must update cpu.pc.
+Encodings that aren't defined go to trap_handler.
+"""
+
+from alu import (op_add, op_sub, op_and, op_or, op_xor,
+                 op_sll, op_srl, op_sra)
+
+
+# opcode is 7 bits, funct3 3 bits, funct7 7 bits -> 17 bit index
+TABLE_SIZE = 1 << 17
+
+
+def table_index(opcode, funct3, funct7):
+    """Get the table slot for a set of decoded fields"""
+    return opcode | (funct3 << 7) | (funct7 << 10)
+
+
+def instruction_index(instruction):
+    """Get the table slot straight from a 32-bit instruction word"""
+    return ((instruction & 0x7F) |
+            ((instruction >> 5) & 0x380) |
+            ((instruction >> 15) & 0x1FC00))
+
+
+# ---- handlers ----
+
+def trap_handler(cpu, decoded):
+    """Every undefined encoding ends up here"""
+    cpu.trap(decoded)
+
+
+def _make_register_op(op):
+    """Handler for an R-type instruction using an ALU function"""
+    def handler(cpu, decoded):
+        regs = cpu.registers.registers
+        rd = decoded.rd
+        if rd:
+            regs[rd] = op(regs[decoded.rs1], regs[decoded.rs2])
+        cpu.pc += 4
+    return handler
+
+
+def _make_immediate_op(op):
+    """Handler for an I-type arithmetic instruction using an ALU function"""
+    def handler(cpu, decoded):
+        regs = cpu.registers.registers
+        rd = decoded.rd
+        if rd:
+            regs[rd] = op(regs[decoded.rs1], decoded.imm)
+        cpu.pc += 4
+    return handler
+
+
+def _make_shift_immediate_op(op):
+    """Handler for SLLI/SRLI/SRAI - shift amount is the low 5 bits of imm"""
+    def handler(cpu, decoded):
+        regs = cpu.registers.registers
+        rd = decoded.rd
+        if rd:
+            regs[rd] = op(regs[decoded.rs1], decoded.imm & 0x1F)
+        cpu.pc += 4
+    return handler
+
+
+def _lw(cpu, decoded):
+    regs = cpu.registers.registers
+    address = (regs[decoded.rs1] + decoded.imm) & 0xFFFFFFFF
+    value = cpu.memory.read_word(address)
+    rd = decoded.rd
+    if rd:
+        regs[rd] = value
+    cpu.pc += 4
+
+
+def _sw(cpu, decoded):
+    regs = cpu.registers.registers
+    address = (regs[decoded.rs1] + decoded.imm) & 0xFFFFFFFF
+    cpu.memory.write_word(address, regs[decoded.rs2])
+    cpu.pc += 4
+
+
+# AI Start - signed comparison for BLT/BGE
+# This was really tricky - branches weren't working
+# BLT was treating -1 as bigger than 5
+# Asked AI how to handle signed comparison in Python
+# AI said: if value >= 0x80000000, subtract 0x100000000 to get signed
+def _to_signed(value):
+    """Convert a 32-bit value to a signed Python int"""
+    if value >= 0x80000000:
+        return value - 0x100000000
+    return value
+# AI End
+
+
+# Taken conditions for the conditional branches, (rs1 value, rs2 value) -> bool
+BRANCH_CONDITIONS = {
+    'BEQ': lambda a, b: a == b,
+    'BNE': lambda a, b: a != b,
+    'BLT': lambda a, b: _to_signed(a) < _to_signed(b),
+    'BGE': lambda a, b: _to_signed(a) >= _to_signed(b),
+}
+
+
+def _make_branch(condition):
+    """Handler for a branch that is taken when condition(rs1, rs2) is true"""
+    def handler(cpu, decoded):
+        regs = cpu.registers.registers
+        if condition(regs[decoded.rs1], regs[decoded.rs2]):
+            cpu.pc = (cpu.pc + decoded.imm) & 0xFFFFFFFF
+        else:
+            cpu.pc += 4
+    return handler
+
+
+def _jal(cpu, decoded):
+    # Save return address
+    rd = decoded.rd
+    if rd:
+        cpu.registers.registers[rd] = (cpu.pc + 4) & 0xFFFFFFFF
+    # Jump
+    cpu.pc = (cpu.pc + decoded.imm) & 0xFFFFFFFF
+
+
+def _jalr(cpu, decoded):
+    regs = cpu.registers.registers
+    # AI Start - JALR address alignment
+    # Asked AI why JALR clears LSB - AI said instructions must be 2-byte aligned
+    target = (regs[decoded.rs1] + decoded.imm) & 0xFFFFFFFE  # Clear LSB
+    # AI End
+    rd = decoded.rd
+    if rd:
+        regs[rd] = (cpu.pc + 4) & 0xFFFFFFFF
+    cpu.pc = target
+
+
+def _lui(cpu, decoded):
+    rd = decoded.rd
+    if rd:
+        cpu.registers.registers[rd] = decoded.imm
+    cpu.pc += 4
+
+
+def _auipc(cpu, decoded):
+    rd = decoded.rd
+    if rd:
+        cpu.registers.registers[rd] = (cpu.pc + decoded.imm) & 0xFFFFFFFF
+    cpu.pc += 4
+
+
+# ---- the table ----
+
+NAMES = ["UNKNOWN"] * TABLE_SIZE
+HANDLERS = [trap_handler] * TABLE_SIZE
+
+_ANY = range(128)
+
+
+def _define(name, handler, opcode, funct3s, funct7s):
+    """Fill every slot matching the given opcode/funct3/funct7 values"""
+    for funct3 in funct3s:
+        for funct7 in funct7s:
+            index = table_index(opcode, funct3, funct7)
+            NAMES[index] = name
+            HANDLERS[index] = handler
+
+
+def _build():
+    """Fill in the table - runs once when the module is imported"""
+    all_funct3 = range(8)
+
+    # R-type (register operations like add, sub, etc)
+    # AND/OR/XOR/SLL don't look at funct7
+    _define("ADD", _make_register_op(op_add), 0x33, [0x0], [0x00])
+    _define("SUB", _make_register_op(op_sub), 0x33, [0x0], [0x20])
+    _define("AND", _make_register_op(op_and), 0x33, [0x7], _ANY)
+    _define("OR", _make_register_op(op_or), 0x33, [0x6], _ANY)
+    _define("XOR", _make_register_op(op_xor), 0x33, [0x4], _ANY)
+    _define("SLL", _make_register_op(op_sll), 0x33, [0x1], _ANY)
+    _define("SRL", _make_register_op(op_srl), 0x33, [0x5], [0x00])
+    _define("SRA", _make_register_op(op_sra), 0x33, [0x5], [0x20])
+
+    # I-type immediate arithmetic (like addi)
+    # The immediate's upper bits land in funct7, so these match any funct7
+    _define("ADDI", _make_immediate_op(op_add), 0x13, [0x0], _ANY)
+    _define("ANDI", _make_immediate_op(op_and), 0x13, [0x7], _ANY)
+    _define("ORI", _make_immediate_op(op_or), 0x13, [0x6], _ANY)
+    _define("XORI", _make_immediate_op(op_xor), 0x13, [0x4], _ANY)
+    # AI Start - shift immediate handling
+    # Asked AI how to tell SRLI from SRAI - they have same funct3
+    # AI said check bit 30 which shows up as bit 10 in decoded immediate
+    # (imm bits 11:10 are funct7 bits 6:5, so SRLI is when both are clear)
+    _define("SLLI", _make_shift_immediate_op(op_sll), 0x13, [0x1], _ANY)
+    _define("SRLI", _make_shift_immediate_op(op_srl), 0x13, [0x5],
+            [f for f in _ANY if f & 0x60 == 0])
+    _define("SRAI", _make_shift_immediate_op(op_sra), 0x13, [0x5],
+            [f for f in _ANY if f & 0x60 != 0])
+    # AI End
+
+    # Load/Store (word only)
+    _define("LW", _lw, 0x03, [0x2], _ANY)
+    _define("SW", _sw, 0x23, [0x2], _ANY)
+
+    # Branches
+    _define("BEQ", _make_branch(BRANCH_CONDITIONS["BEQ"]), 0x63, [0x0], _ANY)
+    _define("BNE", _make_branch(BRANCH_CONDITIONS["BNE"]), 0x63, [0x1], _ANY)
+    _define("BLT", _make_branch(BRANCH_CONDITIONS["BLT"]), 0x63, [0x4], _ANY)
+    _define("BGE", _make_branch(BRANCH_CONDITIONS["BGE"]), 0x63, [0x5], _ANY)
+
+    # Jumps
+    _define("JAL", _jal, 0x6F, all_funct3, _ANY)
+    _define("JALR", _jalr, 0x67, all_funct3, _ANY)
+
+    # Upper immediate
+    _define("LUI", _lui, 0x37, all_funct3, _ANY)
+    _define("AUIPC", _auipc, 0x17, all_funct3, _ANY)
+
+
+_build()
+
+
+def lookup(instruction):
+    """
+    Look up an instruction word in the table
+
+    Args:
+        instruction: 32-bit instruction
+    Returns:
+        (name, handler) tuple
+    """
+    index = instruction_index(instruction)
+    return NAMES[index], HANDLERS[index]
+
+
+# Test
+if __name__ == "__main__":
+    print("Testing dispatch table...")
+
+    for inst in [0x002081B3, 0x40110233, 0x40515093, 0x0032A023, 0x0000A083]:
+        name, handler = lookup(inst)
+        print(f"{inst:08X} -> {name}")
+
+    print("\nDispatch table test complete!")
@@ -0,0 +1,353 @@
+"""
+ELF32 and raw binary program loading
+
+Loads RV32 little-endian ELF executables and raw .bin images straight
+into guest memory - no conversion to a hex file first.
+
+On PagedMemory each PT_LOAD segment is mmapped copy-on-write (see
+mapped_memory.py), so pages are used in place and only faulted in when
+the program touches them. The zero-filled tail of a segment (.bss) is a
+ZeroRegion and costs nothing until used. The dict Memory gets the same
+contents through write_block and zero_block instead.
+
+The entry PC comes from e_entry, and the symbol table (if there is one)
+is loaded into a SymbolTable so traces can show function names.
+"""
+
+import mmap
+import struct
+
+from mapped_memory import map_file
+from symbols import SymbolTable
+
+
+ELF_MAGIC = b'\x7fELF'
+ELFCLASS32 = 1
+ELFDATA2LSB = 1
+ET_EXEC = 2
+EM_RISCV = 243
+
+PT_LOAD = 1
+SHT_SYMTAB = 2
+SHT_DYNSYM = 11
+SHN_UNDEF = 0
+
+# Symbol types worth naming addresses after
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+
+_ELF_HEADER = struct.Struct('<16sHHIIIIIHHHHHH')
+_PROGRAM_HEADER = struct.Struct('<8I')
+_SECTION_HEADER = struct.Struct('<10I')
+_SYMBOL = struct.Struct('<IIIBBH')
+
+
+class ProgramLoadError(Exception):
+    """An ELF or binary file that can't be loaded"""
+
+    def __init__(self, filename, reason):
+        self.filename = filename
+        self.reason = reason
+        super().__init__(f"{filename}: {reason}")
+
+
+class Segment:
+    """One PT_LOAD segment"""
+
+    def __init__(self, address, offset, file_size, mem_size, flags):
+        self.address = address
+        self.offset = offset
+        self.file_size = file_size
+        self.mem_size = mem_size
+        self.flags = flags      # PF_X=1, PF_W=2, PF_R=4
+
+    def __repr__(self):
+        return (f"Segment(0x{self.address:08X}, file {self.file_size} bytes, "
+                f"mem {self.mem_size} bytes, flags {self.flags})")
+
+
+class ProgramImage:
+    """
+    What was loaded from a program file
+
+    Attributes:
+        filename: Where it came from
+        entry: Address execution starts at
+        segments: List of Segment
+        symbols: SymbolTable (empty if the file had none)
+        count: Number of 32-bit words of file data loaded
+        format: 'elf' or 'bin'
+    """
+
+    def __init__(self, filename, entry, segments, symbols=None, format='elf'):
+        self.filename = filename
+        self.format = format
+        self.entry = entry
+        self.segments = segments
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.count = sum(seg.file_size for seg in segments) // 4
+
+
+def _open(path):
+    """Read-only mmap of a whole file, so headers are parsed in place"""
+    try:
+        with open(path, 'rb') as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError as e:
+        raise ProgramLoadError(path, "file not found") from e
+    except ValueError as e:     # mmap refuses empty files
+        raise ProgramLoadError(path, "file is empty") from e
+    except OSError as e:
+        raise ProgramLoadError(path, f"can't read file ({e.strerror})") from e
+
+
+def is_elf(path):
+    """Check whether a file starts with the ELF magic number"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(4) == ELF_MAGIC
+    except OSError:
+        return False
+
+
+def _unpack(data, layout, offset, path, what):
+    """struct.unpack_from with a ProgramLoadError for truncated files"""
+    if offset + layout.size > len(data):
+        raise ProgramLoadError(path, f"{what} runs past the end of the file")
+    return layout.unpack_from(data, offset)
+
+
+def _read_symbols(data, path, shoff, shentsize, shnum):
+    """Collect (address, size, name) for named code/data symbols"""
+    if shoff == 0 or shnum == 0:
+        return SymbolTable()
+
+    sections = [_unpack(data, _SECTION_HEADER, shoff + i * shentsize, path, "section header")
+                for i in range(shnum)]
+    symbols = []
+    for sh_name, sh_type, _, _, sh_offset, sh_size, sh_link, _, _, sh_entsize in sections:
+        if sh_type not in (SHT_SYMTAB, SHT_DYNSYM) or sh_link >= shnum:
+            continue
+        str_offset, str_size = sections[sh_link][4], sections[sh_link][5]
+        if str_offset + str_size > len(data) or sh_offset + sh_size > len(data):
+            raise ProgramLoadError(path, "symbol table runs past the end of the file")
+        strings = data[str_offset:str_offset + str_size]
+        entsize = sh_entsize or _SYMBOL.size
+
+        for offset in range(sh_offset, sh_offset + sh_size - _SYMBOL.size + 1, entsize):
+            st_name, st_value, st_size, st_info, _, st_shndx = _SYMBOL.unpack_from(data, offset)
+            if st_shndx == SHN_UNDEF or (st_info & 0xF) not in (STT_NOTYPE, STT_OBJECT, STT_FUNC):
+                continue
+            end = strings.find(b'\0', st_name)
+            name = strings[st_name:end if end >= 0 else len(strings)].decode('utf-8', 'replace')
+            # Skip unnamed symbols and RISC-V mapping symbols ($x, $d)
+            if name and not name.startswith('$'):
+                symbols.append((st_value, st_size, name))
+    return SymbolTable(symbols)
+
+
+def read_elf(path):
+    """
+    Parse an ELF file's headers and symbols without loading anything
+
+    Args:
+        path: ELF file
+    Returns:
+        ProgramImage (nothing is in memory yet)
+    Raises:
+        ProgramLoadError: If it isn't an RV32 little-endian executable
+    """
+    data = _open(path)
+    if data[:4] != ELF_MAGIC:
+        raise ProgramLoadError(path, "not an ELF file")
+
+    (ident, e_type, e_machine, _, e_entry, e_phoff, e_shoff, _, _,
+     e_phentsize, e_phnum, e_shentsize, e_shnum, _) = _unpack(data, _ELF_HEADER, 0, path, "ELF header")
+    if ident[4] != ELFCLASS32:
+        raise ProgramLoadError(path, "not a 32-bit ELF file")
+    if ident[5] != ELFDATA2LSB:
+        raise ProgramLoadError(path, "not a little-endian ELF file")
+    if e_machine != EM_RISCV:
+        raise ProgramLoadError(path, f"not a RISC-V ELF file (machine {e_machine})")
+    if e_type != ET_EXEC:
+        raise ProgramLoadError(path, f"not an executable (type {e_type})")
+
+    segments = []
+    for i in range(e_phnum):
+        p_type, p_offset, p_vaddr, _, p_filesz, p_memsz, p_flags, _ = \
+            _unpack(data, _PROGRAM_HEADER, e_phoff + i * e_phentsize, path, "program header")
+        if p_type != PT_LOAD or p_memsz == 0:
+            continue
+        if p_offset + p_filesz > len(data):
+            raise ProgramLoadError(path, f"segment at 0x{p_vaddr:08X} runs past the end of the file")
+        if p_filesz > p_memsz or p_vaddr + p_memsz > 0x100000000:
+            raise ProgramLoadError(path, f"segment at 0x{p_vaddr:08X} has a bad size")
+        segments.append(Segment(p_vaddr, p_offset, p_filesz, p_memsz, p_flags))
+
+    if not segments:
+        raise ProgramLoadError(path, "no loadable segments")
+
+    symbols = _read_symbols(data, path, e_shoff, e_shentsize, e_shnum)
+    return ProgramImage(path, e_entry, segments, symbols)
+
+
+def _place(memory, address, path, offset, length):
+    """Put part of a file into memory - mapped if the backend can, copied if not"""
+    if length == 0:
+        return
+    if hasattr(memory, 'add_region'):
+        map_file(memory, address, path, offset, length, mode='cow')
+    else:
+        data = _open(path)
+        memory.write_block(address, data[offset:offset + length])
+
+
+def load_elf(path, memory):
+    """
+    Load an ELF executable's PT_LOAD segments into memory
+
+    Args:
+        path: ELF file
+        memory: Memory or PagedMemory
+    Returns:
+        ProgramImage with the entry point and symbols
+    Raises:
+        ProgramLoadError: If the file can't be loaded
+    """
+    image = read_elf(path)
+    for seg in image.segments:
+        _place(memory, seg.address, path, seg.offset, seg.file_size)
+        if seg.mem_size > seg.file_size:
+            # .bss - zero-filled when touched
+            memory.zero_block(seg.address + seg.file_size, seg.mem_size - seg.file_size)
+    return image
+
+
+def load_binary(path, memory, address=0x0):
+    """
+    Load a raw binary image (little-endian words, no headers)
+
+    Args:
+        path: .bin file
+        memory: Memory or PagedMemory
+        address: Where the first byte goes - also the entry point
+    Returns:
+        ProgramImage
+    Raises:
+        ProgramLoadError: If the file can't be read
+    """
+    size = len(_open(path))
+    _place(memory, address, path, 0, size)
+    return ProgramImage(path, address, [Segment(address, 0, size, size, 0x7)], format='bin')
+
+
+def _build_elf(entry, segments, symbols):
+    """
+    Put together a minimal RV32 executable
+
+    Args:
+        entry: Entry address
+        segments: List of (address, bytes, mem_size)
+        symbols: List of (name, address, size, type, section index)
+    Returns:
+        bytes of the whole file
+    """
+    # Segment data starts on its own page, at the same page offset as its address
+    body = bytearray(0x1000)
+    headers = []
+    for address, data, mem_size in segments:
+        while len(body) % 0x1000 != address % 0x1000:
+            body.append(0)
+        headers.append(_PROGRAM_HEADER.pack(PT_LOAD, len(body), address, address,
+                                            len(data), mem_size, 0x7, 0x1000))
+        body += data
+
+    strtab = bytearray(b'\0')
+    symtab = bytearray(_SYMBOL.size)      # entry 0 is always null
+    for name, address, size, sym_type, shndx in symbols:
+        symtab += _SYMBOL.pack(len(strtab), address, size, (1 << 4) | sym_type, 0, shndx)
+        strtab += name.encode() + b'\0'
+    shstrtab = b'\0.symtab\0.strtab\0'
+
+    while len(body) % 4:
+        body.append(0)
+    symtab_offset = len(body)
+    body += symtab
+    strtab_offset = len(body)
+    body += strtab
+    shstrtab_offset = len(body)
+    body += shstrtab
+    while len(body) % 4:
+        body.append(0)
+
+    sections = [
+        _SECTION_HEADER.pack(0, 0, 0, 0, 0, 0, 0, 0, 0, 0),
+        _SECTION_HEADER.pack(1, SHT_SYMTAB, 0, 0, symtab_offset, len(symtab), 2, 1, 4, _SYMBOL.size),
+        _SECTION_HEADER.pack(9, 3, 0, 0, strtab_offset, len(strtab), 0, 0, 1, 0),
+        _SECTION_HEADER.pack(0, 3, 0, 0, shstrtab_offset, len(shstrtab), 0, 0, 1, 0),
+    ]
+    shoff = len(body)
+    body += b''.join(sections)
+
+    ident = ELF_MAGIC + bytes([ELFCLASS32, ELFDATA2LSB, 1]) + bytes(9)
+    header = _ELF_HEADER.pack(ident, ET_EXEC, EM_RISCV, 1, entry, _ELF_HEADER.size, shoff, 0,
+                              _ELF_HEADER.size, _PROGRAM_HEADER.size, len(headers),
+                              _SECTION_HEADER.size, len(sections), 3)
+    body[:len(header)] = header
+    body[len(header):len(header) + len(headers) * _PROGRAM_HEADER.size] = b''.join(headers)
+    return bytes(body)
+
+
+def create_test_elf_file(filename="test_simple.elf"):
+    """
+    Create a small ELF test program
+
+    Code at 0x10000 loads a word from .data (0x11000), adds 1 and
+    stores it at the start of .bss (0x11004), so x2 ends up 42 and
+    memory[0x11004] = 42.
+    """
+    code = [
+        0x000110B7,  # lui x1, 0x11         (x1 = 0x11000)
+        0x0000A103,  # lw x2, 0(x1)
+        0x00110113,  # addi x2, x2, 1
+        0x0020A223,  # sw x2, 4(x1)
+        0x0000006F,  # halt
+    ]
+    text = struct.pack(f'<{len(code)}I', *code)
+    data = struct.pack('<I', 41)
+
+    elf = _build_elf(0x10000,
+                     [(0x10000, text, len(text)), (0x11000, data, 0x2004)],
+                     [("_start", 0x10000, 12, STT_FUNC, 1),
+                      ("finish", 0x1000C, 8, STT_FUNC, 1),
+                      ("value", 0x11000, 4, STT_OBJECT, 2),
+                      ("buffer", 0x11004, 0x2000, STT_OBJECT, 2)])
+    with open(filename, 'wb') as f:
+        f.write(elf)
+
+    print(f"Created test file: {filename}")
+
+
+# Test
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    from memory import Memory, PagedMemory
+
+    print("Testing ELF loader...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "test_simple.elf")
+        create_test_elf_file(path)
+
+        for mem in (Memory(), PagedMemory()):
+            image = load_elf(path, mem)
+            print(f"\n{type(mem).__name__}: entry 0x{image.entry:08X} (expected 0x00010000), "
+                  f"{len(image.segments)} segments, {len(image.symbols)} symbols")
+            print(f"  0x10000: 0x{mem.read_word(0x10000):08X} (expected 0x000110B7)")
+            print(f"  0x11000: {mem.read_word(0x11000)} (expected 41)")
+            print(f"  0x10008 is {image.symbols.name_for(0x10008)} (expected _start+0x8)")
+
+    print("\nELF loader test complete!")
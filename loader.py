@@ -1,3 +1,237 @@
+"""
+Hex file loading
+
+Format: One 32-bit instruction per line, 8 hex digits. Blank lines and
+lines starting with # are skipped, values wider than 32 bits are
+truncated, and lines that aren't hex are skipped and reported.
+
+load_hex reads the whole file at once, parses it in bulk and writes it
+to memory with a single write_block. Problems come back as HexLoadError
+objects instead of being printed. load_hex_file is the original
+printing interface, now built on top of it.
+"""
+
+import array
+import re
+import sys
+
+
+# Typecode for a 4-byte unsigned array item
+_WORD_TYPECODE = 'I' if array.array('I').itemsize == 4 else 'L'
+
+# A whole comment line, found by the newline in front of it
+_COMMENT_LINE = re.compile(rb'\n[ \t]*#[^\n]*')
+
+
+class HexLoadError(Exception):
+    """
+    A problem with a hex file
+    
+    Attributes:
+        filename: File the problem is in
+        line_num: 1-based line number, or None for whole-file problems
+        line: The offending line (stripped), or None
+        reason: Short description of the problem
+    """
+    
+    def __init__(self, filename, line_num, line, reason):
+        self.filename = filename
+        self.line_num = line_num
+        self.line = line
+        self.reason = reason
+        where = f"{filename}:{line_num}" if line_num is not None else filename
+        super().__init__(f"{where}: {reason}")
+
+
+class HexImage:
+    """
+    A parsed hex file, ready to be written to memory
+    
+    Attributes:
+        filename: Where it came from
+        data: bytes of little-endian words, one per loaded line
+        count: Number of instructions
+        errors: HexLoadError for each line that was skipped as invalid
+        warnings: HexLoadError for each line truncated to 32 bits
+    """
+    
+    def __init__(self, filename, data, errors=None, warnings=None):
+        self.filename = filename
+        self.data = data
+        self.count = len(data) // 4
+        self.errors = errors or []
+        self.warnings = warnings or []
+
+
+def _words_to_bytes(words):
+    """Little-endian bytes for an array of native-order words"""
+    if sys.byteorder != 'little':
+        words.byteswap()
+    return words.tobytes()
+
+
+def _reverse_words(raw):
+    """
+    Turn the bytes bytes.fromhex gives (most significant byte first) into
+    little-endian words - reversing each group of 4 works on any host
+    """
+    words = array.array(_WORD_TYPECODE, raw)
+    words.byteswap()
+    return words.tobytes()
+
+
+def _parse_uniform(data):
+    """
+    Fast path for files that are nothing but 8 hex digits per line
+    (how generated images look). Returns little-endian bytes, or None
+    if the file doesn't have that exact layout.
+    """
+    for newline in (b'\n', b'\r\n'):
+        line_len = 8 + len(newline)
+        padded = data if data.endswith(newline) else data + newline
+        count = len(padded) // line_len
+        if len(padded) != count * line_len:
+            continue
+        # Every line has to end exactly where we expect it to
+        if padded[8::line_len] != newline[:1] * count:
+            continue
+        if len(newline) == 2 and padded[9::line_len] != b'\n' * count:
+            continue
+        
+        try:
+            raw = bytes.fromhex(padded.decode('ascii'))
+        except (UnicodeDecodeError, ValueError):
+            return None
+        # fromhex skips spaces, so a line with one in it comes up short
+        if len(raw) != count * 4:
+            return None
+        return _reverse_words(raw)
+    return None
+
+
+def _parse_filtered(data):
+    """
+    Fast path for 8-digit files with comments and blank lines mixed in.
+    Drops those with whole-buffer operations and hands the rest to
+    _parse_uniform. Returns little-endian bytes, or None if any line
+    needs the line-by-line rules.
+    """
+    if b'\r' in data:
+        data = data.replace(b'\r\n', b'\n')
+        if b'\r' in data:
+            return None     # old Mac line endings - leave them to the slow path
+    
+    data = _COMMENT_LINE.sub(b'', b'\n' + data)
+    while b'\n\n' in data:
+        data = data.replace(b'\n\n', b'\n')
+    return _parse_uniform(data[1:] if data.startswith(b'\n') else data)
+
+
+def parse_hex(data, filename='<data>'):
+    """
+    Parse the contents of a hex file
+    
+    Args:
+        data: File contents as bytes
+        filename: Name used in error reports
+    Returns:
+        HexImage
+    """
+    raw = _parse_uniform(data)
+    if raw is not None:
+        return HexImage(filename, raw)
+    
+    raw = _parse_filtered(data)
+    if raw is not None:
+        return HexImage(filename, raw)
+    
+    # Line by line - same handling as the original loader, for files with
+    # odd widths or bad lines (only this path knows line numbers)
+    text = data.decode('utf-8', errors='replace')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    
+    # Remove whitespace, skip empty lines and comments
+    lines = [(line_num, line) for line_num, line in enumerate(map(str.strip, text.split('\n')), 1)
+             if line and not line.startswith('#')]
+    
+    words = array.array(_WORD_TYPECODE)
+    errors = []
+    warnings = []
+    for line_num, line in lines:
+        try:
+            instruction = int(line, 16)
+        except ValueError:
+            errors.append(HexLoadError(filename, line_num, line, "invalid hex"))
+            continue
+        
+        # Verify it's a 32-bit value
+        if instruction > 0xFFFFFFFF:
+            warnings.append(HexLoadError(filename, line_num, line,
+                                         "value > 32 bits, truncated"))
+        words.append(instruction & 0xFFFFFFFF)
+    
+    return HexImage(filename, _words_to_bytes(words), errors, warnings)
+
+
+def read_hex_file(filename):
+    """
+    Read and parse a whole hex file
+    
+    Args:
+        filename: Path to .hex file
+    Returns:
+        HexImage
+    Raises:
+        HexLoadError: If the file can't be read
+    """
+    try:
+        with open(filename, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError as e:
+        raise HexLoadError(filename, None, None, "file not found") from e
+    except OSError as e:
+        raise HexLoadError(filename, None, None, f"can't read file ({e.strerror})") from e
+    
+    return parse_hex(data, filename)
+
+
+def load_hex(filename, memory, start_address=0x0, strict=False):
+    """
+    Load a .hex file into memory in one block
+    
+    Args:
+        filename: Path to .hex file
+        memory: Memory object to load into
+        start_address: Starting address for program (default 0x0)
+        strict: Raise the first invalid line instead of skipping it
+    Returns:
+        HexImage describing what was loaded
+    Raises:
+        HexLoadError: If the file can't be read, or strict and a line is invalid
+    """
+    image = read_hex_file(filename)
+    if strict and image.errors:
+        raise image.errors[0]
+    
+    memory.write_block(start_address, image.data)
+    return image
+
+
+def problem_messages(image):
+    """
+    The messages the line-by-line loader used to print for a HexImage
+    
+    Returns:
+        List of strings, in file order
+    """
+    problems = [(w.line_num, f"Warning: Line {w.line_num} has value > 32 bits, truncating")
+                for w in image.warnings]
+    problems += [(e.line_num, f"Error: Line {e.line_num} contains invalid hex: '{e.line}'")
+                 for e in image.errors]
+    return [message for _, message in sorted(problems)]
+
+
 def load_hex_file(filename, memory, start_address=0x0):
     """
     Load a .hex file into memory
@@ -8,6 +242,8 @@ def load_hex_file(filename, memory, start_address=0x0):
         00A00113
         002081B3
     
+    Prints problems and a summary - use load_hex to get them back instead.
+    
     Args:
         filename: Path to .hex file
         memory: Memory object to load into
@@ -16,48 +252,23 @@ def load_hex_file(filename, memory, start_address=0x0):
     Returns:
         Number of instructions loaded
     """
-    instruction_count = 0
-    current_address = start_address
-    
     try:
-        with open(filename, 'r') as f:
-            for line_num, line in enumerate(f, 1):
-                # Remove whitespace
-                line = line.strip()
-                
-                # Skip empty lines and comments
-                if not line or line.startswith('#'):
-                    continue
-                
-                # Parse hex value
-                try:
-                    # Should be exactly 8 hex digits
-                    instruction = int(line, 16)
-                    
-                    # Verify it's a 32-bit value
-                    if instruction > 0xFFFFFFFF:
-                        print(f"Warning: Line {line_num} has value > 32 bits, truncating")
-                        instruction = instruction & 0xFFFFFFFF
-                    
-                    # Store in memory
-                    memory.write_word(current_address, instruction)
-                    
-                    instruction_count += 1
-                    current_address += 4  # Move to next word
-                    
-                except ValueError:
-                    print(f"Error: Line {line_num} contains invalid hex: '{line}'")
-                    continue
-        
-        print(f"Loaded {instruction_count} instructions from {filename}")
-        return instruction_count
-        
-    except FileNotFoundError:
-        print(f"Error: File '{filename}' not found")
+        image = load_hex(filename, memory, start_address)
+    except HexLoadError as e:
+        if isinstance(e.__cause__, FileNotFoundError):
+            print(f"Error: File '{filename}' not found")
+        else:
+            print(f"Error loading file: {e}")
         return 0
     except Exception as e:
         print(f"Error loading file: {e}")
         return 0
+    
+    for message in problem_messages(image):
+        print(message)
+    
+    print(f"Loaded {image.count} instructions from {filename}")
+    return image.count
 
 
 def create_test_hex_file(filename="test_simple.hex"):
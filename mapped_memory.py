@@ -0,0 +1,285 @@
+"""
+File-backed guest memory
+
+Host files can be mapped into a PagedMemory's address space with mmap
+instead of being copied in one write_word at a time. Mapping is O(1):
+nothing is read until the guest touches a page, and then the page is
+handed to PagedMemory as a view straight into the mapping.
+
+Two modes:
+  'readonly' - writes to the region raise MemoryAccessError
+  'cow'      - copy-on-write, the first write to a page gives the
+               memory a private copy and the file on disk never changes
+
+Either way the views handed out are read-only, so the mapping itself is
+never written and stays safe to share between memory snapshots.
+
+The same mechanism is used for memory images: save_image dumps every
+non-zero page to a file and load_image maps it back in for a later run.
+"""
+
+import mmap
+import os
+import struct
+
+from memory import PagedMemory, PAGE_SHIFT, PAGE_SIZE, PAGE_MASK
+
+
+MAP_MODES = {
+    'readonly': mmap.ACCESS_READ,
+    'cow': mmap.ACCESS_COPY,
+}
+
+# Image file layout:
+#   header  - magic, version, page size, page count
+#   index   - one u32 page number per stored page, in address order
+#   padding - up to the next page boundary
+#   pages   - PAGE_SIZE bytes each, same order as the index
+IMAGE_MAGIC = b'RVMEMIMG'
+IMAGE_VERSION = 1
+_IMAGE_HEADER = struct.Struct('<8sIII')
+
+
+def _open_mapping(path, mode):
+    """mmap a whole file with the access mode for a map mode name"""
+    if mode not in MAP_MODES:
+        raise ValueError(f"Unknown map mode '{mode}', expected one of {tuple(MAP_MODES)}")
+    # A private (ACCESS_COPY) mapping only needs read access to the file.
+    # The mapping stays valid after the file is closed.
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=MAP_MODES[mode])
+
+
+class MappedRegion:
+    """
+    A byte range of a mapped file placed at a guest address
+
+    Pages the region covers completely are views into the mapping (no copy).
+    Pages it only partly covers are merged over the memory's existing
+    contents for that page, so neighbouring data survives.
+    """
+
+    def __init__(self, mapping, guest_start, file_offset, length, readonly):
+        self.mapping = mapping
+        self.view = memoryview(mapping).toreadonly()
+        self.guest_start = guest_start
+        self.guest_end = guest_start + length
+        self.file_offset = file_offset
+        self.readonly = readonly
+
+    def page_numbers(self):
+        """Every page number the region touches"""
+        return range(self.guest_start >> PAGE_SHIFT,
+                     ((self.guest_end - 1) >> PAGE_SHIFT) + 1)
+
+    def covers(self, page_num):
+        page_start = page_num << PAGE_SHIFT
+        return page_start < self.guest_end and page_start + PAGE_SIZE > self.guest_start
+
+    def fault(self, page_num):
+        """
+        Get a page the region covers completely
+
+        Returns:
+            memoryview of PAGE_SIZE bytes, or None if not completely covered
+        """
+        page_start = page_num << PAGE_SHIFT
+        if page_start < self.guest_start or page_start + PAGE_SIZE > self.guest_end:
+            return None
+        # Whole page lives in the file - hand out a view, no copy
+        src = self.file_offset + (page_start - self.guest_start)
+        return self.view[src:src + PAGE_SIZE]
+
+    def merge(self, page_num, page):
+        """Copy the region's part of a page into a bytearray page"""
+        page_start = page_num << PAGE_SHIFT
+        start = max(page_start, self.guest_start)
+        end = min(page_start + PAGE_SIZE, self.guest_end)
+        src = self.file_offset + (start - self.guest_start)
+        page[start - page_start:end - page_start] = self.view[src:src + (end - start)]
+
+    def overlaps(self, address, num_bytes):
+        """Whether the region holds any of num_bytes bytes at address"""
+        return address < self.guest_end and address + num_bytes > self.guest_start
+
+
+class ImageRegion:
+    """Pages of a memory image file, looked up through its page index"""
+
+    def __init__(self, mapping, page_offsets, readonly):
+        self.mapping = mapping
+        self.view = memoryview(mapping).toreadonly()
+        self.page_offsets = page_offsets    # page number -> file offset
+        self.readonly = readonly
+
+    def page_numbers(self):
+        return self.page_offsets.keys()
+
+    def covers(self, page_num):
+        return page_num in self.page_offsets
+
+    def fault(self, page_num):
+        offset = self.page_offsets.get(page_num)
+        if offset is None:
+            return None
+        return self.view[offset:offset + PAGE_SIZE]
+
+    def merge(self, page_num, page):
+        # Image pages are always whole, fault() never says no to a covered one
+        page[:] = self.fault(page_num)
+
+    def overlaps(self, address, num_bytes):
+        # Whole pages, so any byte of a covered page
+        return (address >> PAGE_SHIFT) in self.page_offsets
+
+
+def map_file(memory, address, path, offset=0, length=None, mode='cow'):
+    """
+    Map part of a host file into guest memory
+
+    Args:
+        memory: PagedMemory to map into
+        address: Guest address of the first mapped byte
+        path: Host file to map
+        offset: Byte offset in the file to start from
+        length: Number of bytes to map (default: rest of the file)
+        mode: 'cow' (private writes) or 'readonly'
+    Returns:
+        The MappedRegion that was added
+    """
+    file_size = os.path.getsize(path)
+    if length is None:
+        length = file_size - offset
+    if offset < 0 or length < 0 or offset + length > file_size:
+        raise ValueError(f"Range {offset}+{length} is outside '{path}' ({file_size} bytes)")
+    if address + length > memory.size:
+        raise ValueError(f"Mapping 0x{address:08X}+{length} doesn't fit in guest memory")
+    if length == 0:
+        return None
+
+    region = MappedRegion(_open_mapping(path, mode), address, offset, length,
+                          readonly=(mode == 'readonly'))
+    memory.add_region(region)
+    return region
+
+
+def save_image(memory, path):
+    """
+    Dump guest memory to an image file that load_image can map back
+
+    Works with any backend that has nonzero_words(); PagedMemory pages
+    are written directly. Only pages with non-zero bytes are stored.
+
+    Args:
+        memory: Memory or PagedMemory
+        path: Image file to write
+    Returns:
+        Number of pages written
+    """
+    if isinstance(memory, PagedMemory):
+        pages = {}
+        for page_num in memory.page_numbers():
+            page = memory.page_view(page_num)
+            if page is not None and any(page):
+                pages[page_num] = page
+    else:
+        pages = {}
+        for address, value in memory.nonzero_words():
+            page = pages.get(address >> PAGE_SHIFT)
+            if page is None:
+                page = pages[address >> PAGE_SHIFT] = bytearray(PAGE_SIZE)
+            struct.pack_into('<I', page, address & PAGE_MASK, value)
+
+    page_nums = sorted(pages)
+    header = _IMAGE_HEADER.pack(IMAGE_MAGIC, IMAGE_VERSION, PAGE_SIZE, len(page_nums))
+    index = struct.pack(f'<{len(page_nums)}I', *page_nums)
+    data_start = -(-(len(header) + len(index)) // PAGE_SIZE) * PAGE_SIZE
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(index)
+        f.write(b'\0' * (data_start - len(header) - len(index)))
+        for page_num in page_nums:
+            f.write(pages[page_num])
+
+    return len(page_nums)
+
+
+def map_image(memory, path, mode='cow'):
+    """
+    Map a memory image written by save_image into a PagedMemory
+
+    Only the page index is read up front - page contents fault in
+    when the guest touches them.
+
+    Args:
+        memory: PagedMemory to map into
+        path: Image file
+        mode: 'cow' (private writes) or 'readonly'
+    Returns:
+        The ImageRegion that was added
+    """
+    mapping = _open_mapping(path, mode)
+    if len(mapping) < _IMAGE_HEADER.size:
+        raise ValueError(f"'{path}' is too small to be a memory image")
+
+    magic, version, page_size, count = _IMAGE_HEADER.unpack_from(mapping, 0)
+    if magic != IMAGE_MAGIC:
+        raise ValueError(f"'{path}' is not a memory image")
+    if version != IMAGE_VERSION or page_size != PAGE_SIZE:
+        raise ValueError(f"'{path}' has unsupported version {version} / page size {page_size}")
+
+    page_nums = struct.unpack_from(f'<{count}I', mapping, _IMAGE_HEADER.size)
+    data_start = -(-(_IMAGE_HEADER.size + 4 * count) // PAGE_SIZE) * PAGE_SIZE
+    if data_start + count * PAGE_SIZE > len(mapping):
+        raise ValueError(f"'{path}' is truncated")
+
+    offsets = {page_num: data_start + i * PAGE_SIZE for i, page_num in enumerate(page_nums)}
+    region = ImageRegion(mapping, offsets, readonly=(mode == 'readonly'))
+    memory.add_region(region)
+    return region
+
+
+def load_image(path, mode='cow', size=0x100000000):
+    """
+    Create a PagedMemory backed by a memory image
+
+    Args:
+        path: Image file written by save_image
+        mode: 'cow' (private writes) or 'readonly'
+        size: Guest memory size
+    Returns:
+        PagedMemory
+    """
+    memory = PagedMemory(size=size)
+    map_image(memory, path, mode)
+    return memory
+
+
+# Test
+if __name__ == "__main__":
+    import tempfile
+
+    print("Testing mapped memory...")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "table.bin")
+        with open(data_path, 'wb') as f:
+            f.write(struct.pack('<4I', 0x11111111, 0x22222222, 0x33333333, 0x44444444))
+
+        mem = PagedMemory()
+        map_file(mem, 0x10000, data_path)
+        print(f"Word at 0x10004 = 0x{mem.read_word(0x10004):08X} (expected 0x22222222)")
+
+        mem.write_word(0x10004, 0xABCDABCD)
+        with open(data_path, 'rb') as f:
+            on_disk = struct.unpack('<4I', f.read())[1]
+        print(f"After write: 0x{mem.read_word(0x10004):08X}, file still has 0x{on_disk:08X}")
+
+        image_path = os.path.join(tmp, "snap.img")
+        pages = save_image(mem, image_path)
+        restored = load_image(image_path)
+        print(f"Saved {pages} page(s); restored word at 0x10004 = "
+              f"0x{restored.read_word(0x10004):08X} (expected 0xABCDABCD)")
+
+    print("\nMapped memory test complete!")
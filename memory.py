@@ -1,3 +1,15 @@
+import struct
+import sys
+
+
+class MemoryAccessError(Exception):
+    """Raised for an access outside the memory size"""
+    
+    def __init__(self, address, message=None):
+        self.address = address
+        super().__init__(message or f"Memory access out of range at 0x{address:08X}")
+
+
 class Memory:
     """
     Simple memory system using dictionary for sparse storage
@@ -12,6 +24,24 @@ class Memory:
         """
         self.data = {}  # Dictionary for sparse storage
         self.size = size
+        
+        # Callbacks run after every write as hook(address, num_bytes)
+        # The CPU's predecode cache uses this to notice self-modifying code
+        self.write_hooks = []
+    
+    def add_write_hook(self, hook):
+        """
+        Register a function to be called after each write
+        
+        Args:
+            hook: Callable taking (address, num_bytes)
+        """
+        self.write_hooks.append(hook)
+    
+    def remove_write_hook(self, hook):
+        """Stop calling a previously registered write hook"""
+        if hook in self.write_hooks:
+            self.write_hooks.remove(hook)
     
     def read_word(self, address):
         """
@@ -41,6 +71,10 @@ class Memory:
         
         # Store as 32-bit value
         self.data[address] = value & 0xFFFFFFFF
+        
+        if self.write_hooks:
+            for hook in self.write_hooks:
+                hook(address, 4)
     
     def read_byte(self, address):
         """
@@ -81,10 +115,683 @@ class Memory:
         word = (word & ~mask) | ((value & 0xFF) << (byte_offset * 8))
         
         self.data[word_addr] = word
+        
+        if self.write_hooks:
+            for hook in self.write_hooks:
+                hook(address, 1)
+    
+    def read_block(self, address, num_bytes):
+        """
+        Read a run of bytes from memory
+        
+        Args:
+            address: Byte address of the first byte
+            num_bytes: Number of bytes to read
+        Returns:
+            bytes (guest byte order, little-endian words)
+        """
+        if address & 3 or num_bytes & 3:
+            return bytes(self.read_byte(address + i) for i in range(num_bytes))
+        
+        get = self.data.get
+        return struct.pack(f'<{num_bytes >> 2}I',
+                           *[get(a, 0) for a in range(address, address + num_bytes, 4)])
+    
+    def write_block(self, address, data):
+        """
+        Write a run of bytes to memory in one go
+        Write hooks are called once for the whole block
+        
+        Args:
+            address: Byte address of the first byte
+            data: bytes-like object (little-endian words)
+        """
+        num_bytes = len(data)
+        if address & 3 or num_bytes & 3:
+            for i, value in enumerate(bytes(data)):
+                self.write_byte(address + i, value)
+            return
+        
+        values = struct.unpack(f'<{num_bytes >> 2}I', data)
+        self.data.update(zip(range(address, address + num_bytes, 4), values))
+        
+        if self.write_hooks and num_bytes:
+            for hook in self.write_hooks:
+                hook(address, num_bytes)
+    
+    def zero_block(self, address, num_bytes):
+        """
+        Set a range of bytes to zero (like .bss)
+        Write hooks are called once for the whole range
+        
+        Args:
+            address: Byte address of the first byte
+            num_bytes: Number of bytes
+        """
+        end = address + num_bytes
+        # Partial words at either end go byte by byte
+        while address < end and address & 3:
+            self.write_byte(address, 0)
+            address += 1
+        while end > address and end & 3:
+            end -= 1
+            self.write_byte(end, 0)
+        if address >= end:
+            return
+        
+        # Zero words are the same as missing ones - drop whichever is fewer to visit
+        data = self.data
+        if (end - address) >> 2 < len(data):
+            for word_addr in range(address, end, 4):
+                data.pop(word_addr, None)
+        else:
+            for word_addr in [a for a in data if address <= a < end]:
+                del data[word_addr]
+        
+        if self.write_hooks:
+            for hook in self.write_hooks:
+                hook(address, end - address)
     
     def clear(self):
         """Clear all memory"""
         self.data = {}
+        
+        # Everything is gone, so anyone caching memory contents has to drop it all
+        for hook in self.write_hooks:
+            hook(0, 0x100000000)
+    
+    def snapshot(self):
+        """
+        Capture the current contents
+        
+        The dict backend has no pages to share, so this copies the dict
+        (values are plain ints, so a shallow copy is complete). Use
+        PagedMemory when big guests need cheap checkpoints.
+        
+        Returns:
+            MemorySnapshot
+        """
+        return MemorySnapshot(self.size, words=dict(self.data))
+    
+    def restore(self, snapshot):
+        """
+        Put memory back to a snapshot (from either backend)
+        The snapshot itself is left untouched and can be restored again
+        """
+        self.data = dict(snapshot.word_table())
+        for hook in self.write_hooks:
+            hook(0, 0x100000000)
+    
+    def nonzero_words(self):
+        """
+        Get every non-zero word in address order
+        
+        Returns:
+            List of (address, value) tuples
+        """
+        return [(addr, self.data[addr]) for addr in sorted(self.data)
+                if self.data[addr] != 0]
+    
+    def dump(self, start_addr, num_words):
+        """
+        Dump memory contents
+        
+        Args:
+            start_addr: Starting address
+            num_words: Number of words to display
+        """
+        print(f"\n=== Memory Dump (0x{start_addr:08X}) ===")
+        for i in range(num_words):
+            addr = start_addr + (i * 4)
+            value = self.read_word(addr)
+            if value != 0:  # Only show non-zero values
+                print(f"[0x{addr:08X}] = 0x{value:08X}")
+
+
+PAGE_SHIFT = 12
+PAGE_SIZE = 1 << PAGE_SHIFT        # 4 KiB
+PAGE_MASK = PAGE_SIZE - 1
+
+_WORD = struct.Struct('<I')
+
+
+class MemorySnapshot:
+    """
+    Frozen memory contents, from Memory.snapshot or PagedMemory.snapshot
+    
+    A PagedMemory snapshot holds read-only pages that the memory it came
+    from (and anything restored from it) shares until they're written, so
+    taking one only copies pages changed since the last snapshot.
+    
+    Attributes:
+        size: Size of the memory it was taken from
+        pages: page number -> read-only memoryview (PagedMemory), or None
+        words: word address -> value (dict Memory), or None
+        regions: PagedMemory regions still to be faulted in
+        word_pages: The pages already cast to words (PagedMemory), so a
+                    restore doesn't have to redo it, or None
+    """
+    
+    def __init__(self, size, pages=None, words=None, regions=(), word_pages=None):
+        self.size = size
+        self.pages = pages
+        self.words = words
+        self.regions = tuple(regions)
+        self.word_pages = word_pages
+    
+    def page_table(self):
+        """Contents as page number -> read-only page bytes"""
+        if self.pages is not None:
+            return self.pages
+        pages = {}
+        for address, value in self.words.items():
+            page = pages.get(address >> PAGE_SHIFT)
+            if page is None:
+                page = pages[address >> PAGE_SHIFT] = bytearray(PAGE_SIZE)
+            _WORD.pack_into(page, address & PAGE_MASK, value)
+        return {page_num: memoryview(bytes(page)) for page_num, page in pages.items()}
+    
+    def word_table(self):
+        """Contents as word address -> value (missing words are zero)"""
+        if self.words is not None:
+            return self.words
+        memory = PagedMemory(self.size)
+        memory.restore(self)
+        return dict(memory.nonzero_words())
+
+
+class ZeroRegion:
+    """
+    A PagedMemory region that reads as zero - used for .bss so big
+    zero-filled areas cost nothing until they're touched
+    """
+    
+    readonly = False
+    
+    def __init__(self, address, num_bytes):
+        self.start = address
+        self.end = address + num_bytes
+    
+    def page_numbers(self):
+        return range(self.start >> PAGE_SHIFT, ((self.end - 1) >> PAGE_SHIFT) + 1)
+    
+    def covers(self, page_num):
+        page_start = page_num << PAGE_SHIFT
+        return page_start < self.end and page_start + PAGE_SIZE > self.start
+    
+    def fault(self, page_num):
+        """A fresh zero page if the region covers all of it, otherwise None"""
+        page_start = page_num << PAGE_SHIFT
+        if page_start >= self.start and page_start + PAGE_SIZE <= self.end:
+            return memoryview(bytearray(PAGE_SIZE))
+        return None
+    
+    def merge(self, page_num, page):
+        """Zero the part of a page the region covers"""
+        page_start = page_num << PAGE_SHIFT
+        start = max(self.start, page_start) - page_start
+        end = min(self.end, page_start + PAGE_SIZE) - page_start
+        page[start:end] = bytes(end - start)
+    
+    def overlaps(self, address, num_bytes):
+        """Whether the region holds any of num_bytes bytes at address"""
+        return address < self.end and address + num_bytes > self.start
+
+
+class PagedMemory:
+    """
+    Memory backed by lazily allocated 4 KiB bytearray pages
+    
+    Same interface as Memory, but a touched word costs 4 bytes instead of
+    a dict entry plus a Python int (~100 bytes). Pages only exist once
+    something is written to them - reading an untouched page returns 0.
+    Covers the full 32-bit address space unless a smaller size is given.
+    
+    Regions (see mapped_memory.py) can supply page contents from files.
+    Their pages are faulted in the first time they're touched.
+    """
+    
+    def __init__(self, size=0x100000000):  # full 32-bit space by default
+        """
+        Initialize memory
+        Args:
+            size: Memory size in bytes - accesses at or above it raise
+                  MemoryAccessError
+        """
+        if size > 0x100000000:
+            raise ValueError("PagedMemory size can't be more than 4 GiB")
+        self.size = size
+        
+        # page number -> memoryview of the page's bytes
+        self.byte_pages = {}
+        # page number -> the same page cast to 32-bit words (host order)
+        self.word_pages = {}
+        
+        # Callbacks run after every write as hook(address, num_bytes)
+        self.write_hooks = []
+        
+        # File-backed regions that haven't necessarily been faulted in yet
+        # Later regions win where they overlap
+        self.regions = []
+        
+        # Pages installed since the last snapshot - the only ones that can
+        # be writable, so the only ones a snapshot has to freeze
+        self.dirty_pages = set()
+    
+    def add_write_hook(self, hook):
+        """
+        Register a function to be called after each write
+        
+        Args:
+            hook: Callable taking (address, num_bytes)
+        """
+        self.write_hooks.append(hook)
+    
+    def remove_write_hook(self, hook):
+        """Stop calling a previously registered write hook"""
+        if hook in self.write_hooks:
+            self.write_hooks.remove(hook)
+    
+    def add_region(self, region):
+        """
+        Add a region whose contents are faulted in lazily - a mapped file
+        (see mapped_memory.py) or a ZeroRegion
+        
+        Pages the region covers completely replace whatever was there and
+        fault in the next time they're touched. Pages it only partly covers
+        keep the bytes outside the region.
+        
+        Args:
+            region: Object with page_numbers(), covers(page_num),
+                    fault(page_num) (whole pages), merge(page_num, page)
+                    and overlaps(address, num_bytes)
+        """
+        self.regions.append(region)
+        
+        page_nums = list(region.page_numbers())
+        for page_num in page_nums:
+            page = self.byte_pages.pop(page_num, None)
+            if page is None:
+                continue
+            del self.word_pages[page_num]
+            if region.fault(page_num) is None:
+                # Only partly covered - lay the region over what's there now
+                merged = bytearray(page)
+                region.merge(page_num, merged)
+                self._install(page_num, self._freeze(page_num, merged))
+        
+        # Anything caching the old contents has to forget it
+        if page_nums and self.write_hooks:
+            first = min(page_nums)
+            span = (max(page_nums) - first + 1) << PAGE_SHIFT
+            for hook in self.write_hooks:
+                hook(first << PAGE_SHIFT, span)
+    
+    def zero_block(self, address, num_bytes):
+        """
+        Make a range read as zero (like .bss) without touching its pages
+        now - they're zero-filled the first time they're used
+        
+        Args:
+            address: Byte address of the first byte
+            num_bytes: Number of bytes
+        """
+        if address + num_bytes > self.size:
+            raise MemoryAccessError(address, f"Block 0x{address:08X}+{num_bytes} runs past the end of memory")
+        if num_bytes > 0:
+            self.add_region(ZeroRegion(address, num_bytes))
+    
+    def _install(self, page_num, page):
+        """Put a page (memoryview of PAGE_SIZE bytes) in the page table"""
+        words = page.cast('I')
+        self.byte_pages[page_num] = page
+        self.word_pages[page_num] = words
+        self.dirty_pages.add(page_num)
+        return words
+    
+    def _allocate(self, page_num):
+        """
+        Get a page for writing, faulting it in from a region if one covers it,
+        otherwise creating a zeroed page. Returns its word view
+        """
+        if self.regions:
+            words = self._fault(page_num)
+            if words is not None:
+                return words
+        return self._install(page_num, memoryview(bytearray(PAGE_SIZE)))
+    
+    def _fault(self, page_num):
+        """Bring in a page from the regions covering it, or return None"""
+        page = self._compose(page_num, len(self.regions))
+        if page is None:
+            return None
+        return self._install(page_num, page)
+    
+    def _compose(self, page_num, top):
+        """
+        Build a page from regions[:top], newest first. A region covering
+        the whole page supplies it directly; one covering part of it is
+        laid over whatever the older regions give.
+        
+        Returns:
+            memoryview of PAGE_SIZE bytes, or None if no region covers it
+        """
+        for index in range(top - 1, -1, -1):
+            region = self.regions[index]
+            if not region.covers(page_num):
+                continue
+            page = region.fault(page_num)
+            if page is not None:
+                return page
+            
+            below = self._compose(page_num, index)
+            merged = bytearray(PAGE_SIZE) if below is None else bytearray(below)
+            region.merge(page_num, merged)
+            return self._freeze(page_num, merged)
+        return None
+    
+    def _freeze(self, page_num, page):
+        """
+        View of a bytearray page, read-only if a read-only region covers
+        any of it - writes to such a page all go through _copy_on_write,
+        which checks them against the regions
+        """
+        for region in self.regions:
+            if region.readonly and region.covers(page_num):
+                return memoryview(bytes(page))
+        return memoryview(page)
+    
+    def _readonly_error(self, address):
+        return MemoryAccessError(address, f"Write to read-only memory at 0x{address:08X}")
+    
+    def _copy_on_write(self, address, data):
+        """
+        Write data to a read-only page by giving it a private copy
+        
+        Called when a write hits a read-only page. Pages shared with a
+        snapshot or straight from a copy-on-write mapping get copied;
+        bytes from a 'readonly' region really are read-only. A page that
+        region only partly covers stays read-only after the copy, so every
+        write to it is checked here.
+        
+        Args:
+            address: Byte address of the first byte
+            data: bytes-like object, all within the page
+        Raises:
+            MemoryAccessError if any byte belongs to a read-only region
+        """
+        page_num = address >> PAGE_SHIFT
+        num_bytes = len(data)
+        # The newest region holding a byte is the one that supplied it
+        for region in reversed(self.regions):
+            if region.covers(page_num) and region.overlaps(address, num_bytes):
+                if region.readonly:
+                    raise self._readonly_error(address) from None
+                break
+        page = bytearray(self.byte_pages[page_num])
+        offset = address & PAGE_MASK
+        page[offset:offset + num_bytes] = data
+        self._install(page_num, self._freeze(page_num, page))
+    
+    def read_word(self, address):
+        """
+        Read a 32-bit word from memory
+        
+        Args:
+            address: Byte address (should be word-aligned)
+        Returns:
+            32-bit value
+        """
+        # Word-align the address
+        address = address & 0xFFFFFFFC
+        if address >= self.size:
+            raise MemoryAccessError(address)
+        
+        # Literal shifts/masks here - this is the hottest path in the simulator
+        words = self.word_pages.get(address >> 12)
+        if words is None:
+            if not self.regions:
+                return 0
+            words = self._fault(address >> 12)
+            if words is None:
+                return 0
+        return words[(address & 0xFFF) >> 2]
+    
+    def write_word(self, address, value):
+        """
+        Write a 32-bit word to memory
+        
+        Args:
+            address: Byte address (should be word-aligned)
+            value: 32-bit value to write
+        """
+        # Word-align the address
+        address = address & 0xFFFFFFFC
+        if address >= self.size:
+            raise MemoryAccessError(address)
+        
+        words = self.word_pages.get(address >> 12)
+        if words is None:
+            words = self._allocate(address >> 12)
+        try:
+            words[(address & 0xFFF) >> 2] = value & 0xFFFFFFFF
+        except TypeError:
+            # Shared page (snapshot or mapped file) - take a private copy
+            self._copy_on_write(address, _WORD.pack(value & 0xFFFFFFFF))
+        
+        if self.write_hooks:
+            for hook in self.write_hooks:
+                hook(address, 4)
+    
+    def read_byte(self, address):
+        """
+        Read a single byte from memory
+        
+        Args:
+            address: Byte address
+        Returns:
+            8-bit value
+        """
+        if address >= self.size:
+            raise MemoryAccessError(address)
+        
+        page = self.byte_pages.get(address >> PAGE_SHIFT)
+        if page is None:
+            if not self.regions or self._fault(address >> PAGE_SHIFT) is None:
+                return 0
+            page = self.byte_pages[address >> PAGE_SHIFT]
+        return page[address & PAGE_MASK]
+    
+    def write_byte(self, address, value):
+        """
+        Write a single byte to memory
+        
+        Args:
+            address: Byte address
+            value: 8-bit value to write
+        """
+        if address >= self.size:
+            raise MemoryAccessError(address)
+        
+        page_num = address >> PAGE_SHIFT
+        page = self.byte_pages.get(page_num)
+        if page is None:
+            self._allocate(page_num)
+            page = self.byte_pages[page_num]
+        try:
+            page[address & PAGE_MASK] = value & 0xFF
+        except TypeError:
+            self._copy_on_write(address, bytes((value & 0xFF,)))
+        
+        if self.write_hooks:
+            for hook in self.write_hooks:
+                hook(address, 1)
+    
+    def read_block(self, address, num_bytes):
+        """
+        Read a run of bytes from memory
+        
+        Args:
+            address: Byte address of the first byte
+            num_bytes: Number of bytes to read
+        Returns:
+            bytes (guest byte order, little-endian words)
+        """
+        if address + num_bytes > self.size:
+            raise MemoryAccessError(address, f"Block 0x{address:08X}+{num_bytes} runs past the end of memory")
+        
+        result = bytearray(num_bytes)
+        done = 0
+        while done < num_bytes:
+            offset = (address + done) & PAGE_MASK
+            chunk = min(PAGE_SIZE - offset, num_bytes - done)
+            page = self.page_view((address + done) >> PAGE_SHIFT)
+            if page is not None:
+                result[done:done + chunk] = page[offset:offset + chunk]
+            done += chunk
+        return bytes(result)
+    
+    def write_block(self, address, data):
+        """
+        Write a run of bytes to memory in one go, a page at a time
+        Write hooks are called once for the whole block
+        
+        Args:
+            address: Byte address of the first byte
+            data: bytes-like object (little-endian words)
+        """
+        data = memoryview(data).cast('B')
+        num_bytes = len(data)
+        if address + num_bytes > self.size:
+            raise MemoryAccessError(address, f"Block 0x{address:08X}+{num_bytes} runs past the end of memory")
+        
+        done = 0
+        while done < num_bytes:
+            page_num = (address + done) >> PAGE_SHIFT
+            offset = (address + done) & PAGE_MASK
+            chunk = min(PAGE_SIZE - offset, num_bytes - done)
+            page = self.byte_pages.get(page_num)
+            if page is None:
+                self._allocate(page_num)
+                page = self.byte_pages[page_num]
+            try:
+                page[offset:offset + chunk] = data[done:done + chunk]
+            except TypeError:
+                self._copy_on_write(address + done, data[done:done + chunk])
+            done += chunk
+        
+        if self.write_hooks and num_bytes:
+            for hook in self.write_hooks:
+                hook(address, num_bytes)
+    
+    def clear(self):
+        """Clear all memory (mapped regions are dropped too)"""
+        self.byte_pages.clear()
+        self.word_pages.clear()
+        self.regions = []
+        
+        for hook in self.write_hooks:
+            hook(0, 0x100000000)
+    
+    def page_count(self):
+        """Number of pages allocated or faulted in so far"""
+        return len(self.byte_pages)
+    
+    def snapshot(self):
+        """
+        Capture the current contents without copying the whole memory
+        
+        Pages written since the last snapshot are frozen into read-only
+        copies, which this memory then shares with the snapshot - the next
+        write to one copies it again. Unchanged pages are shared as they
+        are, so only dirty pages are copied, never the whole memory.
+        
+        Returns:
+            MemorySnapshot
+        """
+        byte_pages = self.byte_pages
+        for page_num in self.dirty_pages:
+            page = byte_pages.get(page_num)
+            if page is not None and not page.readonly:
+                page = memoryview(bytes(page))
+                byte_pages[page_num] = page
+                self.word_pages[page_num] = page.cast('I')
+        self.dirty_pages.clear()
+        return MemorySnapshot(self.size, pages=dict(byte_pages), regions=self.regions,
+                              word_pages=dict(self.word_pages))
+    
+    def restore(self, snapshot):
+        """
+        Put memory back to a snapshot (from either backend)
+        
+        Pages are shared with the snapshot, not copied, and it can be
+        restored again later. Write hooks only hear about pages that are
+        actually different, so cached code for untouched pages survives.
+        """
+        old_pages = self.byte_pages
+        new_pages = snapshot.page_table()
+        regions_changed = list(snapshot.regions) != self.regions
+        
+        self.byte_pages = dict(new_pages)
+        if snapshot.word_pages is not None:
+            self.word_pages = dict(snapshot.word_pages)
+        else:
+            self.word_pages = {page_num: page.cast('I') for page_num, page in new_pages.items()}
+        self.regions = list(snapshot.regions)
+        self.dirty_pages.clear()
+        
+        if not self.write_hooks:
+            return
+        if regions_changed:
+            changed = [(0, 0x100000000)]
+        else:
+            changed = [(page_num << PAGE_SHIFT, PAGE_SIZE)
+                       for page_num in old_pages.keys() | new_pages.keys()
+                       if old_pages.get(page_num) is not new_pages.get(page_num)]
+        for hook in self.write_hooks:
+            for address, num_bytes in changed:
+                hook(address, num_bytes)
+    
+    def page_numbers(self):
+        """
+        Every page number with contents, including mapped pages that
+        haven't been faulted in yet, in address order
+        """
+        page_nums = set(self.byte_pages)
+        for region in self.regions:
+            page_nums.update(region.page_numbers())
+        return sorted(page_nums)
+    
+    def page_view(self, page_num):
+        """
+        Get a page's bytes without faulting it into the page table
+        
+        Returns:
+            memoryview of PAGE_SIZE bytes, or None if the page is all zero
+        """
+        page = self.byte_pages.get(page_num)
+        if page is not None:
+            return page
+        return self._compose(page_num, len(self.regions))
+    
+    def nonzero_words(self):
+        """
+        Get every non-zero word in address order
+        
+        Returns:
+            List of (address, value) tuples
+        """
+        result = []
+        for page_num in self.page_numbers():
+            page = self.page_view(page_num)
+            # Skip untouched (all zero) pages quickly
+            if page is None or not any(page):
+                continue
+            base = page_num << PAGE_SHIFT
+            for i, (value,) in enumerate(_WORD.iter_unpack(page)):
+                if value != 0:
+                    result.append((base + i * 4, value))
+        return result
     
     def dump(self, start_addr, num_words):
         """
@@ -102,6 +809,61 @@ class Memory:
                 print(f"[0x{addr:08X}] = 0x{value:08X}")
 
 
+if sys.byteorder != 'little':
+    # The word views use host byte order, guest memory is little-endian.
+    # On a big-endian host go through struct instead.
+    def _read_word_struct(self, address):
+        address = address & 0xFFFFFFFC
+        if address >= self.size:
+            raise MemoryAccessError(address)
+        page = self.byte_pages.get(address >> PAGE_SHIFT)
+        if page is None:
+            if not self.regions or self._fault(address >> PAGE_SHIFT) is None:
+                return 0
+            page = self.byte_pages[address >> PAGE_SHIFT]
+        return _WORD.unpack_from(page, address & PAGE_MASK)[0]
+    
+    def _write_word_struct(self, address, value):
+        address = address & 0xFFFFFFFC
+        if address >= self.size:
+            raise MemoryAccessError(address)
+        page_num = address >> PAGE_SHIFT
+        if page_num not in self.byte_pages:
+            self._allocate(page_num)
+        try:
+            _WORD.pack_into(self.byte_pages[page_num], address & PAGE_MASK, value & 0xFFFFFFFF)
+        except TypeError:
+            self._copy_on_write(address, _WORD.pack(value & 0xFFFFFFFF))
+        if self.write_hooks:
+            for hook in self.write_hooks:
+                hook(address, 4)
+    
+    PagedMemory.read_word = _read_word_struct
+    PagedMemory.write_word = _write_word_struct
+
+
+# Backend name -> class, for picking one per CPU
+MEMORY_BACKENDS = {
+    'dict': Memory,
+    'paged': PagedMemory,
+}
+
+
+def make_memory(backend='dict', **kwargs):
+    """
+    Create a memory object by backend name
+    
+    Args:
+        backend: 'dict' or 'paged'
+        kwargs: Passed on to the backend (like size)
+    Returns:
+        Memory or PagedMemory
+    """
+    if backend not in MEMORY_BACKENDS:
+        raise ValueError(f"Unknown memory backend '{backend}', expected one of {tuple(MEMORY_BACKENDS)}")
+    return MEMORY_BACKENDS[backend](**kwargs)
+
+
 # Test
 if __name__ == "__main__":
     print("Testing Memory module...")
@@ -126,4 +888,22 @@ if __name__ == "__main__":
     value = mem.read_word(0x2000)
     print(f"Word at 0x2000 = 0x{value:08X} (expected 0x12EFCDAB - little endian)")
     
+    # Same checks on the paged backend
+    paged = PagedMemory()
+    paged.write_byte(0x2000, 0xAB)
+    paged.write_byte(0x2001, 0xCD)
+    paged.write_byte(0x2002, 0xEF)
+    paged.write_byte(0x2003, 0x12)
+    value = paged.read_word(0x2000)
+    print(f"Paged word at 0x2000 = 0x{value:08X} (expected 0x12EFCDAB)")
+    paged.write_word(0xFFFFFFFC, 0xDEADBEEF)
+    print(f"Paged word at 0xFFFFFFFC = 0x{paged.read_word(0xFFFFFFFC):08X} (expected 0xDEADBEEF)")
+    
+    # Block access, straddling a page boundary
+    block = struct.pack('<3I', 0x11111111, 0x22222222, 0x33333333)
+    for m in (mem, paged):
+        m.write_block(0x2FFC, block)
+        print(f"{type(m).__name__} block at 0x2FFC: {m.read_block(0x2FFC, 12).hex()} "
+              f"(expected {block.hex()})")
+    
     print("\nMemory test complete!")
\ No newline at end of file
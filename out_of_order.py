@@ -0,0 +1,675 @@
+"""
+Out-of-order timing model - how a wider, out-of-order core would run it
+
+Like PipelineModel, this doesn't execute anything: it watches the
+instructions the functional CPU runs (as a reporter, or from a recorded
+trace) and works out when each one would be fetched, dispatched, issued,
+completed and committed on a superscalar core with register renaming:
+
+    model = OutOfOrderModel(OutOfOrderConfig(fetch_width=4, rob_size=64))
+    cpu.simulate(max_cycles=10**6, reporter=model)
+    print(model.report())           # IPC, ROB occupancy, stalls by cause
+
+The core, one instruction at a time in program order (cycles from 0):
+  fetch      up to fetch_width a cycle; a taken branch or jump ends the
+             group. A mispredicted one (by a branch_predictor unit) stops
+             fetch until it has executed, and the right path is fetched
+             the cycle its result is ready.
+  dispatch   (rename) frontend_depth cycles after fetch, in order, up to
+             fetch_width a cycle. Needs a ROB entry, a reservation
+             station and, if it writes a register, a free physical
+             register. A physical register is freed when the next writer
+             of the same architectural register commits.
+  issue      the cycle after dispatch at the earliest, once its sources
+             are ready, oldest first, up to issue_width a cycle and one
+             per functional unit a cycle (units are pipelined). A load
+             also waits for the last store to the same word, whose data
+             it gets forwarded (memory dependences are known exactly).
+  complete   issue + the latency of its ALU operation (the ops in
+             ALU.execute; branches compare with SUB or SLT, addresses
+             add with ADD), plus load_latency for loads. Dependents can
+             issue that cycle.
+  commit     in order, from the cycle it completes, up to fetch_width a
+             cycle. Its ROB entry, and the physical register it made
+             stale, are free from the next cycle.
+
+Because issue is oldest first, a younger instruction never delays an
+older one, so each instruction can be timed completely as it arrives.
+Only the prediction of a branch waits for the next pc.
+
+Stall cycles are counted per instruction: how much later than it could
+have it dispatched (rob, reservation, registers, or width when the cycle
+was full) and how long after dispatch + 1 it issued (operands, memory,
+then a cycle each for unit or width when that was what was full).
+
+Command line: python out_of_order.py PROGRAM [--max-cycles N] [--fetch-width N]
+                  [--issue-width N] [--rob N] [--rs N] [--registers N]
+                  [--predictor SPEC|perfect] [--json]
+"""
+
+import heapq
+from collections import deque
+
+from alu import OPERATIONS
+from branch_predictor import JAL, JALR, control_transfer, parse_unit
+from decoder import InstructionDecoder
+
+
+UNITS = ('alu', 'branch', 'memory')
+
+DISPATCH_STALLS = ('rob', 'reservation', 'registers', 'width')
+ISSUE_STALLS = ('operands', 'memory', 'unit', 'width')
+
+# Memory access kinds
+_LOAD, _STORE = 1, 2
+
+_MASK = 0xFFFFFFFF
+
+# Mnemonic -> the ALU operation it takes its latency from
+_ALU_OP = {
+    'ADD': 'ADD', 'ADDI': 'ADD', 'LUI': 'ADD', 'AUIPC': 'ADD', 'SUB': 'SUB',
+    'AND': 'AND', 'ANDI': 'AND', 'OR': 'OR', 'ORI': 'OR', 'XOR': 'XOR', 'XORI': 'XOR',
+    'SLL': 'SLL', 'SLLI': 'SLL', 'SRL': 'SRL', 'SRLI': 'SRL', 'SRA': 'SRA', 'SRAI': 'SRA',
+    'BEQ': 'SUB', 'BNE': 'SUB', 'BLT': 'SLT', 'BGE': 'SLT',
+    'JAL': 'ADD', 'JALR': 'ADD', 'LW': 'ADD', 'SW': 'ADD',
+}
+
+
+def _free(full, cycle):
+    """
+    The first cycle from cycle on that isn't full
+
+    Args:
+        full: Full cycle -> a later cycle to try; the chains are shortened
+              as they're followed, so runs of full cycles are skipped
+        cycle: Where to start
+    Returns:
+        Cycle
+    """
+    passed = []
+    later = full.get(cycle)
+    while later is not None:
+        passed.append(cycle)
+        cycle = later
+        later = full.get(cycle)
+    for full_cycle in passed:
+        full[full_cycle] = cycle
+    return cycle
+
+
+class OutOfOrderConfig:
+    """
+    Core parameters
+
+    Attributes:
+        fetch_width: Instructions fetched, dispatched and committed a cycle
+        issue_width: Instructions issued to functional units a cycle
+        rob_size: Reorder buffer entries (instructions in flight)
+        reservation_stations: Dispatched instructions that can wait to issue
+        physical_registers: Registers to rename onto (32 hold the
+                            architectural state, the rest are for writers
+                            in flight)
+        units: Unit kind (see UNITS) -> how many there are
+        latency: ALU operation -> cycles, for anything that isn't 1
+        load_latency: Cycles a load spends in the memory unit after its
+                      address add
+        frontend_depth: Cycles from fetch to dispatch
+        predictor: parse_unit spec for branch prediction, or None for a
+                   perfect one
+    """
+
+    def __init__(self, fetch_width=4, issue_width=4, rob_size=64, reservation_stations=32,
+                 physical_registers=96, units=None, latency=None, load_latency=2,
+                 frontend_depth=2, predictor="gshare:4096:12+btb:512+ras:16"):
+        units = {**{'alu': 2, 'branch': 1, 'memory': 1}, **(units or {})}
+        latency = dict(latency or {})
+        if min(fetch_width, issue_width, rob_size, reservation_stations) < 1:
+            raise ValueError("widths and buffer sizes must be at least 1")
+        if physical_registers <= 32:
+            raise ValueError("needs more than 32 physical registers to rename onto")
+        for kind, count in units.items():
+            if kind not in UNITS:
+                raise ValueError(f"unknown unit {kind!r} (expected one of {', '.join(UNITS)})")
+            if count < 1:
+                raise ValueError(f"needs at least one {kind} unit")
+        for op, cycles in latency.items():
+            if op not in OPERATIONS:
+                raise ValueError(f"unknown ALU operation {op!r}")
+            if cycles < 1:
+                raise ValueError("latencies must be at least 1 cycle")
+        if load_latency < 0 or frontend_depth < 0:
+            raise ValueError("load latency and front end depth can't be negative")
+        if predictor is not None:
+            parse_unit(predictor)
+        self.fetch_width = fetch_width
+        self.issue_width = issue_width
+        self.rob_size = rob_size
+        self.reservation_stations = reservation_stations
+        self.physical_registers = physical_registers
+        self.units = units
+        self.latency = latency
+        self.load_latency = load_latency
+        self.frontend_depth = frontend_depth
+        self.predictor = predictor
+
+    def to_dict(self):
+        """Parameters as plain data"""
+        return {'fetch_width': self.fetch_width, 'issue_width': self.issue_width,
+                'rob_size': self.rob_size, 'reservation_stations': self.reservation_stations,
+                'physical_registers': self.physical_registers, 'units': dict(self.units),
+                'latency': dict(self.latency), 'load_latency': self.load_latency,
+                'frontend_depth': self.frontend_depth, 'predictor': self.predictor}
+
+
+class OutOfOrderModel:
+    """
+    Out-of-order core timing for a stream of executed instructions
+
+    Use it as a simulate() reporter, or feed it with step() / replay().
+    Counts carry on across runs until reset().
+
+    Attributes:
+        config: OutOfOrderConfig
+        branch_unit: The BranchUnit doing the predicting (None if perfect)
+        instructions: Instructions timed
+        cycles: Cycles until the last one committed
+        dispatch_stalls: Cause -> cycles (see DISPATCH_STALLS)
+        issue_stalls: Cause -> cycles (see ISSUE_STALLS)
+        mispredicts: Mispredicted branches and jumps
+        mispredict_cycles: Fetch cycles lost waiting for them to execute
+        unit_ops: Unit kind -> instructions issued to it
+        rob_histogram: ROB entries in use -> cycles with that many
+    """
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config: OutOfOrderConfig (default: 4-wide, 64-entry ROB)
+        """
+        self.config = config or OutOfOrderConfig()
+        self.decoder = InstructionDecoder()
+        # Instruction word -> (unit, cycles to complete, rs1, rs2, rd, load or
+        #                      store, (kind, offset, call, ret) if it's a transfer)
+        self._info = {}
+        self.reset()
+
+    def reset(self):
+        """Start timing from an empty core"""
+        from trace_recorder import address_trace
+        config = self.config
+        self.branch_unit = parse_unit(config.predictor) if config.predictor else None
+        self._issue, self._settle, self._totals = self._timer()
+        self.trace = address_trace(self._issue)
+
+    # ---- reporter interface ----
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        # The last transfer went to wherever the run stopped
+        self._settle(cpu.pc)
+
+    # ---- feeding it yourself ----
+
+    def step(self, pc, word, address=None):
+        """
+        Time one executed instruction (the next one's pc shows where it went)
+
+        Args:
+            pc: Its address
+            word: Instruction word
+            address: LW/SW address, or None
+        """
+        self._issue(pc, word, address)
+
+    def replay(self, records, end_pc=None):
+        """
+        Time a recorded trace
+
+        Args:
+            records: Iterable of trace records - tuples in RECORD field order
+                     (TraceRing, iter_trace) or a TRACE_DTYPE array
+            end_pc: The pc the run stopped at, if known, so a transfer in
+                    the last record is predicted too
+        """
+        from trace_recorder import FLAG_LOAD, FLAG_STORE
+        memory = FLAG_LOAD | FLAG_STORE
+        issue = self._issue
+        if hasattr(records, 'dtype'):
+            records = zip(records['pc'].tolist(), records['word'].tolist(),
+                          records['mem_addr'].tolist(), records['flags'].tolist())
+        else:
+            records = ((record[1], record[2], record[4], record[7]) for record in records)
+        for pc, word, address, flags in records:
+            issue(pc, word, address if flags & memory else None)
+        if end_pc is not None:
+            self._settle(end_pc)
+
+    # ---- the model ----
+
+    def _timer(self):
+        """
+        The core's state and the function that times one instruction, as
+        closures so the per-instruction work is all on local variables
+
+        Returns:
+            (issue(pc, word, address), settle(end pc), totals() -> counters)
+        """
+        config = self.config
+        infos = self._info
+        describe = self._describe
+        resolve = self.branch_unit.resolve if self.branch_unit is not None else None
+        width = config.fetch_width
+        issue_width = config.issue_width
+        rob_size = config.rob_size
+        stations = config.reservation_stations
+        renames = config.physical_registers - 32
+        depth = config.frontend_depth
+        unit_counts = [config.units[kind] for kind in UNITS]
+        heappush, heappop = heapq.heappush, heapq.heappop
+        free = _free
+
+        ready = [0] * 32                # register -> cycle its value is ready
+        stores = {}                     # word address -> cycle its data is ready
+        issued = {}                     # cycle -> instructions issued
+        busy = [{} for _ in UNITS]      # unit -> cycle -> instructions issued to it
+        width_full = {}                 # cycle with no issue slots left -> a later one to try
+        unit_full = [{} for _ in UNITS]  # the same for each unit
+        waiting = []                    # heap of issue cycles still in the stations
+        rob = deque()                   # commit cycles of instructions in flight
+        writers = deque()               # commit cycles of the last `renames` writers
+        histogram = [0] * (rob_size + 1)
+        dispatch_stalls = [0] * len(DISPATCH_STALLS)
+        issue_stalls = [0] * len(ISSUE_STALLS)
+        unit_ops = [0] * len(UNITS)
+        fetch_cycle = 0
+        fetched = 0                     # in the current fetch group
+        redirect = 0                    # no fetch before this cycle
+        last_dispatch = 0
+        dispatched = 0                  # in last_dispatch's cycle
+        last_commit = 0
+        committed = 0                   # in last_commit's cycle
+        swept = 0                       # histogram is complete up to here
+        pending = None                  # (pc, transfer, cycle resolved) of the last transfer
+        count = 0
+        mispredicts = 0
+        lost = 0
+
+        def settle(next_pc):
+            # Predict the last transfer now that where it went is known
+            nonlocal pending, fetched, redirect, mispredicts
+            pc, (kind, offset, call, ret), resolved = pending
+            pending = None
+            if kind == JALR:
+                target, taken = next_pc, True
+            else:
+                target = (pc + offset) & _MASK
+                taken = kind == JAL or next_pc != ((pc + 4) & _MASK)
+            if resolve is not None and resolve(pc, kind, target, taken, call, ret):
+                mispredicts += 1
+                redirect = resolved
+            elif taken:
+                fetched = width
+
+        def issue(pc, word, address):
+            nonlocal fetch_cycle, fetched, last_dispatch, dispatched, last_commit, committed
+            nonlocal swept, pending, count, lost
+            info = infos.get(word)
+            if info is None:
+                info = describe(word)
+            unit, latency, rs1, rs2, rd, memory, transfer = info
+            if pending is not None:
+                settle(pc)
+
+            # Fetch
+            cycle = fetch_cycle
+            if fetched == width:
+                cycle += 1
+                fetched = 0
+            if redirect > cycle:
+                lost += redirect - cycle
+                cycle = redirect
+                fetched = 0
+            fetch_cycle = cycle
+            fetched += 1
+
+            # Dispatch: in order, then the latest of what it needs free
+            arrive = cycle + depth
+            d = arrive if arrive > last_dispatch else last_dispatch
+            if d == last_dispatch and dispatched == width:
+                d += 1
+                dispatch_stalls[3] += 1
+            base = d
+            cause = None
+            # ROB occupancy up to here; an entry is free the cycle after it commits
+            while rob and rob[0] <= d:
+                done = rob.popleft()
+                histogram[len(rob) + 1] += done - swept
+                swept = done
+            if len(rob) == rob_size:
+                d, cause = rob[0], 0
+            while waiting and waiting[0] <= d:
+                heappop(waiting)
+            if len(waiting) >= stations:
+                while len(waiting) >= stations:
+                    freed = heappop(waiting)
+                if freed > d:
+                    d, cause = freed, 1
+            if rd and len(writers) == renames:
+                freed = writers.popleft()
+                if freed > d:
+                    d, cause = freed, 2
+            if cause is not None:
+                dispatch_stalls[cause] += d - base
+                while rob and rob[0] <= d:
+                    done = rob.popleft()
+                    histogram[len(rob) + 1] += done - swept
+                    swept = done
+            histogram[len(rob)] += d - swept
+            swept = d
+            if d == last_dispatch:
+                dispatched += 1
+            else:
+                last_dispatch = d
+                dispatched = 1
+
+            # Issue: operands (and forwarded store data), then a free slot
+            earliest = e = d + 1
+            t = ready[rs1]
+            if t > e:
+                e, cause = t, 0
+            t = ready[rs2]
+            if t > e:
+                e, cause = t, 0
+            if memory == _LOAD:
+                t = stores.get(address >> 2, 0)
+                if t > e:
+                    e, cause = t, 1
+            if e > earliest:
+                issue_stalls[cause] += e - earliest
+            full = unit_full[unit]
+            while True:
+                if e in full:
+                    t = free(full, e)
+                    issue_stalls[2] += t - e
+                    e = t
+                if e not in width_full:
+                    break
+                t = free(width_full, e)
+                issue_stalls[3] += t - e
+                e = t
+            n = issued.get(e, 0) + 1
+            issued[e] = n
+            if n == issue_width:
+                width_full[e] = e + 1
+            slots = busy[unit]
+            n = slots.get(e, 0) + 1
+            slots[e] = n
+            if n == unit_counts[unit]:
+                full[e] = e + 1
+            unit_ops[unit] += 1
+            heappush(waiting, e)
+
+            # Complete, then commit in order
+            done = e + latency
+            if rd:
+                ready[rd] = done
+            if memory == _STORE:
+                stores[address >> 2] = done
+            if done > last_commit:
+                last_commit = done
+                committed = 1
+            elif committed == width:
+                last_commit += 1
+                committed = 1
+            else:
+                committed += 1
+            rob.append(last_commit + 1)
+            if rd:
+                writers.append(last_commit + 1)
+            if transfer is not None:
+                pending = (pc, transfer, done)
+
+            count += 1
+            if not count & 0xFFF:
+                # Nothing can issue before the next dispatch cycle
+                for table in (issued, *busy, width_full, *unit_full):
+                    for old in [c for c in table if c <= d]:
+                        del table[old]
+
+        def finish_settle(next_pc):
+            if pending is not None:
+                settle(next_pc)
+
+        def totals():
+            # The ROB histogram, with the instructions still in flight draining
+            drained = list(histogram)
+            at = swept
+            for left, done in enumerate(rob):
+                drained[len(rob) - left] += done - at
+                at = done
+            return {'instructions': count, 'cycles': last_commit + 1 if count else 0,
+                    'dispatch_stalls': dict(zip(DISPATCH_STALLS, dispatch_stalls)),
+                    'issue_stalls': dict(zip(ISSUE_STALLS, issue_stalls)),
+                    'unit_ops': dict(zip(UNITS, unit_ops)),
+                    'mispredicts': mispredicts, 'mispredict_cycles': lost,
+                    'rob_histogram': drained}
+
+        return issue, finish_settle, totals
+
+    def _describe(self, word):
+        decoded = self.decoder.decode_record(word)
+        name = decoded.name
+        config = self.config
+        rs1, rs2, rd = decoded.operands()
+        cycles = config.latency.get(_ALU_OP.get(name, 'ADD'), 1)
+        memory = 0
+        if name == 'LW':
+            memory = _LOAD
+            cycles += config.load_latency
+        elif name == 'SW':
+            memory = _STORE
+        transfer = control_transfer(decoded)
+        info = (UNITS.index('memory') if memory else
+                UNITS.index('branch') if transfer is not None else UNITS.index('alu'),
+                cycles, rs1, rs2, rd, memory, transfer)
+        self._info[word] = info
+        return info
+
+    # ---- results ----
+
+    @property
+    def instructions(self):
+        """Instructions timed"""
+        return self._totals()['instructions']
+
+    @property
+    def cycles(self):
+        """Cycles from the first fetch until the last instruction commits"""
+        return self._totals()['cycles']
+
+    @property
+    def dispatch_stalls(self):
+        """Cause -> cycles instructions dispatched later than they could have"""
+        return self._totals()['dispatch_stalls']
+
+    @property
+    def issue_stalls(self):
+        """Cause -> cycles instructions waited after dispatch + 1 to issue"""
+        return self._totals()['issue_stalls']
+
+    @property
+    def mispredicts(self):
+        """Mispredicted branches and jumps"""
+        return self._totals()['mispredicts']
+
+    @property
+    def mispredict_cycles(self):
+        """Fetch cycles lost to mispredictions"""
+        return self._totals()['mispredict_cycles']
+
+    @property
+    def unit_ops(self):
+        """Unit kind -> instructions issued to it"""
+        return self._totals()['unit_ops']
+
+    @property
+    def rob_histogram(self):
+        """ROB entries in use -> cycles with that many"""
+        return self._totals()['rob_histogram']
+
+    def ipc(self):
+        """Instructions per cycle"""
+        totals = self._totals()
+        return totals['instructions'] / totals['cycles'] if totals['cycles'] else 0.0
+
+    def cpi(self):
+        """Cycles per instruction"""
+        totals = self._totals()
+        return totals['cycles'] / totals['instructions'] if totals['instructions'] else 0.0
+
+    def mean_occupancy(self):
+        """Average ROB entries in use per cycle"""
+        histogram = self.rob_histogram
+        cycles = sum(histogram)
+        return sum(n * c for n, c in enumerate(histogram)) / cycles if cycles else 0.0
+
+    def to_dict(self):
+        """Results as plain data, ready for json.dumps"""
+        totals = self._totals()
+        histogram = totals['rob_histogram']
+        return {
+            'config': self.config.to_dict(),
+            'instructions': totals['instructions'],
+            'cycles': totals['cycles'],
+            'ipc': self.ipc(),
+            'rob': {'mean_occupancy': self.mean_occupancy(),
+                    'full_cycles': histogram[-1],
+                    'histogram': histogram},
+            'dispatch_stalls': totals['dispatch_stalls'],
+            'issue_stalls': totals['issue_stalls'],
+            'unit_ops': totals['unit_ops'],
+            'mispredicts': totals['mispredicts'],
+            'mispredict_cycles': totals['mispredict_cycles'],
+        }
+
+    def report(self):
+        """
+        IPC, ROB occupancy, stall breakdowns and unit use
+
+        Returns:
+            String
+        """
+        config = self.config
+        totals = self._totals()
+        cycles = totals['cycles'] or 1
+        histogram = totals['rob_histogram']
+        lines = [
+            f"Out-of-order core: {totals['instructions']} instructions, {totals['cycles']} "
+            f"cycles, IPC {self.ipc():.3f}",
+            f"  {config.fetch_width}-wide fetch, {config.issue_width}-wide issue, ROB "
+            f"{config.rob_size}, {config.reservation_stations} reservation stations, "
+            f"{config.physical_registers} physical registers",
+            "  units: " + ", ".join(f"{config.units[kind]} {kind}" for kind in UNITS) +
+            f"; predictor: {config.predictor or 'perfect'}",
+            "",
+            f"ROB occupancy: mean {self.mean_occupancy():.1f} of {config.rob_size}, "
+            f"full {100 * histogram[-1] / cycles:.1f}% of cycles, "
+            f"empty {100 * histogram[0] / cycles:.1f}%",
+            f"Mispredicted transfers: {totals['mispredicts']} "
+            f"({totals['mispredict_cycles']} fetch cycles lost)",
+        ]
+        for title, stalls in (("Dispatch stall cycles by cause:", totals['dispatch_stalls']),
+                              ("Issue stall cycles by cause:", totals['issue_stalls'])):
+            lines.append("")
+            lines.append(title)
+            for cause, count in stalls.items():
+                lines.append(f"  {cause:<12} {count:>10} {count / cycles:>7.2f} per cycle")
+        lines.append("")
+        lines.append("Instructions per unit:")
+        for kind, count in totals['unit_ops'].items():
+            used = count / (config.units[kind] * cycles)
+            lines.append(f"  {kind:<12} {count:>10} {100 * used:>6.1f}% busy")
+        return "\n".join(lines)
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+    import json
+    from cpu import RISCV_CPU
+    from elf_loader import ProgramLoadError
+    from loader import HexLoadError
+
+    parser = argparse.ArgumentParser(
+        description="Run a program and time it on a superscalar out-of-order core")
+    parser.add_argument("program", help="hex, ELF, raw .bin or .ckpt file")
+    parser.add_argument("--max-cycles", type=int, default=10 ** 6,
+                        help="stop after this many instructions (default: 1000000)")
+    parser.add_argument("--fetch-width", type=int, default=4, help="default: 4")
+    parser.add_argument("--issue-width", type=int, default=4, help="default: 4")
+    parser.add_argument("--rob", type=int, default=64, help="ROB entries (default: 64)")
+    parser.add_argument("--rs", type=int, default=32, help="reservation stations (default: 32)")
+    parser.add_argument("--registers", type=int, default=96,
+                        help="physical registers (default: 96)")
+    parser.add_argument("--predictor", default="gshare:4096:12+btb:512+ras:16",
+                        help="branch_predictor unit spec, or 'perfect'")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        config = OutOfOrderConfig(
+            fetch_width=args.fetch_width, issue_width=args.issue_width, rob_size=args.rob,
+            reservation_stations=args.rs, physical_registers=args.registers,
+            predictor=None if args.predictor == 'perfect' else args.predictor)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    cpu = RISCV_CPU()
+    try:
+        cpu.load(args.program)
+    except (HexLoadError, ProgramLoadError) as e:
+        print(f"Error: {e}")
+        return 1
+    model = OutOfOrderModel(config)
+    cpu.simulate(args.max_cycles, reporter=model)
+    if args.json:
+        print(json.dumps(model.to_dict()))
+    else:
+        print(model.report())
+    return 0
+
+
+# Test
+if __name__ == "__main__":
+    import sys
+    from cpu import RISCV_CPU
+
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    print("Testing out-of-order model...")
+
+    # Ten independent chains (x1..x10) of 4 dependent adds each, interleaved
+    program = []
+    for step in range(4):
+        for reg in range(1, 11):
+            program.append(0x00100013 | reg << 15 | reg << 7)   # addi xN, xN, 1
+    program.append(0x0000006F)  # halt
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    model = OutOfOrderModel(OutOfOrderConfig(units={'alu': 4}, predictor=None))
+    cpu.simulate(max_cycles=1000, reporter=model)
+
+    # 4 a cycle from dispatch in cycle 2: the last (39th) dispatches in 11,
+    # issues in 12 and commits in 13
+    print(f"Instructions: {model.instructions} (expected 40)")
+    print(f"Cycles: {model.cycles} (expected 14)")
+    print(f"Issue stalls waiting for operands: {model.issue_stalls['operands']} (expected 0)")
+    print()
+    print(model.report())
+
+    print("\nOut-of-order model test complete!")
@@ -0,0 +1,434 @@
+"""
+Pipeline timing model - how many cycles a classic 5-stage pipeline needs
+
+The simulator itself is single-cycle: cycle_count is instructions
+retired. PipelineModel works out what an in-order IF/ID/EX/MEM/WB
+pipeline would take for the same instructions. It doesn't execute
+anything. It watches the instructions the CPU runs, as a reporter, or
+reads them back from a recorded trace, and only keeps time:
+
+    model = PipelineModel(PipelineConfig(forwarding=True, branch_penalty=2))
+    cpu.simulate(max_cycles=10**6, reporter=model)
+    print(model.report())           # CPI, stalls by cause, worst PCs
+
+Each instruction's cycle of entry into EX is the latest of:
+  - one cycle after the previous instruction entered EX
+  - the cycle the previous instruction got into MEM (a multi-cycle EX or
+    MEM stage holds everything behind it)                      structural
+  - when the front end delivers it after the previous instruction went
+    somewhere other than pc + 4 (branches are predicted not taken):
+    penalty cycles after the branch, JAL or JALR                control
+  - when its source registers are ready: the end of EX for ALU results
+    and the end of MEM for loads with forwarding, the cycle after WB
+    without                                                  data, load_use
+It then goes into MEM when the instruction ahead has left it, and WB.
+
+An instruction's stall cycles are how much later than one cycle after
+the instruction ahead it leaves WB, so cycles = instructions + 4 + stall
+cycles. They're charged to whichever constraint held it back in EX, and
+any left over (its own multi-cycle EX or MEM) to structural.
+
+Attaching the model (like any reporter with a trace hook) makes the CPU
+run on the interpreter whatever its engine, since only the interpreter
+sees single instructions. Against the interpreter it adds roughly 60% to
+run time, but against engine='translate' (about 7-8 MIPS) a timed run
+takes 6-10x as long. For long runs, record a trace once and replay() it.
+"""
+
+import branch_predictor
+from decoder import InstructionDecoder
+
+
+# What an instruction does, as far as timing cares
+PLAIN, LOAD, BRANCH, JAL, JALR = range(5)
+
+STALL_CAUSES = ('data', 'load_use', 'structural', 'branch', 'jal', 'jalr')
+
+_CONTROL_CAUSE = {BRANCH: 'branch', JAL: 'jal', JALR: 'jalr'}
+
+# branch_predictor.control_transfer() kinds -> ours
+_TRANSFER_KINDS = {branch_predictor.BRANCH: BRANCH, branch_predictor.JAL: JAL,
+                   branch_predictor.JALR: JALR}
+
+
+# A pipeline state, with cycles counted from the one the previous instruction
+# entered EX: (cycle it entered MEM, cycle it entered WB, penalty and cause if
+# the next pc isn't pc + 4, ((register, cycle it's ready, from a load?), ...)
+# for the registers not ready yet). Before the first instruction it's as if
+# there was one in EX in cycle 1, so the first is in EX in cycle 2 and WB in 4.
+_START = (1, 2, 0, None, ())
+
+
+def _advance(state, info, redirected, forwarding):
+    """
+    Time one instruction
+
+    Args:
+        state: Pipeline state before it (see _START)
+        info: PipelineModel._describe() of the instruction
+        redirected: True if it isn't at the previous instruction's pc + 4
+        forwarding: PipelineConfig.forwarding
+    Returns:
+        (state after it, None or ((cause, stall cycles, charged to the previous
+         instruction?), ...))
+    """
+    last_mem, last_wb, last_penalty, last_control, pending = state
+    rs1, rs2, rd, is_load, ex_cycles, mem_cycles, penalty, control = info
+    ready = {reg: (at, load) for reg, at, load in pending}
+
+    # EX: the latest of the constraints in the module docstring, charged to
+    # the first of them on a tie
+    base = 1
+    ex = base
+    cause = None
+    if last_mem > ex:
+        ex, cause = last_mem, 'structural'
+    if redirected and last_penalty and base + last_penalty > ex:
+        ex, cause = base + last_penalty, last_control
+    for rs in (rs1, rs2):
+        at, load = ready.get(rs, (0, False))
+        if at > ex:
+            ex, cause = at, 'load_use' if load else 'data'
+    # Then MEM once the instruction ahead has left it, and WB
+    mem = max(ex + ex_cycles, last_wb)
+    wb = mem + mem_cycles
+
+    late = wb - last_wb - 1
+    stalls = []
+    if late and cause is not None:
+        waited = min(late, ex - base)
+        stalls.append((cause, waited, cause == last_control))
+        late -= waited
+    if late:
+        stalls.append(('structural', late, False))
+
+    if rd:
+        if not forwarding:
+            ready[rd] = (wb + 1, is_load)
+        elif is_load:
+            ready[rd] = (wb, True)
+        else:
+            ready[rd] = (ex + ex_cycles, False)
+    # Counted from this one's EX cycle now, and only what can still hold
+    # up the next instruction (in EX at ex + 1 at the earliest)
+    pending = tuple(sorted((reg, at - ex, load) for reg, (at, load) in ready.items()
+                           if at > ex + 1))
+    state = (mem - ex, wb - ex, penalty, control, pending)
+    return state, tuple(stalls) or None
+
+
+class PipelineConfig:
+    """
+    Pipeline parameters
+
+    Attributes:
+        forwarding: Results go straight from EX/MEM to the next EX; without
+                    it a reader waits until the writer has been through WB
+        branch_penalty: Cycles lost on a taken branch (resolved in EX)
+        jal_penalty: Cycles lost on JAL (target known in ID)
+        jalr_penalty: Cycles lost on JALR (target known in EX)
+        ex_latency: Mnemonic -> cycles in EX, for anything that isn't 1
+        mem_latency: Cycles LW and SW spend in MEM (everything else takes 1)
+    """
+
+    def __init__(self, forwarding=True, branch_penalty=2, jal_penalty=1, jalr_penalty=2,
+                 ex_latency=None, mem_latency=1):
+        if min(branch_penalty, jal_penalty, jalr_penalty) < 0:
+            raise ValueError("penalties can't be negative")
+        if mem_latency < 1 or any(cycles < 1 for cycles in (ex_latency or {}).values()):
+            raise ValueError("stage latencies must be at least 1 cycle")
+        self.forwarding = forwarding
+        self.branch_penalty = branch_penalty
+        self.jal_penalty = jal_penalty
+        self.jalr_penalty = jalr_penalty
+        self.ex_latency = dict(ex_latency or {})
+        self.mem_latency = mem_latency
+
+    def penalty(self, kind):
+        """Cycles lost when an instruction of this kind redirects fetch"""
+        return {BRANCH: self.branch_penalty, JAL: self.jal_penalty,
+                JALR: self.jalr_penalty}.get(kind, 0)
+
+
+class PipelineModel:
+    """
+    Cycle counts for a stream of executed instructions
+
+    Use it as a simulate() reporter, or feed it with step() / replay().
+    Counts carry on across runs until reset().
+
+    The pipeline's state only matters relative to the cycle the last
+    instruction entered EX, and only for the few registers still being
+    produced, so there aren't many different states in practice. Each
+    one gets a table of what each instruction does to it (the next state
+    and any stalls), worked out the first time it's needed. After that,
+    timing an instruction is a dictionary lookup and stall cycles are
+    added up from how often each table entry was used.
+
+    Attributes:
+        instructions: Instructions timed
+        stalls: Cause -> stall cycles (see STALL_CAUSES)
+        pc_stalls: pc -> stall cycles charged to it; data and structural
+                   stalls go to the instruction that waited, control
+                   stalls to the branch or jump that caused them
+    """
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config: PipelineConfig (default: forwarding, 2-cycle branches)
+        """
+        self.config = config or PipelineConfig()
+        self.decoder = InstructionDecoder()
+        # Instruction word -> (rs1, rs2, rd, is load, EX cycles, MEM cycles,
+        #                      penalty and cause if it redirects fetch)
+        self._info = {}
+        self.reset()
+
+    def reset(self):
+        """Start timing from an empty pipeline"""
+        # State -> its table, with the state itself under None and then
+        #   pc << 32 | word                  (after the instruction at pc - 4)
+        #   (previous pc, pc, word)          (after a jump, or anything else)
+        # -> (next state's table, None or [times used, ((cause, cycles, pc), ...)])
+        self._tables = {}
+        self._stalled = []
+        self._pc_words = {}
+        self._issue, self._count = self._timer()
+        issue = self._issue
+
+        def trace(cpu, decoded):
+            issue(cpu.pc, decoded.word)
+        self.trace = trace
+
+    @property
+    def instructions(self):
+        """Instructions timed"""
+        return self._count()
+
+    @property
+    def stalls(self):
+        """Cause -> stall cycles"""
+        totals = dict.fromkeys(STALL_CAUSES, 0)
+        for used, charges in self._stalled:
+            for cause, cycles, _ in charges:
+                totals[cause] += used * cycles
+        return totals
+
+    @property
+    def pc_stalls(self):
+        """pc -> stall cycles charged to it"""
+        totals = {}
+        for used, charges in self._stalled:
+            for _, cycles, pc in charges:
+                if used:
+                    totals[pc] = totals.get(pc, 0) + used * cycles
+        return totals
+
+    # ---- reporter interface ----
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        pass
+
+    # ---- feeding it yourself ----
+
+    def step(self, pc, word):
+        """Time one executed instruction (the next one's pc shows where it went)"""
+        self._issue(pc, word)
+
+    def replay(self, records):
+        """
+        Time a recorded trace
+
+        Args:
+            records: Iterable of trace records - tuples in RECORD field order
+                     (TraceRing, iter_trace) or a TRACE_DTYPE array
+        """
+        issue = self._issue
+        if hasattr(records, 'dtype'):
+            for pc, word in zip(records['pc'].tolist(), records['word'].tolist()):
+                issue(pc, word)
+        else:
+            for record in records:
+                issue(record[1], record[2])
+
+    # ---- the model ----
+
+    def _timer(self):
+        """
+        The current state and the function that moves it on by one
+        instruction, as closures so the per-instruction work is all on
+        local variables
+
+        Returns:
+            (issue(pc, word), count() -> instructions timed)
+        """
+        table = self._table(_START)
+        transition = self._transition
+        last_pc = -8
+        count = 0
+
+        def issue(pc, word):
+            nonlocal table, last_pc, count
+            if pc == last_pc + 4:
+                key = pc << 32 | word
+            else:
+                key = (last_pc, pc, word)
+            step = table.get(key)
+            if step is None:
+                step = transition(table, key, last_pc, pc, word)
+            table, stalled = step
+            if stalled is not None:
+                stalled[0] += 1
+            last_pc = pc
+            count += 1
+
+        def instructions():
+            return count
+
+        return issue, instructions
+
+    def _table(self, state):
+        """The transition table for a state, made empty the first time"""
+        table = self._tables.get(state)
+        if table is None:
+            table = self._tables[state] = {None: state}
+        return table
+
+    def _transition(self, table, key, last_pc, pc, word):
+        """Work out, and remember, what one instruction does to a state"""
+        info = self._info.get(word)
+        if info is None:
+            info = self._describe(word)
+        state, stalls = _advance(table[None], info, pc != last_pc + 4, self.config.forwarding)
+        self._pc_words[pc] = word
+        stalled = None
+        if stalls is not None:
+            stalled = [0, tuple((cause, cycles, last_pc if on_last else pc)
+                                for cause, cycles, on_last in stalls)]
+            self._stalled.append(stalled)
+        step = table[key] = (self._table(state), stalled)
+        return step
+
+    def _describe(self, word):
+        decoded = self.decoder.decode_record(word)
+        name = decoded.name
+        config = self.config
+        rs1, rs2, rd = decoded.operands()
+        transfer = branch_predictor.control_transfer(decoded)
+        if name == 'LW':
+            kind = LOAD
+        elif transfer is not None:
+            kind = _TRANSFER_KINDS[transfer[0]]
+        else:
+            kind = PLAIN
+        info = (rs1, rs2, rd,
+                kind == LOAD,
+                config.ex_latency.get(name, 1),
+                config.mem_latency if name in ('LW', 'SW') else 1,
+                config.penalty(kind),
+                _CONTROL_CAUSE.get(kind))
+        self._info[word] = info
+        return info
+
+    # ---- results ----
+
+    @property
+    def cycles(self):
+        """Cycles from the first fetch until the last instruction leaves WB"""
+        count = self._count()
+        return count + 4 + self.stall_cycles() if count else 0
+
+    def cpi(self):
+        """Cycles per instruction (pipeline fill included)"""
+        return self.cycles / self.instructions if self.instructions else 0.0
+
+    def stall_cycles(self):
+        """All stall cycles"""
+        return sum(self.stalls.values())
+
+    def hotspots(self, limit=10):
+        """(pc, stall cycles) for the PCs charged the most, worst first"""
+        ranked = sorted(self.pc_stalls.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def to_dict(self):
+        """Results as plain data, ready for json.dumps"""
+        return {
+            'instructions': self.instructions,
+            'cycles': self.cycles,
+            'cpi': self.cpi(),
+            'stalls': self.stalls,
+            'pc_stalls': {f"0x{pc:08X}": count for pc, count in sorted(self.pc_stalls.items())},
+        }
+
+    def report(self, limit=10, symbols=None):
+        """
+        CPI, stall breakdown and the PCs with the most stall cycles
+
+        Args:
+            limit: PCs to list
+            symbols: Optional SymbolTable for naming them
+        Returns:
+            String
+        """
+        config = self.config
+        total = self.cycles or 1
+        lines = [
+            f"Pipeline: {self.instructions} instructions, {self.cycles} cycles, "
+            f"CPI {self.cpi():.3f}",
+            f"  forwarding {'on' if config.forwarding else 'off'}, penalties: branch "
+            f"{config.branch_penalty}, jal {config.jal_penalty}, jalr {config.jalr_penalty}; "
+            f"MEM {config.mem_latency} cycle(s)",
+            "",
+            "Stall cycles by cause:",
+        ]
+        stalls = self.stalls
+        for cause in STALL_CAUSES:
+            count = stalls[cause]
+            lines.append(f"  {cause:<11} {count:>10} {100 * count / total:>5.1f}% of cycles")
+        lines.append(f"  {'total':<11} {sum(stalls.values()):>10}")
+
+        if self._stalled:
+            lines.append("")
+            lines.append(f"Most stalled PCs (top {limit}):")
+            for pc, count in self.hotspots(limit):
+                where = symbols.name_for(pc) if symbols else None
+                text = self.decoder.disassemble(self.decoder.decode_record(self._pc_words[pc]))
+                lines.append(f"  0x{pc:08X} {count:>10}  {text}" + (f"  <{where}>" if where else ""))
+        return "\n".join(lines)
+
+
+# Test
+if __name__ == "__main__":
+    from cpu import RISCV_CPU
+
+    print("Testing pipeline model...")
+
+    # Loop: a load feeding an add straight away, and a taken branch each time
+    program = [
+        0x00000093,  # addi x1, x0, 0
+        0x00A00113,  # addi x2, x0, 10
+        0x00002183,  # lw x3, 0(x0)
+        0x003080B3,  # add x1, x1, x3
+        0xFFF10113,  # addi x2, x2, -1
+        0xFE011AE3,  # bne x2, x0, -12
+        0x0000006F,  # halt
+    ]
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    model = PipelineModel()
+    cpu.simulate(max_cycles=1000, reporter=model)
+
+    print(f"Instructions: {model.instructions} (expected 42)")
+    print(f"Load-use stalls: {model.stalls['load_use']} (expected 10)")
+    print(f"Branch stalls: {model.stalls['branch']} (expected 18)")
+    print(f"Cycles: {model.cycles} (expected {42 + 4 + 10 + 18})")
+    print()
+    print(model.report())
+
+    print("\nPipeline model test complete!")
@@ -0,0 +1,149 @@
+class PredecodeCache:
+    """
+    Cache of decoded instructions keyed by PC
+
+    Loops run the same PCs over and over, so we only fetch and decode
+    each one the first time and reuse the result after that.
+    Writes to memory under a cached PC throw the entry away so
+    self-modifying code still sees the new instruction.
+    """
+
+    def __init__(self, memory, decoder):
+        """
+        Args:
+            memory: Memory object instructions are fetched from
+            decoder: InstructionDecoder used on a miss
+        """
+        self.memory = memory
+        self.decoder = decoder
+
+        # pc -> DecodedInstruction (shared, interned by the decoder)
+        self.entries = {}
+
+        # Lowest and highest cached PC, so stores to data memory
+        # can skip the invalidation work entirely
+        self.low = 0xFFFFFFFF
+        self.high = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        # Optional function(pc, decoded) -> entry applied to every fill,
+        # so a profiler can swap in its own records for some PCs
+        self.wrap = None
+
+        memory.add_write_hook(self.invalidate)
+
+    def lookup(self, pc):
+        """
+        Get the decoded instruction at a PC
+
+        Args:
+            pc: Address of the instruction
+        Returns:
+            DecodedInstruction
+        """
+        entry = self.entries.get(pc)
+        if entry is None:
+            return self.fill(pc)
+        self.hits += 1
+        return entry
+
+    def fill(self, pc):
+        """
+        Fetch and decode the instruction at a PC and cache it
+        Counts as a miss
+
+        Args:
+            pc: Address of the instruction
+        Returns:
+            DecodedInstruction
+        """
+        self.misses += 1
+        entry = self.decoder.decode_record(self.memory.read_word(pc))
+        if self.wrap is not None:
+            entry = self.wrap(pc, entry)
+        self.entries[pc] = entry
+
+        if pc < self.low:
+            self.low = pc
+        if pc > self.high:
+            self.high = pc
+
+        return entry
+
+    def invalidate(self, address, num_bytes=4):
+        """
+        Drop cached instructions overlapping a written range
+        Called by Memory after every write
+
+        Args:
+            address: First byte written
+            num_bytes: Number of bytes written
+        """
+        # Every cached instruction covers pc..pc+3
+        if address + num_bytes <= self.low or address > self.high + 3:
+            return
+
+        if num_bytes >= len(self.entries) * 2:
+            # Big range (like Memory.clear) - cheaper to check every entry
+            end = address + num_bytes
+            stale = [pc for pc in self.entries
+                     if pc + 4 > address and pc < end]
+        else:
+            # PCs are 2-byte aligned, so any PC that overlaps the write
+            # starts within 3 bytes before it
+            start = (address - 3) & ~1
+            stale = [pc for pc in range(start, address + num_bytes, 2)
+                     if pc in self.entries]
+
+        for pc in stale:
+            del self.entries[pc]
+        self.invalidations += len(stale)
+
+    def clear(self):
+        """Drop every cached instruction (counters are kept)"""
+        # Clear in place - the CPU run loop holds a reference to this dict
+        self.entries.clear()
+        self.low = 0xFFFFFFFF
+        self.high = 0
+
+    def stats(self):
+        """
+        Get the cache counters
+
+        Returns:
+            Dictionary with hits, misses, invalidations, entries and hit_rate
+        """
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'entries': len(self.entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+# Test
+if __name__ == "__main__":
+    from memory import Memory
+    from decoder import InstructionDecoder
+
+    print("Testing predecode cache...")
+
+    mem = Memory()
+    cache = PredecodeCache(mem, InstructionDecoder())
+
+    mem.write_word(0x0, 0x00500093)  # addi x1, x0, 5
+    cache.lookup(0x0)
+    cache.lookup(0x0)
+    print(f"After two lookups: {cache.stats()} (expected 1 hit, 1 miss)")
+
+    mem.write_word(0x0, 0x00A00113)  # addi x2, x0, 10
+    decoded = cache.lookup(0x0)
+    print(f"After overwrite: 0x{decoded.word:08X} (expected 0x00A00113)")
+    print(f"Invalidations: {cache.invalidations} (expected 1)")
+
+    print("\nPredecode cache test complete!")
@@ -0,0 +1,457 @@
+"""
+Execution profiler - where a guest program spends its cycles
+
+    profile = cpu.start_profiling()
+    cpu.simulate(max_cycles=1000000)
+    print(profile.report())          # hottest PCs, mnemonics and blocks
+    print(profile.annotate())        # disassembly with a count per line
+    profile.write_csv("profile.csv")
+
+Counting every instruction would slow the interpreter loop down a lot,
+so nothing is counted for ordinary instructions. Instead, the predecode
+cache hands out a ProfiledInstruction for every branch, jump and trap,
+whose handler bumps a slot in a preallocated list when control goes
+somewhere other than pc + 4. Flow through straight-line code is
+conserved, so the execution count of every PC follows from those:
+
+    count[pc] = count[pc - 4] - transfers out of (pc - 4) + transfers into pc
+
+Per-mnemonic counts, taken/not-taken branch counts and basic block
+counts are all worked out from the same numbers when a report is asked
+for. Mnemonics come from the code in memory at that point, so code that
+rewrote itself is reported as it ended up.
+"""
+
+import csv
+import json
+
+from decoder import DecodedInstruction
+from dispatch import BRANCH_CONDITIONS, lookup, trap_handler
+
+
+# PCs only have to be 2-byte aligned, so the inbound pages count per halfword
+PAGE_SHIFT = 12
+PAGE_SLOTS = 1 << (PAGE_SHIFT - 1)
+_SLOT_MASK = PAGE_SLOTS - 1
+
+# Instructions that end a basic block
+_BLOCK_ENDS = frozenset(('BEQ', 'BNE', 'BLT', 'BGE', 'JAL', 'JALR'))
+
+
+class ProfiledInstruction(DecodedInstruction):
+    """
+    A DecodedInstruction for one PC, with a handler that counts transfers
+
+    Unlike ordinary records these aren't shared - each belongs to the
+    PC it was fetched from.
+    """
+
+    __slots__ = ('pc', 'slot', 'counts', 'profiler')
+
+    def __init__(self, decoded, pc, slot, counts, profiler, handler):
+        for name in DecodedInstruction.__slots__:
+            setattr(self, name, getattr(decoded, name))
+        self.pc = pc
+        self.slot = slot
+        self.counts = counts
+        self.profiler = profiler
+        self.handler = handler
+
+
+# ---- counting handlers ----
+
+def _counting_branch(condition):
+    """Branch handler that also counts the taken ones (no extra call)"""
+    def handler(cpu, decoded):
+        regs = cpu.registers.registers
+        if condition(regs[decoded.rs1], regs[decoded.rs2]):
+            cpu.pc = (cpu.pc + decoded.imm) & 0xFFFFFFFF
+            decoded.counts[decoded.slot] += 1
+        else:
+            cpu.pc += 4
+    return handler
+
+
+def _counting_jump(original):
+    """JAL - always goes to its target"""
+    def handler(cpu, decoded):
+        original(cpu, decoded)
+        decoded.counts[decoded.slot] += 1
+    return handler
+
+
+def _counting_indirect(original):
+    """JALR, and traps (which 'jump' back onto themselves) - the target is only known now"""
+    def handler(cpu, decoded):
+        original(cpu, decoded)
+        decoded.counts[decoded.slot] += 1
+        decoded.profiler.jump_into(cpu.pc)
+    return handler
+
+
+_COUNTING_HANDLERS = {name: _counting_branch(condition)
+                      for name, condition in BRANCH_CONDITIONS.items()}
+_COUNTING_HANDLERS['JAL'] = _counting_jump(lookup(0x0000006F)[1])
+_COUNTING_HANDLERS['JALR'] = _counting_indirect(lookup(0x00000067)[1])
+_COUNTING_HANDLERS['UNKNOWN'] = _counting_indirect(trap_handler)
+
+# The ones whose target doesn't depend on registers
+_STATIC_TARGETS = frozenset(('BEQ', 'BNE', 'BLT', 'BGE', 'JAL'))
+
+
+class Profiler:
+    """
+    Execution counts for one CPU, gathered across any number of runs
+
+    Attributes:
+        site_counts: Preallocated list of transfer counts, one slot per
+                     branch/jump/trap site
+        sites: (pc, word, static target or None) for each slot in use
+        inbound: page number -> list of transfers into each halfword whose
+                 source can't tell where it went (run starts and ends,
+                 JALR targets, traps)
+    """
+
+    def __init__(self, cpu, capacity=1024):
+        """
+        Args:
+            cpu: RISCV_CPU being profiled (its memory and decoder are
+                 used to name what ran)
+            capacity: Slots to start with (the list grows as needed)
+        """
+        self.cpu = cpu
+        self.site_counts = [0] * capacity
+        self.sites = []
+        self.site_slots = {}
+        self.inbound = {}
+
+    # ---- recording ----
+
+    def wrap(self, pc, decoded):
+        """
+        PredecodeCache hook: the record to run at pc - a counting copy
+        for branches, jumps and traps, the shared record for the rest
+        """
+        handler = _COUNTING_HANDLERS.get(decoded.name)
+        # Halt and empty memory never get as far as their handler
+        if handler is None or decoded.word == 0x0000006F or decoded.word == 0:
+            return decoded
+        key = (pc, decoded.word)
+        slot = self.site_slots.get(key)
+        if slot is None:
+            slot = len(self.sites)
+            if slot == len(self.site_counts):
+                # Grow in place - records already handed out keep this list
+                self.site_counts.extend([0] * len(self.site_counts))
+            target = (pc + decoded.imm) & 0xFFFFFFFF if decoded.name in _STATIC_TARGETS else None
+            self.sites.append((pc, decoded.word, target))
+            self.site_slots[key] = slot
+        return ProfiledInstruction(decoded, pc, slot, self.site_counts, self, handler)
+
+    def _page(self, pc):
+        page = self.inbound.get(pc >> PAGE_SHIFT)
+        if page is None:
+            page = self.inbound[pc >> PAGE_SHIFT] = [0] * PAGE_SLOTS
+        return page
+
+    def jump_into(self, pc):
+        """Control arrived at pc from somewhere that doesn't record its target"""
+        self._page(pc)[(pc >> 1) & _SLOT_MASK] += 1
+
+    def enter(self, pc):
+        """A run starts at pc"""
+        self._page(pc)[(pc >> 1) & _SLOT_MASK] += 1
+
+    def leave(self, pc):
+        """A run stopped with the instruction at pc not executed"""
+        self._page(pc)[(pc >> 1) & _SLOT_MASK] -= 1
+
+    def reset(self):
+        """Forget everything counted so far (handed-out records stay valid)"""
+        self.site_counts[:] = [0] * len(self.site_counts)
+        self.inbound.clear()
+
+    # ---- analysis ----
+
+    def transfers(self):
+        """
+        Every control transfer counted
+
+        Returns:
+            (outbound, inbound) dicts of pc -> count
+        """
+        outbound = {}
+        inbound = {}
+        for (pc, _, target), count in zip(self.sites, self.site_counts):
+            if count:
+                outbound[pc] = outbound.get(pc, 0) + count
+                if target is not None:
+                    inbound[target] = inbound.get(target, 0) + count
+        for page_num, page in self.inbound.items():
+            base = page_num << PAGE_SHIFT
+            for i, count in enumerate(page):
+                if count:
+                    inbound[base + 2 * i] = inbound.get(base + 2 * i, 0) + count
+        return outbound, inbound
+
+    def counts(self):
+        """
+        Execution count of every PC that ran
+
+        Returns:
+            Dict of pc -> count, in address order
+        """
+        outbound, inbound = self.transfers()
+        counts = {}
+        # A jump to pc % 4 == 2 starts a run of its own, on the other grid
+        for alignment in (0, 2):
+            events = sorted(pc for pc in set(outbound) | set(inbound) if pc & 3 == alignment)
+            flow = 0
+            for i, pc in enumerate(events):
+                flow += inbound.get(pc, 0)
+                if flow:
+                    counts[pc] = flow
+                flow -= outbound.get(pc, 0)
+                # Everything up to the next transfer runs as often as this did
+                if flow and i + 1 < len(events):
+                    for address in range(pc + 4, events[i + 1], 4):
+                        counts[address] = flow
+        return dict(sorted(counts.items()))
+
+    def _decoded(self, pc):
+        cpu = self.cpu
+        return cpu.decoder.decode_record(cpu.memory.read_word(pc))
+
+    def instructions(self):
+        """
+        Everything that ran, in address order
+
+        Returns:
+            List of (pc, count, DecodedInstruction)
+        """
+        return [(pc, count, self._decoded(pc)) for pc, count in self.counts().items()]
+
+    def total(self):
+        """Instructions executed"""
+        return sum(self.counts().values())
+
+    def mnemonics(self):
+        """
+        Execution count per mnemonic (names from InstructionDecoder.get_name)
+
+        Returns:
+            Dict of name -> count, most executed first
+        """
+        decoder = self.cpu.decoder
+        totals = {}
+        for pc, count, decoded in self.instructions():
+            name = decoder.get_name(decoded)
+            totals[name] = totals.get(name, 0) + count
+        return dict(sorted(totals.items(), key=lambda item: -item[1]))
+
+    def branches(self):
+        """
+        Outcome counts for every conditional branch that ran
+
+        Returns:
+            Dict of pc -> (taken, not_taken)
+        """
+        outbound, _ = self.transfers()
+        result = {}
+        for pc, count, decoded in self.instructions():
+            if decoded.name in BRANCH_CONDITIONS:
+                taken = outbound.get(pc, 0)
+                result[pc] = (taken, count - taken)
+        return result
+
+    def blocks(self):
+        """
+        Basic blocks that ran - straight-line code entered only at the top
+        and left only at the bottom
+
+        Returns:
+            List of (start_pc, length, count) in address order
+        """
+        outbound, inbound = self.transfers()
+        blocks = []
+        previous = None
+        for pc, count, decoded in self.instructions():
+            if previous is None or pc != previous[0] + 4 or previous[1] or inbound.get(pc):
+                blocks.append([pc, 1, count])
+            else:
+                blocks[-1][1] += 1
+            # Anything after a jump, branch or trap starts a new block
+            ends = decoded.name in _BLOCK_ENDS or pc in outbound
+            previous = (pc, ends)
+        return [tuple(block) for block in blocks]
+
+    def hotspots(self, limit=20):
+        """
+        The most executed PCs
+
+        Returns:
+            List of (pc, count, DecodedInstruction), highest count first
+        """
+        ranked = sorted(self.instructions(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit] if limit else ranked
+
+    def _where(self, pc):
+        symbols = self.cpu.symbols
+        where = symbols.name_for(pc) if symbols else None
+        return f"  <{where}>" if where else ""
+
+    def report(self, limit=10):
+        """
+        Hotspot report: the most executed PCs, mnemonics and basic blocks
+
+        Args:
+            limit: Rows in each table
+        Returns:
+            String
+        """
+        decoder = self.cpu.decoder
+        total = self.total() or 1
+        branches = self.branches()
+        transfers = sum(self.transfers()[0].values())
+        lines = [f"Profile: {self.total()} instructions, {transfers} control transfers", ""]
+
+        lines.append(f"Hottest instructions (top {limit}):")
+        lines.append(f"  {'count':>10} {'%':>6}  {'pc':<10}  instruction")
+        for pc, count, decoded in self.hotspots(limit):
+            note = ""
+            if pc in branches:
+                taken, not_taken = branches[pc]
+                note = f"   taken {taken}, not taken {not_taken}"
+            lines.append(f"  {count:>10} {100 * count / total:>5.1f}%  0x{pc:08X}  "
+                         f"{decoder.disassemble(decoded)}{note}{self._where(pc)}")
+
+        lines.append("")
+        lines.append("Mnemonics:")
+        for name, count in list(self.mnemonics().items())[:limit]:
+            lines.append(f"  {count:>10} {100 * count / total:>5.1f}%  {name}")
+
+        lines.append("")
+        lines.append(f"Hottest basic blocks (top {limit}, by instructions executed):")
+        ranked = sorted(self.blocks(), key=lambda block: (-block[1] * block[2], block[0]))
+        for start, length, count in ranked[:limit]:
+            lines.append(f"  {length * count:>10} {100 * length * count / total:>5.1f}%  "
+                         f"0x{start:08X}  {length} instruction(s) x {count}{self._where(start)}")
+        return "\n".join(lines)
+
+    def annotate(self):
+        """
+        Disassembly of everything that ran, each line with its count,
+        share of the total and branch outcomes; gaps between blocks of
+        code are marked with '...'
+
+        Returns:
+            String
+        """
+        decoder = self.cpu.decoder
+        symbols = self.cpu.symbols
+        total = self.total() or 1
+        branches = self.branches()
+        lines = []
+        previous = None
+        for pc, count, decoded in self.instructions():
+            if previous is not None and pc != previous + 4:
+                lines.append(f"{'':>18}...")
+            if symbols:
+                found = symbols.lookup(pc)
+                if found and found[1] == 0:
+                    lines.append(f"{'':>18}<{found[0]}>:")
+            note = ""
+            if pc in branches:
+                taken, not_taken = branches[pc]
+                note = f"  ; taken {taken}, not taken {not_taken}"
+            lines.append(f"{count:>10} {100 * count / total:>5.1f}%  {pc:08X}:  {decoded.word:08X}  "
+                         f"{decoder.disassemble(decoded):<24}{note}".rstrip())
+            previous = pc
+        return "\n".join(lines)
+
+    def rows(self):
+        """One dict per PC that ran - what write_csv and to_dict export"""
+        decoder = self.cpu.decoder
+        branches = self.branches()
+        block_of = {}
+        for start, length, _ in self.blocks():
+            for i in range(length):
+                block_of[start + 4 * i] = start
+        rows = []
+        for pc, count, decoded in self.instructions():
+            taken, not_taken = branches.get(pc, (None, None))
+            rows.append({
+                'pc': pc,
+                'count': count,
+                'mnemonic': decoder.get_name(decoded),
+                'disassembly': decoder.disassemble(decoded),
+                'taken': taken,
+                'not_taken': not_taken,
+                'block': block_of[pc],
+            })
+        return rows
+
+    def to_dict(self):
+        """Everything in the profile as plain data, ready for json.dumps"""
+        return {
+            'instructions': self.total(),
+            'transfers': sum(self.transfers()[0].values()),
+            'pcs': self.rows(),
+            'mnemonics': self.mnemonics(),
+            'blocks': [{'start': start, 'length': length, 'count': count}
+                       for start, length, count in self.blocks()],
+        }
+
+    def write_json(self, path):
+        """Write to_dict() as JSON"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_csv(self, path):
+        """Write one row per PC that ran (see rows())"""
+        fields = ['pc', 'count', 'mnemonic', 'disassembly', 'taken', 'not_taken', 'block']
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            for row in self.rows():
+                row['pc'] = f"0x{row['pc']:08X}"
+                row['block'] = f"0x{row['block']:08X}"
+                writer.writerow(row)
+
+    def write(self, path):
+        """Write CSV or JSON depending on the file extension (.json, anything else is CSV)"""
+        if str(path).lower().endswith('.json'):
+            self.write_json(path)
+        else:
+            self.write_csv(path)
+
+
+# Test
+if __name__ == "__main__":
+    from cpu import RISCV_CPU
+
+    print("Testing profiler...")
+
+    # Sums 1..10: the loop body runs 10 times, its branch is taken 9 times
+    program = [
+        0x00000093,  # addi x1, x0, 0
+        0x00000113,  # addi x2, x0, 0
+        0x00A00193,  # addi x3, x0, 10
+        0x00110113,  # addi x2, x2, 1
+        0x002080B3,  # add x1, x1, x2
+        0xFE311CE3,  # bne x2, x3, -8
+        0x0000006F,  # halt
+    ]
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    profile = cpu.start_profiling()
+    result = cpu.simulate(max_cycles=1000)
+
+    print(f"Counted {profile.total()} instructions (expected {result.cycles})")
+    print(f"bne at 0x14: {profile.branches()[0x14]} (expected (9, 1))")
+    print(f"Blocks: {profile.blocks()} (expected [(0, 3, 1), (12, 3, 10)])")
+    print()
+    print(profile.annotate())
+
+    print("\nProfiler test complete!")
@@ -0,0 +1,97 @@
+"""
+Reporters - the optional output layer for simulation runs
+
+RISCV_CPU.simulate does no printing of its own. Pass it a reporter to
+get output:
+
+  ConsoleReporter  the classic banner / trace / final state printout
+  JSONReporter     one JSON object per run, for scripts
+
+A reporter has start(cpu), finish(cpu, result) and a trace attribute
+that is either None (no per-instruction output - lets the CPU use its
+fastest engine) or a function called as trace(cpu, decoded) before each
+instruction executes.
+"""
+
+import json
+import sys
+
+from loader import HexImage, problem_messages
+
+
+class ConsoleReporter:
+    """Prints what RISCV_CPU.run and load_program always used to print"""
+
+    def __init__(self, verbose=False):
+        """
+        Args:
+            verbose: Print every instruction as it executes
+        """
+        self.verbose = verbose
+        self.trace = self._trace if verbose else None
+
+    def loading(self, program_file):
+        print(f"Loading: {program_file}")
+
+    def loaded(self, cpu, image):
+        """Summary of a loaded program (HexImage, ProgramImage or Checkpoint)"""
+        if isinstance(image, HexImage):
+            for message in problem_messages(image):
+                print(message)
+            print(f"Loaded {image.count} instructions from {image.filename}")
+            print(f"Loaded {image.count} instructions\n")
+        elif image.format == 'checkpoint':
+            print(f"Restored checkpoint at PC=0x{image.pc:08X}, cycle {image.cycle_count}\n")
+        elif image.format == 'elf':
+            print(f"Loaded {len(image.segments)} segment(s), {len(image.symbols)} symbol(s), "
+                  f"entry 0x{image.entry:08X}\n")
+        else:
+            print(f"Loaded {image.count} words\n")
+
+    def load_failed(self, program_file, error):
+        """A hex file that couldn't be read - same messages as load_hex_file"""
+        if isinstance(error.__cause__, FileNotFoundError):
+            print(f"Error: File '{program_file}' not found")
+        else:
+            print(f"Error loading file: {error}")
+        print("Loaded 0 instructions\n")
+
+    def start(self, cpu):
+        print("Starting execution...")
+        print(f"PC = 0x{cpu.pc:08X}\n")
+
+    def _trace(self, cpu, decoded):
+        where = cpu.symbols.name_for(cpu.pc) if cpu.symbols else None
+        print(f"[{cpu.cycle_count}] PC=0x{cpu.pc:08X} | {decoded.word:08X} | {decoded.name}"
+              + (f"  <{where}>" if where else ""))
+
+    def finish(self, cpu, result):
+        if result.halted:
+            print(result.message())
+        print(f"\nFinished after {result.cycles} cycles")
+        cpu.print_final_state()
+
+
+class JSONReporter:
+    """Writes each run's result as one line of JSON"""
+
+    trace = None
+
+    def __init__(self, stream=None, indent=None, extra=None):
+        """
+        Args:
+            stream: Where to write (default: sys.stdout at write time)
+            indent: json.dumps indent, None for one line per run
+            extra: Dict of fields added to every result (like the program name)
+        """
+        self.stream = stream
+        self.indent = indent
+        self.extra = extra or {}
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        record = dict(self.extra)
+        record.update(result.to_dict())
+        print(json.dumps(record, indent=self.indent), file=self.stream or sys.stdout)
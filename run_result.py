@@ -0,0 +1,102 @@
+"""
+Structured result of a simulation run
+
+RISCV_CPU.simulate returns one of these instead of printing anything.
+Printing is left to a reporter (see reporter.py).
+"""
+
+
+# Why a run stopped
+HALT_INSTRUCTION = 'halt'                  # jal x0, 0
+HALT_UNINITIALIZED = 'uninitialized'       # fetched a zero word
+HALT_ILLEGAL = 'illegal_instruction'       # encoding the CPU can't execute
+HALT_MAX_CYCLES = 'max_cycles'             # ran out of cycles, still running
+
+HALT_REASONS = (HALT_INSTRUCTION, HALT_UNINITIALIZED, HALT_ILLEGAL, HALT_MAX_CYCLES)
+
+
+class RunResult:
+    """
+    What a run ended with
+
+    Attributes:
+        halt_reason: One of HALT_REASONS
+        cycles: Instructions executed
+        pc: Final PC
+        registers: List of the 32 register values
+        trap_cause: Description of the illegal instruction, or None
+        memory_diff: {address: (before, after)} for every word the run
+                     changed, or None if it wasn't asked for
+    """
+
+    def __init__(self, halt_reason, cycles, pc, registers, trap_cause=None, memory_diff=None):
+        self.halt_reason = halt_reason
+        self.cycles = cycles
+        self.pc = pc
+        self.registers = registers
+        self.trap_cause = trap_cause
+        self.memory_diff = memory_diff
+
+    @property
+    def halted(self):
+        """True if the program stopped by itself rather than running out of cycles"""
+        return self.halt_reason != HALT_MAX_CYCLES
+
+    def message(self):
+        """One-line description of how the run ended"""
+        if self.halt_reason == HALT_INSTRUCTION:
+            return f"Halt detected at cycle {self.cycles}"
+        if self.halt_reason == HALT_UNINITIALIZED:
+            return f"Reached uninitialized memory at PC=0x{self.pc:08X}"
+        if self.halt_reason == HALT_ILLEGAL:
+            return self.trap_cause
+        return f"Stopped after {self.cycles} cycles (max cycles reached)"
+
+    def to_dict(self):
+        """Plain dict for JSON output (memory diff keys become hex strings)"""
+        result = {
+            'halt_reason': self.halt_reason,
+            'cycles': self.cycles,
+            'pc': self.pc,
+            'registers': list(self.registers),
+        }
+        if self.trap_cause is not None:
+            result['trap_cause'] = self.trap_cause
+        if self.memory_diff is not None:
+            result['memory_diff'] = {f"0x{address:08X}": [before, after]
+                                     for address, (before, after) in sorted(self.memory_diff.items())}
+        return result
+
+    def __repr__(self):
+        return (f"RunResult({self.halt_reason}, cycles={self.cycles}, "
+                f"pc=0x{self.pc:08X})")
+
+
+def illegal_instruction_message(decoded, pc):
+    """trap_cause text for an instruction the CPU can't execute"""
+    return (f"Illegal instruction 0x{decoded.word:08X} at PC=0x{pc:08X} "
+            f"(opcode 0x{decoded.opcode:02X}, "
+            f"funct3 0x{decoded.funct3:X}, "
+            f"funct7 0x{decoded.funct7:02X})")
+
+
+def diff_memory(before, after):
+    """
+    Compare two nonzero_words() snapshots
+
+    Args:
+        before: List of (address, value) from before the run
+        after: List of (address, value) from after it
+    Returns:
+        {address: (before, after)} for every word that changed
+    """
+    old = dict(before)
+    new = dict(after)
+    diff = {}
+    for address, value in new.items():
+        if old.get(address, 0) != value:
+            diff[address] = (old.get(address, 0), value)
+    for address, value in old.items():
+        if address not in new:
+            diff[address] = (value, 0)
+    return diff
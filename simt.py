@@ -0,0 +1,549 @@
+"""
+Lockstep SIMT engine - one program, many guest states, NumPy arrays
+
+Runs N copies ("lanes") of the same program at once, the way a GPU runs
+threads of a warp. All guest state lives in NumPy arrays:
+  - regs   N x 32 uint32 register matrix (column 0 stays zero)
+  - pc     per-lane PCs
+  - pages  page number -> N x 1024 uint32 array, one row per lane
+
+Each step picks the lowest PC any running lane is at, executes that one
+instruction for every lane sitting on it (a mask over the N lanes), and
+leaves the rest waiting. When a branch sends lanes different ways they
+split into groups by PC; running the lowest PC first lets the lanes that
+went the short way catch up, and once they share a PC again they run as
+one group again. Per-lane results are identical to running each lane on
+its own RISCV_CPU - only the order work happens in changes.
+
+Instruction words are decoded once with InstructionDecoder and executed
+with the ALU operations applied to whole columns of the register matrix.
+
+Pages loaded from the program image are shared read-only views (one copy
+for all lanes); a page gets its own per-lane copy on the first store.
+
+NumPy is optional for the rest of the simulator - it's only needed here.
+"""
+
+try:
+    import numpy as np
+except ImportError:  # only the SIMT engine needs NumPy
+    np = None
+
+from alu import OPERATIONS
+from decoder import InstructionDecoder
+from memory import PagedMemory, PAGE_SHIFT, PAGE_SIZE, PAGE_MASK
+from run_result import (RunResult, illegal_instruction_message, HALT_INSTRUCTION,
+                        HALT_UNINITIALIZED, HALT_ILLEGAL, HALT_MAX_CYCLES)
+
+
+WORDS_PER_PAGE = PAGE_SIZE // 4
+
+# Per-lane halt state, stored as small codes in SIMTEngine.halt_codes
+RUNNING = 0
+HALT_CODES = {1: HALT_INSTRUCTION, 2: HALT_UNINITIALIZED, 3: HALT_ILLEGAL}
+_HALT, _UNINITIALIZED, _ILLEGAL = 1, 2, 3
+
+# Larger than any 32-bit PC, marks lanes that aren't running
+_IDLE_PC = 1 << 40
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("the SIMT engine needs NumPy (pip install numpy)")
+
+
+# ---- vectorised ALU ----
+# The alu.py functions only use +, -, &, |, ^ and shifts for most operations,
+# and those work unchanged on uint32 arrays. The ones that branch on the
+# sign bit get array versions with the same results.
+
+def _signed(values):
+    return values.view(np.int32)
+
+
+def _vector_sra(a, b):
+    return (_signed(a) >> (b & 0x1F)).astype(np.uint32)
+
+
+def _vector_slt(a, b):
+    return (_signed(a) < _signed(b)).astype(np.uint32)
+
+
+def _vector_sltu(a, b):
+    return (a < b).astype(np.uint32)
+
+
+VECTOR_OPERATIONS = dict(OPERATIONS, SRA=_vector_sra, SLT=_vector_slt, SLTU=_vector_sltu)
+
+
+# ---- per-instruction handlers ----
+# Same shapes as dispatch.py, but each one runs for a group of lanes:
+# handler(sim, lanes, decoded, pc) where lanes indexes rows of the
+# register matrix and pc is the group's (shared) PC. Handlers return the
+# next PC when every lane in the group goes to the same place, else None.
+
+def _make_register_op(op):
+    def handler(sim, lanes, decoded, pc):
+        rd = decoded.rd
+        if rd:
+            regs = sim.regs
+            regs[lanes, rd] = op(regs[lanes, decoded.rs1], regs[lanes, decoded.rs2])
+        sim.pc[lanes] = pc + 4
+        return pc + 4
+    return handler
+
+
+def _make_immediate_op(op, shift=False):
+    def handler(sim, lanes, decoded, pc):
+        rd = decoded.rd
+        if rd:
+            imm = decoded.imm & 0x1F if shift else decoded.imm
+            sim.regs[lanes, rd] = op(sim.regs[lanes, decoded.rs1], imm)
+        sim.pc[lanes] = pc + 4
+        return pc + 4
+    return handler
+
+
+def _lw(sim, lanes, decoded, pc):
+    address = sim.regs[lanes, decoded.rs1] + np.uint32(decoded.imm)
+    values = sim._load(lanes, address)
+    if decoded.rd:
+        sim.regs[lanes, decoded.rd] = values
+    sim.pc[lanes] = pc + 4
+    return pc + 4
+
+
+def _sw(sim, lanes, decoded, pc):
+    address = sim.regs[lanes, decoded.rs1] + np.uint32(decoded.imm)
+    sim._store(lanes, address, sim.regs[lanes, decoded.rs2])
+    sim.pc[lanes] = pc + 4
+    return pc + 4
+
+
+def _make_branch(condition):
+    def handler(sim, lanes, decoded, pc):
+        taken = condition(sim.regs[lanes, decoded.rs1], sim.regs[lanes, decoded.rs2])
+        target = (pc + decoded.imm) & 0xFFFFFFFF
+        if taken.all():
+            sim.pc[lanes] = target
+            return target
+        if not taken.any():
+            sim.pc[lanes] = pc + 4
+            return pc + 4
+        # Divergence - lanes split into two groups
+        sim.pc[lanes] = np.where(taken, target, pc + 4)
+        return None
+    return handler
+
+
+def _jal(sim, lanes, decoded, pc):
+    if decoded.rd:
+        sim.regs[lanes, decoded.rd] = (pc + 4) & 0xFFFFFFFF
+    target = (pc + decoded.imm) & 0xFFFFFFFF
+    sim.pc[lanes] = target
+    return target
+
+
+def _jalr(sim, lanes, decoded, pc):
+    # Read rs1 before writing rd - they can be the same register
+    target = (sim.regs[lanes, decoded.rs1] + np.uint32(decoded.imm)) & 0xFFFFFFFE
+    if decoded.rd:
+        sim.regs[lanes, decoded.rd] = (pc + 4) & 0xFFFFFFFF
+    sim.pc[lanes] = target
+    return None
+
+
+def _lui(sim, lanes, decoded, pc):
+    if decoded.rd:
+        sim.regs[lanes, decoded.rd] = decoded.imm
+    sim.pc[lanes] = pc + 4
+    return pc + 4
+
+
+def _auipc(sim, lanes, decoded, pc):
+    if decoded.rd:
+        sim.regs[lanes, decoded.rd] = (pc + decoded.imm) & 0xFFFFFFFF
+    sim.pc[lanes] = pc + 4
+    return pc + 4
+
+
+def _trap(sim, lanes, decoded, pc):
+    # PC stays on the bad instruction, like RISCV_CPU.trap
+    sim.halt_codes[lanes] = _ILLEGAL
+    sim.trap_words[lanes] = decoded.word
+    return None
+
+
+def _build_handlers():
+    """Instruction name (from the dispatch table) -> vector handler"""
+    ops = VECTOR_OPERATIONS
+    handlers = {name: _make_register_op(ops[name])
+                for name in ('ADD', 'SUB', 'AND', 'OR', 'XOR', 'SLL', 'SRL', 'SRA')}
+    handlers.update({
+        'ADDI': _make_immediate_op(ops['ADD']),
+        'ANDI': _make_immediate_op(ops['AND']),
+        'ORI': _make_immediate_op(ops['OR']),
+        'XORI': _make_immediate_op(ops['XOR']),
+        'SLLI': _make_immediate_op(ops['SLL'], shift=True),
+        'SRLI': _make_immediate_op(ops['SRL'], shift=True),
+        'SRAI': _make_immediate_op(ops['SRA'], shift=True),
+        'LW': _lw,
+        'SW': _sw,
+        'BEQ': _make_branch(lambda a, b: a == b),
+        'BNE': _make_branch(lambda a, b: a != b),
+        'BLT': _make_branch(lambda a, b: _signed(a) < _signed(b)),
+        'BGE': _make_branch(lambda a, b: _signed(a) >= _signed(b)),
+        'JAL': _jal,
+        'JALR': _jalr,
+        'LUI': _lui,
+        'AUIPC': _auipc,
+    })
+    return handlers
+
+
+VECTOR_HANDLERS = _build_handlers()
+
+
+class SIMTEngine:
+    """
+    N guest states run in lockstep
+
+    Attributes:
+        num_lanes: N
+        regs: N x 32 uint32 register matrix
+        pc: Per-lane PCs (int64)
+        cycles: Per-lane instruction counts
+        halt_codes: Per-lane RUNNING or a HALT_CODES key
+        pages: page number -> N x 1024 uint32 words
+        written: page number -> bool per word, True once a guest store has
+                 hit it (words never stored to hold the same value in
+                 every lane, so fetching them needs no per-lane check)
+        steps: Instruction groups executed so far
+        instructions: Lane-instructions executed so far (sum of cycles)
+    """
+
+    def __init__(self, num_lanes, memory=None):
+        """
+        Args:
+            num_lanes: Number of guest states
+            memory: Optional Memory or PagedMemory every lane starts from
+        """
+        _require_numpy()
+        if num_lanes < 1:
+            raise ValueError("need at least one lane")
+        self.num_lanes = num_lanes
+        self.regs = np.zeros((num_lanes, 32), dtype=np.uint32)
+        self.pc = np.zeros(num_lanes, dtype=np.int64)
+        self.cycles = np.zeros(num_lanes, dtype=np.int64)
+        self.halt_codes = np.zeros(num_lanes, dtype=np.uint8)
+        self.trap_words = np.zeros(num_lanes, dtype=np.uint32)
+        self.pages = {}
+        self.written = {}      # page number -> which words a lane has stored to
+        self.symbols = None
+
+        self.decoder = InstructionDecoder()
+        self._decoded = {}     # word -> (DecodedInstruction, handler)
+        self._lane_ids = np.arange(num_lanes)
+
+        self.steps = 0
+        self.instructions = 0
+
+        if memory is not None:
+            self.load_memory(memory)
+
+    # ---- loading ----
+
+    def load(self, program_file):
+        """
+        Load a program (hex, ELF or .bin) into every lane
+
+        Uses RISCV_CPU.load on a scratch paged-memory CPU, so every
+        format it understands works here too.
+
+        Returns:
+            Whatever RISCV_CPU.load returned (HexImage or ProgramImage)
+        """
+        from cpu import RISCV_CPU     # cpu doesn't need this module, keep it one-way
+
+        scratch = RISCV_CPU(memory='paged')
+        image = scratch.load(program_file)
+        self.load_memory(scratch.memory)
+        self.pc[:] = scratch.pc
+        self.symbols = scratch.symbols
+        return image
+
+    def load_memory(self, memory):
+        """
+        Make every lane's memory a copy of memory
+
+        Pages are shared between lanes until one of them is written.
+        """
+        self.pages = {}
+        self.written = {}
+        if isinstance(memory, PagedMemory):
+            for page_num in memory.page_numbers():
+                page = memory.page_view(page_num)
+                if page is not None and any(page):
+                    self._share_page(page_num, np.frombuffer(page, dtype='<u4'))
+        else:
+            words = {}
+            for address, value in memory.nonzero_words():
+                row = words.get(address >> PAGE_SHIFT)
+                if row is None:
+                    row = words[address >> PAGE_SHIFT] = np.zeros(WORDS_PER_PAGE, np.uint32)
+                row[(address & PAGE_MASK) >> 2] = value
+            for page_num, row in words.items():
+                self._share_page(page_num, row)
+
+    def _share_page(self, page_num, row):
+        """Install one page as a read-only view every lane sees"""
+        row = np.array(row, dtype=np.uint32)
+        self.pages[page_num] = np.broadcast_to(row, (self.num_lanes, WORDS_PER_PAGE))
+
+    def _page_for_write(self, page_num):
+        """Page with one row per lane, copying a shared page first"""
+        page = self.pages.get(page_num)
+        if page is None:
+            page = np.zeros((self.num_lanes, WORDS_PER_PAGE), dtype=np.uint32)
+            self.pages[page_num] = page
+        elif not page.flags.writeable:
+            page = self.pages[page_num] = np.array(page)
+        if page_num not in self.written:
+            self.written[page_num] = np.zeros(WORDS_PER_PAGE, dtype=bool)
+        return page
+
+    # ---- per-lane memory access ----
+
+    def _ids(self, lanes):
+        """Lane numbers for a lane index (a slice means every lane)"""
+        return self._lane_ids if isinstance(lanes, slice) else lanes
+
+    def _load(self, lanes, addresses):
+        """Word at addresses[i] in each lane's memory"""
+        ids = self._ids(lanes)
+        page_nums = addresses >> PAGE_SHIFT
+        offsets = (addresses & PAGE_MASK) >> 2
+        first = int(page_nums[0])
+
+        # Usually every lane reads the same page
+        if (page_nums == first).all():
+            page = self.pages.get(first)
+            if page is None:
+                return np.zeros(len(ids), dtype=np.uint32)
+            return page[ids, offsets]
+
+        values = np.zeros(len(ids), dtype=np.uint32)
+        for page_num in np.unique(page_nums):
+            page = self.pages.get(int(page_num))
+            if page is not None:
+                hit = page_nums == page_num
+                values[hit] = page[ids[hit], offsets[hit]]
+        return values
+
+    def _store(self, lanes, addresses, values):
+        """Write values[i] at addresses[i] in each lane's memory"""
+        ids = self._ids(lanes)
+        page_nums = addresses >> PAGE_SHIFT
+        offsets = (addresses & PAGE_MASK) >> 2
+        first = int(page_nums[0])
+
+        if (page_nums == first).all():
+            self._page_for_write(first)[ids, offsets] = values
+            self.written[first][offsets] = True
+            return
+
+        for page_num in np.unique(page_nums):
+            hit = page_nums == page_num
+            self._page_for_write(int(page_num))[ids[hit], offsets[hit]] = values[hit]
+            self.written[int(page_num)][offsets[hit]] = True
+
+    def read_word(self, address):
+        """Word at one address, for every lane (uint32 array)"""
+        page = self.pages.get(address >> PAGE_SHIFT)
+        if page is None:
+            return np.zeros(self.num_lanes, dtype=np.uint32)
+        return page[:, (address & PAGE_MASK) >> 2].copy()
+
+    def write_word(self, address, values):
+        """
+        Write one address in every lane
+
+        Args:
+            address: Byte address (word-aligned)
+            values: One value for all lanes, or an array of N
+        """
+        page_num = address >> PAGE_SHIFT
+        offset = (address & PAGE_MASK) >> 2
+        page = self.pages.get(page_num)
+        if np.ndim(values) == 0 and (page is None or not page.flags.writeable):
+            # Same value everywhere - the page can stay shared
+            row = np.zeros(WORDS_PER_PAGE, np.uint32) if page is None else page[0].copy()
+            row[offset] = values
+            self._share_page(page_num, row)
+            return
+        self._page_for_write(page_num)[:, offset] = values
+        if np.ndim(values):
+            self.written[page_num][offset] = True
+
+    def lane_words(self, lane):
+        """Every non-zero word in one lane's memory, like Memory.nonzero_words"""
+        result = []
+        for page_num in sorted(self.pages):
+            row = self.pages[page_num][lane]
+            base = page_num << PAGE_SHIFT
+            for index in np.flatnonzero(row):
+                result.append((base + int(index) * 4, int(row[index])))
+        return result
+
+    # ---- execution ----
+
+    def _lookup(self, word):
+        """Decoded record and vector handler for a word (cached)"""
+        entry = self._decoded.get(word)
+        if entry is None:
+            decoded = self.decoder.decode_record(word)
+            entry = (decoded, VECTOR_HANDLERS.get(decoded.name, _trap))
+            self._decoded[word] = entry
+        return entry
+
+    def _fetch(self, lanes, pc):
+        """
+        Instruction word at pc for a group of lanes
+
+        Returns:
+            (word, lanes) - lanes is narrowed if some of them have
+            rewritten this instruction to something else
+        """
+        page = self.pages.get(pc >> PAGE_SHIFT)
+        if page is None:
+            return 0, lanes
+        offset = (pc & PAGE_MASK) >> 2
+        written = self.written.get(pc >> PAGE_SHIFT)
+        if written is None or not written[offset]:
+            return int(page[0, offset]), lanes
+
+        words = page[lanes, offset]
+        word = words[0]
+        if (words != word).any():
+            lanes = self._ids(lanes)[words == word]
+        return int(word), lanes
+
+    def run(self, max_cycles=1000):
+        """
+        Run every lane until it halts or has executed max_cycles instructions
+
+        Can be called again with a larger max_cycles to keep going, like
+        RISCV_CPU.simulate.
+
+        Returns:
+            Number of lanes still running (0 if all halted)
+        """
+        num_lanes = self.num_lanes
+        pc = self.pc
+        cycles = self.cycles
+        halt_codes = self.halt_codes
+        everyone = slice(None)
+        steps = instructions = 0
+
+        running = (halt_codes == RUNNING) & (cycles < max_cycles)
+        num_running = int(np.count_nonzero(running))
+        # No lane can hit max_cycles for at least this many more steps
+        headroom = max_cycles - int(cycles[running].max()) if num_running else 0
+        lanes = None
+
+        while num_running:
+            if lanes is None:
+                # Lowest PC any running lane is at, and every lane sitting on it
+                waiting = np.where(running, pc, _IDLE_PC)
+                group_pc = int(waiting.min())
+                group = waiting == group_pc
+                size = int(np.count_nonzero(group))
+                lanes = everyone if size == num_lanes else np.flatnonzero(group)
+
+            word, fetched = self._fetch(lanes, group_pc)
+            converged = fetched is lanes and size == num_running
+            lanes = fetched
+
+            # Same halt checks as the interpreter: no cycle is counted
+            if word == 0x0000006F or word == 0:
+                halt_codes[lanes] = _HALT if word else _UNINITIALIZED
+                running[lanes] = False
+                num_running = int(np.count_nonzero(running))
+                lanes = None
+                continue
+
+            decoded, handler = self._lookup(word)
+            next_pc = handler(self, lanes, decoded, group_pc)
+            cycles[lanes] += 1
+            steps += 1
+            instructions += size if converged else len(self._ids(lanes))
+
+            headroom -= 1
+            if handler is _trap or headroom <= 0:
+                running[lanes] = halt_codes[lanes] == RUNNING
+                running &= cycles < max_cycles
+                num_running = int(np.count_nonzero(running))
+                headroom = max_cycles - int(cycles[running].max()) if num_running else 0
+                lanes = None
+            elif next_pc is None or not converged:
+                # Split up, or other lanes are waiting - regroup by PC
+                lanes = None
+            else:
+                # Still every running lane on one PC, no need to look
+                group_pc = next_pc
+
+        self.steps += steps
+        self.instructions += instructions
+        return int(np.count_nonzero((halt_codes == RUNNING) & (cycles >= max_cycles)))
+
+    # ---- results ----
+
+    def lane_result(self, lane):
+        """RunResult for one lane, the same one RISCV_CPU.simulate would give"""
+        code = int(self.halt_codes[lane])
+        pc = int(self.pc[lane])
+        trap_cause = None
+        if code == _ILLEGAL:
+            decoded = self.decoder.decode_record(int(self.trap_words[lane]))
+            trap_cause = illegal_instruction_message(decoded, pc)
+        return RunResult(HALT_CODES.get(code, HALT_MAX_CYCLES), int(self.cycles[lane]), pc,
+                         [int(value) for value in self.regs[lane]], trap_cause)
+
+    def results(self):
+        """RunResult for every lane"""
+        return [self.lane_result(lane) for lane in range(self.num_lanes)]
+
+    def efficiency(self):
+        """Average fraction of the lanes doing work in each step"""
+        if not self.steps:
+            return 0.0
+        return self.instructions / (self.steps * self.num_lanes)
+
+
+# Test
+if __name__ == "__main__":
+    print("Testing SIMT engine...")
+
+    # Sum 1..n where n is different in every lane (x10 = lane + 1)
+    program = [
+        0x00000093,  # addi x1, x0, 0
+        0x00000113,  # addi x2, x0, 0
+        0x00110113,  # addi x2, x2, 1
+        0x002080B3,  # add x1, x1, x2
+        0xFEA11CE3,  # bne x2, x10, -8
+        0x40102023,  # sw x1, 0x400(x0)
+        0x0000006F,  # halt
+    ]
+
+    sim = SIMTEngine(8)
+    for i, word in enumerate(program):
+        sim.write_word(i * 4, word)
+    sim.regs[:, 10] = np.arange(1, 9)
+    sim.run(max_cycles=1000)
+
+    print(f"x1 per lane: {sim.regs[:, 1].tolist()} (expected [1, 3, 6, 10, 15, 21, 28, 36])")
+    print(f"Stored sums: {sim.read_word(0x400).tolist()} (expected the same)")
+    print(f"Lane 7: {sim.lane_result(7).message()} (expected halt at cycle 27)")
+    print(f"Lanes busy per step: {sim.efficiency():.0%}")
+
+    print("\nSIMT engine test complete!")
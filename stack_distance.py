@@ -0,0 +1,593 @@
+"""
+Stack distance analysis - LRU miss ratios of many cache sizes from one run
+
+A CacheHierarchy (cache.py) simulates one configuration per run, so a
+sweep over sizes is one run per size. For LRU caches one pass is enough.
+The stack (reuse) distance of a reference is the number of different lines
+used since the last reference to the same line. A fully associative LRU
+cache of C lines hits exactly the references with a distance below C, so
+one histogram of distances gives the miss ratio of every size. A
+set-associative LRU cache hits when the distance counted within the set
+is below its ways, so one histogram per set count gives every
+associativity at that set count.
+
+StackDistanceAnalyzer watches the instruction fetch line stream and the
+LW/SW line stream (split, like the L1s in cache.py; loads and stores both
+allocate, as in a write-back cache):
+
+    analyzer = StackDistanceAnalyzer(configs=["16K:4", "32K:8"], line_size=64)
+    cpu.simulate(max_cycles=10**6, reporter=analyzer)   # or analyzer.replay(trace)
+    print(analyzer.report())
+    analyzer.miss_ratio('data', 65536)       # fully associative 64 KiB
+    analyzer.miss_ratio('data', 32768, 8)    # one of the configs
+
+  ReuseProfile  all distances of a stream, kept with a Fenwick tree over
+                the times lines were last used (O(log n) a reference)
+  SetProfile    distances within each set, up to the most ways wanted
+
+Command line: python stack_distance.py PROGRAM [--max-cycles N]
+                  [--line-size BYTES] [--config SIZE:WAYS ...] [--json]
+"""
+
+
+# Reference streams
+INSTRUCTION, DATA = 'instruction', 'data'
+STREAMS = (INSTRUCTION, DATA)
+
+_MASK = 0xFFFFFFFF
+
+
+def _check_size(name, value):
+    """Sizes must be powers of two"""
+    if value < 1 or value & (value - 1):
+        raise ValueError(f"{name} must be a power of two, got {value}")
+
+
+def _bytes(text):
+    """'32768', '32K' or '1M' -> bytes"""
+    text = text.strip().upper().rstrip('B').rstrip('I')
+    scale = {'K': 1024, 'M': 1024 * 1024}.get(text[-1:], 1)
+    if scale != 1:
+        text = text[:-1]
+    return int(text) * scale
+
+
+def _size_text(size):
+    """4096 -> '4 KiB'"""
+    if size >= 1024 * 1024 and size % (1024 * 1024) == 0:
+        return f"{size // (1024 * 1024)} MiB"
+    if size >= 1024 and size % 1024 == 0:
+        return f"{size // 1024} KiB"
+    return f"{size} B"
+
+
+def parse_config(spec, line_size=64):
+    """
+    Turn a cache config into (size, ways)
+
+    Args:
+        spec: 'SIZE:WAYS' (SIZE in bytes, or with a K/M suffix) or a
+              (size, ways) tuple
+        line_size: Line size it has to fit
+    Returns:
+        (size, ways)
+    Raises:
+        ValueError: If the spec is malformed or the geometry doesn't work
+    """
+    if isinstance(spec, str):
+        parts = spec.split(':')
+        if len(parts) != 2:
+            raise ValueError(f"bad cache config {spec!r} (expected SIZE:WAYS, e.g. 32K:8)")
+        try:
+            size, ways = _bytes(parts[0]), int(parts[1])
+        except ValueError:
+            raise ValueError(f"bad cache config {spec!r} (expected SIZE:WAYS, e.g. 32K:8)") from None
+    else:
+        size, ways = spec
+    _check_size("cache size", size)
+    _check_size("ways", ways)
+    if ways * line_size > size:
+        raise ValueError(f"{ways} ways of {line_size} byte lines don't fit in {size} bytes")
+    return size, ways
+
+
+class ReuseProfile:
+    """
+    Stack distances of one line stream, for fully associative LRU caches
+
+    Every line's latest reference time holds a 1 in a Fenwick tree, so the
+    number of lines used since a line's last reference is a prefix sum.
+    Times are renumbered when the tree fills up.
+
+    Attributes:
+        histogram: histogram[d] = references with stack distance d
+        cold: First references to a line (a miss in any cache)
+    """
+
+    def __init__(self, capacity=1 << 16):
+        """
+        Args:
+            capacity: Initial tree size (it grows with the lines in use)
+        """
+        self.histogram = [0]
+        self.cold = 0
+        self._capacity = capacity
+        self._last = {}         # line -> time of its latest reference
+        self._tree = [0] * (capacity + 1)
+        self._clock = 0
+
+    @property
+    def references(self):
+        return self.cold + sum(self.histogram)
+
+    @property
+    def lines(self):
+        """Different lines referenced"""
+        return len(self._last)
+
+    def access(self, line):
+        """
+        Count one reference
+
+        Returns:
+            Its stack distance, or None for a first reference
+        """
+        last = self._last
+        tree = self._tree
+        size = len(tree)
+        clock = self._clock + 1
+        if clock == size:
+            self._compact()
+            last = self._last
+            tree = self._tree
+            size = len(tree)
+            clock = self._clock + 1
+        self._clock = clock
+
+        when = last.get(line)
+        if when is None:
+            self.cold += 1
+            distance = None
+        else:
+            # Lines whose latest reference came after this line's
+            seen = 0
+            i = when
+            while i:
+                seen += tree[i]
+                i &= i - 1
+            distance = len(last) - seen
+            i = when
+            while i < size:
+                tree[i] -= 1
+                i += i & -i
+            histogram = self.histogram
+            if distance >= len(histogram):
+                histogram.extend([0] * (distance + 1 - len(histogram)))
+            histogram[distance] += 1
+
+        last[line] = clock
+        i = clock
+        while i < size:
+            tree[i] += 1
+            i += i & -i
+        return distance
+
+    def _compact(self):
+        """Renumber the latest reference times 1..lines and rebuild the tree"""
+        order = sorted(self._last, key=self._last.get)
+        self._last = {line: time for time, line in enumerate(order, 1)}
+        count = len(order)
+        size = max(self._capacity, 2 * count) + 1
+        tree = [0] * size
+        for i in range(1, count + 1):
+            tree[i] = 1
+        for i in range(1, size):
+            j = i + (i & -i)
+            if j < size:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._clock = count
+
+    def misses(self, lines):
+        """Misses of a fully associative LRU cache holding this many lines"""
+        return self.cold + sum(self.histogram[lines:])
+
+    def miss_ratio(self, lines):
+        references = self.references
+        return self.misses(lines) / references if references else 0.0
+
+    def miss_curve(self):
+        """
+        Misses of every cache size at once
+
+        Returns:
+            List where curve[c] = misses with c lines; any bigger cache
+            misses curve[-1] times (the cold misses)
+        """
+        curve = [0] * (len(self.histogram) + 1)
+        misses = self.cold
+        curve[-1] = misses
+        for distance in range(len(self.histogram) - 1, -1, -1):
+            misses += self.histogram[distance]
+            curve[distance] = misses
+        return curve
+
+
+class SetProfile:
+    """
+    Stack distances within each set, for set-associative LRU caches with
+    one set count and any number of ways up to a limit
+
+    Attributes:
+        histogram: histogram[d] = references at depth d of their set's LRU stack
+        beyond: References not in the top `ways` of their set's stack
+    """
+
+    def __init__(self, sets, ways):
+        """
+        Args:
+            sets: Number of sets (a power of two)
+            ways: The most ways any cache of interest has
+        """
+        _check_size("sets", sets)
+        self.sets = sets
+        self.ways = ways
+        self._set_mask = sets - 1
+        self._stacks = [[] for _ in range(sets)]
+        self.histogram = [0] * ways
+        self.beyond = 0
+
+    @property
+    def references(self):
+        return self.beyond + sum(self.histogram)
+
+    def access(self, line):
+        """Count one reference (most recent first in each set's stack)"""
+        stack = self._stacks[line & self._set_mask]
+        if line in stack:
+            depth = stack.index(line)
+            self.histogram[depth] += 1
+            if depth:
+                del stack[depth]
+                stack.insert(0, line)
+        else:
+            self.beyond += 1
+            stack.insert(0, line)
+            if len(stack) > self.ways:
+                stack.pop()
+
+    def misses(self, ways):
+        """Misses with this many ways per set"""
+        if ways > self.ways:
+            raise ValueError(f"only tracked up to {self.ways} ways, not {ways}")
+        return self.beyond + sum(self.histogram[ways:])
+
+    def miss_ratio(self, ways):
+        references = self.references
+        return self.misses(ways) / references if references else 0.0
+
+
+class StackDistanceAnalyzer:
+    """
+    LRU miss ratios of every fully associative size and a list of
+    set-associative configs, from one run
+
+    Use it as a simulate() reporter, or feed it with step() / replay().
+
+    Attributes:
+        line_size: Bytes per line, the same for every cache analysed
+        configs: (size, ways) of the set-associative caches
+        profiles: Stream -> ReuseProfile
+        set_profiles: Stream -> {sets: SetProfile}
+        instructions: Instructions seen
+    """
+
+    def __init__(self, configs=(), line_size=64):
+        """
+        Args:
+            configs: Set-associative caches, as parse_config specs
+            line_size: Bytes per line (a power of two)
+        Raises:
+            ValueError: If a config is bad
+        """
+        _check_size("line size", line_size)
+        self.line_size = line_size
+        self._line_bits = line_size.bit_length() - 1
+        self.configs = [parse_config(config, line_size) for config in configs]
+        # One SetProfile per set count, deep enough for its most ways
+        depth = {}
+        for size, ways in self.configs:
+            sets = size // (ways * line_size)
+            depth[sets] = max(depth.get(sets, 0), ways)
+        self.profiles = {stream: ReuseProfile() for stream in STREAMS}
+        self.set_profiles = {stream: {sets: SetProfile(sets, ways) for sets, ways in depth.items()}
+                             for stream in STREAMS}
+        self.instructions = 0
+        self.trace, self._flush = self._tracer()
+
+    # ---- reporter interface ----
+
+    def start(self, cpu):
+        pass
+
+    def finish(self, cpu, result):
+        self._flush()
+
+    def _tracer(self):
+        """
+        The trace hook, as a closure. A reference to the same line as the
+        one before it in its stream has distance 0 everywhere and changes
+        no stack, so those are only counted.
+        """
+        shift = self._line_bits
+        fetch_profiles = [self.profiles[INSTRUCTION].access] + \
+            [profile.access for profile in self.set_profiles[INSTRUCTION].values()]
+        data_profiles = [self.profiles[DATA].access] + \
+            [profile.access for profile in self.set_profiles[DATA].values()]
+        last_fetch = last_data = -1
+        instructions = fetch_repeats = data_repeats = 0
+
+        def trace(cpu, decoded):
+            nonlocal last_fetch, last_data, instructions, fetch_repeats, data_repeats
+            instructions += 1
+            line = cpu.pc >> shift
+            if line == last_fetch:
+                fetch_repeats += 1
+            else:
+                last_fetch = line
+                for access in fetch_profiles:
+                    access(line)
+
+            name = decoded.name
+            if name == 'LW' or name == 'SW':
+                line = ((cpu.registers.registers[decoded.rs1] + decoded.imm) & _MASK) >> shift
+                if line == last_data:
+                    data_repeats += 1
+                else:
+                    last_data = line
+                    for access in data_profiles:
+                        access(line)
+
+        def flush():
+            """Add the counted repeats to the histograms"""
+            nonlocal instructions, fetch_repeats, data_repeats
+            self.instructions += instructions
+            for stream, repeats in ((INSTRUCTION, fetch_repeats), (DATA, data_repeats)):
+                self.profiles[stream].histogram[0] += repeats
+                for profile in self.set_profiles[stream].values():
+                    profile.histogram[0] += repeats
+            instructions = fetch_repeats = data_repeats = 0
+
+        return trace, flush
+
+    # ---- feeding it yourself ----
+
+    def step(self, pc, address=None):
+        """
+        One instruction: its fetch, and its data address if it has one
+
+        Args:
+            pc: Instruction address
+            address: LW/SW address, or None
+        """
+        self._flush()
+        self.instructions += 1
+        self._reference(INSTRUCTION, pc >> self._line_bits)
+        if address is not None:
+            self._reference(DATA, address >> self._line_bits)
+
+    def _reference(self, stream, line):
+        self.profiles[stream].access(line)
+        for profile in self.set_profiles[stream].values():
+            profile.access(line)
+
+    def replay(self, records):
+        """
+        Analyse a recorded trace
+
+        Args:
+            records: Iterable of trace records - tuples in RECORD field order
+                     (TraceRing, iter_trace) or a TRACE_DTYPE array
+        """
+        from trace_recorder import FLAG_LOAD, FLAG_STORE
+        if hasattr(records, 'dtype'):
+            records = zip(records['pc'].tolist(), records['mem_addr'].tolist(),
+                          records['flags'].tolist())
+        else:
+            records = ((record[1], record[4], record[7]) for record in records)
+        # The same as the live hook: repeats of the last line are only counted
+        self._flush()
+        shift = self._line_bits
+        fetch_profiles = [self.profiles[INSTRUCTION]] + list(self.set_profiles[INSTRUCTION].values())
+        data_profiles = [self.profiles[DATA]] + list(self.set_profiles[DATA].values())
+        last_fetch = last_data = -1
+        instructions = fetch_repeats = data_repeats = 0
+        for pc, address, flags in records:
+            instructions += 1
+            line = pc >> shift
+            if line == last_fetch:
+                fetch_repeats += 1
+            else:
+                last_fetch = line
+                for profile in fetch_profiles:
+                    profile.access(line)
+            if flags & (FLAG_LOAD | FLAG_STORE):
+                line = address >> shift
+                if line == last_data:
+                    data_repeats += 1
+                else:
+                    last_data = line
+                    for profile in data_profiles:
+                        profile.access(line)
+        self.instructions += instructions
+        fetch_profiles[0].histogram[0] += fetch_repeats
+        data_profiles[0].histogram[0] += data_repeats
+        for profile in fetch_profiles[1:]:
+            profile.histogram[0] += fetch_repeats
+        for profile in data_profiles[1:]:
+            profile.histogram[0] += data_repeats
+
+    # ---- results ----
+
+    def miss_ratio(self, stream, size, ways=None):
+        """
+        LRU miss ratio of one cache
+
+        Args:
+            stream: INSTRUCTION or DATA
+            size: Capacity in bytes
+            ways: None for fully associative, else one of the configs'
+                  set counts must match size // (ways * line_size)
+        Raises:
+            KeyError: If that set count wasn't analysed
+        """
+        self._flush()
+        if ways is None:
+            return self.profiles[stream].miss_ratio(size // self.line_size)
+        sets = size // (ways * self.line_size)
+        profile = self.set_profiles[stream].get(sets)
+        if profile is None or ways > profile.ways:
+            raise KeyError(f"{_size_text(size)} {ways}-way wasn't among the configs analysed")
+        return profile.miss_ratio(ways)
+
+    def sizes(self):
+        """Powers of two from 256 bytes (or a line) up to the first fully
+        associative size where every stream is down to its cold misses"""
+        self._flush()
+        lines = max(len(self.profiles[stream].histogram) for stream in STREAMS)
+        smallest = max(256, self.line_size)
+        size = smallest
+        while size < lines * self.line_size:
+            size *= 2
+        sizes = []
+        while size >= smallest:
+            sizes.append(size)
+            size //= 2
+        return sizes[::-1]
+
+    def to_dict(self):
+        """Counts and miss ratios as plain data, ready for json.dumps"""
+        self._flush()
+        sizes = self.sizes()
+        data = {'instructions': self.instructions, 'line_size': self.line_size, 'streams': {}}
+        for stream in STREAMS:
+            profile = self.profiles[stream]
+            data['streams'][stream] = {
+                'references': profile.references,
+                'lines': profile.lines,
+                'cold': profile.cold,
+                'fully_associative': [{'size': size, 'miss_ratio': self.miss_ratio(stream, size)}
+                                      for size in sizes],
+                'configs': [{'size': size, 'ways': ways, 'miss_ratio': self.miss_ratio(stream, size, ways)}
+                            for size, ways in self.configs],
+            }
+        return data
+
+    def report(self):
+        """Reference counts, the fully associative miss ratio curve and the configs"""
+        self._flush()
+        lines = [f"Stack distance analysis: {self.instructions} instructions, "
+                 f"{self.line_size} B lines", ""]
+        for stream in STREAMS:
+            profile = self.profiles[stream]
+            lines.append(f"  {stream:<12} {profile.references:>12} references "
+                         f"{profile.lines:>9} lines {profile.cold:>9} cold")
+        lines.append("")
+        lines.append("LRU miss ratio, fully associative:")
+        lines.append(f"  {'size':<18} {'instruction':>12} {'data':>12}")
+        for size in self.sizes():
+            ratios = [f"{100 * self.miss_ratio(stream, size):11.3f}%" for stream in STREAMS]
+            lines.append(f"  {_size_text(size):<18} {' '.join(ratios)}")
+        if self.configs:
+            lines.append("")
+            lines.append("LRU miss ratio, set-associative:")
+            lines.append(f"  {'cache':<18} {'instruction':>12} {'data':>12}")
+            for size, ways in self.configs:
+                ratios = [f"{100 * self.miss_ratio(stream, size, ways):11.3f}%" for stream in STREAMS]
+                lines.append(f"  {_size_text(size) + f' {ways}-way':<18} {' '.join(ratios)}")
+        return "\n".join(lines)
+
+
+# The configs the command line analyses when none are given
+DEFAULT_CONFIGS = ("4K:1", "4K:4", "8K:2", "16K:4", "32K:1", "32K:8", "64K:8", "256K:8")
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+    import json
+    from cpu import RISCV_CPU
+    from elf_loader import ProgramLoadError
+    from loader import HexLoadError
+
+    parser = argparse.ArgumentParser(
+        description="Run a program once and work out LRU miss ratios for many cache sizes")
+    parser.add_argument("program", help="hex, ELF, raw .bin or .ckpt file")
+    parser.add_argument("--max-cycles", type=int, default=10 ** 6,
+                        help="stop after this many instructions (default: 1000000)")
+    parser.add_argument("--line-size", type=int, default=64, help="bytes per line (default: 64)")
+    parser.add_argument("--config", action="append", metavar="SIZE:WAYS",
+                        help="a set-associative cache, e.g. 32K:8 (repeat for more; "
+                             "default: a small sweep)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    try:
+        analyzer = StackDistanceAnalyzer(args.config or DEFAULT_CONFIGS, args.line_size)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 2
+
+    cpu = RISCV_CPU()
+    try:
+        cpu.load(args.program)
+    except (HexLoadError, ProgramLoadError) as e:
+        print(f"Error: {e}")
+        return 1
+    cpu.simulate(args.max_cycles, reporter=analyzer)
+    if args.json:
+        print(json.dumps(analyzer.to_dict()))
+    else:
+        print(analyzer.report())
+    return 0
+
+
+# Test
+if __name__ == "__main__":
+    import sys
+    from cpu import RISCV_CPU
+
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    print("Testing stack distance analysis...")
+
+    # Sum 256 words from 0x1000 twice: 16 lines, reused after 15 others
+    program = [
+        0x00200193,  # addi x3, x0, 2
+        0x00001137,  # lui x2, 1          (x2 = 0x1000)
+        0x40000213,  # addi x4, x0, 1024
+        0x00012283,  # lw x5, 0(x2)
+        0x005080B3,  # add x1, x1, x5
+        0x00410113,  # addi x2, x2, 4
+        0xFFC20213,  # addi x4, x4, -4
+        0xFE0218E3,  # bne x4, x0, -16
+        0xFFF18193,  # addi x3, x3, -1
+        0xFE0190E3,  # bne x3, x0, -32
+        0x0000006F,  # halt
+    ]
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    analyzer = StackDistanceAnalyzer(configs=["1K:1", "1K:2"])
+    cpu.simulate(max_cycles=100000, reporter=analyzer)
+
+    data = analyzer.profiles[DATA]
+    print(f"Data references: {data.references} (expected 512)")
+    print(f"Cold misses: {data.cold} (expected 16)")
+    print(f"Misses with 16 lines: {data.misses(16)} (expected 16)")
+    print(f"Misses with 15 lines: {data.misses(15)} (expected 32)")
+    print()
+    print(analyzer.report())
+
+    print("\nStack distance analysis test complete!")
@@ -0,0 +1,96 @@
+"""
+Address -> symbol name index
+
+Filled from an ELF symbol table (see elf_loader.py) and used wherever
+the simulator wants to show a name instead of a bare address, like the
+verbose trace. Lookups are a binary search over the sorted start addresses.
+"""
+
+from bisect import bisect_right
+
+
+class SymbolTable:
+    """Symbols sorted by address, looked up by the address they contain"""
+
+    def __init__(self, symbols=()):
+        """
+        Args:
+            symbols: Iterable of (address, size, name) tuples
+        """
+        self.addresses = []
+        self.sizes = []
+        self.names = []
+        self.by_name = {}
+        for address, size, name in sorted(symbols):
+            self.addresses.append(address)
+            self.sizes.append(size)
+            self.names.append(name)
+            self.by_name.setdefault(name, address)
+
+    def add(self, address, size, name):
+        """
+        Add one symbol (keeps the table sorted)
+
+        Args:
+            address: Start address
+            size: Size in bytes (0 if unknown)
+            name: Symbol name
+        """
+        index = bisect_right(self.addresses, address)
+        self.addresses.insert(index, address)
+        self.sizes.insert(index, size)
+        self.names.insert(index, name)
+        self.by_name.setdefault(name, address)
+
+    def __len__(self):
+        return len(self.addresses)
+
+    def lookup(self, address):
+        """
+        Find the symbol an address falls in
+
+        An address belongs to the closest symbol at or below it - within
+        its size when the size is known, or up to the next symbol if not.
+
+        Returns:
+            (name, offset) tuple, or None
+        """
+        index = bisect_right(self.addresses, address) - 1
+        if index < 0:
+            return None
+        start = self.addresses[index]
+        size = self.sizes[index]
+        if size and address >= start + size:
+            return None
+        return self.names[index], address - start
+
+    def name_for(self, address):
+        """
+        Readable name for an address, like 'main' or 'main+0x1c'
+
+        Returns:
+            String, or None if no symbol covers the address
+        """
+        found = self.lookup(address)
+        if found is None:
+            return None
+        name, offset = found
+        return f"{name}+0x{offset:x}" if offset else name
+
+    def address_of(self, name):
+        """Address of a symbol by name, or None"""
+        return self.by_name.get(name)
+
+
+# Test
+if __name__ == "__main__":
+    print("Testing symbol table...")
+
+    table = SymbolTable([(0x100, 0x20, "main"), (0x0, 0x10, "_start"), (0x200, 0, "loop")])
+    print(f"0x000 -> {table.name_for(0x000)} (expected _start)")
+    print(f"0x11C -> {table.name_for(0x11C)} (expected main+0x1c)")
+    print(f"0x120 -> {table.name_for(0x120)} (expected None - past the end of main)")
+    print(f"0x300 -> {table.name_for(0x300)} (expected loop+0x100 - no size)")
+    print(f"main is at 0x{table.address_of('main'):X} (expected 0x100)")
+
+    print("\nSymbol table test complete!")
@@ -0,0 +1,306 @@
+import glob
+import random
+
+from assembler import ProgramBuilder, AssemblerError, assemble, np
+from cpu import RISCV_CPU
+from decoder import InstructionDecoder
+from memory import PagedMemory
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Operands each instruction takes, as builder arguments
+OPERANDS = {
+    'add': 'rrr', 'sub': 'rrr', 'and_': 'rrr', 'or_': 'rrr', 'xor': 'rrr',
+    'sll': 'rrr', 'srl': 'rrr', 'sra': 'rrr',
+    'addi': 'rri', 'andi': 'rri', 'ori': 'rri', 'xori': 'rri',
+    'slli': 'rrs', 'srli': 'rrs', 'srai': 'rrs',
+    'lw': 'rir', 'sw': 'rir', 'jalr': 'rir',
+    'beq': 'rrb', 'bne': 'rrb', 'blt': 'rrb', 'bge': 'rrb',
+    'jal': 'rj', 'lui': 'ru', 'auipc': 'ru',
+}
+
+def random_operand(rng, kind):
+    """A random builder argument of one kind"""
+    if kind == 'r':
+        return rng.randrange(32)
+    if kind == 'i':
+        return rng.randrange(-2048, 2048)
+    if kind == 's':
+        return rng.randrange(32)
+    if kind == 'b':
+        return 2 * rng.randrange(-2048, 2048)
+    if kind == 'j':
+        return 2 * rng.randrange(-(1 << 19), 1 << 19)
+    return rng.randrange(1 << 20)
+
+def run_program(builder, max_cycles=10000):
+    """Run a built program on a fresh CPU"""
+    cpu = RISCV_CPU()
+    builder.to_memory(cpu.memory)
+    cpu.pc = builder.origin
+    cpu.simulate(max_cycles=max_cycles)
+    return cpu
+
+def test_every_instruction():
+    """Test every instruction decodes back to its own name and text"""
+    print("\n=== Testing Every Instruction ===")
+    decoder = InstructionDecoder()
+    rng = random.Random(18)
+    passed = 0
+
+    names_ok = True
+    text_ok = True
+    for method, kinds in OPERANDS.items():
+        for _ in range(200):
+            b = ProgramBuilder()
+            getattr(b, method)(*[random_operand(rng, kind) for kind in kinds])
+            word = b.assemble()[0]
+            decoded = decoder.decode_record(word)
+            name = decoder.get_name(decoder.decode(word))
+            names_ok = names_ok and name == method.rstrip('_').upper()
+            # The disassembly assembles back to the same word
+            text_ok = text_ok and assemble(decoder.disassemble(decoded)) == [word]
+    passed += run_test(names_ok, f"get_name matches for all {len(OPERANDS)} instructions")
+    passed += run_test(text_ok, "disassemble -> assemble round trip")
+
+    # The bundled programs, word for word
+    same = True
+    for program in sorted(glob.glob("test_*.hex")):
+        with open(program) as f:
+            words = [int(line.split()[0], 16) for line in f
+                     if line.strip() and not line.startswith('#')]
+        text = "\n".join(decoder.disassemble(decoder.decode_record(w)) for w in words)
+        same = same and assemble(text) == words
+    passed += run_test(same, "Bundled hex programs reassemble from their disassembly")
+    return passed, 3
+
+def test_pseudo_instructions():
+    """Test li, mv, j, ret, nop and friends"""
+    print("\n=== Testing Pseudo-instructions ===")
+    passed = 0
+
+    values = [0, 1, -1, 2047, -2048, 2048, -2049, 0x800, 0xFFF, 0x12345678,
+              0x7FFFFFFF, 0x80000000, 0xFFFFFFFF, 0xFFFFF800, -0x80000000]
+    b = ProgramBuilder()
+    for i, value in enumerate(values):
+        b.li('t0', value)
+        b.sw('t0', 4 * i, 'gp')
+    b.halt()
+    cpu = RISCV_CPU()
+    b.to_memory(cpu.memory)
+    cpu.registers.write(3, 0x1000)
+    cpu.simulate(max_cycles=1000)
+    loaded = [cpu.memory.read_word(0x1000 + 4 * i) for i in range(len(values))]
+    passed += run_test(loaded == [v & 0xFFFFFFFF for v in values], f"li of {len(values)} edge values")
+    passed += run_test(assemble("li a0, 5\nli a0, 0x12345") == [0x00500513, 0x00012537, 0x34550513],
+                       "li is one instruction when it can be")
+
+    text = assemble("""
+        nop
+        mv a0, a1
+        j 8
+        jr t0
+        ret
+        call 12
+        beqz a0, -4
+        bnez a0, 4
+        bgt a0, a1, 8
+        ble a0, a1, 8
+        halt
+    """)
+    expected = assemble("""
+        addi x0, x0, 0
+        addi x10, x11, 0
+        jal x0, 8
+        jalr x0, 0(x5)
+        jalr x0, 0(x1)
+        jal x1, 12
+        beq x10, x0, -4
+        bne x10, x0, 4
+        blt x11, x10, 8
+        bge x11, x10, 8
+        jal x0, 0
+    """)
+    passed += run_test(text == expected, "Pseudo-instructions expand to the real ones")
+    return passed, 3
+
+def test_labels():
+    """Test labels, calls and la in running programs"""
+    print("\n=== Testing Labels ===")
+    passed = 0
+
+    # Recursive factorial with the return address on a stack
+    b = ProgramBuilder()
+    b.source("""
+        li   sp, 0x8000
+        li   a0, 10
+        call fact
+        la   t0, result
+        sw   a0, 0(t0)
+        halt
+    fact:                       # a0 = a0!
+        li   t1, 1
+        ble  a0, t1, base
+        addi sp, sp, -8
+        sw   ra, 4(sp)
+        sw   a0, 0(sp)
+        addi a0, a0, -1
+        call fact
+        lw   t1, 0(sp)
+        lw   ra, 4(sp)
+        addi sp, sp, 8
+        mv   t2, a0             # multiply by adding, no M extension
+        li   a0, 0
+    mul: add  a0, a0, t2
+        addi t1, t1, -1
+        bnez t1, mul
+        ret
+    base:
+        li   a0, 1
+        ret
+    result:
+        .word 0
+    """)
+    cpu = run_program(b, max_cycles=100000)
+    passed += run_test(cpu.halted and cpu.memory.read_word(b.labels['result']) == 3628800,
+                       "Recursive factorial of 10")
+
+    # Forward and backward labels from Python, loaded away from address 0
+    b = ProgramBuilder(origin=0x2000)
+    b.li('a0', 0)
+    b.li('a1', 0)
+    b.j('check')
+    b.label('loop')
+    b.addi('a0', 'a0', 3)
+    b.addi('a1', 'a1', 1)
+    b.label('check')
+    b.li('t0', 50)
+    b.blt('a1', 't0', 'loop')
+    b.halt()
+    cpu = run_program(b)
+    passed += run_test(cpu.registers.read(10) == 150 and cpu.pc == 0x2000 + 4 * (len(b) - 1),
+                       "Builder labels at origin 0x2000")
+    symbols = b.symbols()
+    passed += run_test(symbols.name_for(0x200C) == 'loop' and symbols.name_for(0x2018) == 'check+0x4',
+                       "Labels as a SymbolTable")
+
+    # A branch that only fits once it's patched in
+    b = ProgramBuilder()
+    b.beq(0, 0, 'far')
+    for _ in range(2000):
+        b.nop()
+    b.label('far')
+    try:
+        b.assemble()
+        raised = False
+    except AssemblerError as e:
+        raised = "out of range" in str(e) and "'far'" in str(e)
+    passed += run_test(raised, "Branch past 4 KiB to a label is an error")
+    return passed, 4
+
+def test_errors():
+    """Test problems are reported with their line"""
+    print("\n=== Testing Errors ===")
+    passed = 0
+
+    cases = [
+        ("addi x1, x0, 5\naddi x1, x0, 4096", 2, "out of range"),
+        ("nop\n\nfoo x1, x2", 3, "unknown instruction"),
+        ("add x1, x2, x99", 1, "unknown register"),
+        ("add x1, x2", 1, "takes 3 operand"),
+        ("lw x1, x2", 1, "offset(register)"),
+        ("j nowhere", 1, "undefined label"),
+        ("a:\nnop\na: nop", 3, "defined twice"),
+        ("beq x1, x2, 3", 1, "odd"),
+        ("slli x1, x1, 32", 1, "shift amount"),
+        ("addi x1, x0, five", 1, "expected a number"),
+    ]
+    ok = True
+    for text, line_num, reason in cases:
+        try:
+            assemble(text)
+            ok = False
+            print(f"    no error for {text!r}")
+        except AssemblerError as e:
+            if e.line_num != line_num or reason not in str(e):
+                ok = False
+                print(f"    {text!r}: {e}")
+    passed += run_test(ok, f"{len(cases)} bad programs rejected at the right line")
+
+    try:
+        ProgramBuilder().add('x1', 'x2', 'q7')
+        raised = False
+    except AssemblerError as e:
+        raised = "'q7'" in str(e)
+    passed += run_test(raised, "Builder names the bad register")
+    return passed, 2
+
+def test_outputs():
+    """Test memory, bytes and NumPy output"""
+    print("\n=== Testing Outputs ===")
+    passed = 0
+
+    b = ProgramBuilder(origin=0x400)
+    b.source("start: addi a0, a0, 1\nbne a0, a1, start\nhalt")
+    words = b.assemble()
+    memory = PagedMemory()
+    count = b.to_memory(memory)
+    passed += run_test(count == 3 and [memory.read_word(0x400 + 4 * i) for i in range(3)] == words,
+                       "to_memory writes at the origin")
+    passed += run_test(b.to_bytes() == b''.join(w.to_bytes(4, 'little') for w in words),
+                       "to_bytes is little-endian")
+
+    if np is None:
+        print("  NumPy not installed - skipping to_numpy")
+        passed += 1
+    else:
+        array = b.to_numpy()
+        passed += run_test(array.dtype == np.uint32 and array.tolist() == words, "to_numpy")
+    return passed, 3
+
+def run_all_tests():
+    """Run all assembler tests"""
+    print("=" * 60)
+    print("Assembler Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_every_instruction,
+        test_pseudo_instructions,
+        test_labels,
+        test_errors,
+        test_outputs,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
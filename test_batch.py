@@ -0,0 +1,134 @@
+import json
+import os
+import tempfile
+
+from batch import collect_jobs, run_batch, run_job
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(*names):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, *names)
+
+def write_hex(path, words):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write("".join(f"{word:08X}\n" for word in words))
+
+# addi x1, x0, 5 / addi x2, x0, 10 / add x3, x1, x2 / halt
+ADD_PROGRAM = [0x00500093, 0x00A00113, 0x002081B3, 0x0000006F]
+# addi x1, x1, 1 / jal x0, -4 - never halts
+SPIN_PROGRAM = [0x00108093, 0xFFDFF06F]
+
+def test_collect_jobs():
+    """Test directories and both manifest line formats"""
+    print("\n=== Testing Job Collection ===")
+    passed = 0
+
+    write_hex(scratch_path("progs", "b.hex"), ADD_PROGRAM)
+    write_hex(scratch_path("progs", "sub", "a.hex"), ADD_PROGRAM)
+    with open(scratch_path("progs", "notes.txt"), 'w') as f:
+        f.write("not a program")
+
+    jobs = collect_jobs(scratch_path("progs"), 500)
+    passed += run_test([os.path.basename(p) for p, _ in jobs] == ["b.hex", "a.hex"],
+                       "Directory walk finds programs only")
+    passed += run_test(all(limit == 500 for _, limit in jobs), "Default cycle limit")
+
+    manifest = scratch_path("progs", "manifest.txt")
+    with open(manifest, 'w') as f:
+        f.write("# regression set\n\nb.hex\nsub/a.hex 7\n"
+                '{"program": "b.hex", "max_cycles": 3}\n')
+    jobs = collect_jobs(manifest, 500)
+    passed += run_test([(os.path.relpath(p, scratch_path("progs")), limit) for p, limit in jobs] ==
+                       [("b.hex", 500), (os.path.join("sub", "a.hex"), 7), ("b.hex", 3)],
+                       "Manifest paths and per-job limits")
+    return passed, 3
+
+def test_run_job():
+    """Test a single job's record, including failures"""
+    print("\n=== Testing Single Jobs ===")
+    passed = 0
+
+    write_hex(scratch_path("jobs", "add.hex"), ADD_PROGRAM)
+    record = run_job(scratch_path("jobs", "add.hex"), 100)
+    passed += run_test(record['halt_reason'] == 'halt' and record['registers'][3] == 15,
+                       "Record has the result")
+
+    record = run_job(scratch_path("jobs", "missing.hex"), 100)
+    passed += run_test('error' in record and 'HexLoadError' in record['error'],
+                       "Missing file is recorded, not raised")
+    return passed, 2
+
+def test_run_batch():
+    """Test a pool run streams one record per job into the results file"""
+    print("\n=== Testing Batch Run ===")
+    passed = 0
+
+    jobs = []
+    for i in range(12):
+        path = scratch_path("batch", f"p{i:02d}.hex")
+        write_hex(path, SPIN_PROGRAM if i % 3 == 0 else ADD_PROGRAM)
+        jobs.append((path, 50 + i))
+    jobs.append((scratch_path("batch", "missing.hex"), 50))
+
+    results = scratch_path("batch", "results.jsonl")
+    summary = run_batch(jobs, results, workers=2, chunk_size=3)
+    with open(results) as f:
+        records = {r['program']: r for r in map(json.loads, f)}
+
+    passed += run_test(len(records) == 13 and summary.programs == 13, "One record per job")
+    passed += run_test(summary.failures == 1 and summary.halt_reasons == {'halt': 8, 'max_cycles': 4},
+                       "Summary counts")
+    spin = records[scratch_path("batch", "p03.hex")]
+    passed += run_test(spin['halt_reason'] == 'max_cycles' and spin['cycles'] == 53,
+                       "Per-job cycle limit applied")
+    return passed, 3
+
+def run_all_tests():
+    """Run all batch runner tests"""
+    print("=" * 60)
+    print("Batch Runner Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_collect_jobs,
+        test_run_job,
+        test_run_batch,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
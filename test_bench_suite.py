@@ -0,0 +1,188 @@
+import io
+import json
+import os
+import tempfile
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU
+from bench_suite import (PROGRAMS, MEMCPY_SOURCE, program_cpu, run_suite, make_entry,
+                         load_history, append_history, select_entry, compare, main)
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+def entry(results, label=None, commit=None):
+    """A minimal history entry"""
+    return {'label': label, 'commit': commit,
+            'results': {name: {'value': value, 'unit': unit} for name, (value, unit) in results.items()}}
+
+def test_programs():
+    """Test the benchmark programs do what they say, on both engines"""
+    print("\n=== Testing Benchmark Programs ===")
+    passed = 0
+    total = 0
+
+    for engine in RISCV_CPU.ENGINES:
+        cpu, iterations = program_cpu('arith', 4000, engine)
+        result = cpu.simulate(max_cycles=10 ** 6)
+        passed += run_test(result.halted and cpu.registers.read(1) == iterations and
+                           abs(result.cycles - 4000) < 20, f"arith ({engine})")
+
+        cpu, words = program_cpu('memcpy', 4000, engine)
+        cpu.simulate(max_cycles=10 ** 6)
+        read = cpu.memory.read_word
+        copied = all(read(0x80000 + 4 * i) == read(MEMCPY_SOURCE + 4 * i) for i in range(words))
+        passed += run_test(copied and cpu.memory.read_word(0x80000 + 4 * words) == 0,
+                           f"memcpy copies {words} words ({engine})")
+
+        cpu, iterations = program_cpu('branchy', 4000, engine)
+        cpu.simulate(max_cycles=10 ** 6)
+        taken = cpu.registers.read(6)
+        passed += run_test(taken + cpu.registers.read(7) == iterations and 0 < taken < iterations,
+                           f"branchy takes both paths ({engine})")
+
+        cpu, iterations = program_cpu('calls', 4000, engine)
+        result = cpu.simulate(max_cycles=10 ** 6)
+        passed += run_test(result.halted and cpu.registers.read(8) == iterations and
+                           cpu.registers.read(2) == 0x40000, f"calls unwind the stack ({engine})")
+        total += 4
+
+    return passed, total
+
+def test_suite():
+    """Test a small run covers everything"""
+    print("\n=== Testing Suite Run ===")
+    passed = 0
+
+    seen = []
+    results = run_suite(instructions=2000, calls=200, repeats=1,
+                        progress=lambda name, value, unit: seen.append(name))
+    programs = [name for name in results if name.startswith('program.')]
+    passed += run_test(len(programs) == len(PROGRAMS) * len(RISCV_CPU.ENGINES) and
+                       all(results[name]['unit'] == 'MIPS' for name in programs),
+                       f"{len(programs)} program benchmarks in MIPS")
+    passed += run_test('alu.execute' in results and 'memory.paged.write_byte' in results and
+                       results['decoder.decode']['unit'] == 'ns/call', "Microbenchmarks in ns/call")
+    passed += run_test(seen == list(results) and all(r['value'] > 0 for r in results.values()),
+                       "Progress reported for each")
+    only = run_suite(instructions=2000, calls=200, repeats=1, only='registers')
+    passed += run_test(sorted(only) == ['registers.read', 'registers.write'], "--only filter")
+    return passed, 4
+
+def test_history_and_compare():
+    """Test the history file and regression flags"""
+    print("\n=== Testing History and Compare ===")
+    passed = 0
+
+    path = scratch_path("history.jsonl")
+    first = make_entry({'x': {'value': 1.0, 'unit': 'MIPS'}}, label='before', settings={'repeats': 1})
+    append_history(path, first)
+    append_history(path, entry({'x': (2.0, 'MIPS')}, commit='abc1234'))
+    history = load_history(path)
+    passed += run_test(len(history) == 2 and history[0] == first and
+                       set(first['machine']) >= {'python', 'processor', 'cpus'},
+                       "Entries round-trip with machine metadata")
+    passed += run_test(select_entry(history, 'before') is history[0] and
+                       select_entry(history, 'abc') is history[1] and
+                       select_entry(history, '-1') is history[1], "Select by label, commit and index")
+    try:
+        select_entry(history, '7')
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Missing entry raises ValueError")
+
+    baseline = entry({'fast': (10.0, 'MIPS'), 'slow': (10.0, 'MIPS'), 'call': (100.0, 'ns/call'),
+                      'gone': (1.0, 'MIPS')})
+    current = entry({'fast': (12.0, 'MIPS'), 'slow': (9.0, 'MIPS'), 'call': (104.0, 'ns/call'),
+                     'new': (1.0, 'MIPS')})
+    rows = {row[0]: row for row in compare(baseline, current, threshold=5.0)}
+    passed += run_test(sorted(rows) == ['call', 'fast', 'slow'], "Only shared benchmarks compared")
+    passed += run_test(rows['slow'][5] and round(rows['slow'][4], 1) == 11.1 and
+                       not rows['fast'][5] and rows['fast'][4] < 0, "Fewer MIPS is slower")
+    passed += run_test(not rows['call'][5] and round(rows['call'][4], 1) == 4.0 and
+                       compare(baseline, current, threshold=3.0)[2][5], "More ns/call is slower")
+    return passed, 6
+
+def test_cli():
+    """Test run and compare from the command line"""
+    print("\n=== Testing Command Line ===")
+    passed = 0
+
+    path = scratch_path("cli.jsonl")
+    with redirect_stdout(io.StringIO()):
+        code = main(["--history", path, "run", "--quick", "--only", "arith",
+                     "--instructions", "2000", "--label", "one"])
+    history = load_history(path)
+    passed += run_test(code == 0 and len(history) == 1 and history[0]['label'] == 'one' and
+                       len(history[0]['results']) == len(RISCV_CPU.ENGINES), "run saves an entry")
+
+    # A copy twice as fast, then compare both ways
+    faster = json.loads(json.dumps(history[0]))
+    faster['label'] = 'two'
+    for result in faster['results'].values():
+        result['value'] *= 2
+    append_history(path, faster)
+    out = io.StringIO()
+    with redirect_stdout(out):
+        improved = main(["--history", path, "compare"])
+        regressed = main(["--history", path, "compare", "two", "one"])
+    passed += run_test(improved == 0 and regressed == 1 and "REGRESSION" in out.getvalue(),
+                       "compare exit code flags regressions")
+
+    with redirect_stdout(io.StringIO()):
+        code = main(["--history", path, "compare", "nothing"])
+    passed += run_test(code == 2, "Unknown entry is an error")
+    return passed, 3
+
+def run_all_tests():
+    """Run all benchmark suite tests"""
+    print("=" * 60)
+    print("Benchmark Suite Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_programs,
+        test_suite,
+        test_history_and_compare,
+        test_cli,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
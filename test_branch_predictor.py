@@ -0,0 +1,284 @@
+import io
+import json
+import random
+from contextlib import redirect_stdout
+
+from assembler import ProgramBuilder, assemble
+from cpu import RISCV_CPU
+from branch_predictor import (BranchEvaluator, BranchUnit, BimodalPredictor, GsharePredictor,
+                              TournamentPredictor, BranchTargetBuffer, ReturnAddressStack,
+                              parse_unit, control_transfer, BRANCH, JAL, JALR, main)
+from decoder import InstructionDecoder
+from trace_recorder import TraceRing
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def run(source, units, max_cycles=100000):
+    """A BranchEvaluator after running assembly source to its halt"""
+    b = ProgramBuilder()
+    b.source(source)
+    cpu = RISCV_CPU()
+    b.to_memory(cpu.memory)
+    evaluator = BranchEvaluator(units)
+    cpu.simulate(max_cycles=max_cycles, reporter=evaluator)
+    return evaluator
+
+def wrong(unit, kind='all'):
+    """Mispredicted transfers of one kind"""
+    return unit.totals()[kind][1]
+
+# 5 times round a 10-iteration loop
+NESTED_LOOPS = """
+        li   x1, 5
+    outer:
+        li   x2, 10
+    inner:
+        addi x2, x2, -1
+        bnez x2, inner
+        addi x1, x1, -1
+        bnez x1, outer
+        halt
+"""
+
+# A function called from two places in turn, 20 times
+TWO_CALLERS = """
+        li   s0, 10
+    loop:
+        call work
+        call work
+        addi s0, s0, -1
+        bnez s0, loop
+        halt
+    work:
+        addi a0, a0, 1
+        ret
+"""
+
+def test_direction_predictors():
+    """Test static, bimodal, gshare and tournament on known patterns"""
+    print("\n=== Testing Direction Predictors ===")
+    passed = 0
+
+    sweep = run(NESTED_LOOPS, ["static:not_taken", "static:taken", "static:btfn", "bimodal:64"])
+    never, always, btfn, bimodal = sweep.units
+    passed += run_test(never.totals()['branch'] == (55, 49) and wrong(always) == 6 and
+                       wrong(btfn) == 6, "Static policies on nested loops")
+    # Inner: first taken and last not taken the first time, then only the exit;
+    # outer: its first taken and its exit
+    passed += run_test(wrong(bimodal) == 2 + 4 + 2, "Bimodal counters")
+
+    # Taken, taken, not taken over and over: history sees it, one counter can't
+    pattern = [True, True, False] * 300
+    units = [BranchUnit(BimodalPredictor(64)), BranchUnit(GsharePredictor(256, 8)),
+             BranchUnit(TournamentPredictor(256, 8))]
+    for unit in units:
+        for taken in pattern:
+            unit.resolve(0x40, BRANCH, 0x20, taken, False, False)
+    bimodal, gshare, tournament = units
+    passed += run_test(wrong(bimodal) >= 290 and wrong(gshare) <= 10,
+                       "gshare learns a period-3 pattern bimodal can't")
+    passed += run_test(wrong(tournament) <= 20, "Tournament picks gshare for it")
+
+    # One table entry shared by two branches that go opposite ways
+    shared = BranchUnit(BimodalPredictor(1))
+    apart = BranchUnit(BimodalPredictor(16))
+    for _ in range(100):
+        for unit in (shared, apart):
+            unit.resolve(0x10, BRANCH, 0x0, True, False, False)
+            unit.resolve(0x14, BRANCH, 0x0, False, False, False)
+    passed += run_test(wrong(shared) >= 100 and wrong(apart) <= 2, "Aliasing in a small table")
+    return passed, 5
+
+def test_targets():
+    """Test the BTB and return address stack"""
+    print("\n=== Testing BTB and RAS ===")
+    passed = 0
+
+    sweep = run(TWO_CALLERS, ["bimodal:64", "bimodal:64+btb:64", "bimodal:64+ras:8",
+                              "bimodal:64+btb:64+ras:8"])
+    plain, btb, ras, both = sweep.units
+    passed += run_test(plain.totals()['jal'] == (20, 0) and plain.totals()['jalr'] == (20, 20),
+                       "No BTB: direct jumps known, returns never")
+    passed += run_test(wrong(btb, 'jal') == 2 and wrong(btb, 'jalr') == 20,
+                       "BTB: each call misses once, returns alternate and always miss")
+    passed += run_test(wrong(ras, 'jalr') == 0 and wrong(both, 'jalr') == 0, "RAS predicts every return")
+    # The first taken loop branch is predicted not taken, which fills the BTB in time
+    passed += run_test(wrong(both, 'branch') == wrong(plain, 'branch') == 2,
+                       "Taken branches need a BTB hit only once predicted taken")
+
+    # Recursion 12 deep with an 8-entry stack: the outer 4 returns miss
+    deep = run("""
+            li   sp, 0x8000
+            li   a0, 12
+            call down
+            halt
+        down:
+            addi sp, sp, -4
+            sw   ra, 0(sp)
+            addi a0, a0, -1
+            beqz a0, bottom
+            call down
+        bottom:
+            lw   ra, 0(sp)
+            addi sp, sp, 4
+            ret
+    """, ["bimodal:64+ras:8", "bimodal:64+ras:16"])
+    passed += run_test(deep.units[0].totals()['jalr'] == (12, 4) and wrong(deep.units[1], 'jalr') == 0,
+                       "RAS overflow loses the oldest return addresses")
+
+    table = BranchTargetBuffer(4)
+    table.update(0x100, 0x200)
+    table.update(0x110, 0x300)      # same slot
+    stack = ReturnAddressStack(2)
+    for address in (1, 2, 3):
+        stack.push(address)
+    passed += run_test(table.lookup(0x100) is None and table.lookup(0x110) == 0x300 and
+                       [stack.pop(), stack.pop(), stack.pop()] == [3, 2, None],
+                       "BTB conflicts and RAS depth")
+    return passed, 6
+
+def test_single_pass():
+    """Test one pass over many units matches one run per unit, live or replayed"""
+    print("\n=== Testing Single-Pass Evaluation ===")
+    rng = random.Random(20)
+    passed = 0
+
+    specs = ["static:btfn", "bimodal:16", "gshare:64:4+btb:8", "tournament:64:6+btb:16+ras:4"]
+    same = True
+    replayed = True
+    for _ in range(80):
+        count = rng.randrange(4, 40)
+        words = [random_instruction(rng, count) for _ in range(count)] + [0x0000006F]
+
+        def fresh():
+            cpu = RISCV_CPU()
+            for i, word in enumerate(words):
+                cpu.memory.write_word(i * 4, word)
+            return cpu
+
+        together = BranchEvaluator(specs)
+        fresh().simulate(max_cycles=400, reporter=together)
+        for unit in together.units:
+            alone = BranchEvaluator([unit.name])
+            fresh().simulate(max_cycles=400, reporter=alone)
+            same = same and alone.units[0].to_dict() == unit.to_dict()
+
+        ring = TraceRing()
+        cpu = fresh()
+        cpu.simulate(max_cycles=400, reporter=ring)
+        again = BranchEvaluator(specs)
+        again.replay(ring, end_pc=cpu.pc)
+        replayed = replayed and again.to_dict() == together.to_dict()
+    passed += run_test(same, f"{len(specs)} units in one pass = {len(specs)} runs")
+    passed += run_test(replayed, "Replaying a trace = evaluating live")
+    return passed, 2
+
+def test_specs():
+    """Test parse_unit"""
+    print("\n=== Testing Unit Specs ===")
+    passed = 0
+
+    unit = parse_unit("gshare:4096:12+btb:512+ras:16")
+    passed += run_test(unit.name == "gshare:4096:12+btb:512+ras:16" and
+                       unit.direction.history_bits == 12 and unit.btb.entries == 512 and
+                       unit.ras.depth == 16, "Full spec")
+    passed += run_test(parse_unit("tournament").direction.name == "tournament:4096:12" and
+                       BranchUnit(GsharePredictor(1024)).name == "gshare:1024:10",
+                       "Defaults and generated names")
+    bad = ["perceptron", "bimodal:1000", "static:sometimes", "gshare:16:4:4", "bimodal+l2:4",
+           "gshare:x"]
+    rejected = 0
+    for spec in bad:
+        try:
+            parse_unit(spec)
+        except ValueError:
+            rejected += 1
+    passed += run_test(rejected == len(bad), f"{len(bad)} bad specs rejected")
+    return passed, 3
+
+def test_reports():
+    """Test the report, JSON and command line"""
+    print("\n=== Testing Reports ===")
+    passed = 0
+
+    sweep = run(TWO_CALLERS, ["bimodal:64", "bimodal:64+ras:8"])
+    text = sweep.report(detail="bimodal:64")
+    passed += run_test("bimodal:64+ras:8" in text and "MPKI" in text and
+                       "Most mispredicted with bimodal:64 " in text and " jalr " in text, "report")
+    data = json.loads(json.dumps(sweep.to_dict()))
+    passed += run_test(data['instructions'] == sweep.instructions and
+                       data['units'][1]['totals']['jalr'] == {'executed': 20, 'mispredicted': 0},
+                       "to_dict")
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main(["test_branch.hex", "--unit", "static:btfn", "--unit", "bimodal:16+btb:4"])
+        bad = main(["test_branch.hex", "--unit", "bimodal:3"])
+    passed += run_test(code == 0 and bad == 2 and "bimodal:16+btb:4" in out.getvalue(),
+                       "Command line")
+    return passed, 3
+
+def test_control_transfer():
+    """Test branches, jumps, calls and returns are told apart"""
+    print("\n=== Testing Transfer Classification ===")
+    passed = 0
+
+    decoder = InstructionDecoder()
+    words = assemble("beq x1, x2, -8\njal x1, 16\njal x0, 8\njalr x0, 0(x1)\n"
+                     "jalr x5, 0(x6)\njalr x0, 0(x6)\naddi x1, x1, 1\nlw x1, 0(x2)")
+    got = [control_transfer(decoder.decode_record(word)) for word in words]
+    branch = decoder.decode_record(words[0]).imm
+    passed += run_test(got == [(BRANCH, branch, False, False), (JAL, 16, True, False),
+                               (JAL, 8, False, False), (JALR, 0, False, True),
+                               (JALR, 0, True, False), (JALR, 0, False, False), None, None],
+                       "Kinds, offsets, calls and returns")
+    return passed, 1
+
+def run_all_tests():
+    """Run all branch predictor tests"""
+    print("=" * 60)
+    print("Branch Predictor Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_direction_predictors,
+        test_targets,
+        test_single_pass,
+        test_specs,
+        test_reports,
+        test_control_transfer,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,122 @@
+import random
+
+from decoder import InstructionDecoder
+from bulk_decode import np, decode_array, mnemonics, decode_memory, TYPE_CODES
+from memory import Memory
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def compare_with_scalar(words):
+    """Decode words both ways and return the words that disagree"""
+    decoder = InstructionDecoder()
+    decoded = decode_array(np.array(words, dtype=np.uint32))
+    names = mnemonics(decoded)
+    mismatches = []
+
+    for i, word in enumerate(words):
+        expected = decoder.decode_record(word)
+        row = decoded[i]
+        same = (int(row['opcode']) == expected.opcode and
+                int(row['rd']) == expected.rd and
+                int(row['rs1']) == expected.rs1 and
+                int(row['rs2']) == expected.rs2 and
+                int(row['funct3']) == expected.funct3 and
+                int(row['funct7']) == expected.funct7 and
+                int(row['type']) == TYPE_CODES[expected.type] and
+                # Scalar immediates are unsigned 32-bit patterns
+                (int(row['imm']) & 0xFFFFFFFF) == expected.imm and
+                names[i] == expected.name)
+        if not same:
+            mismatches.append(word)
+
+    return mismatches
+
+def test_random_words():
+    """Test random 32-bit patterns decode the same as the scalar decoder"""
+    print("\n=== Testing Random Words ===")
+    rng = random.Random(42)
+    words = [rng.getrandbits(32) for _ in range(100000)]
+
+    mismatches = compare_with_scalar(words)
+    return run_test(not mismatches, f"100000 random words match ({len(mismatches)} mismatches)"), 1
+
+def test_every_opcode():
+    """Test every opcode with random upper bits, plus the sign-bit edges"""
+    print("\n=== Testing Every Opcode ===")
+    rng = random.Random(7)
+    words = []
+    for opcode in range(128):
+        words.append(opcode)
+        words.append(0xFFFFFF80 | opcode)
+        words.append(0x80000000 | opcode)
+        words.append(0x7FFFFF80 | opcode)
+        for _ in range(50):
+            words.append((rng.getrandbits(25) << 7) | opcode)
+
+    mismatches = compare_with_scalar(words)
+    return run_test(not mismatches, f"{len(words)} opcode patterns match ({len(mismatches)} mismatches)"), 1
+
+def test_decode_memory():
+    """Test decoding straight out of a Memory object"""
+    print("\n=== Testing Decode From Memory ===")
+    passed = 0
+
+    mem = Memory()
+    program = [0x00500093, 0x00A00113, 0x002081B3, 0x0000006F]
+    for i, inst in enumerate(program):
+        mem.write_word(i * 4, inst)
+
+    decoded = decode_memory(mem, 0x0, len(program))
+    names = list(mnemonics(decoded))
+    passed += run_test(names == ["ADDI", "ADDI", "ADD", "JAL"], "Names from memory")
+    passed += run_test(int(decoded[1]['imm']) == 10, "Immediate from memory")
+    return passed, 2
+
+def run_all_tests():
+    """Run all bulk decoder tests"""
+    print("=" * 60)
+    print("Bulk Decoder Tests")
+    print("=" * 60)
+
+    if np is None:
+        print("NumPy not installed - skipping bulk decoder tests")
+        return 0
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_random_words,
+        test_every_opcode,
+        test_decode_memory,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
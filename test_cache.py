@@ -0,0 +1,309 @@
+import json
+import random
+
+from assembler import ProgramBuilder
+from bench_suite import program_cpu
+from cpu import RISCV_CPU
+from cache import Cache, CacheHierarchy, MainMemory, FETCH, LOAD, STORE, WRITEBACK
+from trace_recorder import TraceRing
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def lone(size, ways, line_size=16, policy='lru', write_back=True, seed=0):
+    """A cache with main memory straight below it"""
+    cache = Cache('C', size, ways, line_size, policy, write_back, seed=seed)
+    cache.next_level = MainMemory()
+    return cache
+
+def load_lines(cache, lines, line_size=16):
+    """Load one word from each line number in turn"""
+    for line in lines:
+        cache.access(line * line_size, LOAD)
+
+def run(source, caches, max_cycles=100000):
+    """Run assembly source to its halt with caches attached"""
+    b = ProgramBuilder()
+    b.source(source)
+    cpu = RISCV_CPU()
+    b.to_memory(cpu.memory)
+    return cpu.simulate(max_cycles=max_cycles, reporter=caches)
+
+# Sums 256 words twice: 16 lines of 64 bytes, all hits the second time
+SUM_TWICE = """
+        li   s0, 2
+    again:
+        li   t0, 0x1000
+        li   t1, 256
+    loop:
+        lw   t2, 0(t0)
+        add  a0, a0, t2
+        addi t0, t0, 4
+        addi t1, t1, -1
+        bnez t1, loop
+        addi s0, s0, -1
+        bnez s0, again
+        halt
+"""
+
+def test_replacement():
+    """Test LRU, tree pseudo-LRU and random replacement pick different victims"""
+    print("\n=== Testing Replacement Policies ===")
+    passed = 0
+
+    # A fully associative 4-line cache: fill it, touch A, then bring in E
+    lru = lone(64, 4)
+    plru = lone(64, 4, policy='plru')
+    for cache in (lru, plru):
+        load_lines(cache, [1, 2, 3, 4, 1, 5])
+    passed += run_test(not lru.contains(2 * 16) and lru.contains(3 * 16),
+                       "LRU evicts the least recently used line")
+    # The tree points away from A's half, then away from D within C/D
+    passed += run_test(not plru.contains(3 * 16) and plru.contains(2 * 16),
+                       "PLRU evicts the line its tree points at")
+
+    # Cycling round 5 lines in 4 frames: LRU always evicts the next one wanted
+    cyclic = [1, 2, 3, 4, 5] * 100
+    lru, shuffle = lone(64, 4), lone(64, 4, policy='random')
+    load_lines(lru, cyclic)
+    load_lines(shuffle, cyclic)
+    passed += run_test(lru.misses[LOAD] == 500 and shuffle.misses[LOAD] < 400,
+                       "Cyclic access thrashes LRU, random does better")
+
+    counts = []
+    for seed in (1, 1):
+        cache = lone(64, 4, policy='random', seed=seed)
+        load_lines(cache, [random.Random(7).randrange(12) for _ in range(300)])
+        counts.append((cache.misses[LOAD], list(cache.tags)))
+    passed += run_test(counts[0] == counts[1], "Random replacement repeats with the seed")
+    return passed, 4
+
+def test_conflicts():
+    """Test set mapping: lines a set apart compete, others don't"""
+    print("\n=== Testing Set Conflicts ===")
+    passed = 0
+
+    # 2 ways, 4 sets: lines 0, 4 and 8 all land in set 0
+    cache = lone(128, 2)
+    load_lines(cache, [0, 4, 8] * 10)
+    passed += run_test(cache.misses[LOAD] == 30 and cache.hits[LOAD] == 0,
+                       "Three lines in a 2-way set always miss")
+    cache = lone(128, 2)
+    load_lines(cache, [0, 1, 2] * 10)
+    passed += run_test(cache.misses[LOAD] == 3 and cache.hits[LOAD] == 27,
+                       "Three lines in three sets only miss once each")
+    # Same capacity, fully associative
+    cache = lone(128, 8)
+    load_lines(cache, [0, 4, 8] * 10)
+    passed += run_test(cache.misses[LOAD] == 3, "Fully associative has no conflicts")
+    return passed, 3
+
+def test_write_policies():
+    """Test write-back dirty evictions and write-through stores"""
+    print("\n=== Testing Write Policies ===")
+    passed = 0
+
+    # 2 sets of 2 ways: 0x100, 0x200 and 0x300 are all in set 0
+    caches = CacheHierarchy(l1d=Cache('L1D', 64, 2, 16), l2=Cache('L2', 1024, 4, 16))
+    caches.step(0, 0x100, store=True)
+    passed += run_test(caches.l1d.misses[STORE] == 1 and caches.l1d.contains(0x100),
+                       "Write-back allocates on a store miss")
+    caches.step(4, 0x200)
+    caches.step(8, 0x300)
+    passed += run_test(caches.l1d.writebacks == 1 and caches.l2.hits[WRITEBACK] == 1 and
+                       caches.memory.accesses[WRITEBACK] == 0,
+                       "Evicting a dirty line writes it back to L2")
+    caches.step(12, 0x400)
+    passed += run_test(caches.l1d.writebacks == 1, "Clean lines are dropped")
+
+    caches = CacheHierarchy(l1d=Cache('L1D', 64, 2, 16, write_back=False), l2=None)
+    caches.step(0, 0x100, store=True)
+    missed = not caches.l1d.contains(0x100)
+    caches.step(4, 0x100)
+    caches.step(8, 0x100, store=True)
+    passed += run_test(missed and caches.l1d.hits[STORE] == 1 and
+                       caches.memory.accesses[STORE] == 2 and caches.l1d.writebacks == 0,
+                       "Write-through sends every store down without allocating")
+    return passed, 4
+
+def test_fast_path():
+    """Test counting while the CPU runs matches replaying its trace access by access"""
+    print("\n=== Testing Live Counting = Replay ===")
+    rng = random.Random(21)
+    passed = 0
+
+    def tiny(policy, write_back):
+        return CacheHierarchy(l1i=Cache('L1I', 256, 2, 16, policy),
+                              l1d=Cache('L1D', 256, 2, 16, policy, write_back),
+                              l2=Cache('L2', 1024, 4, 32, policy, hit_latency=10))
+
+    def both(cpu, caches, max_cycles):
+        """Run with caches attached and a TraceRing recording"""
+        ring = TraceRing(capacity=max_cycles)
+
+        class Both:
+            def start(self, cpu):
+                ring.start(cpu)
+
+            def finish(self, cpu, result):
+                caches.finish(cpu, result)
+                ring.finish(cpu, result)
+
+            def trace(self, cpu, decoded):
+                ring.trace(cpu, decoded)
+                caches.trace(cpu, decoded)
+
+        cpu.simulate(max_cycles=max_cycles, reporter=Both())
+        return ring
+
+    configs = [(policy, write_back) for policy in ('lru', 'plru', 'random')
+               for write_back in (True, False)]
+    same = True
+    for name in ('memcpy', 'calls'):
+        for policy, write_back in configs:
+            cpu, _ = program_cpu(name, 6000)
+            live = tiny(policy, write_back)
+            ring = both(cpu, live, 20000)
+            again = tiny(policy, write_back)
+            again.replay(ring)
+            same = same and live.to_dict() == again.to_dict()
+    passed += run_test(same, "Benchmark programs, every policy")
+
+    same = True
+    for _ in range(40):
+        count = rng.randrange(4, 40)
+        words = [random_instruction(rng, count) for _ in range(count)] + [0x0000006F]
+        for policy, write_back in configs:
+            cpu = RISCV_CPU()
+            for i, word in enumerate(words):
+                cpu.memory.write_word(i * 4, word)
+            live = tiny(policy, write_back)
+            ring = both(cpu, live, 400)
+            again = tiny(policy, write_back)
+            again.replay(ring)
+            same = same and live.to_dict() == again.to_dict()
+    passed += run_test(same, "Random programs, every policy")
+    return passed, 2
+
+def test_amat():
+    """Test AMAT from hit latencies and miss rates"""
+    print("\n=== Testing AMAT ===")
+    passed = 0
+
+    # Four loads from one line: one miss all the way to memory
+    caches = CacheHierarchy()
+    flat = CacheHierarchy(l2=None)
+    for hierarchy in (caches, flat):
+        for offset in range(0, 16, 4):
+            hierarchy.l1d.access(0x2000 + offset, LOAD)
+    passed += run_test(caches.amat(caches.l1d) == 1 + 0.25 * (10 + 100), "L1 + L2 + memory")
+    passed += run_test(flat.amat(flat.l1d) == 1 + 0.25 * 100, "No L2")
+
+    caches = CacheHierarchy(memory_latency=200)
+    run(SUM_TWICE, caches)
+    l1i, l1d, l2 = caches.l1i, caches.l1d, caches.l2
+    expected = 1 + l1d.miss_rate() * (10 + l2.miss_rate() * 200)
+    instructions = l1i.accesses()
+    overall = (caches.amat(l1i) * instructions + caches.amat(l1d) * l1d.accesses()) / \
+              (instructions + l1d.accesses())
+    passed += run_test(abs(caches.amat(l1d) - expected) < 1e-12 and
+                       abs(caches.amat() - overall) < 1e-12, "Weighted over both L1s")
+    return passed, 3
+
+def test_geometry():
+    """Test bad cache shapes are rejected"""
+    print("\n=== Testing Geometry Checks ===")
+    passed = 0
+
+    bad = [dict(size=3000), dict(ways=3), dict(line_size=48), dict(size=256, ways=8),
+           dict(policy='fifo'), dict(size=65536, ways=128, line_size=4, policy='plru')]
+    rejected = 0
+    for options in bad:
+        arguments = dict(size=4096, ways=4, line_size=64)
+        arguments.update(options)
+        try:
+            Cache('C', **arguments)
+        except ValueError:
+            rejected += 1
+    passed += run_test(rejected == len(bad), f"{len(bad)} bad shapes rejected")
+    cache = Cache('C', 4096, ways=64, line_size=64)
+    passed += run_test(cache.sets == 1 and Cache('C', 4096, 1, 64).sets == 64,
+                       "Fully associative and direct mapped")
+    return passed, 2
+
+def test_reports():
+    """Test counts from a run, the report and to_dict"""
+    print("\n=== Testing Reports ===")
+    passed = 0
+
+    caches = CacheHierarchy()
+    result = run(SUM_TWICE, caches)
+    l1d = caches.l1d
+    passed += run_test(caches.l1i.accesses() == result.cycles and
+                       l1d.hits[LOAD] + l1d.misses[LOAD] == 512 and l1d.misses[LOAD] == 16,
+                       "Every fetch and load counted, second pass hits")
+
+    text = caches.report()
+    passed += run_test("L1D 32 KiB 8-way 64 B lines, lru, write-back" in text and
+                       "AMAT" in text and "memory reads 17" in text, "report")
+    data = json.loads(json.dumps(caches.to_dict()))
+    passed += run_test(data['caches']['L1D']['misses']['load'] == 16 and
+                       data['memory'][FETCH] == 1 and data['amat']['data'] == caches.amat(l1d),
+                       "to_dict")
+
+    # Counts carry on across runs until reset()
+    run(SUM_TWICE, caches)
+    carried = l1d.hits[LOAD] + l1d.misses[LOAD] == 1024
+    caches.reset()
+    passed += run_test(carried and caches.l1d.accesses() == 0 and not caches.l1d.contains(0x1000),
+                       "Counts accumulate, reset empties")
+    return passed, 4
+
+def run_all_tests():
+    """Run all cache tests"""
+    print("=" * 60)
+    print("Cache Hierarchy Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_replacement,
+        test_conflicts,
+        test_write_policies,
+        test_fast_path,
+        test_amat,
+        test_geometry,
+        test_reports,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,298 @@
+import io
+import os
+import pickle
+import struct
+import tempfile
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU, main
+from memory import PagedMemory, MemoryAccessError
+from mapped_memory import map_file
+from elf_loader import ProgramLoadError
+from checkpoint import dumps, loads, save_checkpoint, load_checkpoint
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+# Sums 1..200 into x1, storing the running total at 0x2000 every iteration
+LOOP_PROGRAM = [
+    0x00000093,  # addi x1, x0, 0
+    0x00000113,  # addi x2, x0, 0
+    0x0C800193,  # addi x3, x0, 200
+    0x00110113,  # addi x2, x2, 1
+    0x002080B3,  # add x1, x1, x2
+    0x000022B7,  # lui x5, 0x2
+    0x0012A023,  # sw x1, 0(x5)
+    0xFE3118E3,  # bne x2, x3, -16
+    0x0000006F,  # halt
+]
+
+def make_cpu(engine='interpreter', memory='paged'):
+    cpu = RISCV_CPU(engine=engine, memory=memory)
+    for i, inst in enumerate(LOOP_PROGRAM):
+        cpu.memory.write_word(i * 4, inst)
+    return cpu
+
+def nonzero(words):
+    """A word table without its zero entries"""
+    return {address: value for address, value in words.items() if value}
+
+def state(cpu):
+    """Everything a checkpoint is supposed to capture"""
+    return (cpu.pc, cpu.cycle_count, cpu.halted, cpu.halt_reason,
+            list(cpu.registers.registers), cpu.memory.nonzero_words())
+
+def test_restore_replays():
+    """Test running on from a restored checkpoint ends the same way"""
+    print("\n=== Testing Restore ===")
+    passed = 0
+    total = 0
+
+    for memory in ('dict', 'paged'):
+        for engine in RISCV_CPU.ENGINES:
+            cpu = make_cpu(engine, memory)
+            cpu.simulate(max_cycles=300)
+            saved = cpu.checkpoint()
+            at_checkpoint = state(cpu)
+            cpu.simulate(max_cycles=2000)
+            finished = state(cpu)
+
+            cpu.restore(saved)
+            same_start = state(cpu) == at_checkpoint
+            cpu.simulate(max_cycles=2000)
+            cpu.restore(saved)              # a second restore of the same checkpoint
+            cpu.simulate(max_cycles=2000)
+            passed += run_test(same_start and state(cpu) == finished and cpu.registers.read(1) == 20100,
+                               f"{memory}/{engine} replays to the same end state")
+            total += 1
+
+    return passed, total
+
+def test_copy_on_write_cost():
+    """Test a checkpoint only copies pages written since the last one"""
+    print("\n=== Testing Copy-On-Write ===")
+    passed = 0
+
+    mem = PagedMemory()
+    for page_num in range(2048):                      # 8 MiB of guest data
+        mem.write_word(0x100000 + (page_num << 12), page_num + 1)
+    first = mem.snapshot()
+
+    for page_num in (3, 700, 2000):
+        mem.write_word(0x100000 + (page_num << 12) + 8, 0xAB)
+    second = mem.snapshot()
+
+    copied = [pn for pn in second.pages if second.pages[pn] is not first.pages[pn]]
+    passed += run_test(len(copied) == 3, f"Second checkpoint copied {len(copied)} page(s) (expected 3)")
+    passed += run_test(all(page.readonly for page in second.pages.values()), "Snapshot pages are read-only")
+
+    mem.write_word(0x100000, 0x55)
+    old = PagedMemory()
+    old.restore(first)
+    passed += run_test(old.read_word(0x100000) == 1 and old.read_word(0x103008) == 0,
+                       "Earlier snapshot unchanged by later writes")
+
+    # Restoring shares pages instead of copying them
+    mem.restore(second)
+    passed += run_test(mem.byte_pages[0x100] is second.pages[0x100], "Restore shares pages")
+    mem.write_word(0x100000, 7)
+    passed += run_test(second.pages[0x100][0] == 1 and mem.read_word(0x100000) == 7,
+                       "Write after restore copies the page")
+    return passed, 5
+
+def test_fork():
+    """Test forked CPUs run independently from the same state"""
+    print("\n=== Testing Fork ===")
+    passed = 0
+
+    parent = make_cpu('translate')
+    parent.simulate(max_cycles=100)
+    child = parent.fork()
+    grandchild = child.fork(engine='interpreter')
+
+    passed += run_test(state(child) == state(parent), "Fork starts in the same state")
+    passed += run_test(grandchild.engine == 'interpreter' and child.engine == 'translate',
+                       "Engine can be changed")
+
+    child.registers.write(3, child.registers.read(2) + 5)    # child's loop ends sooner
+    child.simulate(max_cycles=5000)
+    parent.simulate(max_cycles=5000)
+    grandchild.simulate(max_cycles=5000)
+
+    passed += run_test(parent.registers.read(1) == 20100 and parent.memory.read_word(0x2000) == 20100,
+                       "Parent unaffected by the child")
+    passed += run_test(child.halted and child.cycle_count < parent.cycle_count and
+                       child.memory.read_word(0x2000) == child.registers.read(1) < 20100,
+                       "Child ran its own way")
+    passed += run_test(state(grandchild) == state(parent), "Grandchild matches the parent")
+    return passed, 5
+
+def test_restore_keeps_cache():
+    """Test restore only invalidates cached code on pages that changed"""
+    print("\n=== Testing Code Caches Across Restore ===")
+    passed = 0
+
+    cpu = make_cpu('translate')
+    cpu.simulate(max_cycles=50)
+    saved = cpu.checkpoint()
+    cpu.simulate(max_cycles=2000)
+    blocks = len(cpu.translator.blocks)
+    cpu.restore(saved)
+    passed += run_test(blocks and len(cpu.translator.blocks) == blocks,
+                       "Translated blocks survive a restore (code page untouched)")
+
+    # Patch the code, then restore - the old code must come back
+    cpu.memory.write_word(8, 0x00A00193)       # addi x3, x0, 10
+    cpu.restore(saved)
+    cpu.simulate(max_cycles=5000)
+    passed += run_test(cpu.registers.read(1) == 20100, "Patched code undone by restore")
+    return passed, 2
+
+def test_mapped_regions():
+    """Test snapshots of memory with mapped files"""
+    print("\n=== Testing Mapped Regions ===")
+    passed = 0
+
+    path = scratch_path("data.bin")
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<2048I', *range(1, 2049)))
+
+    mem = PagedMemory()
+    map_file(mem, 0x40000000, path, mode='cow')
+    map_file(mem, 0x50000000, path, mode='readonly')
+    saved = mem.snapshot()
+
+    mem.write_word(0x40001000, 99)      # faulted in after the snapshot, then written
+    mem.restore(saved)
+    passed += run_test(mem.read_word(0x40001000) == 1025, "Mapped page comes back from the file")
+
+    try:
+        mem.write_word(0x50000000, 5)
+        raised = False
+    except MemoryAccessError:
+        raised = True
+    passed += run_test(raised, "Read-only mapping still refuses writes")
+
+    restored = loads(dumps(RISCV_CPU(memory=mem).checkpoint()))
+    copy = PagedMemory()
+    copy.restore(restored.memory)
+    passed += run_test(copy.read_word(0x40001FFC) == 2048 and copy.read_word(0x50000004) == 2,
+                       "Serialised checkpoint includes mapped pages")
+    return passed, 3
+
+def test_serialisation():
+    """Test checkpoint files and pickling"""
+    print("\n=== Testing Serialisation ===")
+    passed = 0
+
+    cpu = make_cpu('interpreter', 'dict')
+    for i in range(1024):                # a page of incompressible-ish data
+        cpu.memory.write_word(0x8000 + i * 4, (i * 2654435761) & 0xFFFFFFFF)
+    cpu.simulate(max_cycles=300)
+    saved = cpu.checkpoint()
+
+    path = scratch_path("warm.ckpt")
+    size = save_checkpoint(saved, path)
+    loaded = load_checkpoint(path)
+    passed += run_test((loaded.pc, loaded.cycle_count, loaded.registers) ==
+                       (saved.pc, saved.cycle_count, saved.registers) and loaded.backend == 'dict',
+                       "CPU state round trips")
+    passed += run_test(loaded.memory.word_table() == nonzero(saved.memory.word_table()),
+                       "Memory round trips")
+    passed += run_test(size < 3 * 4096, f"File is compact ({size} bytes for 3 pages)")
+
+    unpickled = pickle.loads(pickle.dumps(saved))
+    passed += run_test(unpickled.memory.word_table() == nonzero(saved.memory.word_table()) and
+                       unpickled.pc == saved.pc, "Pickles (for worker processes)")
+
+    # A checkpoint file runs anywhere a program does, on either backend
+    expected = None
+    for memory in ('dict', 'paged'):
+        other = RISCV_CPU(memory=memory)
+        other.load(path)
+        other.simulate(max_cycles=5000)
+        expected = expected or state(other)
+        passed += run_test(other.registers.read(1) == 20100 and state(other) == expected,
+                           f"Runs from the file ({memory})")
+
+    bad = scratch_path("bad.ckpt")
+    with open(bad, 'wb') as f:
+        f.write(dumps(saved)[:60])
+    try:
+        load_checkpoint(bad)
+        raised = False
+    except ProgramLoadError:
+        raised = True
+    passed += run_test(raised, "Truncated file raises ProgramLoadError")
+    return passed, 7
+
+def test_cli_save_checkpoint():
+    """Test --save-checkpoint writes a file the CLI can run from"""
+    print("\n=== Testing CLI Checkpoints ===")
+    path = scratch_path("cli.ckpt")
+    with redirect_stdout(io.StringIO()):
+        main(["test_mem.hex", "--verbosity", "quiet", "--max-cycles", "3", "--save-checkpoint", path])
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main([path, "--verbosity", "quiet"])
+
+    expected = io.StringIO()
+    with redirect_stdout(expected):
+        main(["test_mem.hex", "--verbosity", "quiet"])
+    return run_test(code == 0 and out.getvalue() == expected.getvalue(),
+                    "Run resumed from the checkpoint matches a full run"), 1
+
+def run_all_tests():
+    """Run all checkpoint tests"""
+    print("=" * 60)
+    print("Checkpoint Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_restore_replays,
+        test_copy_on_write_cost,
+        test_fork,
+        test_restore_keeps_cache,
+        test_mapped_regions,
+        test_serialisation,
+        test_cli_save_checkpoint,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
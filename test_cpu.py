@@ -1,4 +1,8 @@
-from cpu import RISCV_CPU
+import io
+import json
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU, main
 
 def test_basic_arithmetic():
     """Test if basic math works"""
@@ -164,6 +168,138 @@ def test_full_program():
         print("FAIL - Something wrong")
         return False
 
+def test_predecode_cache():
+    """Test that loops hit the predecode cache and self-modifying code still works"""
+    print("\n=== Test 5: Predecode Cache ===")
+    
+    cpu = RISCV_CPU()
+    
+    # Loop runs the instruction at 0x10 twice and patches it in between
+    # First pass adds 1 to x3, second pass should add 100
+    program = [
+        0x00000193,  # addi x3, x0, 0
+        0x00200213,  # addi x4, x0, 2
+        0x064182B7,  # lui x5, 0x06418
+        0x19328293,  # addi x5, x5, 0x193  (x5 = addi x3, x3, 100)
+        0x00118193,  # addi x3, x3, 1      (gets patched)
+        0x00502823,  # sw x5, 0x10(x0)
+        0xFFF20213,  # addi x4, x4, -1
+        0xFE021AE3,  # bne x4, x0, -12
+        0x0000006F,  # halt
+    ]
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    
+    cpu.run(max_cycles=50, verbose=False)
+    
+    x3 = cpu.registers.read(3)
+    stats = cpu.predecode.stats()
+    
+    print(f"x3 = {x3} (should be 101, 2 means the stale instruction ran)")
+    print(f"Predecode stats: {stats}")
+    
+    if x3 == 101 and stats['hits'] > 0 and stats['invalidations'] >= 1:
+        print("PASS")
+        return True
+    else:
+        print("FAIL")
+        return False
+
+def test_illegal_instruction():
+    """Test that an unknown encoding traps instead of being skipped"""
+    print("\n=== Test 6: Illegal Instruction Trap ===")
+    
+    cpu = RISCV_CPU()
+    
+    program = [
+        0x00500093,  # addi x1, x0, 5
+        0x00000083,  # lb x1, 0(x0) - not supported, should trap
+        0x00A00113,  # addi x2, x0, 10 (never reached)
+        0x0000006F,  # halt
+    ]
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    
+    cpu.run(max_cycles=10, verbose=False)
+    
+    print(f"halted = {cpu.halted} (should be True)")
+    print(f"PC = 0x{cpu.pc:08X} (should be 0x00000004)")
+    print(f"trap_cause = {cpu.trap_cause}")
+    
+    if cpu.halted and cpu.pc == 0x4 and cpu.trap_cause and cpu.registers.read(2) == 0:
+        print("PASS")
+        return True
+    else:
+        print("FAIL")
+        return False
+
+def test_simulate_quiet():
+    """Test simulate() prints nothing and returns the final state"""
+    print("\n=== Test 7: Headless simulate() ===")
+    
+    cpu = RISCV_CPU()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        cpu.load("test_mem.hex")
+        result = cpu.simulate(max_cycles=100, memory_diff=True)
+    
+    print(f"Printed {len(output.getvalue())} characters (should be 0)")
+    print(f"Result: {result}, memory diff {result.memory_diff}")
+    
+    if (output.getvalue() == "" and result.halt_reason == "halt" and result.cycles == 4 and
+            result.registers[3] == 20 and result.memory_diff == {0x10000: (0, 20)}):
+        print("PASS")
+        return True
+    else:
+        print("FAIL")
+        return False
+
+def test_halt_reasons():
+    """Test every way a run can end is reported"""
+    print("\n=== Test 8: Halt Reasons ===")
+    
+    programs = {
+        "halt": [0x00500093, 0x0000006F],
+        "uninitialized": [0x00500093],
+        "illegal_instruction": [0x00000083],
+        "max_cycles": [0x00108093, 0xFFDFF06F],   # addi x1, x1, 1 / jal x0, -4
+    }
+    
+    all_ok = True
+    for expected, program in programs.items():
+        for engine in RISCV_CPU.ENGINES:
+            cpu = RISCV_CPU(engine=engine)
+            for i, inst in enumerate(program):
+                cpu.memory.write_word(i * 4, inst)
+            result = cpu.simulate(max_cycles=50)
+            print(f"{engine:>12}: {result.halt_reason} (should be {expected}) - {result.message()}")
+            all_ok &= result.halt_reason == expected
+    
+    if all_ok:
+        print("PASS")
+        return True
+    else:
+        print("FAIL")
+        return False
+
+def test_cli_json():
+    """Test the command line JSON output"""
+    print("\n=== Test 9: JSON Output ===")
+    
+    output = io.StringIO()
+    with redirect_stdout(output):
+        exit_code = main(["--format", "json", "--max-cycles", "50", "test_arith.hex"])
+    record = json.loads(output.getvalue())
+    print(f"Exit code {exit_code}, record: {record}")
+    
+    if (exit_code == 0 and record["program"] == "test_arith.hex" and
+            record["halt_reason"] == "halt" and record["registers"][3] == 15):
+        print("PASS")
+        return True
+    else:
+        print("FAIL")
+        return False
+
 # Run all tests
 if __name__ == "__main__":
     print("=" * 60)
@@ -175,6 +311,11 @@ if __name__ == "__main__":
         test_memory_ops,
         test_branches,
         test_full_program,
+        test_predecode_cache,
+        test_illegal_instruction,
+        test_simulate_quiet,
+        test_halt_reasons,
+        test_cli_json,
     ]
     
     passed = 0
@@ -0,0 +1,266 @@
+import io
+import json
+import random
+from contextlib import redirect_stdout
+
+from assembler import assemble
+from bench_suite import program_cpu
+from cpu import RISCV_CPU
+from dataflow import DataflowAnalyzer, main
+from decoder import InstructionDecoder
+from timing import EventStream, run_timing
+from trace_recorder import TraceRing, FLAG_LOAD, FLAG_STORE
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def make_cpu(program):
+    """A CPU with program (assembly text or words) loaded at address 0"""
+    if isinstance(program, str):
+        program = assemble(program)
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    return cpu
+
+def analysed(program, **settings):
+    """A DataflowAnalyzer after running program to its halt"""
+    analyzer = DataflowAnalyzer(**settings)
+    make_cpu(program).simulate(max_cycles=100000, reporter=analyzer)
+    return analyzer
+
+def naive(records, windows, latency):
+    """
+    The same limits worked out with the whole run kept in lists
+
+    Returns:
+        (critical path, {window: cycles}, {entry pc: (runs, instructions, paths, longest)})
+    """
+    decoder = InstructionDecoder()
+    steps = []
+    for _, pc, word, _, address, _, _, flags in records:
+        decoded = decoder.decode_record(word)
+        sources = {'R': [decoded.rs1, decoded.rs2], 'I': [decoded.rs1], 'S': [decoded.rs1, decoded.rs2],
+                   'B': [decoded.rs1, decoded.rs2]}.get(decoded.type, [])
+        writes = decoded.type not in ('S', 'B') and decoded.name != 'UNKNOWN'
+        steps.append((pc, decoded.name, [rs for rs in sources if rs], decoded.rd if writes else 0,
+                      address >> 2 if flags & FLAG_LOAD else None,
+                      address >> 2 if flags & FLAG_STORE else None))
+
+    def schedule(window, items):
+        done, retire = [], []
+        writer, stored = {}, {}
+        for i, (_, name, sources, rd, load, store) in enumerate(items):
+            start = max([done[writer[rs]] for rs in sources if rs in writer], default=0)
+            if load is not None and load in stored:
+                start = max(start, done[stored[load]])
+            if window is not None and i >= window:
+                start = max(start, retire[i - window])
+            done.append(start + latency.get(name, 1))
+            retire.append(max(done[-1], retire[-1] if retire else 0))
+            if rd:
+                writer[rd] = i
+            if store is not None:
+                stored[store] = i
+        return max(done, default=0)
+
+    blocks = {}
+    runs = []
+    for i, item in enumerate(steps):
+        if not runs or steps[i - 1][1] in ('BEQ', 'BNE', 'BLT', 'BGE', 'JAL', 'JALR', 'UNKNOWN') or \
+                item[0] != steps[i - 1][0] + 4:
+            runs.append([])
+        runs[-1].append(item)
+    for run in runs:
+        path = schedule(None, run)
+        count, length, paths, longest = blocks.get(run[0][0], (0, 0, 0, 0))
+        blocks[run[0][0]] = (count + 1, length + len(run), paths + path, max(longest, path))
+    return schedule(None, steps), {size: schedule(size, steps) for size in windows}, blocks
+
+def test_limits():
+    """Test hand-worked critical paths and windows"""
+    print("\n=== Testing Critical Paths and Windows ===")
+    passed = 0
+
+    chains = "\n".join(f"addi x{reg}, x{reg}, 1" for _ in range(10) for reg in range(1, 5)) + "\nhalt"
+    analyzer = analysed(chains, windows=(1, 2, 3, 4, 64))
+    passed += run_test(analyzer.critical_path == 10 and analyzer.ideal_ipc() == 4.0 and
+                       analyzer.window_cycles() == {1: 40, 2: 20, 3: 14, 4: 10, 64: 10},
+                       "Four interleaved chains of 10")
+
+    analyzer = analysed(chains, latency={'ADDI': 3})
+    passed += run_test(analyzer.critical_path == 30, "Latencies per mnemonic")
+
+    stored = analysed("addi x1, x0, 5\naddi x1, x1, 1\nsw x1, 256(x0)\nlw x2, 256(x0)\n"
+                      "addi x2, x2, 1\nhalt")
+    other = analysed("addi x1, x0, 5\naddi x1, x1, 1\nsw x1, 256(x0)\nlw x2, 260(x0)\n"
+                     "addi x2, x2, 1\nhalt")
+    passed += run_test(stored.critical_path == 5 and other.critical_path == 3,
+                       "A load depends on the last store to its word only")
+
+    # Renamed: rewriting a register or word doesn't wait for its readers
+    renamed = analysed("addi x1, x0, 1\naddi x2, x1, 1\naddi x1, x0, 2\nsw x0, 0(x0)\n"
+                       "sw x1, 0(x0)\nhalt")
+    passed += run_test(renamed.critical_path == 2, "No false dependences")
+    return passed, 4
+
+def test_blocks():
+    """Test per-block critical paths"""
+    print("\n=== Testing Basic Blocks ===")
+    passed = 0
+
+    analyzer = analysed("""
+        addi x2, x0, 10
+    loop:
+        addi x1, x1, 1
+        addi x1, x1, 1
+        addi x3, x0, 7
+        addi x2, x2, -1
+        bne x2, x0, loop
+        halt
+    """)
+    blocks = analyzer.blocks
+    # The first run is entered at 0; x1 and x2 come from before the block after that
+    passed += run_test(blocks == {0: (1, 6, 3, 3), 4: (9, 45, 18, 2)} and
+                       analyzer.hot_blocks(1)[0][0] == 4, "Loop body runs")
+    return passed, 1
+
+def test_against_naive():
+    """Test streamed results against the whole run kept in lists"""
+    print("\n=== Testing Against a Full-History Schedule ===")
+    rng = random.Random(25)
+    passed = 0
+
+    windows = (1, 3, 8, 32)
+    latency = {'LW': 3, 'SRA': 2}
+    same = True
+    for _ in range(40):
+        count = rng.randrange(4, 40)
+        words = [random_instruction(rng, count) for _ in range(count)] + [0x0000006F]
+        ring = TraceRing(capacity=1000)
+        make_cpu(words).simulate(max_cycles=400, reporter=ring)
+        analyzer = DataflowAnalyzer(windows, latency)
+        analyzer.replay(ring)
+        critical, cycles, blocks = naive(list(ring), windows, latency)
+        same = same and analyzer.critical_path == critical and \
+            analyzer.window_cycles() == cycles and analyzer.blocks == blocks
+    passed += run_test(same, "Random programs")
+
+    same = True
+    for name in ('memcpy', 'calls'):
+        ring = TraceRing(capacity=10000)
+        program_cpu(name, 5000)[0].simulate(max_cycles=10 ** 6, reporter=ring)
+        analyzer = DataflowAnalyzer(windows)
+        analyzer.replay(ring)
+        critical, cycles, blocks = naive(list(ring), windows, {})
+        same = same and analyzer.critical_path == critical and \
+            analyzer.window_cycles() == cycles and analyzer.blocks == blocks
+    passed += run_test(same, "memcpy and calls")
+    return passed, 2
+
+def test_streaming():
+    """Test live, chunked and timing.py runs agree"""
+    print("\n=== Testing Streaming ===")
+    passed = 0
+
+    live = DataflowAnalyzer()
+    program_cpu('branchy', 6000)[0].simulate(max_cycles=10 ** 6, reporter=live)
+    ring = TraceRing(capacity=10000)
+    program_cpu('branchy', 6000)[0].simulate(max_cycles=10 ** 6, reporter=ring)
+    records = list(ring)
+    # Chunk edges in the middle of blocks
+    chunked = DataflowAnalyzer()
+    for at in range(0, len(records), 333):
+        chunked.replay(records[at:at + 333])
+    stepped = DataflowAnalyzer()
+    for record in records:
+        stepped.step(record[1], record[2], record[4] if record[7] & (FLAG_LOAD | FLAG_STORE) else None)
+    passed += run_test(chunked.to_dict() == live.to_dict() == stepped.to_dict(),
+                       "Live = replay in chunks = step()")
+
+    cpu, _ = program_cpu('branchy', 6000)
+    streamed = run_timing(EventStream(cpu, batch=500), {'limits': DataflowAnalyzer}, workers=0)
+    passed += run_test(streamed['limits'] == live.to_dict(), "As a timing.py model")
+    return passed, 2
+
+def test_reports():
+    """Test settings, the report, JSON and the command line"""
+    print("\n=== Testing Reports ===")
+    passed = 0
+
+    rejected = 0
+    for settings in ({'windows': (0, 8)}, {'latency': {'MUL': 3}}, {'latency': {'LW': 0}}):
+        try:
+            DataflowAnalyzer(**settings)
+        except ValueError:
+            rejected += 1
+    passed += run_test(rejected == 3, "Bad windows and latencies rejected")
+
+    analyzer = DataflowAnalyzer(windows=(64, 8, 8))
+    program_cpu('calls', 3000)[0].simulate(max_cycles=10 ** 6, reporter=analyzer)
+    data = json.loads(json.dumps(analyzer.to_dict()))
+    text = analyzer.report()
+    passed += run_test(analyzer.windows == (8, 64) and [w['size'] for w in data['windows']] == [8, 64] and
+                       data['windows'][1]['ipc'] == analyzer.ilp(64) and
+                       data['ideal_ipc'] == analyzer.ilp() and
+                       sum(block['instructions'] for block in data['blocks'].values()) ==
+                       analyzer.instructions and
+                       "critical path" in text and "no limit" in text and "Hottest basic blocks" in text,
+                       "to_dict and report")
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main(["test_branch.hex", "--window", "4", "--json"])
+        bad = main(["test_branch.hex", "--window", "0"])
+        missing = main(["no_such_program.hex"])
+    data = json.loads(out.getvalue().splitlines()[0])
+    passed += run_test(code == 0 and bad == 2 and missing == 1 and
+                       [w['size'] for w in data['windows']] == [4], "Command line")
+    return passed, 3
+
+def run_all_tests():
+    """Run all dataflow analysis tests"""
+    print("=" * 60)
+    print("Dataflow Analysis Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_limits,
+        test_blocks,
+        test_against_naive,
+        test_streaming,
+        test_reports,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -144,6 +144,27 @@ def test_all_instructions():
     
     return passed, len(tests)
 
+def test_shift_immediate_names():
+    """Test SLLI/SRLI/SRAI names match what the CPU executes"""
+    print("\n=== Testing Shift Immediate Names ===")
+    decoder = InstructionDecoder()
+    passed = 0
+    
+    tests = [
+        (0x00209093, "SLLI"),    # slli x1, x1, 2
+        (0x0020D093, "SRLI"),    # srli x1, x1, 2
+        (0x4020D093, "SRAI"),    # srai x1, x1, 2
+        (0x00000083, "UNKNOWN"), # lb x1, 0(x0) - not supported
+    ]
+    
+    for inst, expected_name in tests:
+        decoded = decoder.decode(inst)
+        name = decoder.get_name(decoded)
+        passed += run_test(name == expected_name,
+                          f"0x{inst:08X} -> {expected_name}")
+    
+    return passed, len(tests)
+
 def test_immediate_sign_extension():
     """Test sign extension of immediate values"""
     print("\n=== Testing Immediate Sign Extension ===")
@@ -188,6 +209,119 @@ def test_edge_cases():
     
     return passed, 4
 
+def test_disassemble():
+    """Test instructions format as assembly text"""
+    print("\n=== Testing Disassembly ===")
+    decoder = InstructionDecoder()
+    passed = 0
+    
+    tests = [
+        (0x00500093, "addi x1, x0, 5"),
+        (0xFFF00113, "addi x2, x0, -1"),
+        (0x40110233, "sub x4, x2, x1"),
+        (0x4020D093, "srai x1, x1, 2"),
+        (0x000102B7, "lui x5, 0x10"),
+        (0x0032A023, "sw x3, 0(x5)"),
+        (0xFFC2A203, "lw x4, -4(x5)"),
+        (0x00418463, "beq x3, x4, 8"),
+        (0xFE3116E3, "bne x2, x3, -20"),
+        (0x0000006F, "jal x0, 0"),
+        (0x000080E7, "jalr x1, 0(x1)"),
+        (0xFFFFFFFF, ".word 0xFFFFFFFF"),
+    ]
+    
+    for inst, expected in tests:
+        text = decoder.disassemble(decoder.decode_record(inst))
+        passed += run_test(text == expected, f"0x{inst:08X} -> {expected}")
+    
+    return passed, len(tests)
+
+def test_operands():
+    """Test the registers each format reads and writes"""
+    print("\n=== Testing Operands ===")
+    decoder = InstructionDecoder()
+    passed = 0
+    
+    tests = [
+        (0x002081B3, (1, 2, 3), "add x3, x1, x2 reads both"),
+        (0x00500093, (0, 0, 1), "addi x1, x0, 5 reads rs1 only"),
+        (0xFFC2A203, (5, 0, 4), "lw x4, -4(x5)"),
+        (0x0032A023, (5, 3, 0), "sw x3, 0(x5) writes nothing"),
+        (0x00418463, (3, 4, 0), "beq x3, x4, 8 writes nothing"),
+        (0x000102B7, (0, 0, 5), "lui x5, 0x10 reads nothing"),
+        (0x008000EF, (0, 0, 1), "jal x1, 8 writes the link"),
+        (0x000080E7, (1, 0, 1), "jalr x1, 0(x1)"),
+        (0xFFFFFFFF, (0, 0, 0), "UNKNOWN reads and writes nothing"),
+    ]
+    
+    for inst, expected, name in tests:
+        passed += run_test(decoder.decode_record(inst).operands() == expected, name)
+    
+    return passed, len(tests)
+
+def test_interning():
+    """Test decode_record shares one record per word and bounds its table"""
+    print("\n=== Testing Interning ===")
+    decoder = InstructionDecoder()
+    passed = 0
+    
+    first = decoder.decode_record(0x002081B3)
+    passed += run_test(decoder.decode_record(0x002081B3) is first and
+                       InstructionDecoder().decode_record(0x002081B3) is first,
+                       "Same object for a repeated word, across decoders")
+    
+    # A small limit on this decoder only; the table itself is shared
+    small = InstructionDecoder()
+    small.MAX_INTERNED = 4
+    small._interned.clear()
+    words = [0x00000093 | i << 20 for i in range(4)]    # addi x1, x0, i
+    records = [small.decode_record(word) for word in words]
+    passed += run_test(len(small._interned) == 4, "Table fills up to MAX_INTERNED")
+    
+    small.decode_record(0x00500093)
+    again = small.decode_record(words[0])
+    passed += run_test(len(small._interned) == 2 and again is not records[0] and
+                       again.to_dict() == records[0].to_dict(),
+                       "Table cleared at MAX_INTERNED, records rebuilt the same")
+    small._interned.clear()
+    
+    return passed, 3
+
+def test_decode_dicts():
+    """Test decode() returns the same dictionaries it did before records"""
+    print("\n=== Testing decode() Dictionaries ===")
+    decoder = InstructionDecoder()
+    passed = 0
+    
+    def fields(opcode, rd, funct3, rs1, rs2, funct7, inst_type, *imm):
+        result = {'opcode': opcode, 'rd': rd, 'funct3': funct3, 'rs1': rs1, 'rs2': rs2,
+                  'funct7': funct7, 'type': inst_type}
+        if imm:
+            result['imm'] = imm[0]
+        return result
+    
+    # Negative immediates come back as 32-bit two's complement
+    tests = [
+        (0x002081B3, fields(0x33, 3, 0, 1, 2, 0, 'R'), "R: add x3, x1, x2"),
+        (0x40110233, fields(0x33, 4, 0, 2, 1, 0x20, 'R'), "R: sub x4, x2, x1"),
+        (0xFFF00093, fields(0x13, 1, 0, 0, 31, 0x7F, 'I', 0xFFFFFFFF), "I: addi x1, x0, -1"),
+        (0xFFC2A203, fields(0x03, 4, 2, 5, 28, 0x7F, 'I', 0xFFFFFFFC), "I: lw x4, -4(x5)"),
+        (0xFE20AE23, fields(0x23, 28, 2, 1, 2, 0x7F, 'S', 0xFFFFFFFC), "S: sw x2, -4(x1)"),
+        (0xFE3116E3, fields(0x63, 13, 1, 2, 3, 0x7F, 'B', 0xFFFFFFEC), "B: bne x2, x3, -20"),
+        (0x000102B7, fields(0x37, 5, 0, 2, 0, 0, 'U', 0x00010000), "U: lui x5, 0x10"),
+        (0xFFFFF297, fields(0x17, 5, 7, 31, 31, 0x7F, 'U', 0xFFFFF000), "U: auipc x5, 0xFFFFF"),
+        (0x008000EF, fields(0x6F, 1, 0, 0, 8, 0, 'J', 8), "J: jal x1, 8"),
+        (0xFF1FF06F, fields(0x6F, 0, 7, 31, 17, 0x7F, 'J', 0xFFFFFFF0), "J: jal x0, -16"),
+        (0xFFFFFFFF, fields(0x7F, 31, 7, 31, 31, 0x7F, 'UNKNOWN'), "UNKNOWN: no imm"),
+        (0x00000000, fields(0, 0, 0, 0, 0, 0, 'UNKNOWN'), "UNKNOWN: all zeros"),
+    ]
+    
+    for inst, expected, name in tests:
+        decoded = decoder.decode(inst)
+        passed += run_test(decoded == expected and decoded is not decoder.decode(inst), name)
+    
+    return passed, len(tests)
+
 def run_all_tests():
     """Run all decoder tests"""
     print("=" * 60)
@@ -205,8 +339,13 @@ def run_all_tests():
         test_u_type,
         test_j_type,
         test_all_instructions,
+        test_shift_immediate_names,
         test_immediate_sign_extension,
         test_edge_cases,
+        test_disassemble,
+        test_operands,
+        test_interning,
+        test_decode_dicts,
     ]
     
     for test_func in test_functions:
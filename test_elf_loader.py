@@ -0,0 +1,234 @@
+import io
+import mmap
+import os
+import struct
+import tempfile
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU
+from elf_loader import (load_elf, load_binary, read_elf, create_test_elf_file,
+                        ProgramLoadError, _build_elf, STT_FUNC)
+from memory import Memory, PagedMemory
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+def test_elf_headers():
+    """Test entry point, segments and symbols come out of the headers"""
+    print("\n=== Testing ELF Headers ===")
+    passed = 0
+
+    path = scratch_path("simple.elf")
+    with redirect_stdout(io.StringIO()):
+        create_test_elf_file(path)
+    image = read_elf(path)
+
+    passed += run_test(image.entry == 0x10000, "Entry point from e_entry")
+    passed += run_test([(s.address, s.file_size, s.mem_size) for s in image.segments] ==
+                       [(0x10000, 20, 20), (0x11000, 4, 0x2004)], "PT_LOAD segments")
+    passed += run_test(image.symbols.name_for(0x10004) == "_start+0x4" and
+                       image.symbols.name_for(0x1000C) == "finish" and
+                       image.symbols.address_of("buffer") == 0x11004, "Symbol lookups")
+    passed += run_test(image.symbols.name_for(0x20000) is None, "No symbol past the end")
+    return passed, 4
+
+def test_load_backends():
+    """Test both memory backends end up with the same contents"""
+    print("\n=== Testing Load Into Both Backends ===")
+    passed = 0
+
+    path = scratch_path("simple.elf")
+    with redirect_stdout(io.StringIO()):
+        create_test_elf_file(path)
+
+    for backend in (Memory, PagedMemory):
+        mem = backend()
+        # Junk where .bss goes has to read as zero after loading
+        mem.write_word(0x11008, 0xDEADBEEF)
+        mem.write_word(0x12FFC, 0xDEADBEEF)
+        load_elf(path, mem)
+        passed += run_test(mem.read_word(0x10000) == 0x000110B7 and mem.read_word(0x11000) == 41,
+                           f"{backend.__name__} has code and data")
+        passed += run_test(mem.read_word(0x11008) == 0 and mem.read_word(0x12FFC) == 0,
+                           f"{backend.__name__} .bss is zero")
+    return passed, 4
+
+def test_zero_copy():
+    """Test PagedMemory uses the file's pages in place and .bss lazily"""
+    print("\n=== Testing Zero-Copy Mapping ===")
+    passed = 0
+
+    # A whole page of code so it can be used straight from the mapping
+    code = struct.pack('<1024I', *([0x00108093] * 1023 + [0x0000006F]))
+    path = scratch_path("page.elf")
+    with open(path, 'wb') as f:
+        f.write(_build_elf(0x20000, [(0x20000, code, len(code) + 0x100000)],
+                           [("spin", 0x20000, len(code), STT_FUNC, 1)]))
+
+    mem = PagedMemory()
+    load_elf(path, mem)
+    passed += run_test(mem.page_count() == 0, "Nothing allocated by loading")
+
+    mem.read_word(0x20000)
+    page = mem.byte_pages[0x20]
+    passed += run_test(isinstance(page.obj, mmap.mmap), "Code page is a view of the mapping")
+
+    mem.read_word(0x80000)
+    passed += run_test(mem.page_count() == 2, "A .bss page appears only when touched")
+    return passed, 3
+
+def test_shared_page():
+    """Test two segments sharing one page both survive"""
+    print("\n=== Testing Segments Sharing A Page ===")
+    passed = 0
+
+    path = scratch_path("shared.elf")
+    with open(path, 'wb') as f:
+        f.write(_build_elf(0x30000, [(0x30000, struct.pack('<I', 0x11111111), 4),
+                                     (0x30800, struct.pack('<I', 0x22222222), 8)], []))
+
+    for backend in (Memory, PagedMemory):
+        mem = backend()
+        load_elf(path, mem)
+        passed += run_test(mem.read_word(0x30000) == 0x11111111 and
+                           mem.read_word(0x30800) == 0x22222222,
+                           f"{backend.__name__} keeps both segments")
+    return passed, 2
+
+def verbose_trace(path):
+    """Output of a verbose interpreter run"""
+    cpu = RISCV_CPU()
+    output = io.StringIO()
+    with redirect_stdout(output):
+        cpu.load_program(path)
+        cpu.run(max_cycles=50, verbose=True)
+    return output.getvalue()
+
+def test_run_elf():
+    """Test the CPU starts at the entry point and runs the program"""
+    print("\n=== Testing Running An ELF ===")
+    passed = 0
+
+    path = scratch_path("simple.elf")
+    with redirect_stdout(io.StringIO()):
+        create_test_elf_file(path)
+
+    for engine in RISCV_CPU.ENGINES:
+        for memory in ('dict', 'paged'):
+            cpu = RISCV_CPU(engine=engine, memory=memory)
+            with redirect_stdout(io.StringIO()):
+                cpu.load_program(path)
+                cpu.run(max_cycles=50)
+            passed += run_test(cpu.registers.read(2) == 42 and cpu.memory.read_word(0x11004) == 42,
+                               f"{engine}/{memory} ran the program")
+
+    passed += run_test("<_start+0x8>" in verbose_trace(path), "Verbose trace shows symbols")
+    return passed, 5
+
+def test_raw_binary():
+    """Test loading a raw .bin image"""
+    print("\n=== Testing Raw Binary ===")
+    passed = 0
+
+    path = scratch_path("prog.bin")
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<4I', 0x00500093, 0x00A00113, 0x002081B3, 0x0000006F))
+
+    mem = PagedMemory()
+    image = load_binary(path, mem, address=0x400)
+    passed += run_test(image.entry == 0x400 and mem.read_word(0x408) == 0x002081B3,
+                       "Loaded at the given address")
+
+    cpu = RISCV_CPU(memory='paged')
+    with redirect_stdout(io.StringIO()):
+        cpu.load_program(path)
+        cpu.run(max_cycles=20)
+    passed += run_test(cpu.registers.read(3) == 15, "CPU runs a .bin program")
+    return passed, 2
+
+def test_bad_files():
+    """Test broken files raise ProgramLoadError"""
+    print("\n=== Testing Bad Files ===")
+    passed = 0
+
+    good = _build_elf(0x10000, [(0x10000, b'\x6f\0\0\0', 4)], [])
+    cases = {
+        "not ELF": b'hello world, not an ELF file at all....................................',
+        "64-bit": good[:4] + b'\x02' + good[5:],
+        "big-endian": good[:5] + b'\x02' + good[6:],
+        "truncated": good[:60],
+        "empty": b'',
+    }
+    for name, data in cases.items():
+        path = scratch_path("bad.elf")
+        with open(path, 'wb') as f:
+            f.write(data)
+        try:
+            load_elf(path, Memory())
+            raised = False
+        except ProgramLoadError:
+            raised = True
+        passed += run_test(raised, f"{name} file rejected")
+
+    try:
+        load_elf(scratch_path("missing.elf"), Memory())
+        raised = False
+    except ProgramLoadError:
+        raised = True
+    passed += run_test(raised, "Missing file rejected")
+    return passed, len(cases) + 1
+
+def run_all_tests():
+    """Run all ELF loader tests"""
+    print("=" * 60)
+    print("ELF Loader Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_elf_headers,
+        test_load_backends,
+        test_zero_copy,
+        test_shared_page,
+        test_run_elf,
+        test_raw_binary,
+        test_bad_files,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,215 @@
+import io
+import os
+import random
+import tempfile
+from contextlib import redirect_stdout
+
+from loader import load_hex, load_hex_file, parse_hex, HexLoadError
+from memory import Memory, PagedMemory
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+def reference_parse(text):
+    """The original line-by-line loader's rules: (words, bad lines, truncated lines)"""
+    words, bad, truncated = [], [], []
+    for line_num, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            value = int(line, 16)
+        except ValueError:
+            bad.append(line_num)
+            continue
+        if value > 0xFFFFFFFF:
+            truncated.append(line_num)
+        words.append(value & 0xFFFFFFFF)
+    return words, bad, truncated
+
+def image_words(image):
+    """Words in a HexImage as a list of ints"""
+    return [int.from_bytes(image.data[i:i + 4], 'little') for i in range(0, len(image.data), 4)]
+
+def random_line(rng):
+    """A hex file line - mostly normal, sometimes odd"""
+    kind = rng.randrange(12)
+    if kind == 0:
+        return ""
+    if kind == 1:
+        return "# comment " + str(rng.randrange(100))
+    if kind == 2:
+        return f"  {rng.getrandbits(32):08x}\t"
+    if kind == 3:
+        return f"{rng.getrandbits(36):09X}"           # wider than 32 bits
+    if kind == 4:
+        return rng.choice(["zzzz0000", "12 34567", "0x", "00500093 # addi"])
+    if kind == 5:
+        return f"{rng.getrandbits(16):X}"             # short
+    return f"{rng.getrandbits(32):08X}"
+
+def test_uniform_files():
+    """Test the fast paths on 8-digit files, with and without comments"""
+    print("\n=== Testing Uniform Files ===")
+    passed = 0
+    rng = random.Random(5)
+    words = [rng.getrandbits(32) for _ in range(1000)]
+
+    for name, text in [("LF", "".join(f"{w:08X}\n" for w in words)),
+                       ("CRLF", "".join(f"{w:08x}\r\n" for w in words)),
+                       ("no final newline", "\n".join(f"{w:08X}" for w in words)),
+                       ("commented", "# header\n\n" + "".join(
+                           f"{w:08X}\n" + ("  # note\n\n\n" if i % 7 == 0 else "")
+                           for i, w in enumerate(words)))]:
+        image = parse_hex(text.encode())
+        passed += run_test(image_words(image) == words and not image.errors,
+                           f"{name} file parses")
+    return passed, 4
+
+def test_matches_reference():
+    """Test random messy files load exactly like the original loader"""
+    print("\n=== Testing Messy Files Match Original Rules ===")
+    rng = random.Random(11)
+    trials = 200
+    matched = 0
+
+    for _ in range(trials):
+        lines = [random_line(rng) for _ in range(rng.randrange(0, 60))]
+        text = rng.choice(["\n", "\r\n"]).join(lines)
+        words, bad, truncated = reference_parse(text)
+        image = parse_hex(text.encode())
+        if (image_words(image) == words and
+                [e.line_num for e in image.errors] == bad and
+                [w.line_num for w in image.warnings] == truncated):
+            matched += 1
+        else:
+            print(f"  Mismatch on: {lines!r}")
+
+    return run_test(matched == trials, f"{matched}/{trials} files match"), 1
+
+def test_load_into_memory():
+    """Test load_hex writes one block into both backends"""
+    print("\n=== Testing Load Into Memory ===")
+    passed = 0
+
+    path = scratch_path("prog.hex")
+    with open(path, 'w') as f:
+        f.write("# program\n00500093\n\n00A00113\n002081B3\n")
+
+    for backend in (Memory, PagedMemory):
+        mem = backend()
+        writes = []
+        mem.add_write_hook(lambda address, num_bytes: writes.append((address, num_bytes)))
+        image = load_hex(path, mem, start_address=0x1000)
+        passed += run_test(image.count == 3 and mem.read_word(0x1008) == 0x002081B3,
+                           f"{backend.__name__} holds the program")
+        passed += run_test(writes == [(0x1000, 12)], f"{backend.__name__} saw one block write")
+    return passed, 4
+
+def test_structured_errors():
+    """Test problems come back as HexLoadError instead of being printed"""
+    print("\n=== Testing Structured Errors ===")
+    passed = 0
+
+    path = scratch_path("bad.hex")
+    with open(path, 'w') as f:
+        f.write("00500093\nnot hex\n1FFFFFFFF\n")
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        image = load_hex(path, Memory())
+    passed += run_test(output.getvalue() == "", "load_hex prints nothing")
+    passed += run_test([(e.line_num, e.line) for e in image.errors] == [(2, "not hex")],
+                       "Invalid line reported with its number")
+    passed += run_test([w.line_num for w in image.warnings] == [3], "Truncation reported")
+
+    try:
+        load_hex(path, Memory(), strict=True)
+        raised = None
+    except HexLoadError as e:
+        raised = e
+    passed += run_test(raised is not None and raised.line_num == 2, "strict raises the bad line")
+
+    try:
+        load_hex(scratch_path("missing.hex"), Memory())
+        raised = None
+    except HexLoadError as e:
+        raised = e
+    passed += run_test(raised is not None and raised.line_num is None, "Missing file raises")
+    return passed, 5
+
+def test_legacy_output():
+    """Test load_hex_file still prints what it used to"""
+    print("\n=== Testing load_hex_file Output ===")
+    passed = 0
+
+    path = scratch_path("legacy.hex")
+    with open(path, 'w') as f:
+        f.write("00500093\nnot hex\n1FFFFFFFF\n")
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        count = load_hex_file(path, Memory())
+    expected = ("Error: Line 2 contains invalid hex: 'not hex'\n"
+                "Warning: Line 3 has value > 32 bits, truncating\n"
+                f"Loaded 2 instructions from {path}\n")
+    passed += run_test(count == 2 and output.getvalue() == expected, "Same messages and count")
+
+    output = io.StringIO()
+    with redirect_stdout(output):
+        count = load_hex_file(scratch_path("missing.hex"), Memory())
+    passed += run_test(count == 0 and "not found" in output.getvalue(), "Missing file returns 0")
+    return passed, 2
+
+def run_all_tests():
+    """Run all loader tests"""
+    print("=" * 60)
+    print("Hex Loader Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_uniform_files,
+        test_matches_reference,
+        test_load_into_memory,
+        test_structured_errors,
+        test_legacy_output,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
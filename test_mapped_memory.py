@@ -0,0 +1,236 @@
+import io
+import os
+import struct
+import tempfile
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU
+from memory import Memory, PagedMemory, MemoryAccessError
+from mapped_memory import map_file, save_image, load_image
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+def write_words(path, words):
+    """Write little-endian words to a host file"""
+    with open(path, 'wb') as f:
+        f.write(struct.pack(f'<{len(words)}I', *words))
+
+def test_readonly_mapping():
+    """Test a read-only mapping reads the file and refuses writes"""
+    print("\n=== Testing Read-Only Mapping ===")
+    passed = 0
+
+    path = scratch_path("ro.bin")
+    write_words(path, list(range(1, 2049)))     # two full pages
+    mem = PagedMemory()
+    map_file(mem, 0x40000000, path, mode='readonly')
+
+    passed += run_test(mem.read_word(0x40000000) == 1 and mem.read_word(0x40001FFC) == 2048,
+                       "Words read from the file")
+    passed += run_test(mem.read_byte(0x40000004) == 2, "Bytes read from the file")
+
+    try:
+        mem.write_word(0x40000000, 5)
+        raised = False
+    except MemoryAccessError:
+        raised = True
+    passed += run_test(raised, "Word write raises MemoryAccessError")
+
+    try:
+        mem.write_byte(0x40001000, 5)
+        raised = False
+    except MemoryAccessError:
+        raised = True
+    passed += run_test(raised, "Byte write raises MemoryAccessError")
+
+    return passed, 4
+
+def test_copy_on_write():
+    """Test writes to a cow mapping stay private"""
+    print("\n=== Testing Copy-On-Write Mapping ===")
+    passed = 0
+
+    path = scratch_path("cow.bin")
+    write_words(path, [0xAAAAAAAA] * 1024)
+    mem = PagedMemory()
+    map_file(mem, 0x10000, path)
+    mem.write_word(0x10010, 0x12345678)
+    mem.write_byte(0x10020, 0x01)
+
+    with open(path, 'rb') as f:
+        on_disk = f.read()
+    passed += run_test(mem.read_word(0x10010) == 0x12345678, "Write is visible to the guest")
+    passed += run_test(mem.read_word(0x10020) == 0xAAAAAA01, "Byte write merges with file data")
+    passed += run_test(on_disk == b'\xAA' * 4096, "File on disk is unchanged")
+
+    # A second mapping of the same file must not see the first one's writes
+    other = PagedMemory()
+    map_file(other, 0x10000, path)
+    passed += run_test(other.read_word(0x10010) == 0xAAAAAAAA, "Separate mappings are private")
+    return passed, 4
+
+def test_partial_pages():
+    """Test unaligned regions and file offsets"""
+    print("\n=== Testing Partial Pages ===")
+    passed = 0
+
+    path = scratch_path("part.bin")
+    write_words(path, list(range(100, 3100)))   # 12000 bytes
+    mem = PagedMemory()
+    mem.write_word(0x20FF0, 0x77777777)         # existing data outside the region stays
+    map_file(mem, 0x20FF8, path, offset=8, length=8192)
+
+    passed += run_test(mem.read_word(0x20FF0) == 0x77777777 and mem.read_word(0x20FEC) == 0,
+                       "Rest of a partly mapped page is kept")
+    passed += run_test(mem.read_word(0x20FF8) == 102, "First word comes from the offset")
+    passed += run_test(mem.read_word(0x20FF8 + 8188) == 102 + 2047, "Last mapped word")
+    passed += run_test(mem.read_word(0x20FF8 + 8192) == 0, "Nothing mapped past the length")
+    passed += run_test(mem.page_numbers() == [0x20, 0x21, 0x22], "Page numbers cover the region")
+
+    try:
+        map_file(mem, 0, path, offset=4, length=12000)
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Range past the end of the file is rejected")
+    return passed, 6
+
+def test_partial_readonly_page():
+    """Test a read-only mapping protects its own bytes, not its whole page"""
+    print("\n=== Testing Partly Read-Only Pages ===")
+    passed = 0
+
+    path = scratch_path("small.bin")
+    write_words(path, list(range(1, 17)))      # 64 bytes
+    for faulted in (True, False):
+        mem = PagedMemory()
+        if faulted:
+            mem.write_word(0x10000, 1)          # page already there when mapped
+        map_file(mem, 0x10100, path, mode='readonly')
+        where = "existing page" if faulted else "fresh page"
+
+        mem.write_word(0x10000, 2)
+        mem.write_word(0x100FC, 3)
+        mem.write_byte(0x10140, 4)
+        mem.write_word(0x10FFC, 5)
+        passed += run_test(mem.read_word(0x10000) == 2 and mem.read_word(0x100FC) == 3 and
+                           mem.read_word(0x10140) == 4 and mem.read_word(0x10FFC) == 5 and
+                           mem.read_word(0x10100) == 1, f"Writes just before and after the mapping ({where})")
+
+        raised = 0
+        for write in (lambda: mem.write_word(0x10100, 9), lambda: mem.write_byte(0x1013F, 9),
+                      lambda: mem.write_block(0x100FC, bytes(8))):
+            try:
+                write()
+            except MemoryAccessError:
+                raised += 1
+        passed += run_test(raised == 3 and mem.read_word(0x10100) == 1 and
+                           mem.read_word(0x1013C) == 16 and mem.read_word(0x100FC) == 3,
+                           f"Writes inside the mapping still raise ({where})")
+    return passed, 4
+
+def test_image_round_trip():
+    """Test save_image/load_image from both backends"""
+    print("\n=== Testing Image Round Trip ===")
+    passed = 0
+
+    for backend in (Memory, PagedMemory):
+        mem = backend()
+        mem.write_word(0x0, 0x00500093)
+        mem.write_word(0x1FFC, 0xCAFEBABE)
+        mem.write_byte(0xFFFFFFFF, 0x80)
+
+        path = scratch_path(f"{backend.__name__}.img")
+        pages = save_image(mem, path)
+        restored = load_image(path)
+        passed += run_test(pages == 3 and restored.nonzero_words() == mem.nonzero_words(),
+                           f"{backend.__name__} image restores every word")
+
+        restored.write_word(0x0, 0)
+        passed += run_test(load_image(path).read_word(0x0) == 0x00500093,
+                           f"{backend.__name__} image untouched by later writes")
+
+    with open(scratch_path("junk.img"), 'wb') as f:
+        f.write(b'not an image at all')
+    try:
+        load_image(scratch_path("junk.img"))
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Bad image is rejected")
+    return passed, 5
+
+def test_cpu_from_image():
+    """Test a CPU runs a program straight out of a mapped image"""
+    print("\n=== Testing CPU From Image ===")
+    passed = 0
+
+    program = [0x00500093, 0x00A00113, 0x002081B3, 0x00302023, 0x0000006F]
+    original = PagedMemory()
+    for i, inst in enumerate(program):
+        original.write_word(i * 4, inst)
+    path = scratch_path("prog.img")
+    save_image(original, path)
+
+    for engine in RISCV_CPU.ENGINES:
+        cpu = RISCV_CPU(engine=engine, memory=load_image(path))
+        with redirect_stdout(io.StringIO()):
+            cpu.run(max_cycles=20)
+        passed += run_test(cpu.registers.read(3) == 15 and cpu.memory.read_word(0) == 15,
+                           f"{engine} runs from the image")
+    return passed, len(RISCV_CPU.ENGINES)
+
+def run_all_tests():
+    """Run all mapped memory tests"""
+    print("=" * 60)
+    print("Mapped Memory Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_readonly_mapping,
+        test_copy_on_write,
+        test_partial_pages,
+        test_partial_readonly_page,
+        test_image_round_trip,
+        test_cpu_from_image,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
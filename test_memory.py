@@ -0,0 +1,133 @@
+import random
+
+from memory import Memory, PagedMemory, MemoryAccessError
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def test_backends_agree():
+    """Test random word/byte traffic gives the same contents on both backends"""
+    print("\n=== Testing Backends Agree ===")
+    rng = random.Random(99)
+    dict_mem = Memory()
+    paged_mem = PagedMemory()
+
+    reads_match = True
+    for _ in range(20000):
+        # Cluster addresses so bytes and words overlap a lot
+        address = rng.choice([0x0, 0x1000, 0x10000, 0xFFFFF000]) + rng.randrange(256)
+        op = rng.randrange(4)
+        if op == 0:
+            value = rng.getrandbits(36)   # more than 32 bits on purpose
+            dict_mem.write_word(address, value)
+            paged_mem.write_word(address, value)
+        elif op == 1:
+            value = rng.getrandbits(12)
+            dict_mem.write_byte(address, value)
+            paged_mem.write_byte(address, value)
+        elif op == 2:
+            reads_match &= dict_mem.read_word(address) == paged_mem.read_word(address)
+        else:
+            reads_match &= dict_mem.read_byte(address) == paged_mem.read_byte(address)
+
+    passed = 0
+    passed += run_test(reads_match, "Reads match during traffic")
+    passed += run_test(dict_mem.nonzero_words() == paged_mem.nonzero_words(),
+                       "Final contents match")
+    return passed, 2
+
+def test_size_limit():
+    """Test PagedMemory honours its size"""
+    print("\n=== Testing Size Limit ===")
+    passed = 0
+
+    mem = PagedMemory(size=0x2000)
+    mem.write_word(0x1FFC, 0x12345678)
+    passed += run_test(mem.read_word(0x1FFC) == 0x12345678, "Last word in range works")
+
+    try:
+        mem.write_word(0x2000, 1)
+        raised = False
+    except MemoryAccessError:
+        raised = True
+    passed += run_test(raised, "Write past the end raises MemoryAccessError")
+
+    return passed, 2
+
+def test_lazy_pages():
+    """Test pages are only allocated when written"""
+    print("\n=== Testing Lazy Page Allocation ===")
+    passed = 0
+
+    mem = PagedMemory()
+    mem.read_word(0x80000000)
+    passed += run_test(mem.page_count() == 0, "Reads don't allocate")
+
+    mem.write_word(0x80000000, 1)
+    mem.write_word(0x80000FFC, 2)
+    mem.write_word(0x80001000, 3)
+    passed += run_test(mem.page_count() == 2, "Two pages after writes to two pages")
+
+    mem.clear()
+    passed += run_test(mem.page_count() == 0 and mem.read_word(0x80000000) == 0,
+                       "Clear drops every page")
+    return passed, 3
+
+def test_write_hooks():
+    """Test both backends report writes to hooks"""
+    print("\n=== Testing Write Hooks ===")
+    passed = 0
+
+    for mem in (Memory(), PagedMemory()):
+        seen = []
+        mem.add_write_hook(lambda address, num_bytes: seen.append((address, num_bytes)))
+        mem.write_word(0x100, 5)
+        mem.write_byte(0x105, 7)
+        passed += run_test(seen == [(0x100, 4), (0x105, 1)],
+                           f"{type(mem).__name__} calls hooks")
+    return passed, 2
+
+def run_all_tests():
+    """Run all memory tests"""
+    print("=" * 60)
+    print("Memory Backend Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_backends_agree,
+        test_size_limit,
+        test_lazy_pages,
+        test_write_hooks,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,267 @@
+import io
+import json
+import random
+from contextlib import redirect_stdout
+
+from assembler import assemble
+from bench_suite import program_cpu
+from branch_predictor import BranchEvaluator
+from cpu import RISCV_CPU
+from out_of_order import (OutOfOrderConfig, OutOfOrderModel, DISPATCH_STALLS, ISSUE_STALLS,
+                          main)
+from timing import EventStream, run_timing
+from trace_recorder import TraceRing
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def make_cpu(program):
+    """A CPU with program (assembly text or words) loaded at address 0"""
+    if isinstance(program, str):
+        program = assemble(program)
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    return cpu
+
+def timed(program, **config):
+    """An OutOfOrderModel (perfect prediction unless given) after running program to its halt"""
+    config.setdefault('predictor', None)
+    model = OutOfOrderModel(OutOfOrderConfig(**config))
+    make_cpu(program).simulate(max_cycles=100000, reporter=model)
+    return model
+
+def nonzero(stalls):
+    """Stall causes with any cycles"""
+    return {cause: count for cause, count in stalls.items() if count}
+
+# 20 instructions writing different registers, and 20 all writing x1
+INDEPENDENT = "\n".join(f"addi x{1 + i % 31}, x0, {i}" for i in range(20)) + "\nhalt"
+CHAIN = "\n".join(["addi x1, x1, 1"] * 20) + "\nhalt"
+
+def test_widths_and_latencies():
+    """Test hand-timed runs limited by width, dependences and units"""
+    print("\n=== Testing Widths and Latencies ===")
+    passed = 0
+
+    # 4 a cycle, dispatched from cycle 2, issued the cycle after, done a cycle later
+    model = timed(INDEPENDENT, units={'alu': 4})
+    passed += run_test(model.cycles == 2 + 19 // 4 + 2 + 1 and not nonzero(model.issue_stalls),
+                       "Independent adds: limited by fetch width only")
+
+    model = timed(INDEPENDENT, units={'alu': 4}, issue_width=1)
+    passed += run_test(model.cycles == 3 + 19 + 1 + 1 and
+                       nonzero(model.issue_stalls) == {'width': sum(i - i // 4 for i in range(20))},
+                       "Issue width 1: one a cycle, the wait charged to width")
+
+    model = timed(CHAIN, latency={'ADD': 3})
+    waits = sum(3 * i - i // 4 for i in range(20))
+    passed += run_test(model.cycles == 3 + 3 * 19 + 3 + 1 and
+                       nonzero(model.issue_stalls) == {'operands': waits},
+                       "Dependent chain with 3-cycle adds")
+
+    model = timed("lw x1, 0(x0)\nadd x2, x1, x1\nhalt")
+    passed += run_test(model.cycles == 6 + 1 + 1 and
+                       nonzero(model.issue_stalls) == {'operands': 3}, "Load latency")
+
+    loads = "\n".join(f"lw x{i + 1}, {4 * i}(x0)" for i in range(8)) + "\nhalt"
+    model = timed(loads)
+    passed += run_test(model.cycles == 3 + 7 + 3 + 1 and
+                       nonzero(model.issue_stalls) == {'unit': sum(i - i // 4 for i in range(8))} and
+                       model.unit_ops == {'alu': 0, 'branch': 0, 'memory': 8},
+                       "One memory unit: loads one a cycle")
+    return passed, 5
+
+def test_buffers():
+    """Test the ROB, reservation stations and rename registers filling up"""
+    print("\n=== Testing ROB, Stations and Registers ===")
+    passed = 0
+
+    # Each waits for the one before to commit (cycle 4 + 3i) and dispatches a cycle later
+    model = timed(INDEPENDENT, rob_size=1)
+    passed += run_test(model.cycles == 4 + 3 * 19 + 1 and
+                       nonzero(model.dispatch_stalls) == {'rob': 3 * 19} and
+                       model.rob_histogram == [model.cycles - 3 * 20, 3 * 20],
+                       "ROB of 1: one instruction in flight")
+
+    model = timed(INDEPENDENT, physical_registers=33)
+    passed += run_test(model.cycles == 4 + 3 * 19 + 1 and
+                       nonzero(model.dispatch_stalls) == {'registers': 3 * 19},
+                       "One spare physical register: one writer in flight")
+    model = timed("\n".join(["sw x0, 0(x0)"] * 20) + "\nhalt", physical_registers=33)
+    passed += run_test(not nonzero(model.dispatch_stalls), "Stores don't need one")
+
+    # Frees at issue, so one dispatch a cycle
+    model = timed(INDEPENDENT, reservation_stations=1, units={'alu': 4})
+    passed += run_test(model.cycles == 4 + 19 + 1 and
+                       nonzero(model.dispatch_stalls) == {'reservation': 19},
+                       "One reservation station: one dispatch a cycle")
+
+    model = timed("\n".join(["lw x1, 0(x0)"] * 200) + "\nhalt", rob_size=16)
+    histogram = model.rob_histogram
+    passed += run_test(sum(histogram) == model.cycles and len(histogram) == 17 and
+                       histogram[16] > model.cycles // 2 and model.dispatch_stalls['rob'] > 0,
+                       "ROB occupancy histogram covers every cycle, mostly full here")
+    return passed, 5
+
+def test_memory_and_branches():
+    """Test store to load forwarding and mispredictions"""
+    print("\n=== Testing Memory Dependences and Prediction ===")
+    passed = 0
+
+    model = timed("addi x1, x0, 5\nsw x1, 256(x0)\nlw x2, 256(x0)\nhalt")
+    other = timed("addi x1, x0, 5\nsw x1, 256(x0)\nlw x2, 260(x0)\nhalt")
+    passed += run_test(model.issue_stalls['memory'] == 2 and other.issue_stalls['memory'] == 0,
+                       "A load waits for a store to its word only")
+
+    loop = """
+        addi x2, x0, 50
+    loop:
+        addi x1, x1, 1
+        addi x2, x2, -1
+        bne x2, x0, loop
+        halt
+    """
+    perfect = timed(loop)
+    never = timed(loop, predictor="static:not_taken")
+    sweep = BranchEvaluator(["static:not_taken"])
+    make_cpu(loop).simulate(max_cycles=1000, reporter=sweep)
+    passed += run_test(perfect.mispredicts == 0 and never.mispredicts == 49 and
+                       sweep.units[0].totals()['all'][1] == 49 and
+                       never.branch_unit.totals() == sweep.units[0].totals(),
+                       "Mispredictions are the branch_predictor unit's")
+    # Each waits for the branch to execute: fetched in the cycle its result is ready
+    passed += run_test(never.cycles > perfect.cycles + 49 * 3 and
+                       never.mispredict_cycles > 49 * 3 and perfect.mispredict_cycles == 0,
+                       "Mispredictions cost fetch cycles")
+    return passed, 3
+
+def test_replay():
+    """Test trace replay and step() against live runs"""
+    print("\n=== Testing Replay vs Live ===")
+    rng = random.Random(24)
+    passed = 0
+
+    configs = [OutOfOrderConfig(), OutOfOrderConfig(fetch_width=2, issue_width=1, rob_size=8,
+                                                    reservation_stations=4, physical_registers=40,
+                                                    latency={'SRA': 3, 'SUB': 2},
+                                                    predictor="bimodal:16")]
+    same = True
+    for _ in range(30):
+        count = rng.randrange(4, 40)
+        words = [random_instruction(rng, count) for _ in range(count)] + [0x0000006F]
+        for config in configs:
+            live = OutOfOrderModel(config)
+            ring = TraceRing(capacity=1000)
+            make_cpu(words).simulate(max_cycles=300, reporter=live)
+            cpu = make_cpu(words)
+            cpu.simulate(max_cycles=300, reporter=ring)
+            replayed = OutOfOrderModel(config)
+            replayed.replay(ring, end_pc=cpu.pc)
+            same = same and replayed.to_dict() == live.to_dict() and \
+                sum(live.rob_histogram) == live.cycles
+    passed += run_test(same, "Random programs, two configs")
+
+    cpu, _ = program_cpu('calls', 5000)
+    ring = TraceRing(capacity=10000)
+    cpu.simulate(max_cycles=10 ** 6, reporter=ring)
+    live = OutOfOrderModel()
+    program_cpu('calls', 5000)[0].simulate(max_cycles=10 ** 6, reporter=live)
+    stepped = OutOfOrderModel()
+    for record in ring:
+        stepped.step(record[1], record[2], record[4] if record[7] & 6 else None)
+    stepped.finish(cpu, None)
+    passed += run_test(stepped.to_dict() == live.to_dict() and live.mispredicts > 0, "step()")
+
+    cpu, _ = program_cpu('memcpy', 4000)
+    streamed = run_timing(EventStream(cpu, batch=300), {'ooo': OutOfOrderModel}, workers=0)
+    live = OutOfOrderModel()
+    program_cpu('memcpy', 4000)[0].simulate(max_cycles=10 ** 6, reporter=live)
+    passed += run_test(streamed['ooo'] == live.to_dict(), "As a timing.py model")
+    return passed, 3
+
+def test_configs_and_reports():
+    """Test config checks, the report, JSON and the command line"""
+    print("\n=== Testing Configs and Reports ===")
+    passed = 0
+
+    bad = [{'fetch_width': 0}, {'rob_size': 0}, {'physical_registers': 32},
+           {'units': {'fpu': 1}}, {'units': {'alu': 0}}, {'latency': {'MUL': 3}},
+           {'latency': {'ADD': 0}}, {'load_latency': -1}, {'predictor': "perceptron"}]
+    rejected = 0
+    for settings in bad:
+        try:
+            OutOfOrderConfig(**settings)
+        except ValueError:
+            rejected += 1
+    passed += run_test(rejected == len(bad), f"{len(bad)} bad configs rejected")
+
+    cpu, _ = program_cpu('branchy', 5000)
+    model = OutOfOrderModel()
+    cpu.simulate(max_cycles=10 ** 6, reporter=model)
+    data = json.loads(json.dumps(model.to_dict()))
+    text = model.report()
+    passed += run_test(data['instructions'] == model.instructions and
+                       abs(data['ipc'] - model.instructions / model.cycles) < 1e-12 and
+                       list(data['dispatch_stalls']) == list(DISPATCH_STALLS) and
+                       list(data['issue_stalls']) == list(ISSUE_STALLS) and
+                       data['config']['rob_size'] == 64 and
+                       "IPC" in text and "ROB occupancy" in text and "reservation" in text,
+                       "to_dict and report")
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main(["test_branch.hex", "--rob", "8", "--predictor", "perfect", "--json"])
+        bad = main(["test_branch.hex", "--registers", "20"])
+        missing = main(["no_such_program.hex"])
+    lines = out.getvalue().splitlines()
+    passed += run_test(code == 0 and bad == 2 and missing == 1 and
+                       json.loads(lines[0])['config']['rob_size'] == 8, "Command line")
+    return passed, 3
+
+def run_all_tests():
+    """Run all out-of-order model tests"""
+    print("=" * 60)
+    print("Out-of-Order Model Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_widths_and_latencies,
+        test_buffers,
+        test_memory_and_branches,
+        test_replay,
+        test_configs_and_reports,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
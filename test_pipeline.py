@@ -0,0 +1,223 @@
+import json
+import random
+
+from assembler import assemble
+from cpu import RISCV_CPU
+from pipeline import PipelineConfig, PipelineModel, STALL_CAUSES
+from symbols import SymbolTable
+from trace_recorder import TraceRing
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def make_cpu(program):
+    """A CPU with program (assembly text or words) loaded at address 0"""
+    if isinstance(program, str):
+        program = assemble(program)
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    return cpu
+
+def timed(program, **config):
+    """A PipelineModel after running program to its halt"""
+    model = PipelineModel(PipelineConfig(**config))
+    make_cpu(program).simulate(max_cycles=100000, reporter=model)
+    return model
+
+def nonzero(model):
+    """Stall causes with any cycles"""
+    return {cause: count for cause, count in model.stalls.items() if count}
+
+def test_data_hazards():
+    """Test forwarding, no forwarding and load-use"""
+    print("\n=== Testing Data Hazards ===")
+    passed = 0
+
+    chain = "\n".join(["addi x1, x1, 1"] * 20) + "\nhalt"
+    model = timed(chain)
+    passed += run_test(model.cycles == 20 + 4 and model.stall_cycles() == 0,
+                       "Dependent chain with forwarding: no stalls")
+
+    model = timed(chain, forwarding=False)
+    passed += run_test(nonzero(model) == {'data': 2 * 19} and model.cycles == 20 + 4 + 38,
+                       "Without forwarding: 2 stalls per dependent instruction")
+
+    model = timed("addi x1, x0, 1\naddi x2, x0, 2\naddi x3, x1, 3\nhalt", forwarding=False)
+    passed += run_test(nonzero(model) == {'data': 1}, "Without forwarding: 1 stall a gap later")
+
+    model = timed("lw x1, 0(x0)\nadd x2, x1, x1\nlw x3, 4(x0)\naddi x0, x0, 0\nsw x3, 8(x0)\nhalt")
+    passed += run_test(nonzero(model) == {'load_use': 1} and model.pc_stalls == {4: 1},
+                       "Load-use: 1 stall, not when something sits in between")
+
+    model = timed("addi x0, x0, 7\nadd x1, x0, x0\nlui x2, 1\nauipc x3, 0\nhalt", forwarding=False)
+    passed += run_test(model.stall_cycles() == 0, "x0 and U-type sources never wait")
+    return passed, 5
+
+def test_control_hazards():
+    """Test branch, jal and jalr penalties"""
+    print("\n=== Testing Control Hazards ===")
+    passed = 0
+
+    model = timed("""
+        beq x0, x0, 8       # taken
+        addi x1, x0, 1      # skipped
+        bne x0, x0, 8       # not taken
+        jal x0, 8
+        addi x1, x0, 2      # skipped
+        addi x5, x0, 32
+        jalr x0, 0(x5)      # to pc + 8
+        addi x1, x0, 3      # skipped
+        addi x6, x0, 4
+        halt
+    """)
+    passed += run_test(nonzero(model) == {'branch': 2, 'jal': 1, 'jalr': 2} and
+                       model.pc_stalls == {0: 2, 12: 1, 24: 2},
+                       "Taken branch 2, not taken 0, jal 1, jalr 2 - charged to the jump")
+
+    model = timed("addi x5, x0, 8\njalr x0, 0(x5)\nhalt\n")
+    passed += run_test(model.stall_cycles() == 0, "Jump to pc + 4 costs nothing")
+
+    model = timed("beq x0, x0, 8\naddi x1, x0, 1\naddi x2, x0, 2\nhalt", branch_penalty=3, jal_penalty=0)
+    passed += run_test(model.stalls['branch'] == 3, "Configurable penalty")
+
+    try:
+        PipelineConfig(branch_penalty=-1)
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Negative penalty rejected")
+    return passed, 4
+
+def test_latencies():
+    """Test multi-cycle EX and MEM"""
+    print("\n=== Testing Latencies ===")
+    passed = 0
+
+    model = timed("add x1, x2, x3\naddi x4, x0, 1\nhalt", ex_latency={'ADD': 3})
+    passed += run_test(nonzero(model) == {'structural': 2} and model.cycles == 2 + 4 + 2,
+                       "3-cycle ADD holds the pipeline 2 cycles")
+
+    model = timed("lw x1, 0(x0)\naddi x4, x0, 1\naddi x5, x0, 1\nhalt", mem_latency=3)
+    passed += run_test(nonzero(model) == {'structural': 2} and model.pc_stalls == {0: 2},
+                       "3-cycle MEM: the load pays, not what queues behind it")
+
+    model = timed("lw x1, 0(x0)\nadd x2, x1, x1\nhalt", mem_latency=3)
+    passed += run_test(nonzero(model) == {'structural': 2, 'load_use': 1} and model.cycles == 2 + 4 + 3,
+                       "Slow load then a use")
+
+    model = timed("add x1, x2, x3\nadd x4, x1, x1\nhalt", ex_latency={'ADD': 2})
+    passed += run_test(nonzero(model) == {'structural': 2} and model.cycles == 2 + 4 + 2,
+                       "Forwarding from a 2-cycle ADD")
+    return passed, 4
+
+def test_against_trace():
+    """Test cycles = instructions + 4 + stalls, and replay matches live timing"""
+    print("\n=== Testing Against Traces ===")
+    rng = random.Random(19)
+    passed = 0
+
+    configs = [{}, {'forwarding': False}, {'ex_latency': {'SLL': 2, 'SRA': 4}, 'mem_latency': 2}]
+    accounted = True
+    replayed = True
+    for trial in range(150):
+        count = rng.randrange(4, 40)
+        words = [random_instruction(rng, count) for _ in range(count)] + [0x0000006F]
+        config = configs[trial % len(configs)]
+        live = PipelineModel(PipelineConfig(**config))
+        make_cpu(words).simulate(max_cycles=500, reporter=live)
+        accounted = accounted and live.cycles == live.instructions + 4 + live.stall_cycles() and \
+            sum(live.pc_stalls.values()) == live.stall_cycles()
+
+        ring = TraceRing()
+        make_cpu(words).simulate(max_cycles=500, reporter=ring)
+        again = PipelineModel(PipelineConfig(**config))
+        again.replay(ring)
+        replayed = replayed and again.to_dict() == live.to_dict()
+    passed += run_test(accounted, "Every stall cycle accounted for, by cause and by PC")
+    passed += run_test(replayed, "Replaying a TraceRing gives the same timing")
+    return passed, 2
+
+def test_results():
+    """Test runs, reset and the report"""
+    print("\n=== Testing Results ===")
+    passed = 0
+
+    loop = """
+        addi x2, x0, 5
+    loop:
+        lw   x3, 0(x0)
+        add  x1, x1, x3
+        addi x2, x2, -1
+        bne  x2, x0, loop
+        halt
+    """
+    model = PipelineModel()
+    make_cpu(loop).simulate(max_cycles=1000, reporter=model)
+    once = model.to_dict()
+    make_cpu(loop).simulate(max_cycles=1000, reporter=model)
+    passed += run_test(model.instructions == 2 * once['instructions'] and
+                       model.stalls['load_use'] == 2 * once['stalls']['load_use'],
+                       "Counts carry on across runs")
+    model.reset()
+    passed += run_test(model.instructions == 0 and model.cycles == 0 and model.cpi() == 0.0,
+                       "reset")
+
+    make_cpu(loop).simulate(max_cycles=1000, reporter=model)
+    passed += run_test(model.to_dict() == once and round(model.cpi(), 3) == round(once['cycles'] / 21, 3) and
+                       json.loads(json.dumps(once))['pc_stalls'] == {'0x00000008': 5, '0x00000010': 8},
+                       "to_dict")
+    symbols = SymbolTable([(4, 16, 'loop')])
+    text = model.report(symbols=symbols)
+    passed += run_test("CPI" in text and all(cause in text for cause in STALL_CAUSES) and
+                       "bne x2, x0, -12  <loop+0xc>" in text, "report")
+    passed += run_test(model.hotspots(1) == [(16, 8)] and model.report(limit=1).count("\n  0x") == 1,
+                       "hotspots")
+    return passed, 5
+
+def run_all_tests():
+    """Run all pipeline model tests"""
+    print("=" * 60)
+    print("Pipeline Model Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_data_hazards,
+        test_control_hazards,
+        test_latencies,
+        test_against_trace,
+        test_results,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,277 @@
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU, main
+from symbols import SymbolTable
+from trace_recorder import TraceRing
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+# Sums 1..10: the loop body runs 10 times, its branch is taken 9 times
+SUM_LOOP = [
+    0x00000093,  # addi x1, x0, 0
+    0x00000113,  # addi x2, x0, 0
+    0x00A00193,  # addi x3, x0, 10
+    0x00110113,  # addi x2, x2, 1
+    0x002080B3,  # add x1, x1, x2
+    0xFE311CE3,  # bne x2, x3, -8
+    0x0000006F,  # halt
+]
+
+# Calls a two-instruction function at 0x20 three times through jal/jalr
+CALLS = [
+    0x00000093,  # addi x1, x0, 0     (return address register)
+    0x00300213,  # addi x4, x0, 3
+    0x018000EF,  # jal x1, 24         (call 0x20)
+    0xFFF20213,  # addi x4, x4, -1
+    0xFE021CE3,  # bne x4, x0, -8
+    0x0000006F,  # halt
+    0x00000013,  # nop                (never runs)
+    0x00000013,  # nop                (never runs)
+    0x00128293,  # addi x5, x5, 1     (0x20)
+    0x00008067,  # jalr x0, 0(x1)     (return)
+]
+
+def make_cpu(program, engine='interpreter'):
+    """A CPU with program loaded at address 0"""
+    cpu = RISCV_CPU(engine=engine)
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    return cpu
+
+def traced_counts(ring):
+    """Per-PC execution counts and branch outcomes from trace records"""
+    counts = {}
+    taken = {}
+    records = list(ring)
+    for i, (_, pc, word, *_rest) in enumerate(records):
+        counts[pc] = counts.get(pc, 0) + 1
+        if word & 0x7F == 0x63 and i + 1 < len(records):
+            outcome = taken.setdefault(pc, [0, 0])
+            outcome[records[i + 1][1] != pc + 4] += 1
+    return counts, taken
+
+def test_counts():
+    """Test per-PC, per-mnemonic and branch counts"""
+    print("\n=== Testing Execution Counts ===")
+    passed = 0
+
+    cpu = make_cpu(SUM_LOOP)
+    profile = cpu.start_profiling()
+    result = cpu.simulate(max_cycles=1000)
+    counts = profile.counts()
+    passed += run_test(counts == {0: 1, 4: 1, 8: 1, 12: 10, 16: 10, 20: 10},
+                       "Per-PC counts of the sum loop")
+    passed += run_test(profile.total() == result.cycles == 33, f"{profile.total()} instructions")
+    passed += run_test(profile.mnemonics() == {'ADDI': 13, 'ADD': 10, 'BNE': 10},
+                       f"Mnemonics {profile.mnemonics()}")
+    passed += run_test(profile.branches() == {20: (9, 1)}, "bne taken 9, not taken 1")
+
+    cpu = make_cpu(CALLS)
+    profile = cpu.start_profiling()
+    result = cpu.simulate(max_cycles=1000)
+    expected = {0: 1, 4: 1, 8: 3, 12: 3, 16: 3, 32: 3, 36: 3}
+    passed += run_test(profile.counts() == expected and profile.total() == result.cycles,
+                       "jal/jalr calls and returns")
+    return passed, 5
+
+def test_against_trace():
+    """Test counts match a full trace of the same runs"""
+    print("\n=== Testing Against Traces ===")
+    rng = random.Random(4321)
+    trials = 300
+    matched = 0
+
+    for trial in range(trials):
+        num_words = rng.randrange(4, 40)
+        program = [random_instruction(rng, num_words) for _ in range(num_words)]
+        program.append(0x0000006F)
+
+        # Several runs on the same CPU, each cut short somewhere
+        cpu = make_cpu(program)
+        profile = cpu.start_profiling()
+        ring = TraceRing()
+        for _ in range(rng.randrange(1, 4)):
+            cpu.simulate(max_cycles=cpu.cycle_count + rng.randrange(1, 200), reporter=ring)
+        counts, taken = traced_counts(ring)
+
+        branches = {pc: (t, n) for pc, (n, t) in taken.items()}
+        ok = profile.counts() == counts and profile.total() == cpu.cycle_count
+        # The last branch traced may not have a next record yet
+        ok = ok and all(branches.get(pc, outcome) == outcome or sum(outcome) == counts[pc]
+                        for pc, outcome in profile.branches().items())
+        if ok:
+            matched += 1
+        else:
+            print(f"  Mismatch on trial {trial}: {[f'{w:08X}' for w in program]}")
+
+    return run_test(matched == trials, f"{matched}/{trials} random programs match their traces"), 1
+
+def test_blocks():
+    """Test basic blocks"""
+    print("\n=== Testing Basic Blocks ===")
+    passed = 0
+
+    cpu = make_cpu(SUM_LOOP)
+    profile = cpu.start_profiling()
+    cpu.simulate(max_cycles=1000)
+    passed += run_test(profile.blocks() == [(0, 3, 1), (12, 3, 10)], "Sum loop blocks")
+
+    cpu = make_cpu(CALLS)
+    profile = cpu.start_profiling()
+    cpu.simulate(max_cycles=1000)
+    blocks = profile.blocks()
+    passed += run_test(blocks == [(0, 2, 1), (8, 1, 3), (12, 2, 3), (32, 2, 3)],
+                       f"Call blocks {blocks}")
+    passed += run_test(sum(length * count for _, length, count in blocks) == profile.total(),
+                       "Blocks cover every instruction executed")
+    return passed, 3
+
+def test_profiling_switch():
+    """Test starting, stopping and resetting"""
+    print("\n=== Testing Start/Stop ===")
+    passed = 0
+
+    cpu = make_cpu(SUM_LOOP)
+    profile = cpu.start_profiling()
+    passed += run_test(cpu.start_profiling() is profile, "Starting twice keeps one profiler")
+    cpu.simulate(max_cycles=10)
+    stopped = cpu.stop_profiling()
+    cpu.simulate(max_cycles=1000)
+    passed += run_test(stopped is profile and profile.total() == 10 and cpu.cycle_count == 33,
+                       "Nothing counted after stopping")
+    passed += run_test(type(cpu.predecode.lookup(20)).__name__ == 'DecodedInstruction',
+                       "Plain records back in the predecode cache")
+
+    profile.reset()
+    passed += run_test(profile.total() == 0 and profile.counts() == {}, "reset() clears the counts")
+
+    # Translate engine falls back to the interpreter while profiling
+    cpu = make_cpu(SUM_LOOP, engine='translate')
+    profile = cpu.start_profiling()
+    cpu.simulate(max_cycles=1000)
+    passed += run_test(profile.total() == 33 and cpu.registers.read(1) == 55,
+                       "Profiling a translate-engine CPU")
+    return passed, 5
+
+def test_reports():
+    """Test the hotspot report, annotated listing and exports"""
+    print("\n=== Testing Reports ===")
+    passed = 0
+
+    cpu = make_cpu(CALLS)
+    cpu.symbols = SymbolTable([(0, 32, 'main'), (32, 8, 'bump')])
+    profile = cpu.start_profiling()
+    cpu.simulate(max_cycles=1000)
+
+    report = profile.report(limit=3)
+    passed += run_test("Profile: 17 instructions" in report and "bne x4, x0, -8" in report and
+                       "taken 2, not taken 1" in report, "Hotspot report")
+    hottest = profile.hotspots(limit=1)[0]
+    passed += run_test(hottest[:2] == (8, 3), "Hottest PC comes first")
+
+    listing = profile.annotate()
+    lines = listing.splitlines()
+    passed += run_test("<main>:" in lines[0] and "<bump>:" in listing and
+                       any(line.strip() == "..." for line in lines), "Listing has labels and gaps")
+    passed += run_test(any("jalr x0, 0(x1)" in line and line.split()[0] == "3" for line in lines),
+                       "Listing lines carry counts")
+
+    path = scratch_path("profile.csv")
+    profile.write(path)
+    with open(path, newline='') as f:
+        rows = list(csv.DictReader(f))
+    passed += run_test(len(rows) == 7 and rows[4]['pc'] == '0x00000010' and
+                       rows[4]['taken'] == '2' and rows[4]['block'] == '0x0000000C',
+                       "CSV export")
+
+    path = scratch_path("profile.json")
+    profile.write(path)
+    with open(path) as f:
+        data = json.load(f)
+    passed += run_test(data['instructions'] == 17 and data['mnemonics']['ADDI'] == 8 and
+                       data['blocks'][3] == {'start': 32, 'length': 2, 'count': 3},
+                       "JSON export")
+    return passed, 6
+
+def test_cli():
+    """Test --profile and --profile-out"""
+    print("\n=== Testing Command Line ===")
+    passed = 0
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        main(["test_branch.hex", "--profile"])
+    passed += run_test("Hottest instructions" in out.getvalue(), "--profile prints the report")
+
+    path = scratch_path("cli.json")
+    out = io.StringIO()
+    with redirect_stdout(out):
+        main(["test_branch.hex", "--format", "json", "--profile", "--profile-out", path])
+    result = json.loads(out.getvalue())
+    with open(path) as f:
+        profile = json.load(f)
+    passed += run_test(profile['instructions'] == result['cycles'],
+                       "--profile-out with JSON output left parseable")
+    return passed, 2
+
+def run_all_tests():
+    """Run all profiler tests"""
+    print("=" * 60)
+    print("Profiler Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_counts,
+        test_against_trace,
+        test_blocks,
+        test_profiling_switch,
+        test_reports,
+        test_cli,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,190 @@
+import random
+
+from cpu import RISCV_CPU
+from simt import SIMTEngine, np
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def make_engine(program, num_lanes):
+    """SIMT engine with a list of instruction words at address 0 in every lane"""
+    sim = SIMTEngine(num_lanes)
+    for i, inst in enumerate(program):
+        sim.write_word(i * 4, inst)
+    return sim
+
+def run_scalar(program, registers, max_cycles):
+    """One lane's worth of work on an ordinary CPU"""
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    for reg, value in enumerate(registers):
+        if reg:
+            cpu.registers.write(reg, value)
+    result = cpu.simulate(max_cycles=max_cycles)
+    return cpu, result
+
+def lane_matches(sim, lane, cpu, result):
+    """Check a lane ended in the same state as a scalar CPU"""
+    mine = sim.lane_result(lane)
+    return (mine.to_dict() == result.to_dict() and
+            sim.lane_words(lane) == cpu.memory.nonzero_words())
+
+def test_divergent_loop():
+    """Test lanes with different trip counts split and come back together"""
+    print("\n=== Testing Divergent Loop ===")
+    program = [
+        0x00000093,  # addi x1, x0, 0
+        0x00000113,  # addi x2, x0, 0
+        0x00110113,  # addi x2, x2, 1
+        0x002080B3,  # add x1, x1, x2
+        0xFEA11CE3,  # bne x2, x10, -8
+        0x40102023,  # sw x1, 0x400(x0)
+        0x0000006F,  # halt
+    ]
+    sim = make_engine(program, 16)
+    sim.regs[:, 10] = np.arange(1, 17)
+    remaining = sim.run(max_cycles=1000)
+
+    expected = [n * (n + 1) // 2 for n in range(1, 17)]
+    results = sim.results()
+    passed = 0
+    passed += run_test(sim.regs[:, 1].tolist() == expected, "Per-lane sums in x1")
+    passed += run_test(sim.read_word(0x400).tolist() == expected, "Per-lane stores")
+    passed += run_test(remaining == 0 and all(r.halt_reason == 'halt' for r in results),
+                       "Every lane halted")
+    passed += run_test([r.cycles for r in results] == [3 + 3 * n for n in range(1, 17)],
+                       "Per-lane cycle counts")
+    # The tail (sw, halt) runs once for all 16 lanes, not 16 times
+    passed += run_test(sim.steps == 2 + 3 * 16 + 1, f"Lanes regrouped ({sim.steps} steps)")
+    return passed, 5
+
+def test_halt_reasons():
+    """Test lanes can stop for different reasons"""
+    print("\n=== Testing Halt Reasons ===")
+    program = [
+        0x00050463,  # beq x10, x0, +8
+        0xFFFFFFFF,  # illegal
+        0x00058463,  # beq x11, x0, +8   (into empty memory)
+        0x0000006F,  # halt
+    ]
+    sim = make_engine(program, 3)
+    sim.regs[:, 10] = [0, 1, 0]
+    sim.regs[:, 11] = [0, 0, 1]
+    sim.run(max_cycles=10)
+    results = sim.results()
+
+    passed = 0
+    passed += run_test(results[0].halt_reason == 'uninitialized', "Lane 0 ran off the end")
+    passed += run_test(results[1].halt_reason == 'illegal_instruction' and
+                       results[1].trap_cause.startswith("Illegal instruction 0xFFFFFFFF at PC=0x00000004"),
+                       "Lane 1 trapped")
+    passed += run_test(results[2].halt_reason == 'halt' and results[2].cycles == 2,
+                       "Lane 2 reached the halt")
+
+    # Running out of cycles, then carrying on
+    sim = make_engine([0x00108093, 0xFFDFF06F], 2)   # addi x1, x1, 1; jal x0, -4
+    sim.run(max_cycles=7)
+    passed += run_test(sim.lane_result(0).halt_reason == 'max_cycles' and
+                       sim.cycles.tolist() == [7, 7], "Stops at max cycles")
+    sim.run(max_cycles=10)
+    passed += run_test(sim.cycles.tolist() == [10, 10] and sim.regs[1, 1] == 5,
+                       "Resumes with a larger limit")
+    return passed, 5
+
+def test_random_programs():
+    """Test every lane matches its own RISCV_CPU on random programs"""
+    print("\n=== Testing Random Programs ===")
+    rng = random.Random(4321)
+    trials = 60
+    lanes = 12
+    matched = 0
+
+    for trial in range(trials):
+        num_words = rng.randrange(4, 40)
+        program = [random_instruction(rng, num_words) for _ in range(num_words)]
+        program.append(0x0000006F)
+        max_cycles = rng.randrange(1, 400)
+
+        # Different starting registers per lane, so branches diverge
+        start = [[0] + [rng.randrange(1 << 32) if rng.random() < 0.5 else rng.randrange(8)
+                        for _ in range(31)] for _ in range(lanes)]
+        sim = make_engine(program, lanes)
+        sim.regs[:] = np.array(start, dtype=np.uint32)
+        sim.run(max_cycles=max_cycles)
+
+        ok = True
+        for lane in range(lanes):
+            cpu, result = run_scalar(program, start[lane], max_cycles)
+            if not lane_matches(sim, lane, cpu, result):
+                ok = False
+                print(f"  Mismatch on trial {trial} lane {lane}: {[f'{w:08X}' for w in program]}")
+                break
+        matched += ok
+
+    return run_test(matched == trials, f"{matched}/{trials} random programs match"), 1
+
+def test_load_program():
+    """Test loading a hex file into every lane"""
+    print("\n=== Testing Program Loading ===")
+    sim = SIMTEngine(4)
+    sim.load("test_mem.hex")
+    sim.run(max_cycles=100)
+
+    cpu = RISCV_CPU()
+    cpu.load("test_mem.hex")
+    result = cpu.simulate(max_cycles=100)
+
+    passed = 0
+    passed += run_test(all(lane_matches(sim, lane, cpu, result) for lane in range(4)),
+                       "Every lane matches the CPU")
+    # The code page is still one shared copy; the data page (0x10000) was stored to
+    passed += run_test(not sim.pages[0].flags.writeable and sim.pages[0x10].flags.writeable,
+                       "Pages shared until written")
+    return passed, 2
+
+def run_all_tests():
+    """Run all SIMT engine tests"""
+    print("=" * 60)
+    print("SIMT Engine Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_divergent_loop,
+        test_halt_reasons,
+        test_random_programs,
+        test_load_program,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
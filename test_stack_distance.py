@@ -0,0 +1,259 @@
+import io
+import json
+import random
+from contextlib import redirect_stdout
+
+from bench_suite import program_cpu
+from cache import Cache, CacheHierarchy, MainMemory, LOAD
+from stack_distance import (StackDistanceAnalyzer, ReuseProfile, SetProfile, parse_config,
+                            INSTRUCTION, DATA, main)
+from trace_recorder import TraceRing
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def naive_distances(lines):
+    """Stack distances by keeping the LRU stack as a list"""
+    stack = []
+    distances = []
+    for line in lines:
+        if line in stack:
+            distances.append(stack.index(line))
+            stack.remove(line)
+        else:
+            distances.append(None)
+        stack.insert(0, line)
+    return distances
+
+def cache_misses(lines, sets, ways):
+    """Misses of a cache.Cache with 16-byte lines on a line stream"""
+    cache = Cache('C', sets * ways * 16, ways, 16)
+    cache.next_level = MainMemory()
+    for line in lines:
+        cache.access(line * 16, LOAD)
+    return cache.misses[LOAD]
+
+def random_streams(rng, count):
+    """Line streams over small and large working sets"""
+    streams = []
+    for _ in range(count):
+        lines = rng.randrange(1, 80)
+        streams.append([rng.randrange(lines) for _ in range(rng.randrange(1, 2000))])
+    return streams
+
+def test_distances():
+    """Test stack distances against a plain LRU stack"""
+    print("\n=== Testing Stack Distances ===")
+    rng = random.Random(22)
+    passed = 0
+
+    profile = ReuseProfile()
+    got = [profile.access(line) for line in [1, 2, 1, 3, 2, 2, 1]]
+    passed += run_test(got == [None, None, 1, None, 2, 0, 2] and profile.cold == 3 and
+                       profile.histogram == [1, 1, 2], "Hand-worked sequence")
+
+    same = True
+    for lines in random_streams(rng, 40):
+        expected = naive_distances(lines)
+        # A tiny tree gets renumbered over and over
+        for capacity in (2, 1 << 16):
+            profile = ReuseProfile(capacity)
+            same = same and [profile.access(line) for line in lines] == expected
+    passed += run_test(same, "Random streams, with and without renumbering")
+    return passed, 2
+
+def test_fully_associative():
+    """Test every fully associative size against the cache model"""
+    print("\n=== Testing Fully Associative Sizes ===")
+    rng = random.Random(23)
+    passed = 0
+
+    same = True
+    for lines in random_streams(rng, 20):
+        profile = ReuseProfile()
+        for line in lines:
+            profile.access(line)
+        curve = profile.miss_curve()
+        for ways in (1, 2, 4, 8, 16, 32, 64):
+            same = same and profile.misses(ways) == cache_misses(lines, 1, ways)
+        same = same and all(curve[c] == profile.misses(c) for c in range(len(curve)))
+    passed += run_test(same, "Matches LRU caches of 1-64 lines, and miss_curve")
+
+    profile = ReuseProfile()
+    for line in [0, 1, 2, 3] * 5:
+        profile.access(line)
+    passed += run_test(profile.misses(3) == 20 and profile.misses(4) == 4 and
+                       profile.miss_ratio(4) == 0.2, "Cyclic working set one line too big")
+    return passed, 2
+
+def test_set_associative():
+    """Test per-set distances against set-associative caches"""
+    print("\n=== Testing Set-Associative Configs ===")
+    rng = random.Random(24)
+    passed = 0
+
+    same = True
+    for lines in random_streams(rng, 20):
+        for sets in (2, 4, 16):
+            profile = SetProfile(sets, 8)
+            for line in lines:
+                profile.access(line)
+            for ways in (1, 2, 4, 8):
+                same = same and profile.misses(ways) == cache_misses(lines, sets, ways)
+    passed += run_test(same, "One profile per set count covers every associativity")
+
+    try:
+        profile.misses(16)
+        deeper = False
+    except ValueError:
+        deeper = True
+    passed += run_test(deeper, "Asking for more ways than tracked is an error")
+    return passed, 2
+
+def test_analyzer():
+    """Test a live run against CacheHierarchy runs, and replay against live"""
+    print("\n=== Testing Analyzer vs Cache Runs ===")
+    passed = 0
+
+    configs = ["1K:1", "1K:2", "2K:4", "256:4", "4K:8"]
+    same = True
+    replayed = True
+    for name in ('memcpy', 'calls', 'branchy'):
+        cpu, _ = program_cpu(name, 8000)
+        ring = TraceRing(capacity=20000)
+        analyzer = StackDistanceAnalyzer(configs, line_size=32)
+
+        class Both:
+            def start(self, cpu):
+                ring.start(cpu)
+
+            def finish(self, cpu, result):
+                analyzer.finish(cpu, result)
+                ring.finish(cpu, result)
+
+            def trace(self, cpu, decoded):
+                ring.trace(cpu, decoded)
+                analyzer.trace(cpu, decoded)
+
+        cpu.simulate(max_cycles=20000, reporter=Both())
+        for size, ways in analyzer.configs + [(512, 16), (4096, 128)]:
+            caches = CacheHierarchy(l1i=Cache('L1I', size, ways, 32), l1d=Cache('L1D', size, ways, 32),
+                                    l2=None)
+            caches.replay(ring)
+            associative = None if ways * 32 == size else ways
+            same = same and analyzer.miss_ratio(INSTRUCTION, size, associative) == caches.l1i.miss_rate()
+            same = same and analyzer.miss_ratio(DATA, size, associative) == caches.l1d.miss_rate()
+
+        again = StackDistanceAnalyzer(configs, line_size=32)
+        again.replay(ring)
+        replayed = replayed and again.to_dict() == analyzer.to_dict()
+    passed += run_test(same, "Miss ratios = one cache run per config")
+    passed += run_test(replayed, "Replaying a trace = analysing live")
+
+    analyzer = StackDistanceAnalyzer(["4K:4"])
+    for i in range(100):
+        analyzer.step(i * 4, 0x1000 + 64 * (i % 3) if i % 2 else None)
+    data = analyzer.profiles[DATA]
+    passed += run_test(analyzer.instructions == 100 and data.references == 50 and data.cold == 3 and
+                       analyzer.profiles[INSTRUCTION].cold == 7, "step()")
+    return passed, 3
+
+def test_configs():
+    """Test config parsing and lookups"""
+    print("\n=== Testing Configs ===")
+    passed = 0
+
+    passed += run_test(parse_config("32K:8") == (32768, 8) and parse_config("1M:16") == (1 << 20, 16) and
+                       parse_config("4096:1") == (4096, 1) and parse_config((8192, 2)) == (8192, 2),
+                       "Sizes with and without suffixes")
+    bad = ["32K", "32K:3", "3000:2", "x:2", "256:8", "32K:8:64"]
+    rejected = 0
+    for spec in bad:
+        try:
+            parse_config(spec)
+        except ValueError:
+            rejected += 1
+    passed += run_test(rejected == len(bad), f"{len(bad)} bad configs rejected")
+
+    analyzer = StackDistanceAnalyzer(["32K:8", "16K:4"])
+    try:
+        analyzer.miss_ratio(DATA, 32768, 2)
+        missing = False
+    except KeyError:
+        missing = True
+    # Both configs have 64 sets, tracked 8 deep: 8K:2 is 64 sets too
+    passed += run_test(missing and analyzer.miss_ratio(DATA, 8192, 2) == 0.0,
+                       "Set counts not analysed are a KeyError, shallower ways aren't")
+    return passed, 3
+
+def test_reports():
+    """Test the report, JSON and command line"""
+    print("\n=== Testing Reports ===")
+    passed = 0
+
+    cpu, _ = program_cpu('memcpy', 20000)
+    analyzer = StackDistanceAnalyzer(["4K:2", "32K:8"])
+    cpu.simulate(max_cycles=10 ** 6, reporter=analyzer)
+    text = analyzer.report()
+    passed += run_test("fully associative" in text and "32 KiB 8-way" in text and
+                       "256 B" in text, "report")
+    data = json.loads(json.dumps(analyzer.to_dict()))
+    stream = data['streams']['data']
+    passed += run_test(stream['references'] == analyzer.profiles[DATA].references and
+                       stream['configs'][1] == {'size': 32768, 'ways': 8,
+                                                'miss_ratio': analyzer.miss_ratio(DATA, 32768, 8)} and
+                       stream['fully_associative'][0]['size'] == 256, "to_dict")
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main(["test_branch.hex", "--config", "1K:2", "--line-size", "32"])
+        bad = main(["test_branch.hex", "--config", "1K:3"])
+    passed += run_test(code == 0 and bad == 2 and "1 KiB 2-way" in out.getvalue(), "Command line")
+    return passed, 3
+
+def run_all_tests():
+    """Run all stack distance tests"""
+    print("=" * 60)
+    print("Stack Distance Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_distances,
+        test_fully_associative,
+        test_set_associative,
+        test_analyzer,
+        test_configs,
+        test_reports,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,213 @@
+import functools
+import io
+import json
+import os
+import random
+import tempfile
+from contextlib import redirect_stdout
+
+from bench_suite import program_cpu
+from branch_predictor import BranchEvaluator
+from cache import Cache, CacheHierarchy
+from cpu import RISCV_CPU
+from pipeline import PipelineConfig, PipelineModel
+from stack_distance import StackDistanceAnalyzer
+from timing import EventStream, run_timing, trace_chunks, main
+from trace_recorder import RECORD_SIZE, TraceRing, TraceWriter
+from test_translator import random_instruction
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+def broken_model():
+    """A factory that fails, as a worker would see it"""
+    raise ValueError("no such model")
+
+# One of each kind of model
+MODELS = {
+    'pipeline': functools.partial(PipelineModel, PipelineConfig(forwarding=False, branch_penalty=3)),
+    'predictors': functools.partial(BranchEvaluator, ["bimodal:64", "gshare:256:6+btb:16+ras:4"]),
+    'caches': functools.partial(CacheHierarchy, Cache('L1I', 256, 2, 16), Cache('L1D', 256, 2, 16)),
+    'distances': functools.partial(StackDistanceAnalyzer, ["256:2"], 16),
+}
+
+def live_results(make_cpu, max_cycles):
+    """Each model attached to its own run"""
+    results = {}
+    for name, factory in MODELS.items():
+        model = factory()
+        make_cpu().simulate(max_cycles=max_cycles, reporter=model)
+        results[name] = model.to_dict()
+    return results
+
+def test_event_stream():
+    """Test the batched stream is the same run as one recorded whole"""
+    print("\n=== Testing EventStream ===")
+    rng = random.Random(23)
+    passed = 0
+
+    same = True
+    for batch in (1, 7, 4096):
+        cpu, _ = program_cpu('calls', 3000)
+        ring = TraceRing(capacity=10000)
+        whole = cpu.simulate(max_cycles=5000, reporter=ring)
+        cpu, _ = program_cpu('calls', 3000)
+        stream = EventStream(cpu, max_cycles=5000, batch=batch)
+        chunks = list(stream)
+        same = same and b"".join(chunks) == ring.records() and \
+            all(len(chunk) <= batch * RECORD_SIZE for chunk in chunks) and \
+            stream.result.cycles == whole.cycles and stream.end_pc == cpu.pc
+    passed += run_test(same, "Records, batch sizes and run result match one recorded run")
+
+    same = True
+    for _ in range(30):
+        count = rng.randrange(4, 40)
+        words = [random_instruction(rng, count) for _ in range(count)] + [0x0000006F]
+
+        def fresh():
+            cpu = RISCV_CPU()
+            for i, word in enumerate(words):
+                cpu.memory.write_word(i * 4, word)
+            return cpu
+
+        ring = TraceRing(capacity=1000)
+        fresh().simulate(max_cycles=300, reporter=ring)
+        stream = EventStream(fresh(), max_cycles=300, batch=rng.randrange(1, 50))
+        same = same and list(stream.records()) == list(ring)
+    passed += run_test(same, "Random programs, random batch sizes")
+
+    # The generator only runs the CPU as far as it's been read
+    cpu, _ = program_cpu('arith', 100000)
+    stream = iter(EventStream(cpu, max_cycles=10 ** 6, batch=1000))
+    next(stream)
+    passed += run_test(cpu.cycle_count == 1000 and not cpu.halted, "Runs a batch at a time")
+    return passed, 3
+
+def test_models():
+    """Test one stream gives every model what its own run would"""
+    print("\n=== Testing Many Models From One Run ===")
+    passed = 0
+
+    for name in ('memcpy', 'branchy', 'calls'):
+        expected = live_results(lambda: program_cpu(name, 4000)[0], 10 ** 6)
+        cpu, _ = program_cpu(name, 4000)
+        results = run_timing(EventStream(cpu, batch=512), MODELS, workers=0)
+        passed += run_test(results == expected, f"{name}: in-process = one live run per model")
+
+    # Cut off straight after a taken branch: its outcome comes from the end pc
+    cuts = True
+    for cycles in (2, 3, 4, 5, 17):
+        def make():
+            cpu = RISCV_CPU()
+            for i, word in enumerate([0x00500093, 0xFFF08093, 0xFE009EE3, 0x0000006F]):
+                cpu.memory.write_word(i * 4, word)
+            return cpu
+        expected = live_results(make, cycles)
+        results = run_timing(EventStream(make(), max_cycles=cycles, batch=2), MODELS, workers=0)
+        cuts = cuts and results == expected
+    passed += run_test(cuts, "Runs that stop mid-loop")
+    return passed, 4
+
+def test_workers():
+    """Test worker processes, trace file sources and failures"""
+    print("\n=== Testing Worker Processes ===")
+    passed = 0
+
+    cpu, _ = program_cpu('branchy', 6000)
+    alone = run_timing(EventStream(cpu, batch=256), MODELS, workers=0)
+    cpu, _ = program_cpu('branchy', 6000)
+    pooled = run_timing(EventStream(cpu, batch=256), MODELS, workers=3, queue_depth=2)
+    passed += run_test(pooled == alone and list(pooled) == list(MODELS),
+                       "Workers = in-process, results in the order given")
+
+    path = scratch_path("branchy.trace")
+    cpu, _ = program_cpu('branchy', 6000)
+    with TraceWriter(path) as writer:
+        cpu.simulate(max_cycles=10 ** 6, reporter=writer)
+    models = {name: MODELS[name] for name in ('pipeline', 'caches', 'distances')}
+    from_file = run_timing(trace_chunks(path, batch=100), models, workers=2)
+    passed += run_test(from_file == {name: alone[name] for name in models},
+                       "A recorded trace file as the source")
+
+    cpu, _ = program_cpu('branchy', 20000)
+    try:
+        run_timing(EventStream(cpu, batch=64), {'ok': MODELS['pipeline'], 'bad': broken_model},
+                   workers=2, queue_depth=1)
+        failed = ''
+    except RuntimeError as e:
+        failed = str(e)
+    passed += run_test("no such model" in failed, "A failing worker's traceback comes back")
+    return passed, 3
+
+def test_command_line():
+    """Test the command line sweep"""
+    print("\n=== Testing Command Line ===")
+    passed = 0
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main(["test_branch.hex", "--workers", "0", "--json"])
+    data = json.loads(out.getvalue())
+    passed += run_test(code == 0 and 'pipeline fwd penalty 2' in data and
+                       'branch predictors' in data and 'stack distances' in data, "JSON")
+
+    out = io.StringIO()
+    with redirect_stdout(out):
+        code = main(["test_branch.hex", "--workers", "2"])
+        missing = main(["no_such_program.hex"])
+    text = out.getvalue()
+    passed += run_test(code == 0 and missing == 1 and "CPI" in text and "AMAT" in text and
+                       "mispredicted" in text, "Summary")
+    return passed, 2
+
+def run_all_tests():
+    """Run all decoupled timing tests"""
+    print("=" * 60)
+    print("Decoupled Timing Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_event_stream,
+        test_models,
+        test_workers,
+        test_command_line,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,236 @@
+import glob
+import os
+import tempfile
+
+from cpu import RISCV_CPU
+from trace_recorder import TraceRing, TraceWriter, TRACE_DTYPE, np
+from trace_codec import (CompressedTrace, CompressedTraceWriter, compress_trace,
+                         encode_chunk, decode_chunk)
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+# Walks an array at 0x4000 with a 12-byte stride, summing and storing back
+ARRAY_LOOP = [
+    0x00004137,  # lui x2, 0x4
+    0x00000093,  # addi x1, x0, 0
+    0x00012183,  # lw x3, 0(x2)
+    0x003080B3,  # add x1, x1, x3
+    0x00112023,  # sw x1, 0(x2)
+    0x00C10113,  # addi x2, x2, 12
+    0xFEA148E3,  # blt x2, x10, -16
+    0x0000006F,  # halt
+]
+
+def array_loop_trace(iterations):
+    """Trace of ARRAY_LOOP over `iterations` array elements"""
+    cpu = RISCV_CPU(memory='paged')
+    for i, inst in enumerate(ARRAY_LOOP):
+        cpu.memory.write_word(i * 4, inst)
+    for i in range(iterations):
+        cpu.memory.write_word(0x4000 + 12 * i, i * 7 + 1)
+    cpu.registers.write(10, 0x4000 + 12 * iterations)
+    ring = TraceRing(capacity=6 * iterations)
+    cpu.simulate(max_cycles=10 ** 9, reporter=ring)
+    return ring.to_numpy()
+
+def random_records(rng, count):
+    """Records with arbitrary values in every field"""
+    records = np.zeros(count, dtype=TRACE_DTYPE)
+    records['cycle'] = np.cumsum(rng.integers(1, 4, count)) + rng.integers(0, 1 << 40)
+    pcs = rng.integers(0, 64, count).astype(np.uint32) * 4
+    sequential = rng.random(count) < 0.7
+    for i in range(1, count):                # mostly pc + 4, like real code
+        if sequential[i]:
+            pcs[i] = pcs[i - 1] + 4
+    records['pc'] = pcs
+    records['word'] = rng.integers(0, 1 << 32, count, dtype=np.uint32)
+    records['rd_value'] = rng.integers(0, 1 << 32, count, dtype=np.uint32)
+    records['mem_addr'] = rng.integers(0, 1 << 32, count, dtype=np.uint32)
+    records['mem_value'] = rng.integers(0, 1 << 32, count, dtype=np.uint32)
+    records['rd'] = rng.integers(0, 32, count)
+    records['flags'] = rng.integers(0, 8, count)
+    # Only LW/SW records carry memory fields
+    memory = (records['flags'] & 6) != 0
+    records['mem_addr'][~memory] = 0
+    records['mem_value'][~memory] = 0
+    return records
+
+def test_round_trip_programs():
+    """Test traces of the bundled programs decode exactly"""
+    print("\n=== Testing Bundled Programs ===")
+    passed = 0
+    total = 0
+
+    for program in sorted(glob.glob("test_*.hex")):
+        cpu = RISCV_CPU()
+        cpu.load(program)
+        ring = TraceRing()
+        cpu.simulate(max_cycles=10000, reporter=ring)
+        records = ring.to_numpy()
+
+        ok = True
+        for method in ('zlib', 'lzma'):
+            for chunk_records in (1, 3, 65536):
+                path = scratch_path("program.rvtz")
+                compress_trace(records, path, method=method, chunk_records=chunk_records)
+                with CompressedTrace(path) as trace:
+                    ok = ok and trace.read().tobytes() == records.tobytes()
+        passed += run_test(ok, f"{program} ({len(records)} records)")
+        total += 1
+
+    return passed, total
+
+def test_round_trip_random():
+    """Test arbitrary records survive every delta stage"""
+    print("\n=== Testing Random Records ===")
+    rng = np.random.default_rng(2024)
+    passed = 0
+
+    ok = True
+    for trial in range(50):
+        records = random_records(rng, int(rng.integers(1, 500)))
+        ok = ok and decode_chunk(encode_chunk(records)).tobytes() == records.tobytes()
+    passed += run_test(ok, "50 random chunks decode exactly")
+
+    # The same PC with a different word (self-modifying code)
+    records = array_loop_trace(5).copy()
+    records['word'][20] ^= 0x1000
+    passed += run_test(decode_chunk(encode_chunk(records, 'lzma'), 'lzma').tobytes() == records.tobytes(),
+                       "Changed instruction word at a repeated PC")
+    passed += run_test(len(decode_chunk(encode_chunk(records[:0]))) == 0, "Empty chunk")
+    return passed, 3
+
+def test_random_access():
+    """Test reading chunks and ranges without decoding the rest"""
+    print("\n=== Testing Random Access ===")
+    passed = 0
+    records = array_loop_trace(1000)
+    path = scratch_path("seek.rvtz")
+    compress_trace(records, path, chunk_records=500)
+
+    with CompressedTrace(path) as trace:
+        passed += run_test(len(trace) == len(records) and trace.num_chunks == -(-len(records) // 500),
+                           f"{len(trace)} records in {trace.num_chunks} chunks")
+        passed += run_test(trace.chunk(4).tobytes() == records[2000:2500].tobytes(),
+                           "Chunk 4 on its own")
+        passed += run_test(trace.read(990, 2010).tobytes() == records[990:2010].tobytes(),
+                           "Range across chunk boundaries")
+        passed += run_test(trace.find_chunk(0) == 0 and trace.find_chunk(4999) == 9 and
+                           trace.chunks[9][3] == records['cycle'][4500],
+                           "Index finds chunks by record and holds first cycles")
+        try:
+            trace.find_chunk(len(records))
+            raised = False
+        except IndexError:
+            raised = True
+        passed += run_test(raised, "Record past the end raises IndexError")
+    return passed, 5
+
+def test_streaming_writer():
+    """Test recording straight into a compressed file"""
+    print("\n=== Testing Compressed Recorder ===")
+    passed = 0
+
+    raw = scratch_path("raw.trace")
+    packed = scratch_path("streamed.rvtz")
+    cpu = RISCV_CPU()
+    cpu.load("test_mem.hex")
+    with TraceWriter(raw) as writer:
+        cpu.simulate(max_cycles=100, reporter=writer)
+    cpu = RISCV_CPU()
+    cpu.load("test_mem.hex")
+    with CompressedTraceWriter(packed, chunk_records=3) as writer:
+        cpu.simulate(max_cycles=100, reporter=writer)
+
+    offline = scratch_path("offline.rvtz")
+    compress_trace(raw, offline, chunk_records=3)
+    with open(packed, 'rb') as f, open(offline, 'rb') as g:
+        passed += run_test(f.read() == g.read(), "Same file as compressing the raw trace")
+
+    # Compression on a long strided loop
+    records = array_loop_trace(20000)
+    path = scratch_path("loop.rvtz")
+    compress_trace(records, path)
+    ratio = records.nbytes / os.path.getsize(path)
+    passed += run_test(ratio > 50, f"Strided loop compresses {ratio:.0f}x")
+
+    with open(path, 'rb') as f:
+        data = bytearray(f.read())
+    bad = scratch_path("bad.rvtz")
+    with open(bad, 'wb') as f:
+        f.write(data[:len(data) // 2])
+    try:
+        CompressedTrace(bad)
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Truncated file raises ValueError")
+
+    data[100] ^= 0xFF
+    with open(bad, 'wb') as f:
+        f.write(data)
+    try:
+        with CompressedTrace(bad) as trace:
+            trace.chunk(0)
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Corrupt chunk raises ValueError")
+    return passed, 4
+
+def run_all_tests():
+    """Run all trace codec tests"""
+    print("=" * 60)
+    print("Trace Codec Tests")
+    print("=" * 60)
+
+    if np is None:
+        print("NumPy not installed - skipping trace codec tests")
+        return 0
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_round_trip_programs,
+        test_round_trip_random,
+        test_random_access,
+        test_streaming_writer,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
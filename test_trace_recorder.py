@@ -0,0 +1,256 @@
+import io
+import os
+import tempfile
+
+from cpu import RISCV_CPU
+from trace_recorder import (TraceRing, TraceWriter, address_trace, iter_chunks, iter_trace,
+                            read_trace, np,
+                            FLAG_RD_WRITE, FLAG_LOAD, FLAG_STORE, RECORD_SIZE)
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+# Removed when the interpreter exits
+_SCRATCH = tempfile.TemporaryDirectory()
+
+def scratch_path(name):
+    """Path for a throwaway file"""
+    return os.path.join(_SCRATCH.name, name)
+
+# Sums 1..20 into x1, storing the running total at 0x2000 and reading it back
+LOOP_PROGRAM = [
+    0x00000093,  # addi x1, x0, 0
+    0x00000113,  # addi x2, x0, 0
+    0x01400193,  # addi x3, x0, 20
+    0x00110113,  # addi x2, x2, 1
+    0x002080B3,  # add x1, x1, x2
+    0x000022B7,  # lui x5, 0x2
+    0x0012A023,  # sw x1, 0(x5)
+    0x0002A303,  # lw x6, 0(x5)
+    0xFE3116E3,  # bne x2, x3, -20
+    0x0000006F,  # halt
+]
+
+def make_cpu(engine='interpreter'):
+    cpu = RISCV_CPU(engine=engine)
+    for i, inst in enumerate(LOOP_PROGRAM):
+        cpu.memory.write_word(i * 4, inst)
+    return cpu
+
+def test_records_match_execution():
+    """Test every record agrees with stepping the same program by hand"""
+    print("\n=== Testing Record Contents ===")
+    passed = 0
+
+    cpu = make_cpu()
+    ring = TraceRing()
+    result = cpu.simulate(max_cycles=1000, reporter=ring)
+    records = list(ring)
+    passed += run_test(len(records) == result.cycles == 2 + 1 + 6 * 20,
+                       f"One record per instruction ({len(records)})")
+
+    stepper = make_cpu()
+    ok = True
+    for cycle, pc, word, rd_value, address, value, rd, flags in records:
+        inst = stepper.memory.read_word(stepper.pc)
+        before = stepper.pc
+        stepper.simulate(max_cycles=stepper.cycle_count + 1)
+        expected_rd = (inst >> 7) & 0x1F if inst & 0x7F not in (0x23, 0x63) else 0
+        ok = ok and (cycle, pc, word, rd) == (stepper.cycle_count - 1, before, inst, expected_rd)
+        ok = ok and rd_value == (stepper.registers.read(rd) if rd else 0)
+        ok = ok and bool(flags & FLAG_RD_WRITE) == bool(rd)
+    passed += run_test(ok, "Cycle, PC, word and rd value match")
+
+    stores = [r for r in records if r[7] & FLAG_STORE]
+    loads = [r for r in records if r[7] & FLAG_LOAD]
+    totals = [n * (n + 1) // 2 for n in range(1, 21)]
+    passed += run_test([(r[4], r[5]) for r in stores] == [(0x2000, t) for t in totals],
+                       "SW records address and stored value")
+    passed += run_test([(r[4], r[5], r[3]) for r in loads] == [(0x2000, t, t) for t in totals],
+                       "LW records address and loaded value")
+    return passed, 4
+
+def test_writer():
+    """Test the file writer, batching and the readers"""
+    print("\n=== Testing Trace Files ===")
+    passed = 0
+
+    ring = TraceRing()
+    make_cpu().simulate(max_cycles=1000, reporter=ring)
+
+    contents = []
+    for batch in (1, 7, 4096):
+        path = scratch_path(f"batch{batch}.trace")
+        with TraceWriter(path, batch=batch) as writer:
+            make_cpu().simulate(max_cycles=1000, reporter=writer)
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    passed += run_test(contents[0] == contents[1] == contents[2] and
+                       contents[0][16:] == ring.records(), "Same file whatever the batch size")
+    passed += run_test(list(iter_trace(path)) == list(ring), "iter_trace reads it back")
+    chunks = list(iter_chunks(path, batch=50))
+    passed += run_test(b''.join(chunks) == ring.records() and
+                       [len(chunk) // RECORD_SIZE for chunk in chunks] == [50, 50, 23],
+                       "iter_chunks reads it back in batches")
+
+    # A stream that isn't closed by the writer, and a run split in two
+    stream = io.BytesIO()
+    writer = TraceWriter(stream, batch=5)
+    cpu = make_cpu()
+    cpu.simulate(max_cycles=50, reporter=writer)
+    cpu.simulate(max_cycles=1000, reporter=writer)
+    writer.close()
+    passed += run_test(not stream.closed and stream.getvalue() == contents[0],
+                       "Split run writes the same records to a stream")
+
+    bad = scratch_path("bad.trace")
+    with open(bad, 'wb') as f:
+        f.write(b'not a trace at all')
+    try:
+        list(iter_trace(bad))
+        raised = False
+    except ValueError:
+        raised = True
+    passed += run_test(raised, "Bad file raises ValueError")
+    return passed, 5
+
+def test_numpy_reader():
+    """Test loading traces into NumPy arrays"""
+    print("\n=== Testing NumPy Reader ===")
+    if np is None:
+        print("NumPy not installed - skipping")
+        return 0, 0
+    passed = 0
+
+    path = scratch_path("numpy.trace")
+    with TraceWriter(path) as writer:
+        make_cpu().simulate(max_cycles=1000, reporter=writer)
+    records = list(iter_trace(path))
+
+    for mmap in (False, True):
+        trace = read_trace(path, mmap=mmap)
+        passed += run_test(trace.dtype.itemsize == RECORD_SIZE and
+                           trace['pc'].tolist() == [r[1] for r in records] and
+                           trace['mem_value'].tolist() == [r[5] for r in records],
+                           f"Fields read back (mmap={mmap})")
+
+    stores = trace[(trace['flags'] & FLAG_STORE) != 0]
+    passed += run_test(int(stores['mem_value'][-1]) == 210, "Filter stores with a mask")
+    return passed, 3
+
+def test_ring():
+    """Test the ring buffer keeps the most recent records"""
+    print("\n=== Testing Ring Buffer ===")
+    passed = 0
+
+    full = TraceRing()
+    make_cpu().simulate(max_cycles=1000, reporter=full)
+    ring = TraceRing(capacity=10)
+    make_cpu().simulate(max_cycles=1000, reporter=ring)
+
+    passed += run_test(len(ring) == 10 and ring.count == full.count, "Keeps the last 10")
+    passed += run_test(list(ring) == list(full)[-10:], "Oldest first after wrapping")
+    if np is not None:
+        passed += run_test(ring.to_numpy()['cycle'].tolist() == list(range(full.count - 10, full.count)),
+                           "to_numpy in order")
+    else:
+        passed += run_test(True, "to_numpy in order (NumPy not installed)")
+    return passed, 3
+
+def test_disabled_and_engines():
+    """Test tracing is opt-in and leaves results unchanged"""
+    print("\n=== Testing Opt-In Tracing ===")
+    passed = 0
+
+    plain = make_cpu('translate')
+    plain_result = plain.simulate(max_cycles=1000)
+    passed += run_test(len(plain.translator.blocks) > 0, "No recorder: translate engine runs blocks")
+
+    traced = make_cpu('translate')
+    ring = TraceRing()
+    traced_result = traced.simulate(max_cycles=1000, reporter=ring)
+    passed += run_test(traced_result.to_dict() == plain_result.to_dict() and ring.count == plain_result.cycles,
+                       "Recorder falls back to the interpreter with the same result")
+
+    # A trap is still recorded, with nothing written
+    cpu = RISCV_CPU()
+    cpu.memory.write_word(0, 0x00100093)   # addi x1, x0, 1
+    cpu.memory.write_word(4, 0xFFFFFFFF)   # illegal
+    ring = TraceRing()
+    cpu.simulate(max_cycles=10, reporter=ring)
+    records = list(ring)
+    passed += run_test(len(records) == 2 and records[1][2] == 0xFFFFFFFF and records[1][7] == 0,
+                       "Illegal instruction recorded without flags")
+    return passed, 3
+
+def test_address_trace():
+    """Test address_trace() hands on what the records hold"""
+    print("\n=== Testing Address Trace ===")
+    passed = 0
+
+    class Stepped:
+        def __init__(self):
+            self.steps = []
+            self.trace = address_trace(lambda pc, word, address: self.steps.append((pc, word, address)))
+
+        def start(self, cpu):
+            pass
+
+        def finish(self, cpu, result):
+            pass
+
+    stepped = Stepped()
+    make_cpu().simulate(max_cycles=1000, reporter=stepped)
+    ring = TraceRing()
+    make_cpu().simulate(max_cycles=1000, reporter=ring)
+    expected = [(pc, word, address if flags & (FLAG_LOAD | FLAG_STORE) else None)
+                for _, pc, word, _, address, _, _, flags in ring]
+    passed += run_test(stepped.steps == expected, "PC, word and LW/SW address per instruction")
+    return passed, 1
+
+def run_all_tests():
+    """Run all trace recorder tests"""
+    print("=" * 60)
+    print("Trace Recorder Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_records_match_execution,
+        test_writer,
+        test_numpy_reader,
+        test_ring,
+        test_disabled_and_engines,
+        test_address_trace,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,253 @@
+import io
+import random
+from contextlib import redirect_stdout
+
+from cpu import RISCV_CPU
+from memory import PagedMemory, MemoryAccessError
+
+
+def run_test(condition, test_name):
+    """Helper to run a single test"""
+    if condition:
+        print(f"  PASS: {test_name}")
+        return True
+    else:
+        print(f"  FAIL: {test_name}")
+        return False
+
+def run_program(engine, program, max_cycles, memory='dict'):
+    """Run a list of instruction words on a fresh CPU and return it"""
+    cpu = RISCV_CPU(engine=engine, memory=memory)
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+
+    cpu.simulate(max_cycles=max_cycles)
+    return cpu
+
+def same_state(a, b):
+    """Check two CPUs ended in exactly the same architectural state"""
+    return (a.pc == b.pc and
+            a.cycle_count == b.cycle_count and
+            a.halted == b.halted and
+            a.registers.registers == b.registers.registers and
+            a.memory.nonzero_words() == b.memory.nonzero_words())
+
+def random_instruction(rng, num_words):
+    """Make a random instruction the CPU knows how to run"""
+    rd = rng.randrange(32)
+    rs1 = rng.randrange(8)      # keep sources in a small set so values get reused
+    rs2 = rng.randrange(8)
+    kind = rng.randrange(9)
+
+    if kind == 0:  # R-type
+        funct3, funct7 = rng.choice([(0, 0x00), (0, 0x20), (7, 0), (6, 0),
+                                     (4, 0), (1, 0), (5, 0x00), (5, 0x20)])
+        return (funct7 << 25) | (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | 0x33
+    if kind in (1, 2):  # I-type arithmetic
+        funct3 = rng.choice([0, 7, 6, 4, 1, 5])
+        imm = rng.randrange(4096)
+        if funct3 in (1, 5):
+            imm = rng.randrange(32) | rng.choice([0x000, 0x400])
+        return (imm << 20) | (rs1 << 15) | (funct3 << 12) | (rd << 7) | 0x13
+    if kind == 3:  # LW from the data area (x0-relative, small offsets)
+        imm = 0x400 + 4 * rng.randrange(16)
+        return (imm << 20) | (0 << 15) | (2 << 12) | (rd << 7) | 0x03
+    if kind == 4:  # SW - sometimes over the program itself
+        imm = rng.choice([0x400 + 4 * rng.randrange(16), 4 * rng.randrange(num_words)])
+        return (((imm >> 5) & 0x7F) << 25) | (rs2 << 20) | (0 << 15) | \
+               (2 << 12) | ((imm & 0x1F) << 7) | 0x23
+    if kind == 5:  # Branch, small offset either way
+        funct3 = rng.choice([0, 1, 4, 5])
+        imm = rng.choice([-16, -12, -8, -4, 8, 12, 16]) & 0x1FFF
+        return (((imm >> 12) & 1) << 31) | (((imm >> 5) & 0x3F) << 25) | \
+               (rs2 << 20) | (rs1 << 15) | (funct3 << 12) | \
+               (((imm >> 1) & 0xF) << 8) | (((imm >> 11) & 1) << 7) | 0x63
+    if kind == 6:  # LUI / AUIPC
+        return (rng.randrange(1 << 20) << 12) | (rd << 7) | rng.choice([0x37, 0x17])
+    if kind == 7:  # JAL forward
+        imm = rng.choice([4, 8, 12])
+        return (((imm >> 1) & 0x3FF) << 21) | (rd << 7) | 0x6F
+    # JALR relative to a register (usually lands on empty memory)
+    return (rng.randrange(64) << 20) | (rs1 << 15) | (rd << 7) | 0x67
+
+def test_bundled_programs():
+    """Test both engines agree on the bundled hex programs"""
+    print("\n=== Testing Bundled Programs ===")
+    passed = 0
+
+    files = ["test_base.hex", "test_arith.hex", "test_mem.hex", "test_branch.hex"]
+    for filename in files:
+        cpus = []
+        for engine in RISCV_CPU.ENGINES:
+            cpu = RISCV_CPU(engine=engine)
+            with redirect_stdout(io.StringIO()):
+                cpu.load_program(filename)
+                cpu.run(max_cycles=100)
+            cpus.append(cpu)
+        passed += run_test(same_state(cpus[0], cpus[1]), f"{filename} matches")
+
+    return passed, len(files)
+
+def test_counting_loop():
+    """Test a loop that runs inside one translated block"""
+    print("\n=== Testing Counting Loop ===")
+    passed = 0
+
+    program = [
+        0x00000093,  # addi x1, x0, 0
+        0x3E800113,  # addi x2, x0, 1000
+        0x00108093,  # addi x1, x1, 1
+        0xFE209EE3,  # bne x1, x2, -4
+        0x0000006F,  # halt
+    ]
+
+    # Cycle limits that land mid-loop, right at the end and well past it
+    for max_cycles in (7, 1001, 2002, 5000):
+        interp = run_program('interpreter', program, max_cycles)
+        trans = run_program('translate', program, max_cycles)
+        passed += run_test(same_state(interp, trans), f"max_cycles={max_cycles}")
+
+    return passed, 4
+
+def test_self_modifying_code():
+    """Test a store into a translated block is picked up"""
+    print("\n=== Testing Self-Modifying Code ===")
+
+    program = [
+        0x00000193,  # addi x3, x0, 0
+        0x00200213,  # addi x4, x0, 2
+        0x064182B7,  # lui x5, 0x06418
+        0x19328293,  # addi x5, x5, 0x193  (x5 = addi x3, x3, 100)
+        0x00118193,  # addi x3, x3, 1      (gets patched)
+        0x00502823,  # sw x5, 0x10(x0)
+        0xFFF20213,  # addi x4, x4, -1
+        0xFE021AE3,  # bne x4, x0, -12
+        0x0000006F,  # halt
+    ]
+
+    interp = run_program('interpreter', program, 50)
+    trans = run_program('translate', program, 50)
+
+    passed = 0
+    passed += run_test(trans.registers.read(3) == 101, "Patched instruction ran")
+    passed += run_test(same_state(interp, trans), "Matches interpreter")
+    passed += run_test(trans.translator.invalidations > 0, "Block was invalidated")
+    return passed, 3
+
+def test_random_programs():
+    """Test random programs give identical state on both engines"""
+    print("\n=== Testing Random Programs ===")
+    rng = random.Random(1234)
+    trials = 300
+    matched = 0
+
+    for trial in range(trials):
+        num_words = rng.randrange(4, 40)
+        program = [random_instruction(rng, num_words) for _ in range(num_words)]
+        program.append(0x0000006F)
+        max_cycles = rng.randrange(1, 400)
+
+        # Alternate memory backends too - they must not change the result
+        interp = run_program('interpreter', program, max_cycles)
+        trans = run_program('translate', program, max_cycles,
+                            memory=('dict', 'paged')[trial % 2])
+        if same_state(interp, trans):
+            matched += 1
+        else:
+            print(f"  Mismatch on trial {trial}: {[f'{w:08X}' for w in program]}")
+
+    return run_test(matched == trials, f"{matched}/{trials} random programs match"), 1
+
+def test_memory_faults():
+    """Test a load, store or fetch that raises leaves both engines in the same state"""
+    print("\n=== Testing Memory Faults ===")
+    passed = 0
+
+    def run_faulting(engine, program, size):
+        cpu = RISCV_CPU(engine=engine, memory=PagedMemory(size))
+        for i, inst in enumerate(program):
+            cpu.memory.write_word(i * 4, inst)
+        try:
+            cpu.simulate(max_cycles=10000)
+        except MemoryAccessError:
+            return cpu, True
+        return cpu, False
+
+    programs = [
+        ([0x00700093,   # addi x1, x0, 7
+          0x00010137,   # lui x2, 0x10
+          0x00012183,   # lw x3, 0(x2)
+          0x0000006F],  # halt
+         0x8000, "Load past the end partway through a block"),
+        ([0x00007137,   # lui x2, 0x7
+          0x00108093,   # addi x1, x1, 1
+          0x00112023,   # sw x1, 0(x2)
+          0x10010113,   # addi x2, x2, 256
+          0xFE009AE3,   # bne x1, x0, -12
+          0x0000006F],  # halt
+         0x8000, "Store past the end after looping in the block"),
+        ([0x00100093,   # addi x1, x0, 1
+          0x00200113,   # addi x2, x0, 2
+          0x00300193,   # addi x3, x0, 3
+          0x00400213],  # addi x4, x0, 4, then off the end
+         16, "Fetch past the end"),
+    ]
+    for program, size, name in programs:
+        interp, interp_raised = run_faulting('interpreter', program, size)
+        trans, trans_raised = run_faulting('translate', program, size)
+        passed += run_test(interp_raised and trans_raised and interp.cycle_count > 0 and
+                           same_state(interp, trans), name)
+
+    # Random programs whose loads and stores (at 0x400 and up) mostly fault
+    rng = random.Random(2)
+    matched = 0
+    for _ in range(200):
+        num_words = rng.randrange(4, 40)
+        program = [random_instruction(rng, num_words) for _ in range(num_words)]
+        program.append(0x0000006F)
+        interp, interp_raised = run_faulting('interpreter', program, 0x400)
+        trans, trans_raised = run_faulting('translate', program, 0x400)
+        if interp_raised == trans_raised and same_state(interp, trans):
+            matched += 1
+    passed += run_test(matched == 200, f"{matched}/200 random faulting programs match")
+
+    return passed, len(programs) + 1
+
+def run_all_tests():
+    """Run all translator tests"""
+    print("=" * 60)
+    print("Block Translator Tests")
+    print("=" * 60)
+
+    total_passed = 0
+    total_tests = 0
+
+    test_functions = [
+        test_bundled_programs,
+        test_counting_loop,
+        test_self_modifying_code,
+        test_random_programs,
+        test_memory_faults,
+    ]
+
+    for test_func in test_functions:
+        passed, total = test_func()
+        total_passed += passed
+        total_tests += total
+
+    print("\n" + "=" * 60)
+    print(f"Tests passed: {total_passed}/{total_tests}")
+    print("=" * 60)
+
+    if total_passed == total_tests:
+        print("✓ All tests passed!")
+        return 0
+    else:
+        print(f"✗ {total_tests - total_passed} test(s) failed")
+        return 1
+
+
+if __name__ == "__main__":
+    import sys
+    exit_code = run_all_tests()
+    sys.exit(exit_code)
@@ -0,0 +1,377 @@
+"""
+Decoupled timing - one functional run, many timing models
+
+The pipeline, branch predictor, cache and stack distance models all sit on
+top of the functional CPU, and what the CPU executes doesn't depend on any
+of them. Attaching them one at a time reruns the same program once per
+configuration. Here the CPU runs once and its execution becomes a stream
+of events that any number of models consume:
+
+    models = {
+        'forwarding': functools.partial(PipelineModel, PipelineConfig()),
+        'no forwarding': functools.partial(PipelineModel, PipelineConfig(forwarding=False)),
+        'gshare': functools.partial(BranchEvaluator, ["gshare:4096:12+btb:512"]),
+        'caches': CacheHierarchy,
+    }
+    results = run_timing(EventStream(cpu, max_cycles=10**6), models, workers=4)
+    results['no forwarding']['cpi']
+
+An event is a trace record (trace_recorder.RECORD): pc, instruction word
+(which gives the instruction class and its source and destination
+registers), rd, memory address and flags. A branch's outcome is the pc of
+the event after it, so the stream ends with the pc the run stopped at.
+Every model's replay() already reads records.
+
+EventStream is a generator. It runs the CPU one batch of instructions
+at a time and yields each batch of records as bytes, so timing starts
+before the functional run is over and memory stays at a batch or two.
+run_timing sends every batch to worker processes through bounded
+queues. Each worker builds its share of the models from factories, which
+must pickle (classes, functools.partial, module-level functions), and
+sends back each model's to_dict(). With workers=0 everything runs in
+this process and the factories needn't pickle.
+
+Command line: python timing.py PROGRAM [--max-cycles N] [--workers N]
+                  [--batch N] [--json]
+"""
+
+import functools
+import inspect
+import multiprocessing
+import queue
+import traceback
+
+from trace_recorder import RECORD, TraceRecorder, iter_chunks
+
+
+class _BatchRecorder(TraceRecorder):
+    """A TraceRecorder that hands back whatever it has recorded when asked"""
+
+    def __init__(self, batch):
+        super().__init__(batch)
+        self._full = []
+
+    def _buffer_full(self):
+        self._full.append(bytes(self.buffer))
+        self.offset = 0
+
+    def take(self):
+        """Records since the last take(), as a list of bytes chunks"""
+        chunks = self._full
+        self._full = []
+        if self.offset:
+            chunks.append(bytes(self.buffer[:self.offset]))
+            self.offset = 0
+        return chunks
+
+
+class EventStream:
+    """
+    Runs a CPU a batch of instructions at a time, yielding the records
+
+    Iterate it once. Afterwards `result` is the RunResult of the whole run
+    and `end_pc` the pc it stopped at.
+    """
+
+    def __init__(self, cpu, max_cycles=10 ** 6, batch=4096):
+        """
+        Args:
+            cpu: A loaded RISCV_CPU
+            max_cycles: Stop after this many instructions in total
+            batch: Instructions run, and records yielded, at a time
+        """
+        if batch < 1:
+            raise ValueError("batch must be at least 1 instruction")
+        self.cpu = cpu
+        self.max_cycles = max_cycles
+        self.batch = batch
+        self.result = None
+        self.end_pc = None
+
+    def __iter__(self):
+        """Batches of records as bytes (RECORD_SIZE bytes each)"""
+        cpu = self.cpu
+        recorder = _BatchRecorder(self.batch)
+        while True:
+            stop = min(cpu.cycle_count + self.batch, self.max_cycles)
+            self.result = cpu.simulate(max_cycles=stop, reporter=recorder)
+            yield from recorder.take()
+            if cpu.halted or cpu.cycle_count >= self.max_cycles:
+                break
+        self.end_pc = cpu.pc
+
+    def records(self):
+        """The same stream as tuples in RECORD field order"""
+        for chunk in self:
+            yield from RECORD.iter_unpack(chunk)
+
+
+def trace_chunks(path, batch=4096):
+    """
+    Batches of records from a trace file written by TraceWriter, as a
+    source for run_timing (it has no end pc, so the last instruction's
+    branch outcome is unknown)
+
+    Raises:
+        ValueError if the file isn't a trace
+    """
+    return iter_chunks(path, batch)
+
+
+def _feed(models, chunk):
+    for model in models.values():
+        model.replay(RECORD.iter_unpack(chunk))
+
+
+def _finish(models, end_pc):
+    """Tell models that care where the run stopped, then collect results"""
+    for model in models.values():
+        if end_pc is not None and 'end_pc' in inspect.signature(model.replay).parameters:
+            model.replay((), end_pc=end_pc)
+    return {name: model.to_dict() for name, model in models.items()}
+
+
+def _worker(factories, chunks, results):
+    """Worker process: build models, replay every batch into them, send back results"""
+    try:
+        models = {name: factory() for name, factory in factories}
+        while True:
+            item = chunks.get()
+            if isinstance(item, tuple):
+                results.put(('done', _finish(models, item[1])))
+                return
+            _feed(models, item)
+    except Exception:
+        results.put(('error', traceback.format_exc()))
+
+
+def _put(chunks, process, item, results):
+    """Queue an item for a worker, giving up if the worker has died"""
+    while True:
+        try:
+            chunks.put(item, timeout=0.5)
+            return
+        except queue.Full:
+            if process.is_alive():
+                continue
+            # It sends its traceback before it goes, if it can
+            try:
+                status, payload = results.get(timeout=0.5)
+            except queue.Empty:
+                status = None
+            if status == 'error':
+                raise RuntimeError(f"timing worker failed:\n{payload}") from None
+            raise RuntimeError(f"timing worker exited with code {process.exitcode}") from None
+
+
+def run_timing(source, models, workers=None, queue_depth=8):
+    """
+    Replay one event stream into many timing models
+
+    Args:
+        source: EventStream, or any iterable of record batches as bytes
+                (e.g. trace_chunks); an `end_pc` attribute, if it has one,
+                is read once it's exhausted
+        models: Dict of name -> zero-argument factory making a model with
+                replay(records) and to_dict()
+        workers: Worker processes, at most one per model (default: available
+                 cores); 0 runs every model in this process
+        queue_depth: Batches each worker may have waiting, which bounds
+                     memory when the models are slower than the CPU
+    Returns:
+        Dict of name -> the model's to_dict()
+    Raises:
+        RuntimeError: If a worker fails
+    """
+    from batch import available_cores
+    if workers is None:
+        workers = available_cores()
+    workers = min(workers, len(models))
+    if workers <= 0:
+        built = {name: factory() for name, factory in models.items()}
+        for chunk in source:
+            _feed(built, chunk)
+        return _finish(built, getattr(source, 'end_pc', None))
+
+    # Deal the models out round robin
+    shares = [list(models.items())[i::workers] for i in range(workers)]
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    processes = []
+    for share in shares:
+        chunks = context.Queue(maxsize=queue_depth)
+        process = context.Process(target=_worker, args=(share, chunks, results), daemon=True)
+        process.start()
+        processes.append((process, chunks))
+
+    try:
+        for chunk in source:
+            for process, chunks in processes:
+                _put(chunks, process, chunk, results)
+        end = ('end', getattr(source, 'end_pc', None))
+        for process, chunks in processes:
+            _put(chunks, process, end, results)
+
+        combined = {}
+        for process, _ in processes:
+            while True:
+                try:
+                    status, payload = results.get(timeout=0.5)
+                    break
+                except queue.Empty:
+                    if not any(p.is_alive() for p, _ in processes):
+                        raise RuntimeError("timing workers exited without results") from None
+            if status == 'error':
+                raise RuntimeError(f"timing worker failed:\n{payload}")
+            combined.update(payload)
+    finally:
+        for process, _ in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+    # In the order they were given
+    return {name: combined[name] for name in models}
+
+
+def summary(name, data):
+    """One line about a model's results, whichever kind of model it was"""
+    if 'cpi' in data:
+        return f"{name:<28} CPI {data['cpi']:.3f} ({data['cycles']} cycles)"
+    if 'ipc' in data:
+        return (f"{name:<28} IPC {data['ipc']:.3f} ({data['cycles']} cycles, "
+                f"mean ROB occupancy {data['rob']['mean_occupancy']:.1f})")
+    if 'units' in data:
+        rates = []
+        for unit in data['units']:
+            executed = sum(kind['executed'] for kind in unit['totals'].values())
+            wrong = sum(kind['mispredicted'] for kind in unit['totals'].values())
+            rates.append(f"{unit['name']} {100 * wrong / executed if executed else 0:.2f}%")
+        return f"{name:<28} mispredicted: " + ", ".join(rates)
+    if 'amat' in data:
+        from cache import DEMAND_TYPES
+        rates = []
+        for cache, counts in data['caches'].items():
+            misses = sum(counts['misses'][kind] for kind in DEMAND_TYPES)
+            accesses = misses + sum(counts['hits'][kind] for kind in DEMAND_TYPES)
+            rates.append(f"{cache} {100 * misses / accesses if accesses else 0:.2f}%")
+        return f"{name:<28} AMAT {data['amat']['overall']:.2f} cycles, misses: " + ", ".join(rates)
+    if 'ideal_ipc' in data:
+        windows = ", ".join(f"{window['size']} {window['ipc']:.2f}" for window in data['windows'])
+        return (f"{name:<28} ideal IPC {data['ideal_ipc']:.2f} (critical path "
+                f"{data['critical_path']} cycles), by window: {windows}")
+    if 'streams' in data:
+        streams = data['streams']
+        return (f"{name:<28} {streams['instruction']['lines']} instruction lines, "
+                f"{streams['data']['lines']} data lines")
+    return f"{name:<28} {data}"
+
+
+def default_models():
+    """The sweep the command line runs: pipelines, predictors, caches, cores and limits"""
+    from branch_predictor import BranchEvaluator, DEFAULT_UNITS
+    from dataflow import DataflowAnalyzer
+    from out_of_order import OutOfOrderConfig, OutOfOrderModel
+    from pipeline import PipelineConfig, PipelineModel
+    from stack_distance import StackDistanceAnalyzer, DEFAULT_CONFIGS
+
+    models = {}
+    for forwarding in (True, False):
+        for penalty in (1, 2, 3):
+            config = PipelineConfig(forwarding=forwarding, branch_penalty=penalty,
+                                    jalr_penalty=penalty)
+            label = f"pipeline {'fwd' if forwarding else 'no-fwd'} penalty {penalty}"
+            models[label] = functools.partial(PipelineModel, config)
+    models['branch predictors'] = functools.partial(BranchEvaluator, DEFAULT_UNITS)
+    for size in (4096, 32768):
+        for policy in ('lru', 'random'):
+            models[f"caches {size // 1024}K {policy}"] = functools.partial(
+                _caches, size, policy)
+    models['stack distances'] = functools.partial(StackDistanceAnalyzer, DEFAULT_CONFIGS)
+    for width, rob in ((2, 32), (4, 64)):
+        config = OutOfOrderConfig(fetch_width=width, issue_width=width, rob_size=rob)
+        models[f"out-of-order {width}-wide"] = functools.partial(OutOfOrderModel, config)
+    models['dataflow limits'] = DataflowAnalyzer
+    return models
+
+
+def _caches(size, policy):
+    """Split L1s of one size and policy over the default L2"""
+    from cache import Cache, CacheHierarchy
+    return CacheHierarchy(l1i=Cache('L1I', size, 4, 64, policy),
+                          l1d=Cache('L1D', size, 4, 64, policy))
+
+
+def main(argv=None):
+    """Command line entry point - returns the process exit code"""
+    import argparse
+    import json
+    from cpu import RISCV_CPU
+    from elf_loader import ProgramLoadError
+    from loader import HexLoadError
+
+    parser = argparse.ArgumentParser(
+        description="Run a program once and replay it into a sweep of timing models")
+    parser.add_argument("program", help="hex, ELF, raw .bin or .ckpt file")
+    parser.add_argument("--max-cycles", type=int, default=10 ** 6,
+                        help="stop after this many instructions (default: 1000000)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes (default: available cores; 0 for none)")
+    parser.add_argument("--batch", type=int, default=4096,
+                        help="instructions per batch of events (default: 4096)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    cpu = RISCV_CPU()
+    try:
+        cpu.load(args.program)
+    except (HexLoadError, ProgramLoadError) as e:
+        print(f"Error: {e}")
+        return 1
+    stream = EventStream(cpu, args.max_cycles, args.batch)
+    results = run_timing(stream, default_models(), args.workers)
+    if args.json:
+        print(json.dumps(results))
+    else:
+        print(f"Timing sweep: {stream.result.cycles} instructions, {len(results)} models")
+        for name, data in results.items():
+            print(f"  {summary(name, data)}")
+    return 0
+
+
+# Test
+if __name__ == "__main__":
+    import sys
+    from cpu import RISCV_CPU
+    from pipeline import PipelineConfig, PipelineModel
+
+    if len(sys.argv) > 1:
+        sys.exit(main())
+
+    print("Testing decoupled timing...")
+
+    # A 10-iteration loop inside a 5-iteration loop
+    program = [
+        0x00500093,  # addi x1, x0, 5
+        0x00A00113,  # addi x2, x0, 10
+        0xFFF10113,  # addi x2, x2, -1
+        0xFE011EE3,  # bne x2, x0, -4
+        0xFFF08093,  # addi x1, x1, -1
+        0xFE0098E3,  # bne x1, x0, -16
+        0x0000006F,  # halt
+    ]
+    cpu = RISCV_CPU()
+    for i, inst in enumerate(program):
+        cpu.memory.write_word(i * 4, inst)
+    stream = EventStream(cpu, batch=16)
+    models = {penalty: functools.partial(PipelineModel, PipelineConfig(branch_penalty=penalty))
+              for penalty in (0, 2)}
+    results = run_timing(stream, models, workers=0)
+
+    print(f"Instructions: {stream.result.cycles} (expected 116)")
+    print(f"Cycles with no branch penalty: {results[0]['cycles']} (expected 120)")
+    # 49 taken branches (9 a pass inner, 4 outer) cost 2 cycles each
+    print(f"Cycles with a 2 cycle penalty: {results[2]['cycles']} (expected 218)")
+    for name, data in results.items():
+        print(f"  {summary(f'penalty {name}', data)}")
+
+    print("\nDecoupled timing test complete!")
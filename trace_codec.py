@@ -0,0 +1,486 @@
+"""
+Compressed traces - delta encoding in seekable chunks
+
+Raw trace records (trace_recorder.py) are 32 bytes each, which adds up
+fast on long runs. Most of those bytes can be predicted:
+
+  pc         the next PC is almost always pc + 4 - one bit per record says
+             whether it wasn't, and only those records store a delta
+  word       each PC's instruction word is stored once per chunk (plus any
+             that changed, for self-modifying code)
+  cycle      stored as the difference from "one more than the last"
+  rd_value   how much the change differs from the last time the same
+             instruction ran (loop counters and pointers cost nothing)
+  mem_addr   the same, per LW/SW - a constant stride costs nothing
+  mem_value  only for LW/SW records: loads into rd are already in rd_value,
+             and a store is compared with the last value written to rs2
+
+Each chunk of records is turned into those streams and compressed with
+zlib or lzma. The file ends with an index of chunk offsets, so a reader
+can jump straight to any chunk without decompressing the ones before it.
+
+    compress_trace("run.trace", "run.rvtz", method='lzma')
+    with CompressedTrace("run.rvtz") as trace:
+        trace.chunk(40)                      # one chunk, TRACE_DTYPE array
+        trace.read(1000000, 1000100)         # records by index
+
+Needs NumPy.
+
+File layout (little-endian):
+    header  - magic, version, method, records per chunk
+    chunks  - compressed streams, one after another
+    index   - per chunk: offset, compressed size, record count, first cycle
+    footer  - index offset, chunk count, total records, magic
+"""
+
+import lzma
+import struct
+import zlib
+
+from trace_recorder import (TraceRecorder, TRACE_DTYPE, FLAG_RD_WRITE, FLAG_LOAD, FLAG_STORE,
+                            RECORD_SIZE, read_trace, np, _require_numpy)
+
+
+CODEC_MAGIC = b'RVTRZIP\0'
+CODEC_VERSION = 1
+_HEADER = struct.Struct('<8sHHI')
+_INDEX_ENTRY = struct.Struct('<QIIQ')
+_FOOTER = struct.Struct('<QIQ8s')
+_STREAM_COUNT = 12
+
+METHODS = {'zlib': 0, 'lzma': 1}
+DEFAULT_CHUNK_RECORDS = 65536
+
+
+def _compress(method, data, level):
+    if method == 'lzma':
+        return lzma.compress(data, preset=level)
+    return zlib.compress(data, level)
+
+
+def _decompress(method, data):
+    if method == 'lzma':
+        return lzma.decompress(data)
+    return zlib.decompress(data)
+
+
+# ---- per-key deltas ----
+# Differences taken between consecutive records with the same key (same
+# register, same instruction), in uint32 arithmetic so they wrap like the
+# guest does. The first record of each key keeps its value as it is.
+
+def _group_delta(values, keys):
+    order = np.argsort(keys, kind='stable')
+    ordered = values[order]
+    deltas = ordered.copy()
+    deltas[1:] -= ordered[:-1]
+    sorted_keys = keys[order]
+    starts = np.empty(len(keys), dtype=bool)
+    starts[:1] = True
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    deltas[starts] = ordered[starts]
+    result = np.empty_like(values)
+    result[order] = deltas
+    return result
+
+
+def _group_undelta(deltas, keys):
+    count = len(keys)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    totals = np.cumsum(deltas[order], dtype=np.uint32)
+    starts = np.empty(count, dtype=bool)
+    starts[:1] = True
+    starts[1:] = sorted_keys[1:] != sorted_keys[:-1]
+    # Take off whatever the earlier keys added to the running total
+    start_of = np.maximum.accumulate(np.where(starts, np.arange(count), 0))
+    offsets = np.zeros(count, dtype=np.uint32)
+    later = start_of > 0
+    offsets[later] = totals[start_of[later] - 1]
+    result = np.empty_like(deltas)
+    result[order] = totals - offsets
+    return result
+
+
+def _stride_delta(values, keys):
+    """Per-key change in stride - zero for anything stepping evenly"""
+    return _group_delta(_group_delta(values, keys), keys)
+
+
+def _stride_undelta(deltas, keys):
+    return _group_undelta(_group_undelta(deltas, keys), keys)
+
+
+def _last_written(records, positions, registers):
+    """
+    Value each register last had written to it in the chunk before each
+    position (0 if it wasn't written yet) - what a store usually stores
+    """
+    writes = np.flatnonzero(records['flags'] & FLAG_RD_WRITE)
+    write_regs = records['rd'][writes]
+    values = np.zeros(len(positions), dtype=np.uint32)
+    for reg in np.unique(registers):
+        mine = writes[write_regs == reg]
+        wanted = registers == reg
+        before = np.searchsorted(mine, positions[wanted]) - 1
+        found = np.zeros(len(before), dtype=np.uint32)
+        found[before >= 0] = records['rd_value'][mine[before[before >= 0]]]
+        values[wanted] = found
+    return values
+
+
+def _value_predictions(records, memory):
+    """What each LW/SW's value is compared with: rd for loads, rs2's last value for stores"""
+    positions = np.flatnonzero(memory)
+    predicted = records['rd_value'][positions].copy()
+    stores = (records['flags'][positions] & FLAG_STORE) != 0
+    rs2 = ((records['word'][positions[stores]] >> 20) & 0x1F).astype(np.uint8)
+    predicted[stores] = _last_written(records, positions[stores], rs2)
+    return predicted
+
+
+# ---- chunk encoding ----
+
+def encode_chunk(records, method='zlib', level=6):
+    """
+    Compress one chunk of records
+
+    Args:
+        records: TRACE_DTYPE array
+        method: 'zlib' or 'lzma'
+        level: Compression level for that method
+    Returns:
+        bytes
+    """
+    count = len(records)
+    cycle = records['cycle']
+    pc = records['pc']
+    word = records['word']
+    rd = records['rd']
+    flags = records['flags']
+
+    # Cycles: nearly always one more than the record before
+    cycle_deltas = np.diff(cycle, prepend=cycle[:1]) - 1
+    cycle_deltas[:1] = 0
+
+    # PCs: a bit for every record that didn't follow on with pc + 4, and
+    # the jump for just those records
+    predicted = np.empty(count, dtype=np.uint32)
+    predicted[:1] = pc[:1]
+    predicted[1:] = pc[:-1] + np.uint32(4)
+    taken = pc != predicted
+    jumps = (pc - predicted)[taken]
+
+    # Words: one per PC, and the odd record that disagrees with it
+    table_pcs, first, inverse = np.unique(pc, return_index=True, return_inverse=True)
+    table_words = word[first]
+    changed = np.flatnonzero(word != table_words[inverse]).astype(np.uint32)
+
+    rd_values = _stride_delta(records['rd_value'], pc)
+
+    memory = (flags & (FLAG_LOAD | FLAG_STORE)) != 0
+    strides = _stride_delta(records['mem_addr'][memory], pc[memory])
+    mem_values = records['mem_value'][memory] ^ _value_predictions(records, memory)
+
+    streams = [
+        cycle_deltas.astype('<u8'), np.packbits(taken), jumps.astype('<u4'),
+        table_pcs.astype('<u4'), table_words.astype('<u4'),
+        changed.astype('<u4'), word[changed].astype('<u4'),
+        rd, flags, rd_values.astype('<u4'), strides.astype('<u4'), mem_values.astype('<u4'),
+    ]
+    payload = [struct.pack('<IQI', count, int(cycle[0]) if count else 0, int(pc[0]) if count else 0)]
+    payload.append(struct.pack(f'<{_STREAM_COUNT}I', *[stream.nbytes for stream in streams]))
+    payload.extend(stream.tobytes() for stream in streams)
+    return _compress(method, b''.join(payload), level)
+
+
+def decode_chunk(data, method='zlib'):
+    """
+    Decompress one chunk back into records
+
+    Returns:
+        TRACE_DTYPE array
+    Raises:
+        ValueError if the chunk is damaged
+    """
+    try:
+        payload = memoryview(_decompress(method, data))
+        count, first_cycle, first_pc = struct.unpack_from('<IQI', payload, 0)
+        sizes = struct.unpack_from(f'<{_STREAM_COUNT}I', payload, 16)
+    except (zlib.error, lzma.LZMAError, struct.error) as e:
+        raise ValueError(f"corrupt trace chunk ({e})") from None
+    if 16 + 4 * _STREAM_COUNT + sum(sizes) != len(payload):
+        raise ValueError("corrupt trace chunk (stream sizes don't add up)")
+
+    dtypes = ['<u8', 'u1', '<u4', '<u4', '<u4', '<u4', '<u4', 'u1', 'u1', '<u4', '<u4', '<u4']
+    streams = []
+    offset = 16 + 4 * _STREAM_COUNT
+    for size, dtype in zip(sizes, dtypes):
+        streams.append(np.frombuffer(payload[offset:offset + size], dtype=dtype))
+        offset += size
+    (cycle_deltas, taken_bits, jumps, table_pcs, table_words, changed, changed_words,
+     rd, flags, rd_values, strides, mem_values) = streams
+
+    records = np.zeros(count, dtype=TRACE_DTYPE)
+    if not count:
+        return records
+
+    records['cycle'] = first_cycle + np.arange(count, dtype=np.uint64) + np.cumsum(cycle_deltas)
+
+    # Rebuild PCs a run at a time: each taken record starts a new run of
+    # pc + 4 steps, so pc = run start + 4 * (position in run)
+    taken = np.unpackbits(taken_bits, count=count).astype(bool)
+    taken[0] = True
+    starts = np.flatnonzero(taken)
+    run_of = np.cumsum(taken) - 1
+    run_pc = np.empty(len(starts), dtype=np.uint32)
+    run_pc[0] = first_pc
+    if len(starts) > 1:
+        # Each run starts where the previous run's prediction plus the jump lands
+        run_lengths = np.diff(starts).astype(np.uint32)
+        steps = run_lengths * np.uint32(4) + jumps
+        run_pc[1:] = np.cumsum(steps, dtype=np.uint32) + np.uint32(first_pc)
+    within = (np.arange(count) - starts[run_of]).astype(np.uint32)
+    pc = run_pc[run_of] + within * np.uint32(4)
+    records['pc'] = pc
+
+    words = table_words[np.searchsorted(table_pcs, pc)]
+    words[changed] = changed_words
+    records['word'] = words
+
+    records['rd'] = rd
+    records['flags'] = flags
+    records['rd_value'] = _stride_undelta(rd_values, pc)
+
+    memory = (flags & (FLAG_LOAD | FLAG_STORE)) != 0
+    records['mem_addr'][memory] = _stride_undelta(strides, pc[memory])
+    records['mem_value'][memory] = mem_values ^ _value_predictions(records, memory)
+    return records
+
+
+# ---- files ----
+
+class TraceEncoder:
+    """Writes a compressed trace file a chunk at a time"""
+
+    def __init__(self, path, method='zlib', level=None, chunk_records=DEFAULT_CHUNK_RECORDS):
+        """
+        Args:
+            path: File to write
+            method: 'zlib' or 'lzma'
+            level: Compression level (default 6 for both)
+            chunk_records: Records per chunk - smaller chunks seek finer,
+                           bigger ones compress better
+        """
+        _require_numpy()
+        if method not in METHODS:
+            raise ValueError(f"Unknown method '{method}', expected one of {tuple(METHODS)}")
+        self.method = method
+        self.level = 6 if level is None else level
+        self.chunk_records = chunk_records
+        self.index = []
+        self.count = 0
+        self._pending = []
+        self._pending_count = 0
+        self.stream = open(path, 'wb')
+        self.stream.write(_HEADER.pack(CODEC_MAGIC, CODEC_VERSION, METHODS[method], chunk_records))
+
+    def write(self, records):
+        """Add records (TRACE_DTYPE array, or raw record bytes)"""
+        if not isinstance(records, np.ndarray):
+            records = np.frombuffer(records, dtype=TRACE_DTYPE)
+        while len(records):
+            take = self.chunk_records - self._pending_count
+            self._pending.append(records[:take])
+            self._pending_count += len(records[:take])
+            records = records[take:]
+            if self._pending_count == self.chunk_records:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        records = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_count = 0
+        data = encode_chunk(records, self.method, self.level)
+        self.index.append((self.stream.tell(), len(data), len(records), int(records['cycle'][0])))
+        self.stream.write(data)
+        self.count += len(records)
+
+    def close(self):
+        """Write the last partial chunk and the index"""
+        if self.stream.closed:
+            return
+        if self._pending_count:
+            self._write_chunk()
+        index_offset = self.stream.tell()
+        for entry in self.index:
+            self.stream.write(_INDEX_ENTRY.pack(*entry))
+        self.stream.write(_FOOTER.pack(index_offset, len(self.index), self.count, CODEC_MAGIC))
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompressedTraceWriter(TraceRecorder):
+    """Reporter that records straight into a compressed trace file, one chunk per buffer"""
+
+    def __init__(self, path, method='zlib', level=None, chunk_records=DEFAULT_CHUNK_RECORDS):
+        super().__init__(chunk_records)
+        self.encoder = TraceEncoder(path, method, level, chunk_records)
+
+    def _buffer_full(self):
+        self.encoder.write(np.frombuffer(self.buffer, dtype=TRACE_DTYPE).copy())
+        self.offset = 0
+
+    def close(self):
+        """Encode what's buffered and finish the file"""
+        if self.offset:
+            self.encoder.write(np.frombuffer(self.buffer, dtype=TRACE_DTYPE, count=self.offset // RECORD_SIZE).copy())
+            self.offset = 0
+        self.encoder.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CompressedTrace:
+    """
+    Reader with random access by chunk
+
+    Attributes:
+        method: 'zlib' or 'lzma'
+        count: Total records
+        chunks: List of (offset, size, records, first cycle) per chunk
+    """
+
+    def __init__(self, path):
+        """
+        Raises:
+            ValueError if the file isn't a complete compressed trace
+        """
+        _require_numpy()
+        self.path = path
+        self.stream = open(path, 'rb')
+        try:
+            self._read_index()
+        except (ValueError, struct.error) as e:
+            self.stream.close()
+            raise ValueError(f"{path}: {e}") from None
+
+        self.starts = np.zeros(len(self.chunks) + 1, dtype=np.int64)
+        self.starts[1:] = np.cumsum([records for _, _, records, _ in self.chunks])
+
+    def _read_index(self):
+        magic, version, method, _ = _HEADER.unpack(self.stream.read(_HEADER.size))
+        if magic != CODEC_MAGIC:
+            raise ValueError("not a compressed trace")
+        if version != CODEC_VERSION or method not in METHODS.values():
+            raise ValueError(f"unsupported compressed trace version {version}")
+        self.method = [name for name, value in METHODS.items() if value == method][0]
+
+        self.stream.seek(-_FOOTER.size, 2)
+        index_offset, num_chunks, self.count, magic = _FOOTER.unpack(self.stream.read(_FOOTER.size))
+        if magic != CODEC_MAGIC:
+            raise ValueError("truncated compressed trace (no index)")
+        self.stream.seek(index_offset)
+        data = self.stream.read(num_chunks * _INDEX_ENTRY.size)
+        self.chunks = [entry for entry in _INDEX_ENTRY.iter_unpack(data)]
+        if len(self.chunks) != num_chunks:
+            raise ValueError("truncated chunk index")
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def num_chunks(self):
+        return len(self.chunks)
+
+    def chunk(self, n):
+        """Records of chunk n as a TRACE_DTYPE array"""
+        offset, size, _, _ = self.chunks[n]
+        self.stream.seek(offset)
+        return decode_chunk(self.stream.read(size), self.method)
+
+    def __iter__(self):
+        """Every chunk in order"""
+        for n in range(self.num_chunks):
+            yield self.chunk(n)
+
+    def find_chunk(self, index):
+        """Chunk number holding the record at index"""
+        if not 0 <= index < self.count:
+            raise IndexError(f"record {index} out of range")
+        return int(np.searchsorted(self.starts, index, side='right')) - 1
+
+    def read(self, start=0, stop=None):
+        """Records start..stop, decompressing only the chunks they're in"""
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop:
+            return np.zeros(0, dtype=TRACE_DTYPE)
+        first = self.find_chunk(start)
+        last = self.find_chunk(stop - 1)
+        records = np.concatenate([self.chunk(n) for n in range(first, last + 1)])
+        base = self.starts[first]
+        return records[start - base:stop - base]
+
+    def close(self):
+        self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def compress_trace(source, path, method='zlib', level=None, chunk_records=DEFAULT_CHUNK_RECORDS):
+    """
+    Compress a whole trace
+
+    Args:
+        source: Trace file path (from TraceWriter) or a TRACE_DTYPE array
+        path: Compressed file to write
+        method, level, chunk_records: As for TraceEncoder
+    Returns:
+        Number of records written
+    """
+    records = read_trace(source, mmap=True) if not isinstance(source, np.ndarray) else source
+    with TraceEncoder(path, method, level, chunk_records) as encoder:
+        for start in range(0, len(records), chunk_records):
+            encoder.write(np.asarray(records[start:start + chunk_records]))
+    return encoder.count
+
+
+# Test
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    from cpu import RISCV_CPU
+    from trace_recorder import TraceRing
+
+    print("Testing trace codec...")
+
+    cpu = RISCV_CPU()
+    cpu.load("test_mem.hex")
+    ring = TraceRing()
+    cpu.simulate(max_cycles=100, reporter=ring)
+    records = ring.to_numpy()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.rvtz")
+        compress_trace(records, path, chunk_records=2)
+        with CompressedTrace(path) as trace:
+            print(f"{len(trace)} records in {trace.num_chunks} chunks (expected 4 in 2)")
+            print(f"Chunk 1 decodes to PCs {[f'0x{pc:08X}' for pc in trace.chunk(1)['pc']]} "
+                  f"(expected 0x00000008, 0x0000000C)")
+            print(f"Round trip exact: {trace.read().tobytes() == records.tobytes()} (expected True)")
+
+    print("\nTrace codec test complete!")
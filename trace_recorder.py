@@ -0,0 +1,338 @@
+"""
+Binary execution traces
+
+The verbose console trace formats and prints a line per instruction,
+which is slow and leaves nothing to analyse afterwards. The recorders
+here are reporters (see reporter.py) that append one fixed-width binary
+record per executed instruction instead:
+
+  TraceWriter  batches records into a buffer and writes them to a file
+  TraceRing    keeps only the most recent records, in memory
+
+    with TraceWriter("run.trace") as recorder:
+        cpu.simulate(max_cycles=100000, reporter=recorder)
+    trace = read_trace("run.trace")      # NumPy structured array
+    trace['pc'], trace['mem_addr'][trace['flags'] & FLAG_STORE != 0]
+
+Tracing only happens when a recorder is passed to simulate() - without
+one the CPU runs exactly as before (the translate engine included), so
+a disabled trace costs nothing.
+
+Record layout (32 bytes, little-endian):
+    cycle      u64  cycle the instruction executed in
+    pc         u32
+    word       u32  instruction word
+    rd_value   u32  value written to rd (0 if nothing was)
+    mem_addr   u32  LW/SW address
+    mem_value  u32  value loaded or stored
+    rd         u8   destination register (0 if nothing was written)
+    flags      u8   FLAG_RD_WRITE | FLAG_LOAD | FLAG_STORE
+    (2 bytes padding)
+
+A trace file is a 16 byte header (magic, version, record size) followed
+by the records.
+"""
+
+import abc
+import struct
+
+from dispatch import NAMES
+
+try:
+    import numpy as np
+except ImportError:  # only read_trace/to_numpy need NumPy
+    np = None
+
+
+TRACE_MAGIC = b'RVTRACE\0'
+TRACE_VERSION = 1
+_HEADER = struct.Struct('<8sHHI')
+RECORD = struct.Struct('<QIIIIIBBxx')
+RECORD_SIZE = RECORD.size
+
+# Bits of a record's flags byte
+FLAG_RD_WRITE = 1
+FLAG_LOAD = 2
+FLAG_STORE = 4
+
+# Flags each instruction starts with - rd writes are dropped later for x0
+_MEMORY_KINDS = {'LW': FLAG_LOAD | FLAG_RD_WRITE, 'SW': FLAG_STORE}
+_WRITES_RD = {name: 0 if name in ('BEQ', 'BNE', 'BLT', 'BGE', 'UNKNOWN') else FLAG_RD_WRITE
+              for name in set(NAMES)}
+
+if np is not None:
+    TRACE_DTYPE = np.dtype([
+        ('cycle', '<u8'), ('pc', '<u4'), ('word', '<u4'), ('rd_value', '<u4'),
+        ('mem_addr', '<u4'), ('mem_value', '<u4'), ('rd', 'u1'), ('flags', 'u1'),
+        ('pad', 'V2'),
+    ])
+else:
+    TRACE_DTYPE = None
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("reading traces into arrays needs NumPy (pip install numpy)")
+
+
+class TraceRecorder(abc.ABC):
+    """
+    Common part of the recorders - turns executed instructions into records
+
+    The CPU calls trace() before each instruction runs, but the value an
+    instruction writes is only known afterwards, so each record is held
+    back until the next call (or finish()) and completed then.
+    Subclasses decide what happens when the buffer fills up.
+    """
+
+    def __init__(self, capacity):
+        """
+        Args:
+            capacity: Records the buffer holds
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1 record")
+        self.capacity = capacity
+        self.buffer = bytearray(capacity * RECORD_SIZE)
+        self.offset = 0
+        self.count = 0              # records completed so far
+        self._pending = None
+        self.trace = self._trace
+
+    def start(self, cpu):
+        # A run that raised part way leaves an instruction that never finished
+        self._pending = None
+
+    def finish(self, cpu, result):
+        if self._pending is not None:
+            self._complete(cpu)
+
+    def _trace(self, cpu, decoded):
+        regs = cpu.registers.registers
+        if self._pending is not None:
+            self._complete(cpu)
+
+        # Only loads and stores need anything worked out before they run
+        kind = _MEMORY_KINDS.get(decoded.name)
+        if kind is None:
+            self._pending = (cpu.cycle_count, cpu.pc, decoded, 0, 0, _WRITES_RD[decoded.name])
+        else:
+            address = (regs[decoded.rs1] + decoded.imm) & 0xFFFFFFFF
+            value = regs[decoded.rs2] if kind == FLAG_STORE else 0
+            self._pending = (cpu.cycle_count, cpu.pc, decoded, address, value, kind)
+
+    def _complete(self, cpu):
+        """Write out the held-back record now its instruction has run"""
+        cycle, pc, decoded, address, value, flags = self._pending
+        self._pending = None
+
+        rd = decoded.rd
+        rd_value = 0
+        if flags & FLAG_RD_WRITE and rd:
+            rd_value = cpu.registers.registers[rd]
+        else:
+            flags &= ~FLAG_RD_WRITE
+            rd = 0
+        if flags & FLAG_LOAD:
+            value = rd_value if rd else cpu.memory.read_word(address)
+
+        RECORD.pack_into(self.buffer, self.offset, cycle, pc, decoded.word,
+                         rd_value, address, value, rd, flags)
+        self.offset += RECORD_SIZE
+        self.count += 1
+        if self.offset == len(self.buffer):
+            self._buffer_full()
+
+    @abc.abstractmethod
+    def _buffer_full(self):
+        """Make room in the full buffer and set offset to where the next record goes"""
+
+
+class TraceWriter(TraceRecorder):
+    """Streams records to a file, writing them in batches"""
+
+    def __init__(self, file, batch=4096):
+        """
+        Args:
+            file: Path, or a binary stream opened for writing
+            batch: Records collected before each write
+        """
+        super().__init__(batch)
+        if isinstance(file, (str, bytes)) or hasattr(file, '__fspath__'):
+            self.stream = open(file, 'wb')
+            self._owns_stream = True
+        else:
+            self.stream = file
+            self._owns_stream = False
+        self.stream.write(_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, RECORD_SIZE, 0))
+
+    def _buffer_full(self):
+        self.stream.write(self.buffer)
+        self.offset = 0
+
+    def flush(self):
+        """Write out whatever is buffered"""
+        if self.offset:
+            self.stream.write(memoryview(self.buffer)[:self.offset])
+            self.offset = 0
+        self.stream.flush()
+
+    def close(self):
+        """Flush, and close the file if this writer opened it"""
+        self.flush()
+        if self._owns_stream:
+            self.stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceRing(TraceRecorder):
+    """Keeps the last `capacity` records in memory, older ones are overwritten"""
+
+    def __init__(self, capacity=65536):
+        super().__init__(capacity)
+
+    def _buffer_full(self):
+        self.offset = 0
+
+    def records(self):
+        """The kept records as bytes, oldest first"""
+        if self.count < self.capacity:
+            return bytes(self.buffer[:self.offset])
+        return bytes(self.buffer[self.offset:] + self.buffer[:self.offset])
+
+    def __iter__(self):
+        """Kept records as tuples in RECORD field order, oldest first"""
+        return RECORD.iter_unpack(self.records())
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def to_numpy(self):
+        """Kept records as a TRACE_DTYPE structured array, oldest first"""
+        _require_numpy()
+        return np.frombuffer(self.records(), dtype=TRACE_DTYPE)
+
+
+def address_trace(step):
+    """
+    A reporter trace() for models that only need each instruction and its address
+
+    Args:
+        step: Called as step(pc, word, address) before each instruction runs,
+              with the address LW/SW use or None for other instructions
+
+    Returns:
+        A trace(cpu, decoded) function to set as the reporter's trace
+    """
+    def trace(cpu, decoded):
+        name = decoded.name
+        if name == 'LW' or name == 'SW':
+            step(cpu.pc, decoded.word, (cpu.registers.registers[decoded.rs1] + decoded.imm) & 0xFFFFFFFF)
+        else:
+            step(cpu.pc, decoded.word, None)
+    return trace
+
+
+def _check_header(header, path):
+    if len(header) < _HEADER.size:
+        raise ValueError(f"{path}: too small to be a trace file")
+    magic, version, record_size, _ = _HEADER.unpack(header)
+    if magic != TRACE_MAGIC:
+        raise ValueError(f"{path}: not a trace file")
+    if version != TRACE_VERSION or record_size != RECORD_SIZE:
+        raise ValueError(f"{path}: unsupported trace version {version}")
+
+
+def iter_chunks(path, batch=4096):
+    """
+    Records of a trace file as raw bytes, up to batch records at a time
+
+    Args:
+        path: Trace file written by TraceWriter
+        batch: Records per chunk (the last one may hold fewer)
+    Raises:
+        ValueError if the file isn't a trace
+    """
+    with open(path, 'rb') as f:
+        _check_header(f.read(_HEADER.size), path)
+        while True:
+            chunk = f.read(RECORD_SIZE * batch)
+            whole = len(chunk) - len(chunk) % RECORD_SIZE
+            if not whole:
+                break
+            yield chunk[:whole]
+
+
+def iter_trace(path):
+    """
+    Records of a trace file as tuples in RECORD field order (no NumPy needed)
+
+    Raises:
+        ValueError if the file isn't a trace
+    """
+    for chunk in iter_chunks(path):
+        yield from RECORD.iter_unpack(chunk)
+
+
+def read_trace(path, mmap=False):
+    """
+    Load a trace file into NumPy
+
+    Args:
+        path: Trace file written by TraceWriter
+        mmap: Map the file instead of reading it (for traces bigger than RAM)
+    Returns:
+        Structured array with TRACE_DTYPE fields ('cycle', 'pc', 'word', ...)
+    Raises:
+        ValueError if the file isn't a trace
+    """
+    _require_numpy()
+    with open(path, 'rb') as f:
+        _check_header(f.read(_HEADER.size), path)
+        f.seek(0, 2)
+        count = (f.tell() - _HEADER.size) // RECORD_SIZE
+    if mmap:
+        if count == 0:
+            return np.zeros(0, dtype=TRACE_DTYPE)
+        return np.memmap(path, dtype=TRACE_DTYPE, mode='r', offset=_HEADER.size, shape=(count,))
+    return np.fromfile(path, dtype=TRACE_DTYPE, count=count, offset=_HEADER.size)
+
+
+# Test
+if __name__ == "__main__":
+    import os
+    import tempfile
+
+    from cpu import RISCV_CPU
+
+    print("Testing trace recorders...")
+
+    cpu = RISCV_CPU()
+    cpu.load("test_mem.hex")
+    ring = TraceRing(capacity=3)
+    result = cpu.simulate(max_cycles=100, reporter=ring)
+    print(f"Ran {result.cycles} instructions, ring kept the last {len(ring)} (expected 3)")
+    for cycle, pc, word, rd_value, address, value, rd, flags in ring:
+        print(f"  [{cycle}] PC=0x{pc:08X} {word:08X} rd=x{rd}:{rd_value} "
+              f"mem=0x{address:08X}:{value} flags={flags}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "run.trace")
+        cpu = RISCV_CPU()
+        cpu.load("test_mem.hex")
+        with TraceWriter(path, batch=2) as writer:
+            cpu.simulate(max_cycles=100, reporter=writer)
+        records = list(iter_trace(path))
+        print(f"File holds {len(records)} records, {os.path.getsize(path)} bytes "
+              f"(expected {result.cycles}, {16 + 32 * result.cycles})")
+        if np is not None:
+            trace = read_trace(path)
+            stores = trace[trace['flags'] & FLAG_STORE != 0]
+            print(f"Stores at: {[f'0x{a:08X}' for a in stores['mem_addr']]}")
+
+    print("\nTrace test complete!")
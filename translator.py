@@ -0,0 +1,440 @@
+from memory import MemoryAccessError
+
+
+class TranslatedBlock:
+    """
+    One basic block compiled into a Python function
+
+    The function is called as
+        function(R, read_word, write_word, stale, budget, fault)
+    and returns (next_pc, instructions_executed).
+    R is the register list, stale is a one-item list that gets set
+    when a store invalidates translated code, and budget is the most
+    instructions the block may run (it can loop back on itself).
+    If a load or store raises, the registers written so far are still
+    stored back to R, fault is set to [pc of that instruction,
+    instructions executed before it] and the exception propagates.
+    """
+
+    def __init__(self, start_pc, end_pc, length, function, source):
+        self.start_pc = start_pc
+        self.end_pc = end_pc          # address just past the last instruction
+        self.length = length          # instructions in one pass
+        self.function = function
+        self.source = source
+        self.executions = 0
+
+
+class BlockTranslator:
+    """
+    Translates guest basic blocks into Python functions
+
+    A block runs from its start PC up to and including the first
+    BEQ/BNE/BLT/BGE/JAL/JALR. The generated code keeps registers in
+    local variables and only writes back the ones it changes.
+    Blocks whose branch goes back to their own start loop inside the
+    function, so tight loops never leave compiled code.
+
+    Anything the translator can't handle exactly like the interpreter
+    (halt, zero words, unknown encodings) ends the block before it,
+    and the CPU runs that instruction through the interpreter instead.
+    """
+
+    MAX_BLOCK_LENGTH = 64
+
+    def __init__(self, memory, decoder):
+        """
+        Args:
+            memory: Memory object guest code lives in
+            decoder: InstructionDecoder to decode guest code with
+        """
+        self.memory = memory
+        self.decoder = decoder
+
+        # start pc -> TranslatedBlock
+        self.blocks = {}
+        # word address -> start PCs of blocks containing that word
+        self.word_owners = {}
+
+        # Address range covered by translated code
+        self.low = 0xFFFFFFFF
+        self.high = 0
+
+        # Set to True whenever a store throws away translated code, so a
+        # running block knows to stop after the store
+        self.stale = [False]
+        # Where a block stopped when a load or store raised:
+        # [pc, instructions it executed before that one]
+        self.fault = [0, 0]
+
+        self.translations = 0
+        self.invalidations = 0
+        self.untranslatable = 0
+
+        memory.add_write_hook(self.invalidate)
+
+    def lookup(self, pc):
+        """
+        Get the block starting at a PC, translating it if needed
+
+        Args:
+            pc: Start address of the block
+        Returns:
+            TranslatedBlock, or None if the first instruction
+            has to go through the interpreter
+        """
+        block = self.blocks.get(pc)
+        if block is None:
+            block = self.translate(pc)
+        return block
+
+    def translate(self, start_pc):
+        """
+        Translate the basic block at start_pc and cache it
+
+        Args:
+            start_pc: Address of the first instruction
+        Returns:
+            TranslatedBlock, or None if nothing could be translated
+        """
+        body = []
+        touched = set()
+        written = set()
+        pc = start_pc
+        terminator = None
+
+        while len(body) < self.MAX_BLOCK_LENGTH:
+            try:
+                instruction = self.memory.read_word(pc)
+            except MemoryAccessError:
+                # Stop before it - the interpreter faults on the fetch when it gets there
+                break
+
+            # Halt and empty memory are handled by the run loop
+            if instruction == 0x0000006F or instruction == 0:
+                break
+
+            decoded = self.decoder.decode_record(instruction)
+            name = decoded.name
+            if name in _TERMINATORS:
+                terminator = (pc, decoded, name)
+                pc += 4
+                self._collect_registers(decoded, touched, written)
+                break
+
+            lines = self._emit(pc, decoded, name)
+            if lines is None:
+                break
+
+            self._collect_registers(decoded, touched, written)
+            body.append((pc, instruction, name, lines))
+            pc += 4
+
+        length = len(body) + (1 if terminator else 0)
+        if length == 0:
+            self.untranslatable += 1
+            return None
+
+        source = self._generate(start_pc, body, terminator, touched, written)
+        namespace = {}
+        code = compile(source, f"<block 0x{start_pc:08X}>", "exec")
+        exec(code, namespace)
+
+        block = TranslatedBlock(start_pc, pc, length,
+                                namespace['block'], source)
+        self.blocks[start_pc] = block
+        for addr in range(start_pc & ~3, pc, 4):
+            self.word_owners.setdefault(addr, []).append(start_pc)
+
+        if start_pc < self.low:
+            self.low = start_pc
+        if pc > self.high:
+            self.high = pc
+
+        self.translations += 1
+        return block
+
+    def invalidate(self, address, num_bytes=4):
+        """
+        Throw away blocks overlapping a written range
+        Called by Memory after every write
+
+        Args:
+            address: First byte written
+            num_bytes: Number of bytes written
+        """
+        if address + num_bytes <= self.low or address >= self.high:
+            return
+
+        if num_bytes >= len(self.word_owners) * 4:
+            end = address + num_bytes
+            words = [w for w in self.word_owners if w + 4 > address and w < end]
+        else:
+            words = range(address & ~3, address + num_bytes, 4)
+
+        for word in words:
+            owners = self.word_owners.pop(word, None)
+            if owners is None:
+                continue
+            for start_pc in owners:
+                if self.blocks.pop(start_pc, None) is not None:
+                    self.invalidations += 1
+                    self.stale[0] = True
+
+    def clear(self):
+        """Drop all translated code"""
+        self.blocks.clear()
+        self.word_owners.clear()
+        self.low = 0xFFFFFFFF
+        self.high = 0
+
+    def stats(self):
+        """
+        Get translation counters
+
+        Returns:
+            Dictionary with blocks, translations, invalidations,
+            untranslatable and block_executions
+        """
+        return {
+            'blocks': len(self.blocks),
+            'translations': self.translations,
+            'invalidations': self.invalidations,
+            'untranslatable': self.untranslatable,
+            'block_executions': sum(b.executions for b in self.blocks.values()),
+        }
+
+    # ---- code generation ----
+
+    def _collect_registers(self, decoded, touched, written):
+        """Record which registers an instruction reads and writes"""
+        opcode = decoded.opcode
+        if opcode in (0x33, 0x23, 0x63):
+            touched.add(decoded.rs1)
+            touched.add(decoded.rs2)
+        elif opcode in (0x13, 0x03, 0x67):
+            touched.add(decoded.rs1)
+        if opcode not in (0x23, 0x63):
+            touched.add(decoded.rd)
+            written.add(decoded.rd)
+        touched.discard(0)
+        written.discard(0)
+
+    def _emit(self, pc, decoded, name):
+        """
+        Generate the statements for one non-branch instruction
+        Picks the code by the dispatch table name, so it always agrees
+        with what the interpreter would run
+
+        Returns:
+            List of source lines, or None if the interpreter has to run it
+        """
+        rd = decoded.rd
+        rs1 = _reg(decoded.rs1)
+        rs2 = _reg(decoded.rs2)
+        imm = decoded.imm
+
+        if name in _REGISTER_OPS:
+            return _assign(rd, _REGISTER_OPS[name].format(a=rs1, b=rs2))
+
+        if name in _IMMEDIATE_OPS:
+            return _assign(rd, _IMMEDIATE_OPS[name].format(a=rs1, b=imm))
+
+        if name in _SHIFT_IMMEDIATE_OPS:
+            return _assign(rd, _SHIFT_IMMEDIATE_OPS[name].format(a=rs1, b=imm & 0x1F))
+
+        if name == "LW":
+            if rd == 0:
+                # The value is dropped but the read still happens (and can fault)
+                return [f"read_word(({rs1} + {imm}) & 0xFFFFFFFF)"]
+            return _assign(rd, f"read_word(({rs1} + {imm}) & 0xFFFFFFFF)")
+
+        if name == "SW":
+            # A store may have overwritten translated code (maybe this block)
+            return [f"write_word(({rs1} + {imm}) & 0xFFFFFFFF, {rs2})",
+                    "if stale[0]:",
+                    "    executed += {done}",
+                    f"    next_pc = 0x{(pc + 4) & 0xFFFFFFFF:08X}",
+                    "    break"]
+
+        if name == "LUI":
+            return _assign(rd, f"{imm}")
+
+        if name == "AUIPC":
+            return _assign(rd, f"{(pc + imm) & 0xFFFFFFFF}")
+
+        # UNKNOWN - the interpreter traps on it
+        return None
+
+    def _emit_terminator(self, pc, decoded, name, start_pc, length):
+        """Generate the statements that end a block and pick next_pc"""
+        rd = decoded.rd
+        rs1 = _reg(decoded.rs1)
+        rs2 = _reg(decoded.rs2)
+        imm = decoded.imm
+        fallthrough = (pc + 4) & 0xFFFFFFFF
+        link = (pc + 4) & 0xFFFFFFFF
+
+        if name in _BRANCH_CONDITIONS:
+            cond = _BRANCH_CONDITIONS[name].format(a=rs1, b=rs2)
+            target = (pc + imm) & 0xFFFFFFFF
+            lines = [f"executed += {length}"]
+            if target == start_pc:
+                # Loop back on ourselves while there is budget left
+                lines += [f"if {cond}:",
+                          f"    if executed + {length} <= budget:",
+                          "        continue",
+                          f"    next_pc = 0x{target:08X}",
+                          "else:",
+                          f"    next_pc = 0x{fallthrough:08X}"]
+            else:
+                lines += [f"next_pc = 0x{target:08X} if {cond} else 0x{fallthrough:08X}"]
+            return lines + ["break"]
+
+        if name == "JAL":
+            target = (pc + imm) & 0xFFFFFFFF
+            lines = [f"executed += {length}"]
+            lines += _assign(rd, f"{link}")
+            if target == start_pc:
+                lines += [f"if executed + {length} <= budget:",
+                          "    continue"]
+            return lines + [f"next_pc = 0x{target:08X}", "break"]
+
+        # JALR - work out the target before rd is written in case rd == rs1
+        lines = [f"executed += {length}",
+                 f"next_pc = ({rs1} + {imm}) & 0xFFFFFFFE"]
+        lines += _assign(rd, f"{link}")
+        return lines + ["break"]
+
+    def _generate(self, start_pc, body, terminator, touched, written):
+        """Put the block function's source together"""
+        regs = sorted(touched)
+        out = ["def block(R, read_word, write_word, stale, budget, fault):"]
+        for r in regs:
+            out.append(f"    x{r} = R[{r}]")
+        out.append("    executed = 0")
+        # Registers go back to R however the block ends, like the
+        # interpreter leaves everything before a faulting load or store done
+        out.append("    try:")
+        out.append("        while True:")
+
+        accesses = False
+        for index, (pc, instruction, name, lines) in enumerate(body):
+            out.append(f"            # 0x{pc:08X}: {instruction:08X}  {name}")
+            if name in ("LW", "SW"):
+                # Only loads and stores can raise
+                out.append(f"            at = {index}")
+                accesses = True
+            for line in lines:
+                out.append("            " + line.replace("{done}", str(index + 1)))
+
+        if terminator is not None:
+            pc, decoded, name = terminator
+            length = len(body) + 1
+            out.append(f"            # 0x{pc:08X}  {name}")
+            for line in self._emit_terminator(pc, decoded, name, start_pc, length):
+                out.append("            " + line)
+        else:
+            # Block was cut short - carry on at the next instruction
+            end_pc = (start_pc + 4 * len(body)) & 0xFFFFFFFF
+            out.append(f"            executed += {len(body)}")
+            out.append(f"            next_pc = 0x{end_pc:08X}")
+            out.append("            break")
+
+        if accesses:
+            out.append("    except Exception:")
+            out.append(f"        fault[0] = (0x{start_pc:08X} + 4 * at) & 0xFFFFFFFF")
+            out.append("        fault[1] = executed + at")
+            out.append("        raise")
+        out.append("    finally:")
+        for r in sorted(written):
+            out.append(f"        R[{r}] = x{r}")
+        if not written:
+            out.append("        pass")
+        out.append("    return next_pc, executed")
+        return "\n".join(out) + "\n"
+
+
+# Python expressions for each instruction, by dispatch table name
+# {a} and {b} are the operands; all values are unsigned 32-bit
+_SIGNED = "(({a} ^ 0x80000000) - 0x80000000)"
+
+_REGISTER_OPS = {
+    "ADD": "({a} + {b}) & 0xFFFFFFFF",
+    "SUB": "({a} - {b}) & 0xFFFFFFFF",
+    "AND": "{a} & {b}",
+    "OR": "{a} | {b}",
+    "XOR": "{a} ^ {b}",
+    "SLL": "({a} << ({b} & 0x1F)) & 0xFFFFFFFF",
+    "SRL": "{a} >> ({b} & 0x1F)",
+    "SRA": "(" + _SIGNED + " >> ({b} & 0x1F)) & 0xFFFFFFFF",
+}
+
+_IMMEDIATE_OPS = {
+    "ADDI": "({a} + {b}) & 0xFFFFFFFF",
+    "ANDI": "{a} & {b}",
+    "ORI": "{a} | {b}",
+    "XORI": "{a} ^ {b}",
+}
+
+_SHIFT_IMMEDIATE_OPS = {
+    "SLLI": "({a} << {b}) & 0xFFFFFFFF",
+    "SRLI": "{a} >> {b}",
+    "SRAI": "(" + _SIGNED + " >> {b}) & 0xFFFFFFFF",
+}
+
+# Flipping the sign bit turns a signed compare into an unsigned one
+_BRANCH_CONDITIONS = {
+    "BEQ": "{a} == {b}",
+    "BNE": "{a} != {b}",
+    "BLT": "({a} ^ 0x80000000) < ({b} ^ 0x80000000)",
+    "BGE": "({a} ^ 0x80000000) >= ({b} ^ 0x80000000)",
+}
+
+_TERMINATORS = set(_BRANCH_CONDITIONS) | {"JAL", "JALR"}
+
+
+def _reg(num):
+    """Source text for reading a register (x0 is always 0)"""
+    return "0" if num == 0 else f"x{num}"
+
+
+def _assign(rd, expr):
+    """Source lines for writing a register (writes to x0 are dropped)"""
+    if rd == 0:
+        return ["pass"]
+    return [f"x{rd} = {expr}"]
+
+
+# Test
+if __name__ == "__main__":
+    from memory import Memory
+    from decoder import InstructionDecoder
+
+    print("Testing block translator...")
+
+    mem = Memory()
+    program = [
+        0x00000093,  # addi x1, x0, 0
+        0x00A00113,  # addi x2, x0, 10
+        0x00108093,  # addi x1, x1, 1
+        0xFE209EE3,  # bne x1, x2, -4
+        0x0000006F,  # halt
+    ]
+    for i, inst in enumerate(program):
+        mem.write_word(i * 4, inst)
+
+    translator = BlockTranslator(mem, InstructionDecoder())
+    block = translator.lookup(0x0)
+    print(block.source)
+
+    R = [0] * 32
+    next_pc, executed = block.function(R, mem.read_word, mem.write_word,
+                                       translator.stale, 1000, translator.fault)
+    block = translator.lookup(next_pc)
+    next_pc, more = block.function(R, mem.read_word, mem.write_word,
+                                   translator.stale, 1000, translator.fault)
+    print(f"x1 = {R[1]} (expected 10), next pc = 0x{next_pc:08X} (expected 0x00000010)")
+    print(f"Executed {executed + more} instructions (expected 22)")
+
+    print("\nTranslator test complete!")